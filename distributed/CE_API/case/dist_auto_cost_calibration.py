@@ -0,0 +1,403 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+/***************************************************************************
+  *
+  * @file dist_auto_cost_calibration.py
+  * @brief auto-parallel cost model离线校准
+  *
+  * 生成一组小的静态图op(matmul, elementwise, 激活, reduce)与集合通信op的corpus,
+  * 取auto-parallel cost model的估计耗时, 再在CPU上实测同样的op:
+  * 计算op用静态图Executor执行, 以1个与1+repeat个相同op的耗时差消除Executor的固定开销;
+  * 通信op用dist_collective_gloo_bench在一个gloo通信组中实测.
+  * 输出spearman秩相关, MAPE(原始值与按类别缩放后的值)以及偏差最大的op;
+  * corpus与每次结果保存在AUTO_COST_CALIB_DIR中, 与上一次结果对比, 标记cost model准确度的退化
+  *
+  * python dist_auto_cost_calibration.py --dir cost_calibration
+  *
+  **************************************************************************/
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from utils import run_priority
+
+# cost model只支持V100/A100, 以V100单机8卡作为估计用的cluster
+CLUSTER_CONFIG = {"cluster": {"num_nodes": 1, "num_gpus": 8, "gpu_model": "V100", "gpu_memory": 32}}
+# 与上一次结果相比, spearman下降或缩放后MAPE上升超过该值时视为退化
+SPEARMAN_TOLERANCE = 0.1
+MAPE_TOLERANCE = 0.2
+# cost model是确定性的, 同一op估计值相对变化超过该值即为模型改动
+ESTIMATE_TOLERANCE = 0.01
+# 通信op的cost类型 -> gloo bench中的op
+COMM_BENCH_OP = {
+    "all_reduce": "all_reduce",
+    "all_gather": "all_gather",
+    "broadcast": "broadcast",
+    "send_v2": "sendrecv",
+}
+
+
+def generate_corpus(quick=False):
+    """
+    生成corpus, 每条为一个op及其输入shape, id唯一
+    :param quick: 只保留少量case, 用于冒烟测试
+    """
+    corpus = []
+    matmul_shapes = [(32, 64, 32), (64, 128, 256), (128, 128, 128), (256, 256, 256), (128, 1024, 64), (512, 512, 512)]
+    shapes = [[64, 64], [256, 256], [512, 512], [1024, 1024], [64, 8192]]
+    if quick:
+        matmul_shapes = matmul_shapes[1:4]
+        shapes = shapes[1:3]
+    for m, k, n in matmul_shapes:
+        corpus.append(
+            {
+                "id": "matmul_v2-{}x{}x{}".format(m, k, n),
+                "kind": "comp",
+                "op": "matmul_v2",
+                "inputs": {"X": [m, k], "Y": [k, n]},
+                "attrs": {"trans_x": False, "trans_y": False},
+            }
+        )
+    for shape in shapes:
+        name = "x".join(str(s) for s in shape)
+        for op in ["elementwise_add", "elementwise_mul", "elementwise_div"]:
+            corpus.append(
+                {
+                    "id": "{}-{}".format(op, name),
+                    "kind": "comp",
+                    "op": op,
+                    "inputs": {"X": shape, "Y": shape},
+                    "attrs": {"axis": -1},
+                }
+            )
+        for op, attrs in [("relu", {}), ("gelu", {"approximate": False}), ("softmax", {"axis": -1})]:
+            corpus.append(
+                {"id": "{}-{}".format(op, name), "kind": "comp", "op": op, "inputs": {"X": shape}, "attrs": attrs}
+            )
+        for op in ["reduce_sum", "reduce_mean"]:
+            corpus.append(
+                {
+                    "id": "{}-{}".format(op, name),
+                    "kind": "comp",
+                    "op": op,
+                    "inputs": {"X": shape},
+                    "attrs": {"dim": [1], "keep_dim": False, "reduce_all": False},
+                }
+            )
+    sizes = [16 << 10, 256 << 10, 1 << 20, 4 << 20]
+    if quick:
+        sizes = sizes[:2]
+    for op in COMM_BENCH_OP:
+        for size in sizes:
+            corpus.append(
+                {
+                    "id": "{}-{}B".format(op, size),
+                    "kind": "comm",
+                    "op": op,
+                    "inputs": {"X": [size // 4]},
+                    "attrs": {},
+                    "nranks": 2,
+                }
+            )
+    return corpus
+
+
+def build_program(entry, repeat=1):
+    """
+    单个op重复repeat次的静态图, 输入为feed变量
+    :return: main_program, startup_program, 最后一个输出变量
+    """
+    import paddle
+
+    main_program = paddle.static.Program()
+    startup_program = paddle.static.Program()
+    with paddle.static.program_guard(main_program, startup_program):
+        block = main_program.global_block()
+        inputs = {name: [paddle.static.data(name.lower(), shape, "float32")] for name, shape in entry["inputs"].items()}
+        out = None
+        for i in range(repeat):
+            out = block.create_var(name="{}_out_{}".format(entry["op"], i), dtype="float32")
+            block.append_op(type=entry["op"], inputs=inputs, outputs={"Out": [out]}, attrs=entry["attrs"])
+    return main_program, startup_program, out
+
+
+def estimate(entry, cluster):
+    """
+    cost model估计耗时(us), 0表示cost model未建模该op
+    """
+    import paddle
+    from paddle.distributed.auto_parallel.static.cost import CommContext
+    from paddle.distributed.auto_parallel.static.cost.base_cost import (
+        _g_op_cost_factory,
+        build_comm_desc,
+        calc_time_by_cost_model,
+    )
+
+    if entry["kind"] == "comm":
+        desc = build_comm_desc(entry["op"], list(range(entry["nranks"])), paddle.float32, entry["inputs"]["X"])
+        return _g_op_cost_factory[entry["op"]](op_desc=desc, comm_context=CommContext(cluster)).time
+    main_program, _, _ = build_program(entry)
+    return calc_time_by_cost_model(main_program.global_block().ops[-1], cluster)
+
+
+def measure_comp(entry, exe, repeat=8, iters=20):
+    """
+    CPU实测单个计算op耗时(us): (1+repeat个op的耗时 - 1个op的耗时) / repeat, 取中位数
+    """
+    feed = {
+        name.lower(): np.random.RandomState(0).uniform(0.5, 1.5, shape).astype("float32")
+        for name, shape in entry["inputs"].items()
+    }
+    medians = []
+    for count in [1, 1 + repeat]:
+        main_program, startup_program, out = build_program(entry, count)
+        exe.run(startup_program)
+        for _ in range(3):
+            exe.run(main_program, feed=feed, fetch_list=[out])
+        costs = []
+        for _ in range(iters):
+            start = time.perf_counter()
+            exe.run(main_program, feed=feed, fetch_list=[out])
+            costs.append(time.perf_counter() - start)
+        medians.append(np.median(costs))
+    # 极小的op可能被噪声淹没, 下限取0.1us
+    return max((medians[1] - medians[0]) / repeat * 1e6, 0.1)
+
+
+def measure_comm(entries, iters=20):
+    """
+    在一个gloo通信组中实测全部通信op, 返回 id -> p50耗时(us)
+    """
+    from dist_collective_gloo_bench import launch
+
+    res = {}
+    for nranks in sorted({entry["nranks"] for entry in entries}):
+        group = [entry for entry in entries if entry["nranks"] == nranks]
+        ops = sorted({COMM_BENCH_OP[entry["op"]] for entry in group})
+        sizes = sorted({entry["inputs"]["X"][0] * 4 for entry in group})
+        summary, failures = launch(
+            nranks=nranks, sizes=[str(size) for size in sizes], dtypes=["float32"], ops=ops, iters=iters
+        )
+        if failures:
+            raise Exception("gloo bench failed: {}".format(failures))
+        p50 = {(item["op"], item["bytes"]): item["p50_us"] for item in summary}
+        for entry in group:
+            res[entry["id"]] = p50[(COMM_BENCH_OP[entry["op"]], entry["inputs"]["X"][0] * 4)]
+    return res
+
+
+def rankdata(values):
+    """秩, 相同值取平均秩"""
+    values = np.asarray(values, dtype="float64")
+    order = np.argsort(values, kind="mergesort")
+    ranks = np.empty(len(values))
+    i = 0
+    while i < len(values):
+        j = i
+        while j + 1 < len(values) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        ranks[order[i : j + 1]] = (i + j) / 2.0
+        i = j + 1
+    return ranks
+
+
+def spearman(x, y):
+    """spearman秩相关系数"""
+    if len(x) < 2:
+        return float("nan")
+    rx = rankdata(x)
+    ry = rankdata(y)
+    if rx.std() == 0 or ry.std() == 0:
+        return float("nan")
+    return float(np.corrcoef(rx, ry)[0, 1])
+
+
+def evaluate(ops, top=5):
+    """
+    按kind(comp/comm/all)统计准确度
+    缩放系数取log(actual/estimate)中位数的指数(几何中位数), 对个别离群op不敏感, 即只校准量纲(V100估计值与CPU实测)后的误差
+    """
+    metrics = {}
+    modeled = {key: value for key, value in ops.items() if value["estimate"] > 0}
+    for kind in ["comp", "comm", "all"]:
+        items = [(key, value) for key, value in modeled.items() if kind == "all" or value["kind"] == kind]
+        if not items:
+            continue
+        est = np.array([value["estimate"] for _, value in items])
+        act = np.array([value["actual"] for _, value in items])
+        scale = float(np.exp(np.median(np.log(act / est))))
+        log_error = np.abs(np.log(scale * est / act))
+        worst = np.argsort(-log_error)[:top]
+        metrics[kind] = {
+            "count": len(items),
+            "spearman": spearman(est, act),
+            "mape": float(np.mean(np.abs(est - act) / act)),
+            "scale": scale,
+            "calibrated_mape": float(np.mean(np.abs(scale * est - act) / act)),
+            "worst": [
+                {"id": items[i][0], "ratio": float(scale * est[i] / act[i]), "estimate": est[i], "actual": act[i]}
+                for i in worst
+            ],
+        }
+    metrics["unmodeled"] = sorted(key for key, value in ops.items() if value["estimate"] <= 0)
+    return metrics
+
+
+def compare(latest, baseline):
+    """
+    与上一次结果对比, 返回退化说明list
+    """
+    flags = []
+    for kind in ["comp", "comm", "all"]:
+        if kind not in latest["metrics"] or kind not in baseline["metrics"]:
+            continue
+        new = latest["metrics"][kind]
+        old = baseline["metrics"][kind]
+        # 参与统计的op数不同(如本次未测通信op)时指标不可比
+        if new["count"] != old["count"]:
+            continue
+        if old["spearman"] - new["spearman"] > SPEARMAN_TOLERANCE:
+            flags.append("{} spearman {:.3f} -> {:.3f}".format(kind, old["spearman"], new["spearman"]))
+        if new["calibrated_mape"] > old["calibrated_mape"] * (1 + MAPE_TOLERANCE):
+            flags.append(
+                "{} calibrated mape {:.3f} -> {:.3f}".format(kind, old["calibrated_mape"], new["calibrated_mape"])
+            )
+    for key, value in latest["ops"].items():
+        if key not in baseline["ops"]:
+            continue
+        old_estimate = baseline["ops"][key]["estimate"]
+        if abs(value["estimate"] - old_estimate) > ESTIMATE_TOLERANCE * max(abs(old_estimate), 1e-9):
+            flags.append("{} estimate {:.4g} -> {:.4g}".format(key, old_estimate, value["estimate"]))
+    newly_unmodeled = set(latest["metrics"]["unmodeled"]) - set(baseline["metrics"]["unmodeled"])
+    if newly_unmodeled:
+        flags.append("newly unmodeled: {}".format(sorted(newly_unmodeled)))
+    return flags
+
+
+def calibrate(calib_dir, quick=False, with_comm=True, repeat=8, iters=20, top=5):
+    """
+    执行一次校准, corpus不存在时生成, 结果追加到results.json
+    :return: 本次结果, 退化说明list
+    """
+    import paddle
+    from paddle.distributed.auto_parallel.static.cluster import get_default_cluster
+
+    os.makedirs(calib_dir, exist_ok=True)
+    corpus_path = os.path.join(calib_dir, "corpus.json")
+    results_path = os.path.join(calib_dir, "results.json")
+    if os.path.exists(corpus_path):
+        with open(corpus_path) as f:
+            corpus = json.load(f)
+    else:
+        corpus = generate_corpus(quick=quick)
+        with open(corpus_path, "w") as f:
+            json.dump(corpus, f, indent=1)
+    if not with_comm:
+        corpus = [entry for entry in corpus if entry["kind"] != "comm"]
+
+    # 通信实测需要在开启静态图之前完成, 子进程使用动态图
+    actual = measure_comm([entry for entry in corpus if entry["kind"] == "comm"], iters) if with_comm else {}
+    cluster = get_default_cluster(CLUSTER_CONFIG)
+    paddle.enable_static()
+    try:
+        with paddle.pir_utils.OldIrGuard():
+            exe = paddle.static.Executor(paddle.CPUPlace())
+            ops = {}
+            for entry in corpus:
+                if entry["kind"] == "comp":
+                    actual[entry["id"]] = measure_comp(entry, exe, repeat, iters)
+                ops[entry["id"]] = {
+                    "kind": entry["kind"],
+                    "estimate": float(estimate(entry, cluster)),
+                    "actual": float(actual[entry["id"]]),
+                }
+    finally:
+        paddle.disable_static()
+
+    latest = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "paddle_version": paddle.__version__,
+        "paddle_commit": paddle.__git_commit__,
+        "metrics": evaluate(ops, top),
+        "ops": ops,
+    }
+    history = []
+    if os.path.exists(results_path):
+        with open(results_path) as f:
+            history = json.load(f)
+    flags = compare(latest, history[-1]) if history else []
+    latest["flags"] = flags
+    history.append(latest)
+    with open(results_path + ".tmp", "w") as f:
+        json.dump(history, f, indent=1)
+    os.replace(results_path + ".tmp", results_path)
+    return latest, flags
+
+
+def report(latest, flags):
+    """打印结果"""
+    for kind in ["comp", "comm", "all"]:
+        if kind not in latest["metrics"]:
+            continue
+        item = latest["metrics"][kind]
+        print(
+            "{:5} count {:3}  spearman {:.3f}  mape {:.3g}  scale {:.3g}  calibrated mape {:.3f}".format(
+                kind, item["count"], item["spearman"], item["mape"], item["scale"], item["calibrated_mape"]
+            )
+        )
+        for worst in item["worst"]:
+            print(
+                "      {:32} est*scale/actual {:8.3f}  est {:10.4g}us  actual {:10.4g}us".format(
+                    worst["id"], worst["ratio"], worst["estimate"], worst["actual"]
+                )
+            )
+    if latest["metrics"]["unmodeled"]:
+        print("unmodeled (estimate 0): {}".format(", ".join(latest["metrics"]["unmodeled"])))
+    for flag in flags:
+        print("REGRESSION: {}".format(flag))
+
+
+@run_priority(level="P0")
+def test_auto_cost_calibration():
+    """test_auto_cost_calibration"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        latest, flags = calibrate(temp_dir, quick=True, repeat=4, iters=5)
+        report(latest, flags)
+        assert set(latest["metrics"]) >= {"comp", "comm", "all", "unmodeled"}
+        assert all(value["actual"] > 0 for value in latest["ops"].values())
+        # cost model为确定性的, 第二次运行不应出现估计值变化
+        latest, flags = calibrate(temp_dir, quick=True, with_comm=False, repeat=4, iters=5)
+        assert not [flag for flag in flags if "estimate" in flag], flags
+        with open(os.path.join(temp_dir, "results.json")) as f:
+            assert len(json.load(f)) == 2
+    print("test_auto_cost_calibration ... ok")
+
+
+def main():
+    """main"""
+    parser = argparse.ArgumentParser(description="auto-parallel cost model calibration")
+    parser.add_argument("--dir", default=os.getenv("AUTO_COST_CALIB_DIR", "cost_calibration"), help="corpus与结果目录")
+    parser.add_argument("--quick", action="store_true", help="生成小corpus")
+    parser.add_argument("--no_comm", action="store_true", help="跳过通信op")
+    parser.add_argument("--repeat", type=int, default=8, help="差分计时的op重复次数")
+    parser.add_argument("--iters", type=int, default=20)
+    parser.add_argument("--top", type=int, default=5, help="输出偏差最大的op个数")
+    args = parser.parse_args()
+
+    latest, flags = calibrate(
+        args.dir, quick=args.quick, with_comm=not args.no_comm, repeat=args.repeat, iters=args.iters, top=args.top
+    )
+    report(latest, flags)
+    return 1 if flags else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
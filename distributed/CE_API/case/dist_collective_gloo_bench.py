@@ -0,0 +1,396 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+/***************************************************************************
+  *
+  * @file dist_collective_gloo_bench.py
+  * @brief gloo CPU集合通信性能与正确性测试
+  *
+  * 只启动一次多进程通信组, 在同一组内依次测试all_reduce, all_gather, broadcast, reduce_scatter,
+  * alltoall, send/recv, barrier, 覆盖多个消息大小与数据类型;
+  * 每次迭代前各rank先barrier对齐, 计时只包含通信本身, 输出转numpy在计时之后;
+  * 每个rank都用numpy计算期望值校验结果, 汇总各rank每次迭代的最大耗时, 输出延迟分位数与带宽.
+  * gloo不支持reduce_scatter和alltoall时, 分别由all_reduce和逐对send/recv组合实现, impl列标记为composed
+  *
+  * python dist_collective_gloo_bench.py --nranks 2 --sizes 1K,64K,1M --dtypes float32,int64
+  *
+  **************************************************************************/
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import traceback
+import multiprocessing
+from contextlib import closing
+
+import numpy as np
+
+from utils import run_priority
+
+OPS = ["all_reduce", "all_gather", "broadcast", "reduce_scatter", "alltoall", "sendrecv", "barrier"]
+# nccl-tests中busbw的系数, 与具体实现无关, 便于不同卡数之间对比
+BUS_FACTOR = {
+    "all_reduce": lambda n: 2.0 * (n - 1) / n,
+    "all_gather": lambda n: (n - 1.0) / n,
+    "broadcast": lambda n: 1.0,
+    "reduce_scatter": lambda n: (n - 1.0) / n,
+    "alltoall": lambda n: (n - 1.0) / n,
+    "sendrecv": lambda n: 1.0,
+    "barrier": lambda n: 0.0,
+}
+
+
+def find_free_port():
+    """find_free_port"""
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def parse_size(size):
+    """1K/4M/123 -> 字节数"""
+    size = size.strip().upper()
+    unit = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}.get(size[-1:], 1)
+    return int(float(size.rstrip("KMG")) * unit)
+
+
+def rank_input(op, dtype, numel, rank):
+    """
+    每个rank的输入只由(op, dtype, numel, rank)决定, 任一rank都能算出全部rank的输入;
+    取值为小整数, 求和在各dtype下都是精确的, 可逐元素严格比较
+    """
+    seed = (OPS.index(op) * 1000003 + numel * 31 + rank * 7 + len(dtype)) % (1 << 31)
+    return np.random.RandomState(seed).randint(-8, 8, size=[numel]).astype(dtype)
+
+
+def expected(op, dtype, numel, rank, nranks):
+    """numpy计算本rank的期望输出"""
+    inputs = [rank_input(op, dtype, numel, r) for r in range(nranks)]
+    chunk = numel // nranks
+    if op == "all_reduce":
+        return np.sum(inputs, axis=0).astype(dtype)
+    if op == "all_gather":
+        return np.stack(inputs)
+    if op == "broadcast":
+        return inputs[0]
+    if op == "reduce_scatter":
+        return np.sum(inputs, axis=0).astype(dtype)[rank * chunk : (rank + 1) * chunk]
+    if op == "alltoall":
+        return np.stack([inputs[r][rank * chunk : (rank + 1) * chunk] for r in range(nranks)])
+    if op == "sendrecv":
+        return inputs[(rank - 1) % nranks]
+    return None
+
+
+class Collective(object):
+    """
+    单个rank上的集合通信, run只执行通信, result返回输出的numpy结果
+    """
+
+    def __init__(self, rank, nranks):
+        """初始化"""
+        import paddle
+        import paddle.distributed as dist
+
+        self.paddle = paddle
+        self.dist = dist
+        self.rank = rank
+        self.nranks = nranks
+        self.impl = {op: "native" for op in OPS}
+        self._probe()
+
+    def _probe(self):
+        """
+        探测reduce_scatter与alltoall是否有原生实现, 不支持时在通信前即抛出Unimplemented, 各rank行为一致
+        """
+        paddle = self.paddle
+        try:
+            self.dist.reduce_scatter(paddle.zeros([1]), [paddle.zeros([1]) for _ in range(self.nranks)])
+        except Exception:
+            self.impl["reduce_scatter"] = "composed"
+        try:
+            self.dist.alltoall(
+                [paddle.zeros([1]) for _ in range(self.nranks)], [paddle.zeros([1]) for _ in range(self.nranks)]
+            )
+        except Exception:
+            self.impl["alltoall"] = "composed"
+
+    def _exchange(self, sends, recvs):
+        """
+        点对点交换, sends/recvs为 peer -> tensor;
+        gloo的send在对端recv前会阻塞, 所有rank按相同的(i, j)顺序逐对处理, 每对中小rank先发后收, 避免互相等待
+        """
+        for i in range(self.nranks):
+            for j in range(i + 1, self.nranks):
+                if self.rank not in (i, j):
+                    continue
+                peer = j if self.rank == i else i
+                for kind in ["send", "recv"] if self.rank == i else ["recv", "send"]:
+                    if kind == "send" and peer in sends:
+                        self.dist.send(sends[peer], peer)
+                    elif kind == "recv" and peer in recvs:
+                        self.dist.recv(recvs[peer], peer)
+
+    def prepare(self, op, dtype, numel):
+        """构造本rank的输入与输出buffer, 不计入耗时"""
+        paddle = self.paddle
+        data = rank_input(op, dtype, numel, self.rank)
+        chunk = numel // self.nranks
+        if op in ["all_reduce", "broadcast"]:
+            return {"tensor": paddle.to_tensor(data)}
+        if op == "all_gather":
+            return {"tensor": paddle.to_tensor(data), "out": []}
+        if op == "reduce_scatter":
+            return {
+                "in": [paddle.to_tensor(data[r * chunk : (r + 1) * chunk]) for r in range(self.nranks)],
+                "tensor": paddle.to_tensor(data),
+                "out": paddle.zeros([chunk], dtype=dtype),
+            }
+        if op == "alltoall":
+            return {
+                "in": [paddle.to_tensor(data[r * chunk : (r + 1) * chunk]) for r in range(self.nranks)],
+                "out": [paddle.zeros([chunk], dtype=dtype) for _ in range(self.nranks)],
+            }
+        if op == "sendrecv":
+            return {"tensor": paddle.to_tensor(data), "out": paddle.zeros([numel], dtype=dtype)}
+        return {}
+
+    def run(self, op, buf):
+        """执行一次op, 只包含通信, 输出留在buf中"""
+        dist = self.dist
+        if op == "all_reduce":
+            dist.all_reduce(buf["tensor"])
+        elif op == "all_gather":
+            del buf["out"][:]
+            dist.all_gather(buf["out"], buf["tensor"])
+        elif op == "broadcast":
+            dist.broadcast(buf["tensor"], src=0)
+        elif op == "reduce_scatter":
+            if self.impl[op] == "native":
+                dist.reduce_scatter(buf["out"], buf["in"])
+            else:
+                dist.all_reduce(buf["tensor"])
+        elif op == "alltoall":
+            if self.impl[op] == "native":
+                dist.alltoall(buf["out"], buf["in"])
+            else:
+                buf["out"][self.rank] = buf["in"][self.rank].clone()
+                peers = [r for r in range(self.nranks) if r != self.rank]
+                self._exchange({r: buf["in"][r] for r in peers}, {r: buf["out"][r] for r in peers})
+        elif op == "sendrecv":
+            # 环形: 发给下一个rank, 从上一个rank接收
+            self._exchange({(self.rank + 1) % self.nranks: buf["tensor"]}, {(self.rank - 1) % self.nranks: buf["out"]})
+        else:
+            dist.barrier()
+
+    def result(self, op, buf):
+        """run之后把输出转为numpy, 不计入耗时"""
+        if op in ["all_reduce", "broadcast"]:
+            return buf["tensor"].numpy()
+        if op in ["all_gather", "alltoall"]:
+            return np.stack([t.numpy() for t in buf["out"]])
+        if op == "reduce_scatter":
+            if self.impl[op] == "native":
+                return buf["out"].numpy()
+            chunk = buf["tensor"].shape[0] // self.nranks
+            return buf["tensor"][self.rank * chunk : (self.rank + 1) * chunk].numpy()
+        if op == "sendrecv":
+            return buf["out"].numpy()
+        return None
+
+
+def worker(rank, nranks, endpoints, master, config, queue):
+    """
+    单个rank: 初始化一次通信组, 跑完全部case后把耗时与校验结果放入queue
+    """
+    os.environ.update(
+        {
+            "PADDLE_TRAINER_ID": str(rank),
+            "PADDLE_TRAINERS_NUM": str(nranks),
+            "PADDLE_TRAINER_ENDPOINTS": ",".join(endpoints),
+            "PADDLE_CURRENT_ENDPOINT": endpoints[rank],
+            "PADDLE_MASTER": master,
+            "PADDLE_RANK_IN_NODE": str(rank),
+            "PADDLE_LOCAL_SIZE": str(nranks),
+            "PADDLE_DISTRI_BACKEND": "gloo",
+        }
+    )
+    records = []
+    try:
+        import paddle
+
+        paddle.set_device("cpu")
+        paddle.distributed.init_parallel_env()
+        comm = Collective(rank, nranks)
+        for op in config["ops"]:
+            for dtype in config["dtypes"] if op != "barrier" else ["-"]:
+                for size in config["sizes"] if op != "barrier" else [0]:
+                    record = {"op": op, "dtype": dtype, "bytes": 0, "impl": comm.impl[op], "times": [], "errors": []}
+                    records.append(record)
+                    if op != "barrier":
+                        itemsize = np.dtype(dtype).itemsize
+                        # 按rank数对齐, reduce_scatter/alltoall可均分
+                        numel = max(size // itemsize // nranks, 1) * nranks
+                        record["bytes"] = numel * itemsize
+                        expect = expected(op, dtype, numel, rank, nranks)
+                    for i in range(config["warmup"] + config["iters"]):
+                        buf = comm.prepare(op, dtype, numel) if op != "barrier" else {}
+                        # 各rank对齐后再计时, 到达先后的差异不计入通信耗时
+                        comm.dist.barrier()
+                        start = time.perf_counter()
+                        comm.run(op, buf)
+                        cost = time.perf_counter() - start
+                        if i >= config["warmup"]:
+                            record["times"].append(cost)
+                        if op != "barrier" and (i == 0 or i == config["warmup"] + config["iters"] - 1):
+                            out = comm.result(op, buf)
+                            if not np.array_equal(out, expect):
+                                bad = int(np.sum(out != expect)) if out.shape == expect.shape else -1
+                                record["errors"].append("iter {}: {} mismatched elements".format(i, bad))
+        queue.put((rank, records, None))
+    except Exception:
+        queue.put((rank, records, traceback.format_exc()))
+
+
+def launch(nranks=2, sizes=None, dtypes=None, ops=None, iters=20, warmup=3, timeout=1800):
+    """
+    启动nranks个进程组成一个gloo通信组, 全部case在同一组中执行
+    :return: 汇总后的结果list, 各rank的异常信息dict
+    """
+    config = {
+        "sizes": [parse_size(s) for s in (sizes or ["1K", "64K", "1M"])],
+        "dtypes": dtypes or ["float32", "float64", "int32", "int64"],
+        "ops": ops or OPS,
+        "iters": iters,
+        "warmup": warmup,
+    }
+    endpoints = ["127.0.0.1:{}".format(find_free_port()) for _ in range(nranks)]
+    master = "127.0.0.1:{}".format(find_free_port())
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(r, nranks, endpoints, master, config, queue)) for r in range(nranks)]
+    for proc in procs:
+        proc.start()
+    results = {}
+    failures = {}
+    deadline = time.time() + timeout
+    while len(results) < nranks and time.time() < deadline:
+        try:
+            rank, records, error = queue.get(timeout=5)
+        except Exception:
+            if all(not proc.is_alive() for proc in procs):
+                break
+            continue
+        results[rank] = records
+        if error:
+            failures[rank] = error
+    for proc in procs:
+        proc.join(timeout=10)
+        if proc.is_alive():
+            proc.terminate()
+    for rank in range(nranks):
+        if rank not in results:
+            failures.setdefault(rank, "rank {} exited without result".format(rank))
+    return summarize(results, nranks), failures
+
+
+def summarize(results, nranks):
+    """
+    合并各rank: 每次迭代的耗时取各rank最大值(集合通信以最慢的rank为准), 再计算分位数与带宽
+    """
+    if not results:
+        return []
+    summary = []
+    count = min(len(records) for records in results.values())
+    for i in range(count):
+        records = [results[rank][i] for rank in sorted(results)]
+        base = records[0]
+        iters = min(len(record["times"]) for record in records)
+        times = np.max([record["times"][:iters] for record in records], axis=0) if iters else np.array([0.0])
+        p50 = float(np.percentile(times, 50))
+        algbw = base["bytes"] / p50 / 1e9 if p50 > 0 else 0.0
+        errors = [
+            "rank {} {}".format(rank, e) for rank, record in zip(sorted(results), records) for e in record["errors"]
+        ]
+        if iters == 0 or len(records) < nranks:
+            errors.append("not finished on all ranks")
+        summary.append(
+            {
+                "op": base["op"],
+                "impl": base["impl"],
+                "dtype": base["dtype"],
+                "bytes": base["bytes"],
+                "iters": iters,
+                "p50_us": p50 * 1e6,
+                "p90_us": float(np.percentile(times, 90)) * 1e6,
+                "p99_us": float(np.percentile(times, 99)) * 1e6,
+                "algbw_GBps": algbw,
+                "busbw_GBps": algbw * BUS_FACTOR[base["op"]](nranks),
+                "correct": not errors,
+                "errors": errors,
+            }
+        )
+    return summary
+
+
+def report(summary):
+    """打印结果表"""
+    print(
+        "{:16}{:10}{:9}{:>10}{:>11}{:>11}{:>11}{:>11}{:>11}  {}".format(
+            "op", "impl", "dtype", "bytes", "p50(us)", "p90(us)", "p99(us)", "algbw", "busbw", "check"
+        )
+    )
+    for item in summary:
+        print(
+            "{op:16}{impl:10}{dtype:9}{bytes:>10}{p50_us:>11.1f}{p90_us:>11.1f}{p99_us:>11.1f}"
+            "{algbw_GBps:>11.3f}{busbw_GBps:>11.3f}  ".format(**item)
+            + ("ok" if item["correct"] else "; ".join(item["errors"]))
+        )
+
+
+@run_priority(level="P0")
+def test_collective_gloo_bench():
+    """test_collective_gloo_bench"""
+    summary, failures = launch(nranks=2, sizes=["1K", "64K"], iters=5, warmup=1)
+    report(summary)
+    assert not failures, failures
+    assert {item["op"] for item in summary} == set(OPS)
+    assert all(item["correct"] for item in summary), [item for item in summary if not item["correct"]]
+    print("test_collective_gloo_bench... ok")
+
+
+def main():
+    """main"""
+    parser = argparse.ArgumentParser(description="gloo CPU collective benchmark")
+    parser.add_argument("--nranks", type=int, default=int(os.getenv("GLOO_BENCH_NRANKS", "2")))
+    parser.add_argument("--sizes", default=os.getenv("GLOO_BENCH_SIZES", "1K,64K,1M"), help="消息大小, 逗号分隔")
+    parser.add_argument("--dtypes", default=os.getenv("GLOO_BENCH_DTYPES", "float32,float64,int32,int64"))
+    parser.add_argument("--ops", default=",".join(OPS))
+    parser.add_argument("--iters", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--output", default=None, help="结果json")
+    args = parser.parse_args()
+
+    summary, failures = launch(
+        nranks=args.nranks,
+        sizes=args.sizes.split(","),
+        dtypes=args.dtypes.split(","),
+        ops=args.ops.split(","),
+        iters=args.iters,
+        warmup=args.warmup,
+    )
+    report(summary)
+    for rank, error in sorted(failures.items()):
+        print("rank {} failed:\n{}".format(rank, error))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"nranks": args.nranks, "results": summary, "failures": failures}, f, indent=1)
+    return 1 if failures or not all(item["correct"] for item in summary) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
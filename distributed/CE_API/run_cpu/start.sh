@@ -5,6 +5,8 @@ export FLAGS_call_stack_level=2
 
 cd task
 cases="dist_CountFilterEntry.py \
+       dist_collective_gloo_bench.py \
+       dist_auto_cost_calibration.py \
        dist_data_inmemorydataset.py  \
        dist_data_queuedataset.py \
        dist_DistAttr.py \
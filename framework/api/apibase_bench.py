@@ -0,0 +1,103 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+对比APIBase引擎开启前后整个case目录的耗时
+old: APIBASE_STATIC_CACHE=0 APIBASE_WORKERS=1, 每次调用重建静态图, 串行执行places x dtypes
+new: 静态图缓存 + APIBASE_WORKERS个进程
+每个case文件和run.sh一样单独起一个pytest进程, 逐个串行执行, 输出总耗时, 加速最多的case以及两种模式结果不一致的case
+
+python apibase_bench.py --dir paddlebase --workers 4 --output apibase_bench.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+MODES = {
+    "old": {"APIBASE_STATIC_CACHE": "0", "APIBASE_WORKERS": "1"},
+    "new": {"APIBASE_STATIC_CACHE": "1"},
+}
+
+
+def run_case(path, case, env, timeout):
+    """
+    执行单个case文件, 返回 (是否通过, 耗时s)
+    """
+    start = time.time()
+    try:
+        ret = subprocess.run(
+            [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", case],
+            cwd=path,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=timeout,
+        ).returncode
+    except subprocess.TimeoutExpired:
+        ret = -1
+    return ret == 0, time.time() - start
+
+
+def bench(path, cases, workers, timeout=1800):
+    """
+    old/new两种模式分别执行全部case
+    :return: {mode: {case: [passed, cost]}}
+    """
+    res = {}
+    for mode, extra in MODES.items():
+        env = dict(os.environ, FLAGS_call_stack_level="2", FLAGS_set_to_1d="0", **extra)
+        if mode == "new":
+            env["APIBASE_WORKERS"] = str(workers)
+        res[mode] = {}
+        for case in cases:
+            res[mode][case] = list(run_case(path, case, env, timeout))
+            print("[{}] {} {} {:.2f}s".format(mode, case, "pass" if res[mode][case][0] else "fail", res[mode][case][1]))
+    return res
+
+
+def report(res, top=10):
+    """
+    打印总耗时, 加速最多的case以及结果不一致的case
+    """
+    old, new = res["old"], res["new"]
+    old_total = sum(v[1] for v in old.values())
+    new_total = sum(v[1] for v in new.values())
+    print(
+        "cases {}  old {:.1f}s  new {:.1f}s  speedup {:.2f}x".format(
+            len(old), old_total, new_total, old_total / new_total
+        )
+    )
+    speedup = sorted(old, key=lambda case: new[case][1] / old[case][1])
+    for case in speedup[:top]:
+        print("    {:<48} old {:8.2f}s  new {:8.2f}s".format(case, old[case][1], new[case][1]))
+    diff = [case for case in old if old[case][0] != new[case][0]]
+    for case in diff:
+        print("result changed: {} old {} new {}".format(case, old[case][0], new[case][0]))
+    return diff
+
+
+def main():
+    """main"""
+    parser = argparse.ArgumentParser(__doc__)
+    parser.add_argument("--dir", type=str, default="paddlebase", help="case目录")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="new模式的APIBASE_WORKERS")
+    parser.add_argument("--limit", type=int, default=0, help="只执行前limit个case, 0为全部")
+    parser.add_argument("--timeout", type=int, default=1800, help="单个case超时s")
+    parser.add_argument("--output", type=str, default=None, help="结果保存为json")
+    args = parser.parse_args()
+    path = os.path.abspath(args.dir)
+    cases = sorted(f for f in os.listdir(path) if f.startswith("test") and f.endswith(".py"))
+    if args.limit:
+        cases = cases[: args.limit]
+    res = bench(path, cases, args.workers, args.timeout)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(res, f, indent=1)
+    sys.exit(1 if report(res) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+test APIBase.compute_grad
+"""
+from apibase import APIBase
+import paddle
+import pytest
+import numpy as np
+
+
+class Scale(paddle.nn.Layer):
+    """
+    x * w, 不输入x时为w * w
+    """
+
+    def __init__(self, w):
+        super(Scale, self).__init__()
+        self.w = w
+
+    def forward(self, x=None):
+        """
+        forward
+        """
+        if x is None:
+            return self.w * self.w
+        return x * self.w
+
+
+def multiply(x, y):
+    """
+    func api
+    """
+    return paddle.multiply(x, y)
+
+
+class TestComputeGrad(APIBase):
+    """
+    test
+    """
+
+    def hook(self):
+        """
+        implement
+        """
+        self.types = [np.float64]
+        self.places = [paddle.CPUPlace()]
+        self.enable_backward = True
+
+
+def _engine(func, batch):
+    """
+    APIBase实例, 按run中的方式设置dtype与place
+    """
+    obj = TestComputeGrad(func)
+    obj.dtype = np.float64
+    obj.place = paddle.CPUPlace()
+    obj.grad_batch = batch
+    obj.data = None
+    return obj
+
+
+w = np.array([[0.5, -1.0, 2.0], [1.5, 3.0, -0.5]])
+x = np.array([[1.0, 2.0, -3.0], [0.2, -0.4, 0.6]])
+
+
+@pytest.mark.api_nn_apibase_parameters
+def test_compute_grad0():
+    """
+    class layer, grad of data
+    """
+    for batch in [True, False]:
+        grad = _engine(Scale, batch).compute_grad(x * w, data=x, w=w)
+        assert list(grad.keys()) == ["data"]
+        assert np.allclose(grad["data"], w / w.size, atol=1e-6)
+
+
+@pytest.mark.api_nn_apibase_parameters
+def test_compute_grad1():
+    """
+    class layer without data, grad of perturbed kwargs
+    """
+    for batch in [True, False]:
+        grad = _engine(Scale, batch).compute_grad(w * w, w=w)
+        assert np.allclose(grad["w"], 2 * w / w.size, atol=1e-3)
+
+
+@pytest.mark.api_nn_apibase_parameters
+def test_compute_grad2():
+    """
+    func, grad of perturbed kwargs
+    """
+    for batch in [True, False]:
+        grad = _engine(multiply, batch).compute_grad(x * w, x=x, y=w)
+        assert np.allclose(grad["x"], w / w.size, atol=1e-6)
+        assert np.allclose(grad["y"], x / x.size, atol=1e-6)
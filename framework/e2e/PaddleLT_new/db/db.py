@@ -7,10 +7,10 @@ db object
 """
 
 import json
+import time
 import traceback
 from datetime import datetime
 import yaml
-import pymysql
 
 # from utils.logger import logger
 
@@ -20,13 +20,45 @@ ACCURACY = "%.6g"
 class DB(object):
     """DB class"""
 
+    # sql参数占位符, 不同backend不同
+    placeholder = "%s"
+
     def __init__(self, storage="storage.yaml"):
         self.storage = storage
-        host, port, user, password, database = self.load_storge()
-        self.db = pymysql.connect(host=host, port=port, user=user, password=password, database=database, charset="utf8")
+        self.db = self.connect()
         self.cursor = self.db.cursor()
         # self.now_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+    def connect(self):
+        """
+        建立数据库连接
+        """
+        import pymysql
+
+        host, port, user, password, database = self.load_storge()
+        return pymysql.connect(host=host, port=port, user=user, password=password, database=database, charset="utf8")
+
+    def reconnect(self):
+        """
+        连接断开后重连
+        """
+        self.db.ping(True)
+        self.cursor = self.db.cursor()
+
+    def transient_errors(self):
+        """
+        可重试的瞬时错误类型, 如连接断开、死锁、锁等待超时
+        """
+        import pymysql
+
+        return (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
+    def last_insert_id(self):
+        """
+        最近一次插入的自增id
+        """
+        return self.db.insert_id()
+
     def load_storge(self):
         """
         解析storage.yaml的内容添加到self.db
@@ -48,24 +80,56 @@ class DB(object):
         """
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+    def insert_sql(self, table, keys):
+        """参数化的INSERT语句"""
+        sql_table = "`" + table + "`"
+        sql_keys = ",".join("`" + k + "`" for k in keys)
+        values = ",".join([self.placeholder] * len(keys))
+        return "INSERT INTO {table}({keys}) VALUES ({values})".format(table=sql_table, keys=sql_keys, values=values)
+
     def insert(self, table, data):
         """插入数据"""
         id = -1
-        sql_table = "`" + table + "`"
         ls = [(k, data[k]) for k in data if data[k] is not None]
-        keys = ",".join(("`" + i[0] + "`") for i in ls)
-        values = ",".join("%r" % i[1] for i in ls)
-
-        sql = "INSERT INTO {table}({keys}) VALUES ({values})".format(table=sql_table, keys=keys, values=values)
+        sql = self.insert_sql(table=table, keys=[i[0] for i in ls])
         try:
-            self.cursor.execute(sql)
-            id = self.db.insert_id()
+            self.cursor.execute(sql, tuple(i[1] for i in ls))
+            id = self.last_insert_id()
             self.db.commit()
         except Exception as e:
             # print(traceback.format_exc())
             print(e)
         return id
 
+    def insert_many(self, table, data_list, chunk_size=1000, retry=3):
+        """
+        批量插入数据, 按chunk_size分批executemany, 全部数据在同一事务中提交.
+        遇到瞬时错误时回滚并重连, 整批重试, 超过重试次数则抛出异常
+        :param data_list: [{column: value}, ...], 所有dict的key需一致
+        :return: 插入行数
+        """
+        if not data_list:
+            return 0
+        keys = list(data_list[0].keys())
+        sql = self.insert_sql(table=table, keys=keys)
+        rows = [tuple(data[k] for k in keys) for data in data_list]
+
+        for i in range(retry):
+            try:
+                for start in range(0, len(rows), chunk_size):
+                    self.cursor.executemany(sql, rows[start : start + chunk_size])
+                self.db.commit()
+                return len(rows)
+            except self.transient_errors() as e:
+                print("db insert_many error, retry {}/{}: {}".format(i + 1, retry, e))
+                try:
+                    self.db.rollback()
+                except Exception:
+                    pass
+                time.sleep(2**i)
+                self.reconnect()
+        raise Exception("insert_many into {} failed after {} retries".format(table, retry))
+
     def update(self, table, data, data_condition):
         """按照data_condition 更新数据"""
         sql_table = "`" + table + "`"
@@ -210,6 +274,14 @@ class DB(object):
             print(traceback.format_exc())
             print(e)
 
+    def insert_cases(self, jid, case_dict, create_time, chunk_size=1000):
+        """向case表中批量录入数据"""
+        data_list = [
+            {"jid": jid, "case_name": case_name, "result": result, "create_time": create_time}
+            for case_name, result in case_dict.items()
+        ]
+        return self.insert_many(table="layer_case", data_list=data_list, chunk_size=chunk_size)
+
     def update_job(self, id, status, update_time):
         """数据录入完成后更新job表中的部分字段"""
         data = {"status": status, "update_time": update_time}
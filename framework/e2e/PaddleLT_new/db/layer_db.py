@@ -12,6 +12,7 @@ import socket
 import platform
 from datetime import datetime
 from db.db import DB
+from db.sqlite_db import SqliteDB
 from db.snapshot import Snapshot
 
 # from strategy.compare import perf_compare
@@ -29,6 +30,12 @@ class LayerBenchmarkDB(object):
         :param storage: 信息配置文件
         """
         self.storage = storage
+        # 数据库backend: mysql或sqlite, sqlite文件路径由PLT_BM_SQLITE指定
+        self.backend = os.environ.get("PLT_BM_DB_BACKEND", "mysql")
+        # mysql连接失败时的备用backend, 设为sqlite时退回本地sqlite文件, 默认None不退回
+        self.fallback = os.environ.get("PLT_BM_DB_FALLBACK", "None")
+        # 批量写入每次executemany的行数
+        self.chunk_size = int(os.environ.get("PLT_BM_DB_CHUNK", 1000))
         self.now_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
         # md5唯一标识码
@@ -98,11 +105,28 @@ class LayerBenchmarkDB(object):
         else:
             raise Exception("unknown framework, PaddleLayerTest only support test PaddlePaddle or Pytorch")
 
+    def _db(self):
+        """
+        按backend创建数据库连接
+        """
+        if self.backend == "mysql":
+            try:
+                return DB(storage=self.storage)
+            except Exception as e:
+                if self.fallback != "sqlite":
+                    raise
+                self.logger.get_log().warning(f"mysql连接失败, 退回sqlite backend: {e}")
+                return SqliteDB(storage=self.storage)
+        elif self.backend == "sqlite":
+            return SqliteDB(storage=self.storage)
+        else:
+            raise Exception("unknown db backend, PaddleLayerTest only support mysql or sqlite")
+
     def latest_insert(self, data_dict, error_list):
         """
         插入最新数据
         """
-        db = DB(storage=self.storage)
+        db = self._db()
 
         # 插入layer_job
         latest_id = db.insert_job(
@@ -131,8 +155,8 @@ class LayerBenchmarkDB(object):
         self.logger.get_log().info("性能测试job_id: {}".format(latest_id))
 
         # 插入layer_case
-        for title, perf_dict in data_dict.items():
-            db.insert_case(jid=latest_id, case_name=title, result=json.dumps(perf_dict), create_time=self.now_time)
+        case_dict = {title: json.dumps(perf_dict) for title, perf_dict in data_dict.items()}
+        db.insert_cases(jid=latest_id, case_dict=case_dict, create_time=self.now_time, chunk_size=self.chunk_size)
 
         if bool(error_list):
             db.update_job(id=latest_id, status="done", update_time=self.now_time)
@@ -146,7 +170,7 @@ class LayerBenchmarkDB(object):
         获取baseline dict
         """
         # 获取baseline用于对比
-        db = DB(storage=self.storage)
+        db = self._db()
         baseline_job = db.select_baseline_job(
             comment=self.baseline_comment,
             testing=self.testing,
@@ -167,7 +191,7 @@ class LayerBenchmarkDB(object):
         """
         插入最新数据
         """
-        db = DB(storage=self.storage)
+        db = self._db()
 
         # 插入layer_job
         basleine_id = db.insert_job(
@@ -196,8 +220,8 @@ class LayerBenchmarkDB(object):
         self.logger.get_log().info("性能测试job_id: {}".format(basleine_id))
 
         # 插入layer_case
-        for title, perf_dict in data_dict.items():
-            db.insert_case(jid=basleine_id, case_name=title, result=json.dumps(perf_dict), create_time=self.now_time)
+        case_dict = {title: json.dumps(perf_dict) for title, perf_dict in data_dict.items()}
+        db.insert_cases(jid=basleine_id, case_dict=case_dict, create_time=self.now_time, chunk_size=self.chunk_size)
 
         if bool(error_list):
             db.update_job(id=basleine_id, status="done", update_time=self.now_time)
@@ -0,0 +1,125 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+sqlite db object, 与DB接口一致, 用于离线调试及单机基线存储
+"""
+
+import os
+import sqlite3
+from db.db import DB
+
+LAYER_JOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS `layer_job` (
+    `id` INTEGER PRIMARY KEY AUTOINCREMENT,
+    `comment` TEXT,
+    `status` TEXT,
+    `env_info` TEXT,
+    `framework` TEXT,
+    `agile_pipeline_build_id` INTEGER,
+    `testing` TEXT,
+    `plt_perf_content` TEXT,
+    `layer_type` TEXT,
+    `commit` TEXT,
+    `version` TEXT,
+    `hostname` TEXT,
+    `hardware` TEXT,
+    `system` TEXT,
+    `md5_id` TEXT,
+    `base` INTEGER,
+    `ci` INTEGER,
+    `create_time` TEXT,
+    `update_time` TEXT
+)
+"""
+
+LAYER_CASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS `layer_case` (
+    `id` INTEGER PRIMARY KEY AUTOINCREMENT,
+    `jid` INTEGER,
+    `case_name` TEXT,
+    `result` TEXT,
+    `create_time` TEXT
+)
+"""
+
+
+class SqliteDB(DB):
+    """sqlite DB class"""
+
+    placeholder = "?"
+
+    def __init__(self, storage=None, path=None):
+        """
+        :param storage: 兼容DB接口, sqlite不读取
+        :param path: sqlite文件路径, 默认取环境变量PLT_BM_SQLITE
+        """
+        self.path = path if path else os.environ.get("PLT_BM_SQLITE", "layer_benchmark.db")
+        super(SqliteDB, self).__init__(storage=storage)
+
+    def connect(self):
+        """
+        建立数据库连接, 并在首次使用时建表
+        """
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute(LAYER_JOB_SCHEMA)
+        conn.execute(LAYER_CASE_SCHEMA)
+        conn.execute("CREATE INDEX IF NOT EXISTS `layer_case_jid` ON `layer_case` (`jid`)")
+        conn.commit()
+        return conn
+
+    def reconnect(self):
+        """
+        重新打开数据库连接
+        """
+        try:
+            self.db.close()
+        except Exception:
+            pass
+        self.db = self.connect()
+        self.cursor = self.db.cursor()
+
+    def transient_errors(self):
+        """
+        可重试的瞬时错误类型, 如database is locked
+        """
+        return (sqlite3.OperationalError,)
+
+    def last_insert_id(self):
+        """
+        最近一次插入的自增id
+        """
+        return self.cursor.lastrowid
+
+    def show_list(self, table):
+        """返回table中的列list"""
+        self.cursor.execute("PRAGMA table_info(`{}`)".format(table))
+        return [column[1] for column in self.cursor.fetchall()]
+
+
+if __name__ == "__main__":
+    # 写入吞吐benchmark: 逐条insert_case vs 批量insert_cases
+    import time
+    import json
+    import tempfile
+
+    case_num = 5000
+    case_dict = {
+        "layercase^sublayer1000^Det_cases^SIR_{}".format(i): json.dumps({"dy_eval_perf": 0.1 * i})
+        for i in range(case_num)
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = SqliteDB(path=os.path.join(tmp_dir, "row.db"))
+        start = time.perf_counter()
+        for title, result in case_dict.items():
+            db.insert_case(jid=1, case_name=title, result=result, create_time=db.timestamp())
+        row_cost = time.perf_counter() - start
+
+        db = SqliteDB(path=os.path.join(tmp_dir, "bulk.db"))
+        start = time.perf_counter()
+        db.insert_cases(jid=1, case_dict=case_dict, create_time=db.timestamp())
+        bulk_cost = time.perf_counter() - start
+        assert len(db.select(table="layer_case", condition_list=["jid = 1"])) == case_num
+
+    print("insert_case  : {} rows, {:.3f}s, {:.0f} rows/s".format(case_num, row_cost, case_num / row_cost))
+    print("insert_cases : {} rows, {:.3f}s, {:.0f} rows/s".format(case_num, bulk_cost, case_num / bulk_cost))
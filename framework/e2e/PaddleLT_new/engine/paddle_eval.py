@@ -79,6 +79,42 @@ class LayerEval(object):
         data, spec_gen = BuildData(layerfile=self.layerfile).get_single_input_and_multi_spec()
         return data, spec_gen
 
+    def _net_multi_spec_eval(self, log_name, build_strategy=None):
+        """
+        遍历SpecStrategy生成的多组InputSpec动转静, 失败时将失败的InputSpec最小化为动态维最少且仍然失败的InputSpec
+        """
+        logger = Logger(log_name).get_log()
+        data, spec_gen = self._net_input_and_multi_spec()
+
+        def _run(input_spec):
+            st_net = paddle.jit.to_static(
+                self._net_instant(), build_strategy=build_strategy, full_graph=True, input_spec=input_spec
+            )
+            st_net.eval()
+            return st_net, st_net(*data)
+
+        def _fails(input_spec):
+            try:
+                _run(input_spec)
+            except Exception:
+                return True
+            return False
+
+        res = None
+        for input_spec in spec_gen.next():
+            logger.info(f"待测动态InputSpec为: {input_spec}")
+            try:
+                st_net, logit = _run(input_spec)
+            except Exception:
+                bug_trace = traceback.format_exc()
+                minimal = spec_gen.shrink(input_spec, _fails)
+                logger.warning(f"动态InputSpec测试失败, 最小化后的失败InputSpec为: {minimal}, 覆盖率: {spec_gen.report()}")
+                raise Exception(f"最小化后的失败InputSpec为: {minimal}\n{bug_trace}")
+            if res is None:
+                res = (st_net, logit)
+        logger.info(f"动态InputSpec测试均通过, 覆盖率: {spec_gen.report()}")
+        return res
+
     # def _net_input_and_multi_spec_legacy(self):
     #     """get multi inputspec"""
     #     reset(self.seed)
@@ -109,12 +145,15 @@ class LayerEval(object):
 
     def dy2st_eval_inputspec(self):
         """dy2st eval"""
-        data, input_spec = self._net_input_and_spec()
-        Logger("dy2st_eval_inputspec").get_log().info(f"待测动态InputSpec为: {input_spec}")
-        net = self._net_instant()
-        st_net = paddle.jit.to_static(net, full_graph=True, input_spec=input_spec)
-        st_net.eval()
-        logit = st_net(*data)
+        if self.use_multispec == "True":
+            st_net, logit = self._net_multi_spec_eval("dy2st_eval_inputspec")
+        else:
+            data, input_spec = self._net_input_and_spec()
+            Logger("dy2st_eval_inputspec").get_log().info(f"待测动态InputSpec为: {input_spec}")
+            net = self._net_instant()
+            st_net = paddle.jit.to_static(net, full_graph=True, input_spec=input_spec)
+            st_net.eval()
+            logit = st_net(*data)
         if self.return_net_instance == "True":
             return {"res": {"logit": logit}, "net": st_net}
         else:
@@ -150,15 +189,17 @@ class LayerEval(object):
 
     def dy2st_eval_cinn_inputspec(self):
         """dy2st cinn eval with inputspec"""
-        data, input_spec = self._net_input_and_spec()
-        Logger("dy2st_eval_cinn_inputspec").get_log().info(f"待测动态InputSpec为: {input_spec}")
-        net = self._net_instant()
-
         build_strategy = paddle.static.BuildStrategy()
         build_strategy.build_cinn_pass = True
-        cinn_net = paddle.jit.to_static(net, build_strategy=build_strategy, full_graph=True, input_spec=input_spec)
-        cinn_net.eval()
-        logit = cinn_net(*data)
+        if self.use_multispec == "True":
+            cinn_net, logit = self._net_multi_spec_eval("dy2st_eval_cinn_inputspec", build_strategy=build_strategy)
+        else:
+            data, input_spec = self._net_input_and_spec()
+            Logger("dy2st_eval_cinn_inputspec").get_log().info(f"待测动态InputSpec为: {input_spec}")
+            net = self._net_instant()
+            cinn_net = paddle.jit.to_static(net, build_strategy=build_strategy, full_graph=True, input_spec=input_spec)
+            cinn_net.eval()
+            logit = cinn_net(*data)
         if self.return_net_instance == "True":
             return {"res": {"logit": logit}, "net": cinn_net}
         else:
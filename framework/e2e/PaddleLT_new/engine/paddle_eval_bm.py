@@ -76,6 +76,37 @@ class LayerEvalBM(object):
 
         self.logger.get_log().info("_set_cinn_flags 性能测试过程中, 成功追加设定prim_cinn_sot_pir相关FLAGS~~")
 
+    def _synchronize(self):
+        """
+        GPU上等待kernel执行完毕, CPU上无需同步
+        """
+        if paddle.is_compiled_with_cuda() and "gpu" in paddle.get_device():
+            paddle.core._cuda_synchronize(paddle.CUDAPlace(0))
+
+    def _profile(self, perf_func, name):
+        """
+        设置了PLT_PROFILER_DIR时, 计时结束后再用paddle.profiler采集若干step, 导出chrome trace供kernel级对比,
+        采集与计时分开, 不影响计时结果
+        """
+        profiler_dir = os.environ.get("PLT_PROFILER_DIR")
+        if not profiler_dir:
+            return
+        steps = int(os.environ.get("PLT_PROFILER_STEPS", "10"))
+        targets = [paddle.profiler.ProfilerTarget.CPU]
+        if paddle.is_compiled_with_cuda() and "gpu" in paddle.get_device():
+            targets.append(paddle.profiler.ProfilerTarget.GPU)
+        prof = paddle.profiler.Profiler(
+            targets=targets,
+            scheduler=(0, steps),
+            on_trace_ready=paddle.profiler.export_chrome_tracing(profiler_dir, name),
+        )
+        prof.start()
+        for _ in range(steps):
+            perf_func(self.data)
+            self._synchronize()
+            prof.step()
+        prof.stop()
+
     def dy_eval_perf(self):
         """dygraph eval"""
         net = self._net_instant()
@@ -93,7 +124,7 @@ class LayerEvalBM(object):
             start_time = time.time()
             for _ in range(self.timeit_num):
                 _perf(self.data)
-            paddle.core._cuda_synchronize(paddle.CUDAPlace(0))
+            self._synchronize()
             end_time = time.time()
             total_time = end_time - start_time
             total_time_list.append(total_time)
@@ -107,6 +138,7 @@ class LayerEvalBM(object):
                 filename="dy_eval_perf_" + self.layerfile + "_by_step",
             )
 
+        self._profile(_perf, "dy_eval_perf")
         time_res = eval(self.perf_statis)(data_list=total_time_list)
         time_res = round(time_res * self.statis_times, self.statis_round)
 
@@ -130,7 +162,7 @@ class LayerEvalBM(object):
             start_time = time.time()
             for _ in range(self.timeit_num):
                 _perf(self.data)
-            paddle.core._cuda_synchronize(paddle.CUDAPlace(0))
+            self._synchronize()
             end_time = time.time()
             total_time = end_time - start_time
             total_time_list.append(total_time)
@@ -144,6 +176,7 @@ class LayerEvalBM(object):
                 filename="dy_eval_perf_" + self.layerfile + "_by_step",
             )
 
+        self._profile(_perf, "dy2st_eval_perf")
         time_res = eval(self.perf_statis)(data_list=total_time_list)
         time_res = round(time_res * self.statis_times, self.statis_round)
 
@@ -170,7 +203,7 @@ class LayerEvalBM(object):
             start_time = time.time()
             for _ in range(self.timeit_num):
                 _perf(self.data)
-            paddle.core._cuda_synchronize(paddle.CUDAPlace(0))
+            self._synchronize()
             end_time = time.time()
             total_time = end_time - start_time
             total_time_list.append(total_time)
@@ -184,6 +217,7 @@ class LayerEvalBM(object):
                 filename="dy_eval_perf_" + self.layerfile + "_by_step",
             )
 
+        self._profile(_perf, "dy2st_eval_cinn_perf")
         time_res = eval(self.perf_statis)(data_list=total_time_list)
         time_res = round(time_res * self.statis_times, self.statis_round)
 
@@ -6,7 +6,6 @@ data builder
 """
 
 import os
-import itertools
 import numpy as np
 
 if os.environ.get("FRAMEWORK") == "paddle":
@@ -23,6 +22,7 @@ elif os.environ.get("FRAMEWORK") == "torch":
     import layerTorchcase
 
 import pltools.np_tool as tool
+from generator.spec_search import SpecSearch
 
 
 class BuildData(object):
@@ -179,56 +179,53 @@ class SpecInfoMeta:
         """
         return paddle.static.InputSpec(shape=shape, dtype=self.dtype, stop_gradient=self.stop_gradient)
 
-    def maybe_shapes(self):
-        """
-        找到单个InputSpec中, 所有可能的shape
-        """
-        shape_eles = [[-1, s] for s in self.shape]
-        raw_shapes = itertools.product(*shape_eles)
-        has_channel = len(self.shape) == 4 and self.shape[1] == 3
-
-        maybe_shapes = []
-        for shape in raw_shapes:
-            # in case of channel
-            if has_channel and shape[1] is None:
-                continue
-            maybe_shapes.append(shape)
-        return maybe_shapes
-
-    def maybe_specs(self):
-        """
-        maybe_specs
-        """
-        specs = []
-        for shape in self.maybe_shapes():
-            specs.append(self.as_spec(shape))
-        return specs
-
 
 class SpecStrategy:
     """
     SpecStrategy生成器
     """
 
-    def __init__(self, inputs_info):
+    def __init__(self, inputs_info, strategy=None, budget=None, seed=33):
         """
         inputs_info: 是一个list, 包含多个SpecInfoMeta对象, 具体形式为[SpecInfoMeta(shape, dtype, stop_gradient), ...]
+        strategy: 搜索策略, 默认读取环境变量PLT_SPEC_STRATEGY, 见generator.spec_search.STRATEGIES
+        budget: random策略的spec数上限, 默认读取环境变量PLT_SPEC_BUDGET
         """
         self.inputs_info = inputs_info
+        self.search = SpecSearch(
+            shapes=[input_info.shape for input_info in inputs_info],
+            strategy=strategy or os.environ.get("PLT_SPEC_STRATEGY", "pairwise"),
+            budget=budget or int(os.environ.get("PLT_SPEC_BUDGET", "64")),
+            seed=seed,
+        )
+
+    def as_specs(self, shapes):
+        """
+        各输入的shape转为InputSpec
+        """
+        return tuple(input_info.as_spec(shape) for input_info, shape in zip(self.inputs_info, shapes))
 
     def next(self):
         """
         next
         """
-        strategy = self.parse_strategy()
-        for specs in itertools.product(*strategy):
-            yield specs
+        for shapes in self.search:
+            yield self.as_specs(shapes)
+
+    def report(self):
+        """
+        生成的spec数与覆盖率
+        """
+        return self.search.coverage()
 
-    def parse_strategy(self):
+    def shrink(self, specs, fails):
         """
-        生成方法
+        将失败的specs最小化为动态维最少且仍然失败的specs
+        specs: 失败的InputSpec list
+        fails: fails(specs) -> bool
         """
-        strategy = []
-        for input_info in self.inputs_info:
-            strategy.append(input_info.maybe_specs())
-        return strategy
+        bits = []
+        for i, d in self.search.factors:
+            bits.append(1 if specs[i].shape[d] in [-1, None] else 0)
+        minimal, _ = self.search.shrink(bits, lambda shapes: fails(self.as_specs(shapes)))
+        return self.as_specs(self.search.to_shapes(minimal))
@@ -0,0 +1,201 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+动态InputSpec搜索引擎
+每个输入的每一维为一个二值因子(静态 / 动态-1), 按策略生成spec组合, 不依赖框架:
+exhaustive 全组合(原SpecStrategy行为), dynamic 全动态, static 全静态,
+pairwise 任意两维的四种取值组合都至少出现一次(binary covering array), random 固定seed按预算采样;
+shrink 将失败spec最小化为动态维最少的仍失败spec
+"""
+
+import random
+import itertools
+from math import comb
+
+STRATEGIES = ["exhaustive", "dynamic", "static", "pairwise", "random"]
+
+
+class SpecSearch(object):
+    """
+    spec search engine
+    """
+
+    def __init__(self, shapes, strategy="pairwise", budget=64, seed=33, locked=None):
+        """
+        :param shapes: 各输入的静态shape list, 如[[2, 3, 224, 224], [2, 10]]
+        :param strategy: 生成策略, 见STRATEGIES
+        :param budget: random策略的spec数上限
+        :param seed: random策略的随机种子
+        :param locked: 不参与动态化的维度[(输入下标, 维度下标)], 默认锁定4维输入中为3的通道维
+        """
+        if strategy not in STRATEGIES:
+            raise Exception("unknown spec strategy {}, only support {}".format(strategy, STRATEGIES))
+        self.shapes = [list(shape) for shape in shapes]
+        self.strategy = strategy
+        self.budget = budget
+        self.seed = seed
+        if locked is None:
+            locked = [(i, 1) for i, shape in enumerate(self.shapes) if len(shape) == 4 and shape[1] == 3]
+        self.locked = set(locked)
+        # 参与搜索的因子, 即可以动态化的(输入下标, 维度下标)
+        self.factors = [
+            (i, d) for i, shape in enumerate(self.shapes) for d in range(len(shape)) if (i, d) not in self.locked
+        ]
+
+    def to_shapes(self, bits):
+        """
+        因子取值(1为动态)转为各输入的shape
+        """
+        dynamic = {factor for factor, bit in zip(self.factors, bits) if bit}
+        return [
+            tuple(-1 if (i, d) in dynamic else s for d, s in enumerate(shape)) for i, shape in enumerate(self.shapes)
+        ]
+
+    def _exhaustive(self):
+        """全组合"""
+        return [tuple(bits) for bits in itertools.product([0, 1], repeat=len(self.factors))]
+
+    def _pairwise(self):
+        """
+        binary strength-2 covering array: 取N行, 第0行全0, 每个因子为其余N-1行中大小w=floor((N-1)/2)+1的不同子集;
+        同大小的不同子集互不包含, 保证(0,1)/(1,0), 2w > N-1保证两子集相交即(1,1), 第0行保证(0,0)
+        """
+        k = len(self.factors)
+        if k == 0:
+            return [()]
+        rows = 2
+        while comb(rows - 1, (rows - 1) // 2 + 1) < k:
+            rows += 1
+        weight = (rows - 1) // 2 + 1
+        columns = list(itertools.combinations(range(1, rows), weight))[:k]
+        array = [tuple(1 if row in column else 0 for column in columns) for row in range(rows)]
+        # 补充全动态spec, 最常用的组合
+        if tuple([1] * k) not in array:
+            array.append(tuple([1] * k))
+        return array
+
+    def _random(self):
+        """固定seed采样, 预算不小于全组合数时退化为全组合"""
+        k = len(self.factors)
+        if self.budget >= 2**k:
+            return self._exhaustive()
+        rng = random.Random(self.seed)
+        picked = []
+        seen = set()
+        for value in rng.sample(range(2**k), self.budget):
+            bits = tuple((value >> j) & 1 for j in range(k))
+            if bits not in seen:
+                seen.add(bits)
+                picked.append(bits)
+        return picked
+
+    def bits_list(self):
+        """
+        按策略生成的因子取值list
+        """
+        k = len(self.factors)
+        if self.strategy == "exhaustive":
+            return self._exhaustive()
+        elif self.strategy == "dynamic":
+            return [tuple([1] * k)]
+        elif self.strategy == "static":
+            return [tuple([0] * k)]
+        elif self.strategy == "pairwise":
+            return self._pairwise()
+        return self._random()
+
+    def __iter__(self):
+        """
+        逐个生成各输入的shape list
+        """
+        for bits in self.bits_list():
+            yield self.to_shapes(bits)
+
+    def coverage(self, bits_list=None):
+        """
+        覆盖率统计
+        :return: {"specs": spec数, "exhaustive": 全组合数, "single": 单维取值覆盖率, "pairwise": 两维取值组合覆盖率}
+        """
+        bits_list = self.bits_list() if bits_list is None else bits_list
+        k = len(self.factors)
+        single = {(j, bits[j]) for bits in bits_list for j in range(k)}
+        pairs = set()
+        for bits in bits_list:
+            for a, b in itertools.combinations(range(k), 2):
+                pairs.add((a, b, bits[a], bits[b]))
+        total_pairs = 4 * comb(k, 2)
+        return {
+            "strategy": self.strategy,
+            "specs": len(bits_list),
+            "exhaustive": 2**k,
+            "factors": k,
+            "single": len(single) / (2 * k) if k else 1.0,
+            "pairwise": len(pairs) / total_pairs if total_pairs else 1.0,
+        }
+
+    def shrink(self, bits, fails):
+        """
+        失败spec最小化(ddmin): 在保持fails为True的前提下, 尽量减少动态维
+        :param bits: 失败的因子取值
+        :param fails: fails(shapes) -> bool, 该spec是否仍然失败
+        :return: 最小化后的因子取值, fails调用次数
+        """
+        dynamic = [j for j, bit in enumerate(bits) if bit]
+        calls = [0]
+
+        def _fails(keep):
+            """只保留keep中的动态维"""
+            calls[0] += 1
+            keep = set(keep)
+            return fails(self.to_shapes([1 if j in keep else 0 for j in range(len(bits))]))
+
+        n = 2
+        while len(dynamic) >= 2:
+            size = (len(dynamic) + n - 1) // n
+            chunks = [dynamic[i : i + size] for i in range(0, len(dynamic), size)]
+            reduced = False
+            # 先尝试只保留一块, 再尝试去掉一块
+            for chunk in chunks:
+                if _fails(chunk):
+                    dynamic, n, reduced = chunk, 2, True
+                    break
+            if not reduced:
+                for chunk in chunks:
+                    rest = [j for j in dynamic if j not in chunk]
+                    if _fails(rest):
+                        dynamic, n, reduced = rest, max(n - 1, 2), True
+                        break
+            if not reduced:
+                if n >= len(dynamic):
+                    break
+                n = min(n * 2, len(dynamic))
+        if len(dynamic) == 1 and _fails([]):
+            dynamic = []
+        return tuple(1 if j in dynamic else 0 for j in range(len(bits))), calls[0]
+
+
+if __name__ == "__main__":
+    # 各策略的spec数与覆盖率, 以及shrink示例
+    shapes = [[4, 3, 224, 224], [4, 64, 56, 56], [4, 256, 14, 14], [4, 1000], [4, 1]]
+    for strategy in STRATEGIES:
+        report = SpecSearch(shapes, strategy=strategy).coverage()
+        print(
+            "{:<10}: {:>6} specs / {} exhaustive, single {:.1%}, pairwise {:.1%}".format(
+                strategy, report["specs"], report["exhaustive"], report["single"], report["pairwise"]
+            )
+        )
+
+    search = SpecSearch(shapes)
+
+    def fails(spec_shapes):
+        """模拟: 第0个输入的H与第2个输入的batch同时动态时失败"""
+        return spec_shapes[0][2] == -1 and spec_shapes[2][0] == -1
+
+    failing = [1] * len(search.factors)
+    minimal, calls = search.shrink(failing, fails)
+    print(
+        "shrink: {} -> {} dynamic dims in {} calls: {}".format(
+            sum(failing), sum(minimal), calls, search.to_shapes(minimal)
+        )
+    )
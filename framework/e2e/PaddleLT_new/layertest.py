@@ -179,6 +179,7 @@ class LayerTest(object):
                         logger=self.logger.get_log(),
                         delta=precision.get("delta"),
                         rtol=precision.get("rtol"),
+                        fail_fast=precision.get("fail_fast", False),
                     )
 
                     if not compare_res:
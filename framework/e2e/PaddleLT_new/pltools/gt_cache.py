@@ -0,0 +1,461 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+ground truth文件缓存
+本地按内容sha1存储gt文件, 多线程下载(断点续传, 校验大小与sha1, 原子rename)后硬链接到目标目录;
+同一url的part文件由文件锁保护, 多个进程共享存储时不会同时续传同一个part文件;
+上传时与远端已有的manifest.json合并后上传, 下载时manifest中sha1已在本地存储的文件不再下载
+缓存目录由环境变量PLT_GT_CACHE_DIR指定, 并发数由PLT_GT_WORKERS指定
+源地址支持http(s)://与file://, 上传到file://时直接拷贝, 便于离线调试
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+BLOCK_SIZE = 1 << 20
+
+# 单个文件状态
+CACHED = "cached"
+DOWNLOADED = "downloaded"
+UPLOADED = "uploaded"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+def file_sha1(path):
+    """
+    文件内容sha1
+    """
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def url_join(base_url, *parts):
+    """
+    拼接url, 与os.path.join不同, 不依赖系统路径分隔符
+    """
+    return "/".join([base_url.rstrip("/")] + [part.strip("/") for part in parts])
+
+
+def bos_url(bos_path):
+    """
+    bos路径(bucket/key)对应的下载地址, 与run.py中打印的下载链接一致; 带scheme的地址原样返回
+    """
+    if urlparse(bos_path).scheme:
+        return bos_path
+    bucket, _, key = bos_path.partition("/")
+    return url_join("https://{}.bj.bcebos.com".format(bucket), key)
+
+
+def _local_path(url):
+    """
+    file://地址转为本地路径, 其他地址返回None
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        return url2pathname(parsed.path)
+    return None
+
+
+def _write_json(data, path):
+    """
+    原子写入json
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    """
+    读取json, 不存在或损坏时返回{}
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+@contextmanager
+def _flock(path):
+    """
+    进程间互斥的文件锁, 无fcntl的平台上不加锁
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class GTCache(object):
+    """
+    content-addressed ground truth cache
+    """
+
+    def __init__(self, store=None, workers=None, retries=3, timeout=60):
+        """
+        :param store: 本地存储目录, 默认取PLT_GT_CACHE_DIR
+        :param workers: 下载/上传线程数, 默认取PLT_GT_WORKERS
+        :param retries: 单个文件重试次数, 重试时从已下载部分续传
+        :param timeout: 单次请求超时, 单位秒
+        """
+        self.store = store or os.environ.get(
+            "PLT_GT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "plt_gt")
+        )
+        self.workers = int(workers or os.environ.get("PLT_GT_WORKERS", 8))
+        self.retries = retries
+        self.timeout = timeout
+        for sub in ["objects", "tmp"]:
+            os.makedirs(os.path.join(self.store, sub), exist_ok=True)
+        # 无远端manifest时, 按url记录上次下载的sha1及校验信息(etag/size)
+        self.url_index_path = os.path.join(self.store, "urls.json")
+        self.url_index = _read_json(self.url_index_path)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def object_path(self, digest):
+        """
+        sha1对应的存储路径
+        """
+        return os.path.join(self.store, "objects", digest[:2], digest)
+
+    def has(self, digest, size=None):
+        """
+        本地存储中是否已有该文件
+        """
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            return False
+        return size is None or os.path.getsize(path) == size
+
+    def _session(self):
+        """
+        每个线程一个requests.Session, 复用连接
+        """
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def _read(self, url):
+        """
+        读取小文件(如manifest), 不存在时返回None
+        """
+        path = _local_path(url)
+        if path is not None:
+            if not os.path.exists(path):
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        r = self._session().get(url, timeout=self.timeout)
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return r.content
+
+    def _validator(self, url):
+        """
+        无manifest时判断远端文件是否变化的依据: http取ETag/Last-Modified/Content-Length, file取mtime/size
+        """
+        path = _local_path(url)
+        if path is not None:
+            stat = os.stat(path)
+            return "{}-{}".format(stat.st_mtime_ns, stat.st_size)
+        r = self._session().head(url, timeout=self.timeout, allow_redirects=True)
+        r.raise_for_status()
+        validator = r.headers.get("ETag") or r.headers.get("Last-Modified")
+        if validator is None:
+            return None
+        return "{}-{}".format(validator, r.headers.get("Content-Length"))
+
+    def _download(self, url, part_path):
+        """
+        下载到part文件, part文件已存在时从末尾续传
+        :return: 远端文件大小, 未知时返回None
+        """
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        path = _local_path(url)
+        if path is not None:
+            with open(path, "rb") as fin, open(part_path, "ab") as fout:
+                fin.seek(offset)
+                shutil.copyfileobj(fin, fout, BLOCK_SIZE)
+            return os.path.getsize(path)
+
+        headers = {"Range": "bytes={}-".format(offset)} if offset else {}
+        with self._session().get(url, stream=True, headers=headers, timeout=self.timeout) as r:
+            if r.status_code == 416:
+                # part文件已完整或比远端文件长, 交给大小与sha1校验
+                total = r.headers.get("Content-Range", "").rpartition("/")[2]
+                return int(total) if total.isdigit() else None
+            r.raise_for_status()
+            if r.status_code == 206:
+                total = r.headers.get("Content-Range", "").rpartition("/")[2]
+                total = int(total) if total.isdigit() else None
+            else:
+                length = r.headers.get("Content-Length")
+                total = int(length) if length is not None and length.isdigit() else None
+            # 服务端不支持Range时返回200, 需要从头写
+            with open(part_path, "ab" if r.status_code == 206 else "wb") as f:
+                for block in r.iter_content(BLOCK_SIZE):
+                    f.write(block)
+        return total
+
+    def _link(self, digest, output_path):
+        """
+        从本地存储硬链接(跨文件系统时拷贝)到目标路径
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        tmp_path = "{}.{}.{}.tmp".format(output_path, os.getpid(), threading.get_ident())
+        try:
+            os.link(self.object_path(digest), tmp_path)
+        except OSError:
+            shutil.copyfile(self.object_path(digest), tmp_path)
+        os.replace(tmp_path, output_path)
+
+    def _fetch_one(self, url, output_path, expect=None):
+        """
+        获取单个文件
+        :param expect: manifest中的{"sha1", "size"}, None表示远端没有manifest
+        :return: CACHED / DOWNLOADED
+        """
+        if expect is not None and self.has(expect["sha1"], expect.get("size")):
+            self._link(expect["sha1"], output_path)
+            return CACHED
+
+        validator = None
+        if expect is None:
+            try:
+                validator = self._validator(url)
+            except Exception:
+                validator = None
+            record = self.url_index.get(url)
+            if validator is not None and record and record["validator"] == validator and self.has(record["sha1"]):
+                self._link(record["sha1"], output_path)
+                return CACHED
+
+        part_path = os.path.join(self.store, "tmp", hashlib.sha1(url.encode()).hexdigest() + ".part")
+        # 下载、校验与rename期间持有锁, 其他进程等待后直接使用已入库的文件
+        with _flock(part_path + ".lock"):
+            if expect is not None and self.has(expect["sha1"], expect.get("size")):
+                self._link(expect["sha1"], output_path)
+                return CACHED
+            error = None
+            for _ in range(self.retries):
+                try:
+                    total = self._download(url, part_path)
+                except Exception as e:
+                    # 保留part文件, 下次重试续传
+                    error = e
+                    continue
+                size = expect.get("size") if expect is not None else None
+                size = total if size is None else size
+                got = os.path.getsize(part_path)
+                if size is not None and got != size:
+                    os.remove(part_path)
+                    error = Exception("size mismatch for {}: got {}, expect {}".format(url, got, size))
+                    continue
+                digest = file_sha1(part_path)
+                if expect is not None and digest != expect["sha1"]:
+                    os.remove(part_path)
+                    error = Exception("sha1 mismatch for {}: got {}, expect {}".format(url, digest, expect["sha1"]))
+                    continue
+                os.makedirs(os.path.dirname(self.object_path(digest)), exist_ok=True)
+                os.replace(part_path, self.object_path(digest))
+                with self.lock:
+                    self.url_index[url] = {"sha1": digest, "validator": validator}
+                self._link(digest, output_path)
+                return DOWNLOADED
+        raise Exception("download {} failed after {} retries: {}".format(url, self.retries, error))
+
+    def fetch(self, base_url, rel_paths, output_dir, logger=None):
+        """
+        并发获取一组gt文件
+        :param base_url: 源地址, 其下为rel_paths及可选的manifest.json
+        :param rel_paths: 相对路径list, 如["dy_eval/layercase^xxx.tensor"]
+        :param output_dir: 目标目录, 文件保存为output_dir/rel_path
+        :return: {rel_path: CACHED / DOWNLOADED / FAILED}
+        """
+        manifest = self._read(url_join(base_url, MANIFEST))
+        files = json.loads(manifest).get("files", {}) if manifest else None
+
+        def _task(rel):
+            """单个文件"""
+            expect = None if files is None else files.get(rel)
+            try:
+                return rel, self._fetch_one(url_join(base_url, rel), os.path.join(output_dir, rel), expect)
+            except Exception as e:
+                if logger is not None:
+                    logger.warning("gt文件 {} 获取失败: {}".format(rel, e))
+                return rel, FAILED
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            status = dict(pool.map(_task, rel_paths))
+        if files is None:
+            with self.lock:
+                _write_json(self.url_index, self.url_index_path)
+        return status
+
+    def _uploader(self):
+        """
+        每个线程一个bos client
+        """
+        if not hasattr(self.local, "uploader"):
+            from pltools.upload_bos import UploadBos
+
+            self.local.uploader = UploadBos()
+        return self.local.uploader.upload_to_bos
+
+    @staticmethod
+    def _copy_upload(bos_path, file_path):
+        """
+        上传到file://目标, 与upload_to_bos一致, 文件保存为bos_path/basename
+        """
+        target_dir = _local_path(bos_path)
+        os.makedirs(target_dir, exist_ok=True)
+        target = os.path.join(target_dir, os.path.basename(file_path))
+        shutil.copyfile(file_path, target + ".tmp")
+        os.replace(target + ".tmp", target)
+
+    def publish(self, local_dir, upload_url, uploader=None, logger=None):
+        """
+        并发上传local_dir下的全部文件, 远端manifest.json中sha1相同的文件跳过;
+        manifest先读取远端已有的再合并本次上传的文件, 不同设备/任务分批上传到同一地址时不会互相覆盖
+        (同时上传到同一地址的任务之间仍以后上传的manifest为准)
+        :param upload_url: file://地址或bos路径(bucket/key), 远端manifest从bos_url(upload_url)读取
+        :param uploader: upload(bos_path, file_path), 默认file://地址拷贝, 其他地址使用UploadBos
+        :return: {rel_path: UPLOADED / SKIPPED / FAILED}
+        """
+        if uploader is None:
+            uploader = self._copy_upload if _local_path(upload_url) is not None else None
+
+        files = {}
+        for root, _, names in os.walk(local_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, local_dir).replace(os.sep, "/")
+                files[rel] = {"sha1": file_sha1(path), "size": os.path.getsize(path)}
+
+        # 远端manifest读取失败时直接报错, 避免上传只含本次文件的manifest覆盖远端
+        remote = self._read(url_join(bos_url(upload_url), MANIFEST))
+        uploaded = json.loads(remote).get("files", {}) if remote else {}
+
+        def _task(rel):
+            """单个文件"""
+            if uploaded.get(rel) == files[rel]:
+                return rel, SKIPPED
+            try:
+                upload = uploader or self._uploader()
+                upload(url_join(upload_url, os.path.dirname(rel)), os.path.join(local_dir, rel))
+                return rel, UPLOADED
+            except Exception as e:
+                if logger is not None:
+                    logger.warning("gt文件 {} 上传失败: {}".format(rel, e))
+                return rel, FAILED
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            status = dict(pool.map(_task, sorted(files)))
+
+        # 合并远端manifest; 上传失败的文件远端内容不确定, 从manifest中去掉, 下次重新上传
+        merged = dict(uploaded)
+        for rel, info in files.items():
+            if status[rel] == FAILED:
+                merged.pop(rel, None)
+            else:
+                merged[rel] = info
+        manifest = {"version": MANIFEST_VERSION, "files": merged}
+        with tempfile.TemporaryDirectory(dir=os.path.join(self.store, "tmp")) as tmp_dir:
+            _write_json(manifest, os.path.join(tmp_dir, MANIFEST))
+            (uploader or self._uploader())(upload_url, os.path.join(tmp_dir, MANIFEST))
+        return status
+
+
+if __name__ == "__main__":
+    # benchmark: 本地http服务(每个请求模拟20ms网络延迟)上, 原逐个download_sth与GTCache冷/热缓存的耗时
+    # python pltools/gt_cache.py [文件数, 默认200]
+    import sys
+    import time
+    from functools import partial
+    from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+    # 直接执行脚本时sys.path[0]为pltools, 需加入PaddleLT_new以导入pltools包
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from pltools.res_save import download_sth
+
+    class SlowHandler(SimpleHTTPRequestHandler):
+        """模拟网络延迟"""
+
+        def send_head(self):
+            """每个请求延迟20ms"""
+            time.sleep(0.02)
+            return super(SlowHandler, self).send_head()
+
+        def log_message(self, *args):
+            """不打印访问日志"""
+
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        gt_dir = os.path.join(tmp_dir, "plt_gt", "cpu")
+        os.makedirs(os.path.join(gt_dir, "dy_eval"))
+        rel_paths = []
+        for i in range(num):
+            rel = "dy_eval/layercase^sublayer1000^Det_cases^SIR_{}.tensor".format(i)
+            with open(os.path.join(gt_dir, rel), "wb") as f:
+                f.write(os.urandom(256 * 1024))
+            rel_paths.append(rel)
+
+        origin = os.path.join(tmp_dir, "origin")
+        cache = GTCache(store=os.path.join(tmp_dir, "store"))
+        start = time.perf_counter()
+        cache.publish(gt_dir, "file://" + origin + "/cpu")
+        print("publish {} files to file://     : {:.3f}s".format(num, time.perf_counter() - start))
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), partial(SlowHandler, directory=origin))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = "http://127.0.0.1:{}/cpu".format(server.server_address[1])
+
+        start = time.perf_counter()
+        for rel in rel_paths:
+            output_path = os.path.join(tmp_dir, "serial", rel)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            download_sth(gt_url=url_join(base_url, rel), output_path=output_path)
+        print("download_sth serial             : {:.3f}s".format(time.perf_counter() - start))
+
+        for name, store in [("cold", "store_http"), ("warm", "store_http")]:
+            cache = GTCache(store=os.path.join(tmp_dir, store))
+            start = time.perf_counter()
+            status = cache.fetch(base_url, rel_paths, os.path.join(tmp_dir, name))
+            cost = time.perf_counter() - start
+            assert file_sha1(os.path.join(tmp_dir, name, rel_paths[0])) == file_sha1(os.path.join(gt_dir, rel_paths[0]))
+            print(
+                "GTCache {} ({} workers)         : {:.3f}s, {}".format(
+                    name, cache.workers, cost, {s: list(status.values()).count(s) for s in set(status.values())}
+                )
+            )
+        server.shutdown()
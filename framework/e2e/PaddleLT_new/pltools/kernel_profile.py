@@ -0,0 +1,318 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+kernel级profile解析与对比
+支持两种输入: nsys stats导出的cuda_gpu_kern_sum csv, 以及paddle.profiler导出的chrome trace json(CPU可用),
+统一为 (category, name) -> calls/total/self 的表, 时间单位均为ns;
+多次重复的表可合并并按step归一, 再与基线逐kernel对比, 按阈值给出G/S/B
+"""
+import os
+import re
+import csv
+import sys
+import json
+import glob
+import argparse
+from collections import namedtuple
+
+# chrome trace中event名带有耗时后缀, 例如 'matmul dygraph[33.816 us]'
+DURATION_SUFFIX = re.compile(r"\[[\d.]+ ?[mun]?s\]$")
+# GPU trace中的真实kernel; CPU trace没有Kernel事件, 以动态图kernel launch代替
+KERNEL_CATEGORIES = ["Kernel", "DygraphKernelLaunch"]
+
+KernelRow = namedtuple("KernelRow", ["category", "name", "calls", "total", "self", "avg"])
+
+
+class ProfileTable(object):
+    """
+    kernel统计表, rows: (category, name) -> [calls, total, self]
+    """
+
+    def __init__(self, rows=None, steps=1, source=""):
+        """
+        初始化
+        """
+        self.rows = rows if rows is not None else {}
+        self.steps = steps
+        self.source = source
+
+    def add(self, category, name, calls, total, self_time):
+        """
+        累加一条记录
+        """
+        row = self.rows.setdefault((category, name), [0, 0, 0])
+        row[0] += calls
+        row[1] += total
+        row[2] += self_time
+
+    @classmethod
+    def from_nsys_csv(cls, path):
+        """
+        nsys stats --report cuda_gpu_kern_sum --format csv 的结果, kernel没有嵌套, self即total
+        """
+        table = cls(source=path)
+        with open(path, newline="") as f:
+            for record in csv.DictReader(f):
+                calls = int(record["Instances"])
+                # 与此前pandas的 Instances * Avg (ns) 口径一致
+                total = calls * float(record["Avg (ns)"])
+                table.add("Kernel", record["Name"], calls, total, total)
+        return table
+
+    @classmethod
+    def from_chrome_trace(cls, path, categories=None):
+        """
+        paddle.profiler export_chrome_tracing 的结果
+        self时间: 同一(pid, tid)上按时间嵌套, 父event减去直接子event的耗时
+        :param categories: 保留的event类别, None为全部(ProfileStep只计数step)
+        """
+        with open(path) as f:
+            trace = json.load(f)
+        events = trace["traceEvents"] if isinstance(trace, dict) else trace
+        threads = {}
+        steps = 0
+        for event in events:
+            if event.get("ph") != "X" or "dur" not in event:
+                continue
+            if event.get("cat") == "ProfileStep":
+                steps += 1
+                continue
+            # us -> ns, 取整避免浮点误差在嵌套判断中累积
+            start = int(round(float(event["ts"]) * 1000))
+            dur = int(round(float(event["dur"]) * 1000))
+            name = DURATION_SUFFIX.sub("", event["name"]).strip()
+            threads.setdefault((event.get("pid"), event.get("tid")), []).append(
+                (start, -dur, event.get("cat", ""), name)
+            )
+
+        table = cls(steps=max(steps, 1), source=path)
+        for thread_events in threads.values():
+            # 起点相同时长的在前, 即父event先于子event
+            thread_events.sort()
+            # stack元素: [end, category, name, dur, children_dur]
+            stack = []
+            for start, neg_dur, category, name in thread_events:
+                while stack and stack[-1][0] <= start:
+                    cls._pop(table, stack, categories)
+                if stack:
+                    stack[-1][4] += -neg_dur
+                stack.append([start - neg_dur, category, name, -neg_dur, 0])
+            while stack:
+                cls._pop(table, stack, categories)
+        return table
+
+    @staticmethod
+    def _pop(table, stack, categories):
+        """
+        出栈并记录
+        """
+        _, category, name, dur, children = stack.pop()
+        if categories is None or category in categories:
+            table.add(category, name, 1, dur, max(dur - children, 0))
+
+    @classmethod
+    def load(cls, path, categories=None):
+        """
+        按后缀识别格式, 也可为目录(合并目录下全部trace)
+        """
+        if os.path.isdir(path):
+            files = sorted(glob.glob(os.path.join(path, "*.json")) + glob.glob(os.path.join(path, "*.csv")))
+            if not files:
+                raise Exception("no profile file in {}".format(path))
+            return aggregate([cls.load(f, categories) for f in files], per_step=False)
+        if path.endswith(".csv"):
+            return cls.from_nsys_csv(path)
+        return cls.from_chrome_trace(path, categories)
+
+    def select(self, categories):
+        """
+        只保留部分类别
+        """
+        rows = {key: list(value) for key, value in self.rows.items() if key[0] in categories}
+        return ProfileTable(rows, self.steps, self.source)
+
+    def kernels(self):
+        """
+        kernel视图: 有GPU Kernel时只取Kernel, 否则取CPU的kernel launch
+        """
+        present = {category for category, _ in self.rows}
+        for category in KERNEL_CATEGORIES:
+            if category in present:
+                return self.select([category])
+        return ProfileTable(steps=self.steps, source=self.source)
+
+    def total_time(self):
+        """
+        全部记录的self时间之和, kernel视图下即kernel总耗时
+        """
+        return sum(row[2] for row in self.rows.values())
+
+    def total_calls(self):
+        """
+        全部记录的调用次数之和
+        """
+        return sum(row[0] for row in self.rows.values())
+
+    def table(self):
+        """
+        :return: list[KernelRow], 按total降序
+        """
+        res = []
+        for (category, name), (calls, total, self_time) in self.rows.items():
+            res.append(KernelRow(category, name, calls, total, self_time, total / calls if calls else 0))
+        return sorted(res, key=lambda row: (-row.total, row.category, row.name))
+
+    def to_dict(self):
+        """
+        可json化的结果
+        """
+        return {
+            "steps": self.steps,
+            "source": self.source,
+            "rows": [[category, name] + list(value) for (category, name), value in self.rows.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        to_dict的逆操作
+        """
+        rows = {(row[0], row[1]): list(row[2:]) for row in data["rows"]}
+        return cls(rows, data.get("steps", 1), data.get("source", ""))
+
+
+def aggregate(tables, per_step=True):
+    """
+    合并多次重复的profile
+    :param per_step: True时结果为每个step的平均值(step数为各表step之和), 便于不同step数的run之间对比
+    """
+    merged = ProfileTable(steps=0, source=",".join(table.source for table in tables))
+    for table in tables:
+        merged.steps += table.steps
+        for (category, name), (calls, total, self_time) in table.rows.items():
+            merged.add(category, name, calls, total, self_time)
+    if per_step and merged.steps > 1:
+        for row in merged.rows.values():
+            for i in range(3):
+                row[i] /= merged.steps
+        merged.steps = 1
+    return merged
+
+
+def ratio(baseline, latest):
+    """
+    与strategy.compare.perf_compare口径一致的比例, 正数为latest更快
+    """
+    if baseline == 0 or latest == 0:
+        return 0.0
+    if latest > baseline:
+        return (latest - baseline) / baseline * -1
+    return (baseline - latest) / latest
+
+
+def diff(latest, baseline, threshold=0.05, min_time=0, field="self"):
+    """
+    逐kernel对比
+    :param threshold: 与gsb_ratio_rule一致, ratio <= -threshold为B, > threshold为G
+    :param min_time: 两侧耗时均小于该值(ns)的kernel视为S, 避免极短kernel的抖动
+    :param field: 对比字段, self或total
+    :return: list[dict], 按耗时增量降序
+    """
+    index = 2 if field == "self" else 1
+    res = []
+    for key in sorted(set(latest.rows) | set(baseline.rows)):
+        latest_row = latest.rows.get(key)
+        baseline_row = baseline.rows.get(key)
+        item = {
+            "category": key[0],
+            "name": key[1],
+            "latest_calls": latest_row[0] if latest_row else 0,
+            "baseline_calls": baseline_row[0] if baseline_row else 0,
+            "latest": latest_row[index] if latest_row else 0,
+            "baseline": baseline_row[index] if baseline_row else 0,
+        }
+        item["delta"] = item["latest"] - item["baseline"]
+        if baseline_row is None:
+            item["compare"] = "None"
+            item["gsb"] = "new"
+        elif latest_row is None:
+            item["compare"] = "None"
+            item["gsb"] = "removed"
+        else:
+            res_ratio = ratio(item["baseline"], item["latest"])
+            item["compare"] = "{:.2f}%".format(res_ratio * 100)
+            if max(item["latest"], item["baseline"]) < min_time:
+                item["gsb"] = "S"
+            elif res_ratio <= -threshold:
+                item["gsb"] = "B"
+            elif res_ratio > threshold:
+                item["gsb"] = "G"
+            else:
+                item["gsb"] = "S"
+        res.append(item)
+    return sorted(res, key=lambda item: (-item["delta"], item["category"], item["name"]))
+
+
+def gsb_summary(diff_list):
+    """
+    统计diff结果, new/removed计入error之外的单独项
+    """
+    summary = {"G": 0, "S": 0, "B": 0, "new": 0, "removed": 0}
+    for item in diff_list:
+        summary[item["gsb"]] += 1
+    return summary
+
+
+def write_diff_csv(diff_list, filename, prefix=()):
+    """
+    对比结果写csv
+    :param prefix: diff_list中额外的字段, 放在最前面几列
+    """
+    header = list(prefix) + [
+        "category",
+        "name",
+        "latest_calls",
+        "baseline_calls",
+        "latest",
+        "baseline",
+        "delta",
+        "compare",
+        "gsb",
+    ]
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=header)
+        writer.writeheader()
+        writer.writerows(diff_list)
+
+
+def main():
+    """
+    命令行: 对比两份profile
+    python pltools/kernel_profile.py latest.json baseline.json --output kernel_diff.csv
+    """
+    parser = argparse.ArgumentParser(description="kernel profile diff")
+    parser.add_argument("latest", help="待测profile, trace json/nsys csv或其所在目录")
+    parser.add_argument("baseline", help="基线profile")
+    parser.add_argument("--threshold", type=float, default=0.05, help="G/B阈值")
+    parser.add_argument("--min_time", type=float, default=0, help="忽略两侧均短于该值(ns)的kernel")
+    parser.add_argument("--all", action="store_true", help="对比全部event而非只对比kernel")
+    parser.add_argument("--output", default=None, help="结果csv")
+    args = parser.parse_args()
+
+    tables = []
+    for path in [args.latest, args.baseline]:
+        table = ProfileTable.load(path)
+        tables.append(aggregate([table if args.all else table.kernels()]))
+    diff_list = diff(tables[0], tables[1], threshold=args.threshold, min_time=args.min_time)
+    if args.output:
+        write_diff_csv(diff_list, args.output)
+    for item in diff_list:
+        if item["gsb"] != "S":
+            print("{gsb:8}{compare:>10}{latest:>14.1f}{baseline:>14.1f}  {category}:{name}".format(**item))
+    print(gsb_summary(diff_list))
+    return 1 if any(item["gsb"] == "B" for item in diff_list) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
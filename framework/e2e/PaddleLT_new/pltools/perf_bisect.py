@@ -0,0 +1,377 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+性能回退二分定位
+输入按时间排序的build list(第一个为性能正常, 最后一个为性能回退), 每个build由provider安装/切换,
+由probe多次采样耗时; 每一步与两端build的采样做Mann-Whitney U检验, 不显著时追加采样, 达到上限后按中位数远近判定
+每个build的采样与判定过程写入缓存文件(PLT_BISECT_CACHE), 中断后重新执行时已采样的build不再安装和测试
+"""
+
+import os
+import sys
+import json
+import math
+import subprocess
+
+import numpy as np
+
+GOOD = "good"
+BAD = "bad"
+
+
+def mann_whitney_u(x, y):
+    """
+    Mann-Whitney U检验(正态近似, 含结校正)
+    :return: U(x), 双侧p值
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    n1, n2 = len(x), len(y)
+    data = np.concatenate([x, y])
+    order = np.argsort(data, kind="mergesort")
+    ranks = np.empty(len(data), dtype="float64")
+    sorted_data = data[order]
+    i = 0
+    tie_term = 0.0
+    while i < len(data):
+        j = i
+        while j + 1 < len(data) and sorted_data[j + 1] == sorted_data[i]:
+            j += 1
+        ranks[order[i : j + 1]] = (i + j) / 2.0 + 1
+        t = j - i + 1
+        tie_term += t**3 - t
+        i = j + 1
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2.0
+    n = n1 + n2
+    sigma = math.sqrt(n1 * n2 / 12.0 * ((n + 1) - tie_term / (n * (n - 1))))
+    if sigma == 0:
+        return u, 1.0
+    z = (abs(u - n1 * n2 / 2.0) - 0.5) / sigma
+    return u, min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2)))
+
+
+def bootstrap_ratio_ci(base, target, alpha=0.05, rounds=2000, seed=33):
+    """
+    median(target) / median(base) 的bootstrap置信区间
+    """
+    rng = np.random.RandomState(seed)
+    base = np.asarray(base, dtype="float64")
+    target = np.asarray(target, dtype="float64")
+    b = np.median(base[rng.randint(0, len(base), (rounds, len(base)))], axis=1)
+    t = np.median(target[rng.randint(0, len(target), (rounds, len(target)))], axis=1)
+    ratio = t / b
+    return float(np.percentile(ratio, 100 * alpha / 2)), float(np.percentile(ratio, 100 * (1 - alpha / 2)))
+
+
+class WheelProvider(object):
+    """
+    按commit安装paddle wheel, 与binary_search.py的安装方式一致
+    """
+
+    def __init__(self, py_cmd=None, whl_link=None, package="paddlepaddle-gpu"):
+        """
+        :param whl_link: wheel地址模板, {}替换为commit
+        """
+        self.py_cmd = py_cmd or os.environ.get("python_ver", sys.executable)
+        self.whl_link = whl_link or (
+            "https://paddle-qa.bj.bcebos.com/paddle-pipe"
+            "line/Develop-GpuSome-LinuxCentos-Gcc82-Cuda118-Cudnn86-Trt85-Py310-CINN-Compile/{}/paddle"
+            "paddle_gpu-0.0.0-cp310-cp310-linux_x86_64.whl"
+        )
+        self.package = package
+
+    def activate(self, build):
+        """
+        安装build, 返回执行probe的python
+        """
+        os.system(f"{self.py_cmd} -m pip uninstall {self.package} -y")
+        exit_code = os.system(f"{self.py_cmd} -m pip install {self.whl_link.format(build)}")
+        if exit_code != 0:
+            raise Exception("install {} failed".format(build))
+        return self.py_cmd
+
+
+class LocalEnvProvider(object):
+    """
+    已安装好的本地环境, build -> python解释器路径
+    """
+
+    def __init__(self, envs):
+        """
+        :param envs: dict, build -> python
+        """
+        self.envs = envs
+
+    def activate(self, build):
+        """
+        无需安装, 直接返回对应python
+        """
+        return self.envs[build]
+
+
+class LayerPerfProbe(object):
+    """
+    子图性能probe: 以unit-python模式独立进程执行layertest.py, 每次执行得到一个耗时(如LayerEvalBM.dy_eval_perf的统计值)
+    """
+
+    def __init__(self, layerfile, testing, plt_exc="dy_eval_perf", timeout=600):
+        """
+        :param plt_exc: testing yaml中的执行器名称
+        """
+        self.layerfile = layerfile
+        self.testing = testing
+        self.plt_exc = plt_exc
+        self.timeout = timeout
+        self.title = layerfile.replace(".py", "").replace("/", "^").replace(".", "^")
+
+    def key(self):
+        """
+        缓存key, 不同子图/执行器的采样互不复用
+        """
+        return "{}|{}|{}".format(self.layerfile, self.testing, self.plt_exc)
+
+    def __call__(self, python, n):
+        """
+        独立进程执行n次
+        """
+        from pltools.res_save import load_pickle
+
+        env = dict(os.environ, TESTING_MODE="performance", PLT_PERF_MODE="unit-python")
+        result = os.path.join("perf_unit_result", self.title + "-" + self.plt_exc + ".pickle")
+        res = []
+        for _ in range(n):
+            if os.path.exists(result):
+                os.remove(result)
+            subprocess.run(
+                [python, "layertest.py", "--layerfile", self.layerfile, "--testing", self.testing]
+                + ["--plt_exc", self.plt_exc],
+                env=env,
+                timeout=self.timeout,
+            )
+            if not os.path.exists(result):
+                raise Exception("{} {} produced no result".format(self.layerfile, self.plt_exc))
+            res_dict, exc = load_pickle(filename=result)
+            if exc > 0:
+                raise Exception("{} {} failed: {}".format(self.layerfile, self.plt_exc, res_dict[self.plt_exc]))
+            res.append(float(res_dict[self.plt_exc]))
+        return res
+
+
+class PerfBisect(object):
+    """
+    抗噪声的性能回退二分定位
+    """
+
+    def __init__(
+        self,
+        builds,
+        provider,
+        probe,
+        probe_key=None,
+        cache_file=None,
+        alpha=0.05,
+        min_effect=0.03,
+        samples=5,
+        max_samples=30,
+        logger=None,
+    ):
+        """
+        :param builds: 按时间排序的build list, builds[0]性能正常, builds[-1]性能回退
+        :param provider: 提供activate(build) -> python
+        :param probe: probe(python, n) -> n个耗时采样
+        :param probe_key: 缓存key, 默认probe.key()
+        :param alpha: 显著性水平
+        :param min_effect: 认为是回退的最小相对耗时变化
+        :param samples: 每轮采样数
+        :param max_samples: 单个build采样上限
+        """
+        if len(builds) < 2:
+            raise Exception("at least two builds are needed for bisect")
+        self.builds = list(builds)
+        self.provider = provider
+        self.probe = probe
+        self.probe_key = probe_key or (probe.key() if hasattr(probe, "key") else "default")
+        self.cache_file = (
+            cache_file if cache_file is not None else os.environ.get("PLT_BISECT_CACHE", "perf_bisect_cache.json")
+        )
+        self.alpha = alpha
+        self.min_effect = min_effect
+        self.samples = samples
+        self.max_samples = max_samples
+        self.logger = logger
+        self.probe_calls = 0
+        self.active = None
+        self.python = None
+        self.cache = self._load()
+        self.trail = []
+
+    def _log(self, msg):
+        """
+        日志
+        """
+        if self.logger is not None:
+            self.logger.info(msg)
+
+    def _load(self):
+        """
+        读取缓存, 只保留当前probe的部分
+        """
+        if self.cache_file and os.path.exists(self.cache_file):
+            with open(self.cache_file) as f:
+                data = json.load(f)
+            return data.get(self.probe_key, {"samples": {}, "trail": []})
+        return {"samples": {}, "trail": []}
+
+    def _save(self):
+        """
+        每次采样或判定后原子写入缓存
+        """
+        if not self.cache_file:
+            return
+        data = {}
+        if os.path.exists(self.cache_file):
+            with open(self.cache_file) as f:
+                data = json.load(f)
+        self.cache["trail"] = self.trail
+        data[self.probe_key] = self.cache
+        tmp = self.cache_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp, self.cache_file)
+
+    def _samples(self, build, n):
+        """
+        保证build至少有n个采样, 已缓存的采样直接复用
+        """
+        cached = self.cache["samples"].setdefault(build, [])
+        if len(cached) < n:
+            self._log("build {} 采样 {} -> {}".format(build, len(cached), n))
+            # 连续追加采样时不重复安装
+            if self.active != build:
+                self.python = self.provider.activate(build)
+                self.active = build
+            cached.extend(self.probe(self.python, n - len(cached)))
+            self.probe_calls += 1
+            self._save()
+        return cached[:n] if len(cached) > n else cached
+
+    def _slower(self, base, target, alpha=None):
+        """
+        target是否显著慢于base
+        """
+        _, p = mann_whitney_u(base, target)
+        ratio = float(np.median(target) / np.median(base))
+        return p < (alpha or self.alpha) and ratio > 1 + self.min_effect, p, ratio
+
+    def check_endpoints(self):
+        """
+        确认最后一个build相对第一个build存在显著回退
+        """
+        good, bad = self.builds[0], self.builds[-1]
+        n = self.samples
+        while True:
+            x, y = self._samples(good, n), self._samples(bad, n)
+            slower, p, ratio = self._slower(x, y)
+            if slower:
+                self._log("回退确认: {} -> {}, ratio {:.4f}, p {:.3g}".format(good, bad, ratio, p))
+                return ratio
+            if n >= self.max_samples:
+                raise Exception(
+                    "no significant regression between {} and {}: ratio {:.4f}, p {:.3g}".format(good, bad, ratio, p)
+                )
+            n = min(n + self.samples, self.max_samples)
+
+    def judge(self, build):
+        """
+        判定build为good或bad, 同时与两端比较:
+        显著慢于good端、不显著快于bad端且中位数更接近bad端为bad, 反之为good;
+        都不满足时追加采样, 达到上限按中位数的对数距离判定
+        二分步数与追加采样都会多次检验, 显著性水平按 步数*追加次数 做Bonferroni校正
+        """
+        good_ref = self._samples(self.builds[0], self.max_samples)
+        bad_ref = self._samples(self.builds[-1], self.max_samples)
+        steps = max(1, math.ceil(math.log2(len(self.builds) - 1)))
+        alpha = self.alpha / (steps * math.ceil(self.max_samples / float(self.samples)))
+        n = self.samples
+        while True:
+            x = self._samples(build, n)
+            slower, p_good, ratio_good = self._slower(good_ref, x, alpha)
+            faster, p_bad, ratio_bad = self._slower(x, bad_ref, alpha)
+            nearer_bad = abs(math.log(ratio_good)) > abs(math.log(ratio_bad))
+            forced = False
+            if slower and not faster and nearer_bad:
+                decision = BAD
+            elif faster and not slower and not nearer_bad:
+                decision = GOOD
+            elif n < self.max_samples:
+                n = min(n + self.samples, self.max_samples)
+                continue
+            else:
+                forced = True
+                decision = BAD if nearer_bad else GOOD
+            low, high = bootstrap_ratio_ci(good_ref, x, alpha=self.alpha)
+            step = {
+                "build": build,
+                "samples": len(x),
+                "median": float(np.median(x)),
+                "ratio_to_good": round(ratio_good, 6),
+                "ratio_ci": [round(low, 6), round(high, 6)],
+                "p_good": float("{:.4g}".format(p_good)),
+                "p_bad": float("{:.4g}".format(p_bad)),
+                "decision": decision,
+                "forced": forced,
+            }
+            self.trail.append(step)
+            self._save()
+            self._log("build {}: {}".format(build, step))
+            return decision
+
+    def run(self):
+        """
+        二分定位
+        :return: dict, first_bad/last_good及判定过程
+        """
+        self.trail = []
+        ratio = self.check_endpoints()
+        left, right = 0, len(self.builds) - 1
+        while right - left > 1:
+            mid = left + (right - left) // 2
+            if self.judge(self.builds[mid]) == BAD:
+                right = mid
+            else:
+                left = mid
+        res = {
+            "last_good": self.builds[left],
+            "first_bad": self.builds[right],
+            "regression": round(ratio, 6),
+            "trail": self.trail,
+        }
+        self.cache["result"] = {k: v for k, v in res.items() if k != "trail"}
+        self._save()
+        return res
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--builds", type=str, default="candidate_commits.txt", help="commit list文件, 按时间排序")
+    parser.add_argument("--layerfile", type=str, default="layercase/demo/SIR_101.py", help="子图路径")
+    parser.add_argument("--testing", type=str, default="yaml/dy^dy2stcinn_eval-dy2st^dy2stcinn_eval_benchmark.yml")
+    parser.add_argument("--plt_exc", type=str, default="dy_eval_perf", help="执行器")
+    args = parser.parse_args()
+
+    # python pltools/perf_bisect.py --builds candidate_commits.txt --layerfile xxx.py --testing yyy.yml
+    # 直接执行脚本时sys.path[0]为pltools, 需加入PaddleLT_new以导入pltools包
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from pltools.logger import Logger
+
+    with open(args.builds) as f:
+        builds = [line.strip() for line in f if line.strip()]
+    probe = LayerPerfProbe(layerfile=args.layerfile, testing=args.testing, plt_exc=args.plt_exc)
+    bisect = PerfBisect(builds, WheelProvider(), probe, logger=Logger("PLT性能二分定位").get_log())
+    res = bisect.run()
+    print("the first regressed commit is {}, last good commit is {}".format(res["first_bad"], res["last_good"]))
+    with open("final_commit.txt", "w") as f:
+        f.writelines("the final commit is:{}".format(res["first_bad"]))
@@ -0,0 +1,131 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+test GTCache
+"""
+
+import os
+import json
+import fcntl
+import hashlib
+import threading
+
+from pltools.gt_cache import GTCache, MANIFEST, CACHED, DOWNLOADED, UPLOADED, SKIPPED, FAILED, bos_url, file_sha1
+
+
+def _write(path, content):
+    """
+    写入gt文件
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def _manifest(origin):
+    """
+    远端manifest中的文件
+    """
+    with open(os.path.join(origin, MANIFEST)) as f:
+        return json.load(f)["files"]
+
+
+def test_publish_merge_manifest(tmp_path):
+    """
+    分批上传到同一地址时manifest合并, 内容未变的文件跳过, 上传失败的文件从manifest中去掉
+    """
+    origin = str(tmp_path / "origin")
+    upload_url = "file://" + origin
+    _write(str(tmp_path / "a" / "dy_eval" / "SIR_1.tensor"), b"1")
+    _write(str(tmp_path / "a" / "dy_eval" / "SIR_2.tensor"), b"2")
+    _write(str(tmp_path / "b" / "dy_eval" / "SIR_3.tensor"), b"3")
+
+    status = GTCache(store=str(tmp_path / "store_a")).publish(str(tmp_path / "a"), upload_url)
+    assert set(status.values()) == {UPLOADED}
+    # 另一个任务(不同本地存储)上传其余文件
+    status = GTCache(store=str(tmp_path / "store_b")).publish(str(tmp_path / "b"), upload_url)
+    assert status == {"dy_eval/SIR_3.tensor": UPLOADED}
+    assert sorted(_manifest(origin)) == ["dy_eval/SIR_1.tensor", "dy_eval/SIR_2.tensor", "dy_eval/SIR_3.tensor"]
+
+    # 以远端manifest判断是否跳过
+    _write(str(tmp_path / "a" / "dy_eval" / "SIR_2.tensor"), b"22")
+    status = GTCache(store=str(tmp_path / "store_c")).publish(str(tmp_path / "a"), upload_url)
+    assert status == {"dy_eval/SIR_1.tensor": SKIPPED, "dy_eval/SIR_2.tensor": UPLOADED}
+
+    def _fail(bos_path, file_path):
+        """SIR_1上传失败"""
+        if file_path.endswith("SIR_1.tensor"):
+            raise Exception("upload failed")
+        GTCache._copy_upload(bos_path, file_path)
+
+    _write(str(tmp_path / "a" / "dy_eval" / "SIR_1.tensor"), b"11")
+    status = GTCache(store=str(tmp_path / "store_a")).publish(str(tmp_path / "a"), upload_url, uploader=_fail)
+    assert status == {"dy_eval/SIR_1.tensor": FAILED, "dy_eval/SIR_2.tensor": SKIPPED}
+    assert sorted(_manifest(origin)) == ["dy_eval/SIR_2.tensor", "dy_eval/SIR_3.tensor"]
+
+    rel_paths = ["dy_eval/SIR_2.tensor", "dy_eval/SIR_3.tensor"]
+    cache = GTCache(store=str(tmp_path / "store_d"))
+    assert set(cache.fetch(upload_url, rel_paths, str(tmp_path / "out")).values()) == {DOWNLOADED}
+    assert set(cache.fetch(upload_url, rel_paths, str(tmp_path / "out2")).values()) == {CACHED}
+    with open(str(tmp_path / "out2" / "dy_eval" / "SIR_2.tensor"), "rb") as f:
+        assert f.read() == b"22"
+
+
+def test_bos_url():
+    """
+    bos路径转为下载地址
+    """
+    assert (
+        bos_url("paddle-qa/PaddleLT/PaddleLTGroundTruth/latest/gpu")
+        == "https://paddle-qa.bj.bcebos.com/PaddleLT/PaddleLTGroundTruth/latest/gpu"
+    )
+    assert bos_url("file:///tmp/gt") == "file:///tmp/gt"
+
+
+def test_fetch_waits_for_lock(tmp_path):
+    """
+    同一url的下载持有文件锁, 等待期间其他进程入库的文件直接使用, 不再续传part文件
+    """
+    origin = str(tmp_path / "origin")
+    _write(str(tmp_path / "gt" / "dy_eval" / "SIR_1.tensor"), b"1" * 1024)
+    GTCache(store=str(tmp_path / "store_up")).publish(str(tmp_path / "gt"), "file://" + origin)
+    url = "file://" + origin + "/dy_eval/SIR_1.tensor"
+
+    cache = GTCache(store=str(tmp_path / "store"))
+    part_path = os.path.join(cache.store, "tmp", hashlib.sha1(url.encode()).hexdigest() + ".part")
+    result = {}
+    with open(part_path + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        worker = threading.Thread(
+            target=lambda: result.update(
+                cache.fetch("file://" + origin, ["dy_eval/SIR_1.tensor"], str(tmp_path / "out"))
+            )
+        )
+        worker.start()
+        worker.join(0.5)
+        assert worker.is_alive()
+        # 持锁的"另一个进程"完成下载并入库
+        digest = file_sha1(str(tmp_path / "gt" / "dy_eval" / "SIR_1.tensor"))
+        _write(cache.object_path(digest), b"1" * 1024)
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    worker.join(10)
+    assert result == {"dy_eval/SIR_1.tensor": CACHED}
+    assert not os.path.exists(part_path)
+
+
+def test_fetch_drops_oversized_part(tmp_path):
+    """
+    part文件比远端文件长(如远端文件被替换为更短的内容)时按大小校验丢弃后重新下载
+    """
+    origin = tmp_path / "origin"
+    _write(str(origin / "dy_eval" / "SIR_1.tensor"), b"new")
+    url = "file://" + str(origin) + "/dy_eval/SIR_1.tensor"
+    cache = GTCache(store=str(tmp_path / "store"))
+    part_path = os.path.join(cache.store, "tmp", hashlib.sha1(url.encode()).hexdigest() + ".part")
+    _write(part_path, b"stale content")
+
+    status = cache.fetch("file://" + str(origin), ["dy_eval/SIR_1.tensor"], str(tmp_path / "out"))
+    assert status == {"dy_eval/SIR_1.tensor": DOWNLOADED}
+    with open(str(tmp_path / "out" / "dy_eval" / "SIR_1.tensor"), "rb") as f:
+        assert f.read() == b"new"
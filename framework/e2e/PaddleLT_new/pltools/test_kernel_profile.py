@@ -0,0 +1,77 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+test kernel_profile
+"""
+
+import os
+import csv
+
+from pltools.kernel_profile import ProfileTable, aggregate, diff, gsb_summary, write_diff_csv
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "debug", "profile_samples")
+
+
+def _load(name):
+    """
+    读取debug/profile_samples中的合成profile
+    """
+    return ProfileTable.load(os.path.join(SAMPLE_DIR, name))
+
+
+def test_chrome_trace():
+    """
+    chrome trace按线程嵌套计算self耗时, 记录step数
+    """
+    baseline = _load("baseline.paddle_trace.json")
+    latest = _load("latest.paddle_trace.json")
+    assert baseline.steps == 2 and latest.steps == 2
+    # matmul dygraph: 每次100us, 内含infer_meta 10us与kernel launch 80us, self为10us
+    assert baseline.rows[("Operator", "matmul dygraph")] == [2, 200000, 20000]
+    assert baseline.rows[("DygraphKernelLaunch", "matmul kernel launch")] == [2, 160000, 160000]
+    # 不同线程的event互不嵌套
+    assert baseline.rows[("Forward", "Linear")] == [2, 260000, 260000]
+
+
+def test_aggregate():
+    """
+    per_step按总step数归一, 否则为总量
+    """
+    kernels = _load("baseline.paddle_trace.json").kernels()
+    per_step = aggregate([kernels])
+    assert per_step.rows[("DygraphKernelLaunch", "matmul kernel launch")] == [1, 80000, 80000]
+    assert aggregate([kernels, kernels]).rows == per_step.rows
+    total = aggregate([kernels], per_step=False)
+    assert total.rows[("DygraphKernelLaunch", "matmul kernel launch")] == [2, 160000, 160000]
+    assert total.total_time() == kernels.total_time()
+
+
+def test_diff(tmp_path):
+    """
+    逐kernel对比的G/S/B/new/removed
+    """
+    baseline = aggregate([_load("baseline.paddle_trace.json").kernels()])
+    latest = aggregate([_load("latest.paddle_trace.json").kernels()])
+    diff_list = diff(latest, baseline, threshold=0.05)
+    res = {item["name"]: item for item in diff_list}
+    assert res["matmul kernel launch"]["gsb"] == "B" and res["matmul kernel launch"]["compare"] == "-25.00%"
+    assert res["add kernel launch"]["gsb"] == "S"
+    assert res["relu kernel launch"]["gsb"] == "removed"
+    assert res["softmax kernel launch"]["gsb"] == "new"
+    assert gsb_summary(diff_list) == {"G": 0, "S": 1, "B": 1, "new": 1, "removed": 1}
+
+    filename = str(tmp_path / "kernel_diff.csv")
+    write_diff_csv(diff_list, filename)
+    with open(filename) as f:
+        rows = list(csv.DictReader(f))
+    assert [row["name"] for row in rows] == [item["name"] for item in diff_list]
+
+
+def test_nsys_csv():
+    """
+    nsys cuda_gpu_kern_sum csv全部为kernel
+    """
+    nsys = _load("cuda_gpu_kern_sum.csv")
+    assert nsys.total_calls() == 115 and round(nsys.total_time()) == 2101582
+    assert nsys.kernels().rows == nsys.rows
@@ -0,0 +1,138 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+test LayerBenchmarkDB sqlite backend
+"""
+
+import os
+import json
+import socket
+from contextlib import closing
+
+import pytest
+
+from db.sqlite_db import SqliteDB
+from db.layer_db import LayerBenchmarkDB
+
+
+@pytest.fixture
+def bm_env(tmp_path, monkeypatch):
+    """
+    离线环境: sqlite文件、日志与job_id.txt均写入tmp_path
+    """
+    monkeypatch.chdir(tmp_path)
+    for key, value in {
+        "FRAMEWORK": "paddle",
+        "PLT_SET_DEVICE": "cpu",
+        "PLT_MD5": "md5_test",
+        "TESTING": "yaml/dy^dy2stcinn_eval_benchmark.yml",
+        "PLT_PERF_CONTENT": "layer",
+        "CASE_TYPE": "layercase",
+        "PLT_BM_DB_BACKEND": "sqlite",
+        "PLT_BM_SQLITE": str(tmp_path / "layer_benchmark.db"),
+    }.items():
+        monkeypatch.setenv(key, value)
+    monkeypatch.delenv("PLT_BM_DB_FALLBACK", raising=False)
+    return tmp_path
+
+
+def _closed_port_storage(path):
+    """
+    指向无服务端口的mysql配置
+    """
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    with open(path, "w") as f:
+        f.write(
+            "Config:\n  layer_benchmark:\n    MYSQL:\n"
+            "      host: 127.0.0.1\n      port: {}\n      user: u\n      password: p\n      db_name: d\n".format(port)
+        )
+    return path
+
+
+def test_sqlite_schema(tmp_path):
+    """
+    首次连接建表, 重复连接不报错
+    """
+    path = str(tmp_path / "schema.db")
+    db = SqliteDB(path=path)
+    assert db.show_list("layer_case") == ["id", "jid", "case_name", "result", "create_time"]
+    assert "md5_id" in db.show_list("layer_job") and db.show_list("layer_job")[0] == "id"
+    db.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    assert ("layer_case_jid",) in db.cursor.fetchall()
+    assert SqliteDB(path=path).show_list("layer_case") == db.show_list("layer_case")
+
+
+def test_sqlite_round_trip(tmp_path):
+    """
+    insert_job/insert_cases/update_job写入后可按条件查询
+    """
+    db = SqliteDB(path=str(tmp_path / "round_trip.db"))
+    now = db.timestamp()
+    job = dict(
+        comment="baseline_CE_layer_benchmark",
+        status="running",
+        env_info="{}",
+        framework="paddle",
+        agile_pipeline_build_id=0,
+        testing="yaml/t.yml",
+        plt_perf_content="layer",
+        layer_type="layercase",
+        commit="abc",
+        version="0.0.0",
+        hostname="host",
+        hardware="cpu",
+        system="Linux",
+        md5_id="md5",
+        base=1,
+        ci=0,
+        create_time=now,
+        update_time=now,
+    )
+    jid = db.insert_job(**job)
+    assert jid > 0
+    case_dict = {"layercase^SIR_{}".format(i): json.dumps({"dy_eval_perf": i * 0.5}) for i in range(2500)}
+    assert db.insert_cases(jid=jid, case_dict=case_dict, create_time=now, chunk_size=1000) == len(case_dict)
+    db.update_job(id=jid, status="done", update_time=now)
+
+    baseline_job = db.select_baseline_job(
+        comment=job["comment"], testing="yaml/t.yml", plt_perf_content="layer", base=1, ci=0, md5_id="md5"
+    )
+    assert baseline_job["id"] == jid and baseline_job["status"] == "done"
+    rows = db.select(table="layer_case", condition_list=["jid = {}".format(jid)])
+    assert {row["case_name"]: row["result"] for row in rows} == case_dict
+
+
+def test_layer_db_sqlite(bm_env):
+    """
+    LayerBenchmarkDB以sqlite backend写入基线后读出
+    """
+    data_dict = {"layercase^SIR_1": {"dy_eval_perf": 0.1}, "layercase^SIR_2": {"dy_eval_perf": 0.2}}
+    layer_db = LayerBenchmarkDB(storage="apibm_config.yml")
+    layer_db.baseline_insert(data_dict=data_dict, error_list=[])
+    layer_db.latest_insert(data_dict={"layercase^SIR_1": {"dy_eval_perf": 0.3}}, error_list=[])
+
+    baseline_dict, baseline_layer_type = LayerBenchmarkDB(storage="apibm_config.yml").get_baseline_dict()
+    assert baseline_layer_type == "layercase"
+    assert {name: json.loads(row["result"]) for name, row in baseline_dict.items()} == data_dict
+    with open(str(bm_env / "job_id.txt")) as f:
+        assert int(f.read()) == 2
+
+
+def test_mysql_fallback(bm_env, monkeypatch):
+    """
+    mysql连接失败时, 设置PLT_BM_DB_FALLBACK=sqlite退回sqlite, 否则直接报错
+    """
+    storage = _closed_port_storage(str(bm_env / "storage.yml"))
+    monkeypatch.setenv("PLT_BM_DB_BACKEND", "mysql")
+    with pytest.raises(Exception):
+        LayerBenchmarkDB(storage=storage)._db()
+
+    monkeypatch.setenv("PLT_BM_DB_FALLBACK", "sqlite")
+    layer_db = LayerBenchmarkDB(storage=storage)
+    db = layer_db._db()
+    assert isinstance(db, SqliteDB) and db.path == os.environ["PLT_BM_SQLITE"]
+    layer_db.baseline_insert(data_dict={"layercase^SIR_1": {"dy_eval_perf": 0.1}}, error_list=[])
+    assert list(layer_db.get_baseline_dict()[0]) == ["layercase^SIR_1"]
@@ -0,0 +1,86 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+test LayerEval多组InputSpec动转静及失败spec最小化
+"""
+
+import pytest
+
+paddle = pytest.importorskip("paddle")
+
+import generator.builder_data as builder_data
+from generator.builder_data import SpecInfoMeta, SpecStrategy
+from engine.paddle_eval import LayerEval
+
+
+class SpecBugNet(paddle.nn.Layer):
+    """
+    x第1维与y第0维同时为动态维时报错
+    """
+
+    def forward(self, x, y):
+        """
+        forward
+        """
+        if x.shape[1] == -1 and y.shape[0] == -1:
+            raise ValueError("dynamic dim bug")
+        return x.sum() + y.sum()
+
+
+class PassNet(paddle.nn.Layer):
+    """
+    任意InputSpec均可动转静
+    """
+
+    def forward(self, x, y):
+        """
+        forward
+        """
+        return x.sum() + y.sum()
+
+
+def _layer_eval(net_cls, strategy, monkeypatch):
+    """
+    不经过layerfile构造LayerEval, 输入与SpecStrategy直接给定
+    """
+    # builder_data仅在FRAMEWORK=paddle时import paddle
+    monkeypatch.setattr(builder_data, "paddle", paddle, raising=False)
+    data = [paddle.rand([2, 3, 4]), paddle.rand([5, 6])]
+    layer_eval = LayerEval.__new__(LayerEval)
+    layer_eval.use_multispec = "True"
+    layer_eval.return_net_instance = "False"
+    layer_eval._net_instant = net_cls
+    layer_eval._net_input_and_multi_spec = lambda: (
+        data,
+        SpecStrategy(
+            [SpecInfoMeta(shape=value.shape, dtype=value.dtype, stop_gradient=True) for value in data],
+            strategy=strategy,
+        ),
+    )
+    return layer_eval
+
+
+def test_multi_spec_pass(tmp_path, monkeypatch):
+    """
+    全部spec通过时返回首个spec的结果
+    """
+    monkeypatch.chdir(tmp_path)
+    res = _layer_eval(PassNet, "pairwise", monkeypatch).dy2st_eval_inputspec()
+    assert res["net"] is None
+    assert res["res"]["logit"].shape == []
+
+
+@pytest.mark.parametrize("strategy", ["exhaustive", "dynamic"])
+def test_multi_spec_shrink(tmp_path, monkeypatch, strategy):
+    """
+    失败spec最小化为仅保留x第1维与y第0维为动态维
+    """
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(Exception) as e:
+        _layer_eval(SpecBugNet, strategy, monkeypatch).dy2st_eval_inputspec()
+    message = str(e.value)
+    minimal = message.splitlines()[0]
+    assert minimal.startswith("最小化后的失败InputSpec为")
+    assert "shape=(2, -1, 4)" in minimal and "shape=(-1, 6)" in minimal
+    assert "dynamic dim bug" in message
@@ -0,0 +1,132 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+test PerfBisect
+"""
+
+import os
+import random
+
+import pytest
+
+from pltools.perf_bisect import PerfBisect
+
+
+class FakeProvider(object):
+    """
+    模拟build, 用于调试二分逻辑: 每个build对应真实耗时, 采样时叠加噪声
+    """
+
+    def __init__(self, latency, noise=0.05, outlier=0.05, seed=33):
+        """
+        :param latency: dict, build -> 耗时
+        :param noise: 相对高斯噪声
+        :param outlier: 采样出现2~3倍离群值的概率
+        """
+        self.latency = latency
+        self.noise = noise
+        self.outlier = outlier
+        self.rng = random.Random(seed)
+        self.current = None
+        self.installs = 0
+
+    def activate(self, build):
+        """
+        切换当前build
+        """
+        self.current = build
+        self.installs += 1
+        return build
+
+    def probe(self, python, n):
+        """
+        fake probe, python即activate返回的build
+        """
+        res = []
+        for _ in range(n):
+            value = self.latency[python] * (1 + self.rng.gauss(0, self.noise))
+            if self.rng.random() < self.outlier:
+                value *= self.rng.uniform(2, 3)
+            res.append(value)
+        return res
+
+
+class AbortProvider(FakeProvider):
+    """
+    第limit次安装时中断
+    """
+
+    limit = 3
+
+    def activate(self, build):
+        """
+        计数后中断
+        """
+        if self.installs + 1 >= self.limit:
+            raise KeyboardInterrupt
+        return super(AbortProvider, self).activate(build)
+
+
+builds = ["c{:03d}".format(i) for i in range(64)]
+culprit = 41
+latency = {b: (1.0 if i < culprit else 1.08) for i, b in enumerate(builds)}
+
+
+def test_statistic_bisect(tmp_path):
+    """
+    噪声与离群值下统计二分定位到回退build, 单次采样二分(binary_search.py的方式)容易误判
+    """
+    trials = 20
+    hits = {"single": 0, "statistic": 0}
+    for trial in range(trials):
+        provider = FakeProvider(latency, noise=0.05, outlier=0.05, seed=trial)
+        left, right = 0, len(builds) - 1
+        while right - left > 1:
+            mid = left + (right - left) // 2
+            value = provider.probe(provider.activate(builds[mid]), 1)[0]
+            if value > 1.04:
+                right = mid
+            else:
+                left = mid
+        hits["single"] += builds[right] == builds[culprit]
+
+        provider = FakeProvider(latency, noise=0.05, outlier=0.05, seed=trial)
+        cache_file = str(tmp_path / "perf_bisect_cache_{}.json".format(trial))
+        res = PerfBisect(builds, provider, provider.probe, cache_file=cache_file).run()
+        hits["statistic"] += res["first_bad"] == builds[culprit]
+    assert hits["statistic"] >= trials - 1
+    assert hits["statistic"] > hits["single"]
+
+
+def test_resume_from_cache(tmp_path):
+    """
+    中断后重新执行只补测未完成的build, 全部完成后再次执行不再安装
+    """
+    cache_file = str(tmp_path / "perf_bisect_cache.json")
+    provider = AbortProvider(latency, seed=1)
+    with pytest.raises(KeyboardInterrupt):
+        PerfBisect(builds, provider, provider.probe, cache_file=cache_file).run()
+    assert os.path.exists(cache_file)
+
+    provider = FakeProvider(latency, seed=1)
+    full = FakeProvider(latency, seed=1)
+    res = PerfBisect(builds, provider, provider.probe, cache_file=cache_file).run()
+    PerfBisect(builds, full, full.probe, cache_file=str(tmp_path / "full.json")).run()
+    assert res["first_bad"] == builds[culprit]
+    assert provider.installs < full.installs
+
+    provider = FakeProvider(latency, seed=1)
+    res = PerfBisect(builds, provider, provider.probe, cache_file=cache_file).run()
+    assert res["first_bad"] == builds[culprit]
+    assert provider.installs == 0
+
+
+def test_no_regression(tmp_path):
+    """
+    两端没有显著回退时报错
+    """
+    flat = {b: 1.0 for b in builds}
+    provider = FakeProvider(flat, seed=1)
+    with pytest.raises(Exception, match="no significant regression"):
+        PerfBisect(builds, provider, provider.probe, cache_file=str(tmp_path / "cache.json")).run()
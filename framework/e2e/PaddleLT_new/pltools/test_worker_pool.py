@@ -0,0 +1,105 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+test LayerWorkerPool
+"""
+
+import os
+import json
+
+import pytest
+
+from pltools.worker_pool import LayerWorkerPool, PASSED, FAILED, EXCEPTION, CRASH, TIMEOUT
+
+# worker中import的layertest, 按子图名称模拟各种执行结果
+FAKE_LAYERTEST = """
+import os
+import time
+
+
+class LayerTest(object):
+    def __init__(self, title, layerfile, testing, device_place_id=0):
+        self.layerfile = layerfile
+
+    def _case_run(self):
+        name = os.path.basename(self.layerfile)
+        if name.startswith("fail"):
+            assert False, "precision diff"
+        if name.startswith("raise"):
+            raise Exception("engine error")
+        if name.startswith("crash"):
+            os._exit(139)
+        if name.startswith("hang"):
+            time.sleep(60)
+"""
+
+
+@pytest.fixture
+def fake_layertest(tmp_path, monkeypatch):
+    """
+    spawn出的worker继承sys.path, 从而import模拟的layertest
+    """
+    (tmp_path / "layertest.py").write_text(FAKE_LAYERTEST)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setenv("FRAMEWORK", "fake")
+
+
+def test_status(fake_layertest):
+    """
+    结果按py_list顺序返回, 崩溃的worker重启后继续执行剩余子图
+    """
+    py_list = ["layercase/pass_0.py", "layercase/fail_0.py", "layercase/raise_0.py", "layercase/crash_0.py"]
+    py_list += ["layercase/pass_{}.py".format(i) for i in range(1, 5)]
+    pool = LayerWorkerPool(testing="yaml/dy_eval.yml", worker_num=2)
+    results = pool.run(py_list, poll_interval=0.1)
+    assert [res["case"] for res in results] == py_list
+    status = [res["status"] for res in results]
+    assert status == [PASSED, FAILED, EXCEPTION, CRASH] + [PASSED] * 4
+    assert results[0]["title"] == "layercase^pass_0"
+    assert results[3]["exitcode"] == 139
+    assert "precision diff" in results[1]["trace"]
+    assert pool.workers == {}
+
+
+def test_timeout(fake_layertest):
+    """
+    超时子图判为timeout, 不影响后续子图
+    """
+    pool = LayerWorkerPool(testing="yaml/dy_eval.yml", worker_num=1, timeout=3)
+    results = pool.run(["layercase/hang_0.py", "layercase/pass_0.py"], poll_interval=0.1)
+    assert [res["status"] for res in results] == [TIMEOUT, PASSED]
+
+
+def test_max_tasks_per_worker(fake_layertest):
+    """
+    达到任务上限后重启worker
+    """
+    py_list = ["layercase/pass_{}.py".format(i) for i in range(4)]
+    pool = LayerWorkerPool(testing="yaml/dy_eval.yml", worker_num=1, max_tasks_per_worker=2)
+    results = pool.run(py_list, poll_interval=0.1)
+    pids = [res["pid"] for res in results]
+    assert [res["status"] for res in results] == [PASSED] * 4
+    assert pids[0] == pids[1] != pids[2] == pids[3]
+
+
+def test_allure_result(fake_layertest, tmp_path):
+    """
+    每个子图写出allure结果, 崩溃子图与pytest执行时一样不写, 可由报告中缺失的case统计core dumps
+    """
+    py_list = ["layercase/pass_0.py", "layercase/fail_0.py", "layercase/raise_0.py", "layercase/crash_0.py"]
+    report_dir = str(tmp_path / "report")
+    pool = LayerWorkerPool(testing="yaml/dy_eval.yml", worker_num=2, report_dir=report_dir)
+    pool.run(py_list, poll_interval=0.1)
+
+    allure_res = {}
+    for json_file in os.listdir(report_dir):
+        assert json_file.endswith("-result.json")
+        with open(os.path.join(report_dir, json_file)) as f:
+            res = json.load(f)
+        allure_res[res["name"].replace("^", "/") + ".py"] = res
+    assert sorted(allure_res) == sorted(py_list[:3])
+    assert [allure_res[py_file]["status"] for py_file in py_list[:3]] == ["passed", "failed", "broken"]
+    assert "precision diff" in allure_res["layercase/fail_0.py"]["statusDetails"]["trace"]
+    assert allure_res["layercase/raise_0.py"]["statusDetails"]["message"] == "Exception: engine error"
+    assert allure_res["layercase/pass_0.py"]["start"] <= allure_res["layercase/pass_0.py"]["stop"]
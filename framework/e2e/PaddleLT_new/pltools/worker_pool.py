@@ -0,0 +1,350 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+常驻进程池执行引擎
+每个worker进程只import一次paddle, 之后通过队列接收子图并直接调用LayerTest._case_run,
+worker发生segfault/core dump时由主进程记录崩溃子图并重新拉起worker
+"""
+
+import os
+import time
+import platform
+import traceback
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+
+from allure_commons.logger import AllureFileLogger
+from allure_commons.model2 import TestResult, StatusDetails, Label
+from allure_commons.utils import uuid4, md5
+
+from pltools.logger import Logger
+
+# 子图执行状态
+PASSED = "passed"
+FAILED = "failed"  # 精度对比失败
+EXCEPTION = "exception"  # 执行器抛出异常
+CRASH = "crash"  # worker进程崩溃, 如segfault/core dump
+TIMEOUT = "timeout"
+
+# 与pytest执行PaddleLT.py时allure-pytest给出的状态一致: 断言失败为failed, 其余异常为broken
+ALLURE_STATUS = {PASSED: "passed", FAILED: "failed", EXCEPTION: "broken", TIMEOUT: "broken"}
+
+
+def case_title(py_file):
+    """
+    子图py路径转为case名称
+    """
+    return py_file.replace(".py", "").replace("/", "^").replace(".", "^")
+
+
+def write_allure_result(report_dir, res):
+    """
+    按allure-pytest格式写出单个子图的result.json, 字段与PaddleLT.py::test_module_layer一致.
+    崩溃的子图与pytest执行时一样不写结果, 由allure报告中缺失的case统计core dumps
+    """
+    if res["status"] == CRASH:
+        return
+    full_name = "{}#test_module_layer".format(res["title"])
+    result = TestResult(
+        uuid=uuid4(),
+        name=res["title"],
+        fullName=full_name,
+        historyId=md5(full_name),
+        testCaseId=md5(full_name),
+        description="Layer 测试",
+        status=ALLURE_STATUS[res["status"]],
+        stage="finished",
+        start=int(res["start"] * 1000),
+        stop=int((res["start"] + res["duration"]) * 1000),
+        labels=[
+            Label(name="feature", value="case"),
+            Label(name="suite", value=res["title"]),
+            Label(name="host", value=platform.node()),
+            Label(name="thread", value="{}-worker-{}".format(res["pid"], res["worker_id"])),
+            Label(name="framework", value="pytest"),
+            Label(name="language", value="cpython3"),
+            Label(name="package", value=res["title"]),
+        ],
+    )
+    if res["status"] != PASSED:
+        message = (
+            res["trace"].strip().splitlines()[-1]
+            if res["trace"]
+            else "{}, exitcode: {}".format(res["status"], res["exitcode"])
+        )
+        result.statusDetails = StatusDetails(message=message, trace=res["trace"])
+    AllureFileLogger(report_dir).report_result(result)
+
+
+def _worker_main(worker_id, device, testing, task_queue, result_conn):
+    """
+    worker进程主循环
+    """
+    if device is not None:
+        os.environ["CUDA_VISIBLE_DEVICES"] = str(device)
+
+    # 框架在worker启动时import一次, 后续所有子图复用
+    if os.environ.get("FRAMEWORK") == "paddle":
+        import paddle
+    elif os.environ.get("FRAMEWORK") == "torch":
+        import torch
+    import layertest
+
+    result_conn.send({"type": "ready", "worker_id": worker_id, "pid": os.getpid()})
+    while True:
+        py_file = task_queue.get()
+        if py_file is None:
+            break
+
+        title = case_title(py_file)
+        status = PASSED
+        trace = ""
+        start = time.time()
+        try:
+            single_test = layertest.LayerTest(title=title, layerfile=py_file, testing=testing, device_place_id=0)
+            single_test._case_run()
+        except AssertionError:
+            status = FAILED
+            trace = traceback.format_exc()
+        except Exception:
+            status = EXCEPTION
+            trace = traceback.format_exc()
+
+        result_conn.send(
+            {
+                "type": "result",
+                "worker_id": worker_id,
+                "pid": os.getpid(),
+                "case": py_file,
+                "title": title,
+                "status": status,
+                "exitcode": 0,
+                "start": start,
+                "duration": time.time() - start,
+                "trace": trace,
+            }
+        )
+
+
+class LayerWorkerPool(object):
+    """
+    常驻worker进程池
+    """
+
+    def __init__(
+        self, testing, worker_num=4, device_list=None, timeout=None, max_tasks_per_worker=None, report_dir=None
+    ):
+        """
+        :param testing: 执行器配置yml
+        :param worker_num: 每个设备上的worker数
+        :param device_list: 设备编号list, worker按设备轮流绑定CUDA_VISIBLE_DEVICES; None表示不修改设备环境(含CPU)
+        :param timeout: 单个子图超时时间(秒), 超时则杀掉worker并判为失败; None表示不限时
+        :param max_tasks_per_worker: 单个worker最多执行的子图数, 达到后重启以释放显存/内存; None表示不限
+        :param report_dir: allure结果目录, 每个子图完成后写出result.json; None表示不写
+        """
+        self.testing = testing
+        self.device_list = device_list if device_list else [None]
+        self.worker_num = worker_num * len(self.device_list)
+        self.timeout = timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.report_dir = report_dir
+        self.max_startup_failures = self.worker_num * 3
+
+        self.logger = Logger("LayerWorkerPool")
+        # 使用spawn避免继承主进程中已初始化的CUDA上下文
+        self.ctx = multiprocessing.get_context("spawn")
+        self.workers = {}
+        self.startup_failures = 0
+
+    def _spawn(self, worker_id):
+        """
+        启动(或重启)一个worker
+        """
+        device = self.device_list[worker_id % len(self.device_list)]
+        task_queue = self.ctx.Queue()
+        # 每个worker独占一条结果管道, 避免worker在写共享队列时崩溃导致锁无法释放, 其余worker全部阻塞
+        reader, writer = self.ctx.Pipe(duplex=False)
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(worker_id, device, self.testing, task_queue, writer),
+            daemon=True,
+        )
+        process.start()
+        # 主进程关闭写端, worker退出后读端即可读到EOF
+        writer.close()
+        self.workers[worker_id] = {
+            "process": process,
+            "task_queue": task_queue,
+            "reader": reader,
+            "eof": False,
+            "device": device,
+            "ready": False,
+            "case": None,
+            "start": None,
+            "task_count": 0,
+        }
+        self.logger.get_log().info(f"worker {worker_id} 启动, pid: {process.pid}, device: {device}")
+
+    def _kill(self, worker_id):
+        """
+        结束worker进程
+        """
+        process = self.workers[worker_id]["process"]
+        if process.is_alive():
+            process.kill()
+        process.join()
+        self.workers[worker_id]["reader"].close()
+
+    def _respawn(self, worker_id):
+        """
+        崩溃/超时/达到任务上限后重启worker
+        """
+        self._kill(worker_id)
+        self._spawn(worker_id)
+
+    def _handle_message(self, msg, results):
+        """
+        处理worker回传消息
+        """
+        worker = self.workers.get(msg["worker_id"])
+        # 忽略已被重启的旧worker残留的消息
+        if worker is None or msg["pid"] != worker["process"].pid:
+            return
+        if msg["type"] == "ready":
+            worker["ready"] = True
+            return
+
+        worker["case"] = None
+        worker["start"] = None
+        worker["task_count"] += 1
+        self._record(results, msg)
+        if msg["status"] != PASSED:
+            self.logger.get_log().warning(f"子图 {msg['title']} 测试结果: {msg['status']}")
+        if self.max_tasks_per_worker and worker["task_count"] >= self.max_tasks_per_worker:
+            worker["task_queue"].put(None)
+            worker["process"].join()
+            worker["reader"].close()
+            self._spawn(msg["worker_id"])
+
+    def _drain(self, results, block_timeout=None):
+        """
+        读取各worker结果管道中的全部消息
+        """
+        while True:
+            readers = {worker["reader"]: worker for worker in self.workers.values() if not worker["eof"]}
+            ready = wait(list(readers), timeout=0 if block_timeout is None else block_timeout)
+            if not ready:
+                return
+            block_timeout = None
+            for reader in ready:
+                try:
+                    msg = reader.recv()
+                except (EOFError, OSError):
+                    # worker已退出, 由_check_workers处理
+                    readers[reader]["eof"] = True
+                    continue
+                self._handle_message(msg, results)
+
+    def _check_workers(self, results):
+        """
+        检查worker存活及超时情况
+        """
+        for worker_id, worker in list(self.workers.items()):
+            process = worker["process"]
+            py_file = worker["case"]
+            if not process.is_alive():
+                # 先读取进程退出前已回传的结果, 避免误判
+                self._drain(results)
+                if self.workers[worker_id] is not worker:
+                    continue
+                py_file = worker["case"]
+                if py_file is None and not worker["ready"]:
+                    self.startup_failures += 1
+                    if self.startup_failures > self.max_startup_failures:
+                        raise Exception(f"worker启动失败次数过多, 最近一次exitcode: {process.exitcode}")
+                if py_file is not None:
+                    self.logger.get_log().warning(
+                        f"worker {worker_id} 执行子图 {py_file} 时崩溃, exitcode: {process.exitcode}"
+                    )
+                    self._record(results, self._error_result(worker_id, py_file, CRASH, process.exitcode))
+                self._respawn(worker_id)
+            elif py_file is not None and self.timeout and time.time() - worker["start"] > self.timeout:
+                self.logger.get_log().warning(f"子图 {py_file} 执行超时({self.timeout}s), 重启worker {worker_id}")
+                self._record(results, self._error_result(worker_id, py_file, TIMEOUT, -1))
+                self._respawn(worker_id)
+
+    def _record(self, results, res):
+        """
+        记录子图结果, 并即时写出allure结果, 主进程中途退出时已完成的子图仍保留在报告中
+        """
+        results[res["case"]] = res
+        if self.report_dir is not None:
+            write_allure_result(self.report_dir, res)
+
+    def _error_result(self, worker_id, py_file, status, exitcode):
+        """
+        由主进程构造的崩溃/超时结果
+        """
+        worker = self.workers[worker_id]
+        return {
+            "type": "result",
+            "worker_id": worker_id,
+            "pid": worker["process"].pid,
+            "case": py_file,
+            "title": case_title(py_file),
+            "status": status,
+            "exitcode": exitcode,
+            "start": worker["start"],
+            "duration": time.time() - worker["start"],
+            "trace": "",
+        }
+
+    def run(self, py_list, poll_interval=0.5):
+        """
+        执行子图list, 按py_list顺序返回结构化结果
+        :return: [{"case", "title", "status", "exitcode", "start", "duration", "trace", "worker_id"}, ...]
+        """
+        pending = deque(py_list)
+        results = {}
+        for worker_id in range(min(self.worker_num, len(py_list))):
+            self._spawn(worker_id)
+
+        try:
+            while len(results) < len(py_list):
+                for worker in self.workers.values():
+                    if pending and worker["ready"] and worker["case"] is None:
+                        py_file = pending.popleft()
+                        worker["case"] = py_file
+                        worker["start"] = time.time()
+                        worker["task_queue"].put(py_file)
+                self._drain(results, block_timeout=poll_interval)
+                self._check_workers(results)
+        finally:
+            self.close()
+
+        return [results[py_file] for py_file in py_list]
+
+    def close(self):
+        """
+        关闭全部worker
+        """
+        for worker in self.workers.values():
+            if worker["process"].is_alive():
+                worker["task_queue"].put(None)
+        for worker_id, worker in self.workers.items():
+            worker["process"].join(timeout=10)
+            self._kill(worker_id)
+        self.workers = {}
+
+
+if __name__ == "__main__":
+    # CPU调试逻辑, 在PaddleLT_new目录下以模块方式执行, worker才能import pltools与layertest:
+    # PLT_SET_DEVICE=cpu FRAMEWORK=paddle python -m pltools.worker_pool
+    os.environ.setdefault("PLT_SET_DEVICE", "cpu")
+    os.environ.setdefault("FRAMEWORK", "paddle")
+    py_list = ["layercase/demo/SIR_101.py", "layercase/demo/sub_demo/SIR_101.py", "layercase/demo/sub_demo/SIR_252.py"]
+    pool = LayerWorkerPool(testing="yaml/dy_eval.yml", worker_num=2, timeout=200)
+    for res in pool.run(py_list):
+        print(res["title"], res["status"], round(res["duration"], 3))
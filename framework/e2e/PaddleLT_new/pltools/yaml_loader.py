@@ -5,7 +5,12 @@
 yaml base
 """
 
-import yaml
+import os
+import sys
+
+# yaml编译缓存与framework/e2e/utils共用同一份实现
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from utils.yaml_cache import YamlCache
 
 
 class YamlLoader(object):
@@ -16,11 +21,16 @@ class YamlLoader(object):
     def __init__(self, yml):
         """initialize"""
         try:
-            with open(yml, encoding="utf-8") as f:
-                self.yml = yaml.load(f, Loader=yaml.FullLoader)
+            # 通过编译缓存加载, 单个case按需读取
+            self.cache = YamlCache(yml)
         except Exception as e:
             print(e)
 
+    @property
+    def yml(self):
+        """整个yaml内容"""
+        return self.cache.load()
+
     def __str__(self):
         """str"""
         return str(self.yml)
@@ -29,15 +39,15 @@ class YamlLoader(object):
         """
         get case info
         """
-        return {"info": self.yml.get(case_name), "name": case_name}
+        return {"info": self.cache.get(case_name), "name": case_name}
 
     def get_all_case_name(self):
         """
         get all case name
         """
         # 获取全部case name
-        if bool(self.yml):
-            return self.yml.keys()
+        if bool(self.cache):
+            return self.cache.keys()
         else:
             return []
 
@@ -46,7 +56,7 @@ class YamlLoader(object):
         get testings name
         """
         # 获取全部case name
-        if bool(self.yml):
-            return self.yml.get(junior).keys()
+        if bool(self.cache):
+            return self.cache.get(junior).keys()
         else:
             return []
@@ -6,6 +6,7 @@
 测试执行器
 """
 import os
+import sys
 import shutil
 import subprocess
 from subprocess import TimeoutExpired
@@ -13,7 +14,6 @@ import multiprocessing
 from concurrent.futures import ThreadPoolExecutor
 import platform
 from datetime import datetime
-import pandas as pd
 import layertest
 from db.layer_db import LayerBenchmarkDB
 from strategy.compare import perf_compare_dict, perf_compare_kernel_dict
@@ -21,10 +21,13 @@ from pltools.case_select import CaseSelect
 from pltools.logger import Logger
 from pltools.yaml_loader import YamlLoader
 from pltools.json_loader import JSONLoader
-from pltools.res_save import xlsx_save, download_sth, create_tar_gz, extract_tar_gz, load_pickle, save_txt
+from pltools.res_save import xlsx_save, create_tar_gz, extract_tar_gz, load_pickle, save_txt
 from pltools.upload_bos import UploadBos
+from pltools.gt_cache import GTCache, url_join, CACHED, DOWNLOADED, SKIPPED, FAILED
 from pltools.statistics import split_list, sublayer_perf_gsb_gen, kernel_perf_gsb_gen
 from pltools.alarm import Alarm
+from pltools.kernel_profile import ProfileTable, aggregate, diff, gsb_summary, write_diff_csv
+from pltools.worker_pool import LayerWorkerPool, PASSED, CRASH
 
 
 class Run(object):
@@ -81,23 +84,30 @@ class Run(object):
         if not plt_gt_download_url == "None" and os.environ.get("TESTING_MODE") == "precision":
             self.logger.get_log().info(f"下载plt_gt的url为: {plt_gt_download_url}")
             plt_gt_device = plt_gt_download_url.split("/")[-1]
-            # if not os.path.exists(os.path.join("plt_gt_baseline", plt_gt_device)):
-            #     os.makedirs(os.path.join("plt_gt_baseline", plt_gt_device))
+            rel_paths = []
             for testing in YamlLoader(yml=self.testing).get_junior_name("testings"):
-                if not os.path.exists(os.path.join("plt_gt_baseline", plt_gt_device, testing)):
-                    os.makedirs(os.path.join("plt_gt_baseline", plt_gt_device, testing))
                 for py_file in self.py_list:
                     case_name = py_file.replace(".py", "").replace("/", "^").replace(".", "^")
-                    self.logger.get_log().info(f"开始下载plt_gt: {case_name}")
-                    gt_url = f"{plt_gt_download_url}/{testing}/{case_name}.tensor"
-                    download_sth(
-                        gt_url=gt_url,
-                        output_path=os.path.join("plt_gt_baseline", plt_gt_device, testing, f"{case_name}.tensor"),
-                    )
+                    rel_paths.append(f"{testing}/{case_name}.tensor")
+            gt_status = GTCache().fetch(
+                base_url=plt_gt_download_url,
+                rel_paths=rel_paths,
+                output_dir=os.path.join("plt_gt_baseline", plt_gt_device),
+                logger=self.logger.get_log(),
+            )
+            self.logger.get_log().info(
+                "plt_gt获取完成, 共{}个, 本地缓存{}个, 下载{}个, 失败{}个".format(
+                    len(gt_status),
+                    list(gt_status.values()).count(CACHED),
+                    list(gt_status.values()).count(DOWNLOADED),
+                    list(gt_status.values()).count(FAILED),
+                )
+            )
 
-    def _exit_code_txt(self, error_count, error_list):
+    def _exit_code_txt(self, error_count, error_list, core_dumps_list=None):
         """"""
-        core_dumps_list = self._core_dumps_case_count(report_path=self.report_dir)
+        if core_dumps_list is None:
+            core_dumps_list = self._core_dumps_case_count(report_path=self.report_dir)
         if error_count != 0 or core_dumps_list:
             self.logger.get_log().warning("测试失败, 下面进行bug分类统计: ")
             self.logger.get_log().warning(f"报错为core dumps的子图有: {core_dumps_list}")
@@ -156,17 +166,22 @@ class Run(object):
         """精度groundtruth上传"""
         upload_url = os.environ.get("PLT_GT_UPLOAD_URL")
         if not upload_url == "None":
-            _upload = UploadBos()
             self.logger.get_log().info(f"上传plt_gt的路径为: {os.environ.get('PLT_GT_UPLOAD_URL')}")
+            gt_cache = GTCache()
             for device in os.listdir("plt_gt"):
-                device_path = os.path.join("plt_gt", device)
-                for testing in os.listdir(device_path):
-                    testing_path = os.path.join(device_path, testing)
-                    for tensor in os.listdir(testing_path):
-                        _upload.upload_to_bos(
-                            bos_path=os.path.join(upload_url, device, testing),
-                            file_path=os.path.join(testing_path, tensor),
-                        )
+                gt_status = gt_cache.publish(
+                    local_dir=os.path.join("plt_gt", device),
+                    upload_url=url_join(upload_url, device),
+                    logger=self.logger.get_log(),
+                )
+                self.logger.get_log().info(
+                    "plt_gt {} 上传完成, 共{}个, 未变化跳过{}个, 失败{}个".format(
+                        device,
+                        len(gt_status),
+                        list(gt_status.values()).count(SKIPPED),
+                        list(gt_status.values()).count(FAILED),
+                    )
+                )
 
     def _perf_upload(self):
         """性能表格/图表/原始数据上传"""
@@ -258,26 +273,69 @@ class Run(object):
             return py_file, exit_code
         return None, None
 
+    def _use_worker_pool(self):
+        """
+        是否使用常驻进程池执行; layerE2Ecase是独立的pytest用例文件, 不经过LayerTest, 仍按单文件pytest执行
+        """
+        if os.environ.get("PLT_EXEC_ENGINE") != "worker_pool":
+            return False
+        if self.layer_type == "layerE2Ecase":
+            self.logger.get_log().info("layerE2Ecase不支持worker_pool执行引擎, 使用pytest执行")
+            return False
+        return True
+
+    def _worker_pool_run(self, py_list, device_list=None):
+        """
+        常驻进程池执行, worker只import一次paddle, 崩溃后自动重启.
+        与_single_pytest_run一样逐个子图向self.report_dir写allure结果
+        """
+        timeout = os.environ.get("PLT_PYTEST_TIMEOUT", "None")
+        max_tasks = os.environ.get("PLT_WORKER_MAX_TASKS", "None")
+        pool = LayerWorkerPool(
+            testing=self.testing,
+            worker_num=int(os.environ.get("MULTI_WORKER", 13)),
+            device_list=device_list,
+            timeout=None if timeout == "None" else float(timeout),
+            max_tasks_per_worker=None if max_tasks == "None" else int(max_tasks),
+            report_dir=self.report_dir,
+        )
+        results = pool.run(py_list=py_list)
+
+        error_list = [res["case"] for res in results if res["status"] != PASSED]
+        core_dumps_list = [res["case"] for res in results if res["status"] == CRASH]
+        for res in results:
+            if res["status"] != PASSED:
+                self.logger.get_log().warning(
+                    f"子图 {res['title']} 状态: {res['status']}, exitcode: {res['exitcode']}, "
+                    f"耗时: {round(res['duration'], 2)}s"
+                )
+        return error_list, core_dumps_list
+
     def _multithread_test_run(self, py_list):
         """multithread run some test"""
         error_list = []
         error_count = 0
+        core_dumps_list = None
 
-        with ThreadPoolExecutor(max_workers=int(os.environ.get("MULTI_WORKER", 13))) as executor:
-            # 提交任务给线程池
-            futures = [executor.submit(self._single_pytest_run, py_file, self.testing) for py_file in py_list]
+        if self._use_worker_pool():
+            error_list, core_dumps_list = self._worker_pool_run(py_list=py_list)
+            error_count = len(error_list)
+        else:
+            with ThreadPoolExecutor(max_workers=int(os.environ.get("MULTI_WORKER", 13))) as executor:
+                # 提交任务给线程池
+                futures = [executor.submit(self._single_pytest_run, py_file, self.testing) for py_file in py_list]
 
-            # 等待任务完成，并收集返回值
-            for future in futures:
-                _py_file, _exit_code = future.result()
-                if _exit_code is not None:
-                    error_list.append(_py_file)
-                    error_count += 1
+                # 等待任务完成，并收集返回值
+                for future in futures:
+                    _py_file, _exit_code = future.result()
+                    if _exit_code is not None:
+                        error_list.append(_py_file)
+                        error_count += 1
 
         if os.environ.get("MULTI_DOUBLE_CHECK") == "False":
             if not os.environ.get("PLT_GT_UPLOAD_URL") == "None":
                 self._gt_upload()
-            self._exit_code_txt(error_count=error_count, error_list=error_list)
+            self._exit_code_txt(error_count=error_count, error_list=error_list, core_dumps_list=core_dumps_list)
         else:
             self.logger.get_log().info("对于多线程失败case, 进入double check环节: ")
             self._test_run(py_list=error_list)
@@ -318,6 +376,17 @@ class Run(object):
         if len(device_list) < 2:
             raise Exception("single gpu cannot use _multi_gpu_multithread_test_run strategy")
 
+        if self._use_worker_pool():
+            error_list, core_dumps_list = self._worker_pool_run(py_list=py_list, device_list=device_list)
+            if os.environ.get("MULTI_DOUBLE_CHECK") == "False":
+                if not os.environ.get("PLT_GT_UPLOAD_URL") == "None":
+                    self._gt_upload()
+                self._exit_code_txt(error_count=len(error_list), error_list=error_list, core_dumps_list=core_dumps_list)
+            else:
+                self.logger.get_log().info("对于多进程失败case, 进入double check环节: ")
+                self._test_run(py_list=error_list)
+            return
+
         # py_dict = {item: i % len(device_list) for i, item in enumerate(py_list)}
 
         multiprocess_cases = split_list(lst=self.py_list, n=len(device_list))
@@ -516,6 +585,8 @@ class Run(object):
         os.makedirs(name="./nv_report")
 
         sublayer_dict = {}
+        # title -> plt_exc -> ProfileTable, 用于逐kernel对比
+        kernel_tables = {}
         error_count = 0
         error_list = []
         testings_list = YamlLoader(yml=self.testing).get_junior_name("testings")
@@ -531,6 +602,11 @@ class Run(object):
                             f"-o nv_report/{title}-{plt_exc} {self.py_cmd} "
                             f"layertest.py --layerfile {py_file} --testing {self.testing} --plt_exc {plt_exc}"
                         )
+                    elif os.environ.get("PLT_PERF_CONTENT") == "profiler":
+                        exit_code = os.system(
+                            f"PLT_PROFILER_DIR=nv_report/{title}-{plt_exc} {self.py_cmd} "
+                            f"layertest.py --layerfile {py_file} --testing {self.testing} --plt_exc {plt_exc}"
+                        )
                     else:
                         exit_code = os.system(
                             f"layertest.py --layerfile {py_file} --testing {self.testing} --plt_exc {plt_exc}"
@@ -543,6 +619,11 @@ class Run(object):
                             f"-o nv_report/{title}-{plt_exc} {self.py_cmd} "
                             f"layertest.py --layerfile {py_file} --testing {self.testing} --plt_exc {plt_exc}"
                         )
+                    elif os.environ.get("PLT_PERF_CONTENT") == "profiler":
+                        cmd = (
+                            f"PLT_PROFILER_DIR=nv_report/{title}-{plt_exc} {self.py_cmd} "
+                            f"layertest.py --layerfile {py_file} --testing {self.testing} --plt_exc {plt_exc}"
+                        )
                     else:
                         cmd = f"layertest.py --layerfile {py_file} --testing {self.testing} --plt_exc {plt_exc}"
                     # 使用subprocess执行命令并设置超时
@@ -585,20 +666,40 @@ class Run(object):
                         f"--output . "
                         f"nv_report/{title}-{plt_exc}.sqlite"
                     )
-                    df = pd.read_csv(os.path.join("nv_report", f"{title}-{plt_exc}_cuda_gpu_kern_sum.csv"))
-                    kernel_time = (df["Instances"] * df["Avg (ns)"]).sum()
-                    kernel_count = df["Instances"].sum()
+                    table = ProfileTable.from_nsys_csv(
+                        os.path.join("nv_report", f"{title}-{plt_exc}_cuda_gpu_kern_sum.csv")
+                    )
+                    kernel_tables.setdefault(title, {})[plt_exc] = table
+                    kernel_time = table.total_time()
+                    kernel_count = table.total_calls()
 
                     perf_dict[plt_exc + "-" + "kernel_time"] = kernel_time
-                    perf_dict[plt_exc + "-" + "kernel_count"] = int(kernel_count)  # int64无法json化, 所以先转为通用int
+                    perf_dict[plt_exc + "-" + "kernel_count"] = kernel_count
                     self.logger.get_log().info("kernel time and count: ")
                     self.logger.get_log().info(f"kernel time is {kernel_time}")
                     self.logger.get_log().info(f"kernel count is {kernel_count}")
+                elif os.environ.get("PLT_PERF_CONTENT") == "profiler":
+                    # paddle.profiler的chrome trace, 与nsys口径一样记录采集期间(PLT_PROFILER_STEPS个step)的kernel总耗时(ns)与总个数
+                    try:
+                        table = aggregate(
+                            [ProfileTable.load(os.path.join("nv_report", f"{title}-{plt_exc}")).kernels()],
+                            per_step=False,
+                        )
+                    except Exception as e:  # engine未产出trace时记为报错, 不中断整个性能任务
+                        self.logger.get_log().warning(f"{py_file} {plt_exc} profiler trace load failed: {e}")
+                        if py_file not in error_list:
+                            error_list.append(py_file)
+                            error_count += 1
+                        continue
+                    kernel_tables.setdefault(title, {})[plt_exc] = table
+                    perf_dict[plt_exc + "-" + "kernel_time"] = table.total_time()
+                    perf_dict[plt_exc + "-" + "kernel_count"] = int(round(table.total_calls()))
                 else:
                     perf_dict[plt_exc] = loaded_data[0][plt_exc]
 
             sublayer_dict[title] = perf_dict
 
+        self._kernel_diff_gen(kernel_tables=kernel_tables, compare_list=compare_list)
         self._exit_code_txt(error_count=error_count, error_list=error_list)
 
         baseline_dict, baseline_layer_type = self._db_interact(sublayer_dict=sublayer_dict, error_list=error_list)
@@ -614,16 +715,89 @@ class Run(object):
         self._perf_upload()
         self._pts_callback(error_count)
 
+    def _kernel_diff_gen(self, kernel_tables, compare_list):
+        """
+        同一子图不同engine之间逐kernel对比, 结果写入<testing>_kernel_diff.csv, gsb统计写入kernel_gsb_dict.txt
+        """
+        if not kernel_tables or not compare_list:
+            return
+        diff_list = []
+        gsb_dict = {}
+        for compare in compare_list:
+            if compare["baseline"] == "ground_truth":
+                continue
+            compare_name = compare["latest"] + "^" + compare["baseline"]
+            for title, tables in kernel_tables.items():
+                if compare["latest"] not in tables or compare["baseline"] not in tables:
+                    continue
+                layer_diff = diff(
+                    latest=tables[compare["latest"]],
+                    baseline=tables[compare["baseline"]],
+                    threshold=float(os.environ.get("PLT_KERNEL_THRESHOLD", "0.05")),
+                    min_time=float(os.environ.get("PLT_KERNEL_MIN_TIME", "0")),
+                )
+                for item in layer_diff:
+                    item["compare_name"] = compare_name
+                    item["layer"] = title
+                diff_list += layer_diff
+                gsb_dict[compare_name + "^" + title] = gsb_summary(layer_diff)
+        if not diff_list:
+            return
+        csv_file = self.testing.replace("yaml/", "").replace(".yml", "") + "_kernel_diff.csv"
+        write_diff_csv(diff_list, csv_file, prefix=["compare_name", "layer"])
+        save_txt(data=gsb_dict, filename="kernel_gsb_dict")
+        self.logger.get_log().info(f"逐kernel对比结果: {csv_file}")
+
+    def _result_store_save(self, sublayer_dict):
+        """
+        性能结果写入framework/e2e/utils的结果存储(PLT_RESULT_STORE为存储根目录, 未设置时不写入),
+        并由存储渲染与上一次同PLT_BM_MODE的run的对比csv
+        :return: 从存储读回的本次run结果, 与sublayer_dict结构相同, 用于渲染xlsx; 未启用存储时返回None
+        """
+        if not os.environ.get("PLT_RESULT_STORE"):
+            return None
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+        from utils.result_store import ResultStore, env_fingerprint
+
+        store = ResultStore(os.environ.get("PLT_RESULT_STORE"), "paddlelt_perf")
+        tag = os.environ.get("PLT_BM_MODE")
+        store.start_run(
+            tag=tag,
+            fingerprint=env_fingerprint(
+                testing=self.testing, layer_type=self.layer_type, perf_content=os.environ.get("PLT_PERF_CONTENT")
+            ),
+        )
+        rows = []
+        for title, perf_dict in sublayer_dict.items():
+            for key, value in perf_dict.items():
+                # perf_dict的key为plt_exc或plt_exc-kernel_time/kernel_count
+                backend, _, statistic = key.partition("-")
+                rows.append({"case_name": title, "backend": backend, "statistic": statistic or "time", "value": value})
+        store.append(rows)
+        csv_file = self.testing.replace("yaml/", "").replace(".yml", "") + "_result_store.csv"
+        store.render(csv_file, store.diff(latest=store.run_id, tag=tag))
+        self.logger.get_log().info(f"{len(rows)}条结果已写入{store.dir}, run_id: {store.run_id}, 对比报告: {csv_file}")
+        stored_dict = {}
+        for row in store.rows(store.run_id):
+            key = row["backend"] if row["statistic"] == "time" else row["backend"] + "-" + row["statistic"]
+            value = row["value"]
+            stored_dict.setdefault(row["case_name"], {})[key] = (
+                int(value) if row["statistic"] == "kernel_count" else value
+            )
+        store.close()
+        return stored_dict
+
     def _perf_report_gen(
         self, compare_list, baseline_dict, sublayer_dict, error_list, baseline_layer_type, latest_layer_type
     ):
         """
         精度对比策略
         """
+        stored_dict = self._result_store_save(sublayer_dict=sublayer_dict)
         if baseline_layer_type != "none" and (
             os.environ.get("PLT_BM_MODE") == "latest_as_baseline" or os.environ.get("PLT_BM_MODE") == "latest"
         ):
-            if os.environ.get("PLT_PERF_CONTENT") == "kernel":
+            if os.environ.get("PLT_PERF_CONTENT") in ["kernel", "profiler"]:
                 compare_dict = perf_compare_kernel_dict(
                     compare_list=compare_list,
                     baseline_dict=baseline_dict,
@@ -649,8 +823,9 @@ class Run(object):
                 excel_file=os.environ.get("TESTING").replace("yaml/", "").replace(".yml", "") + ".xlsx",
             )
         else:
+            # 启用结果存储时xlsx由存储中的本次run渲染
             xlsx_save(
-                sublayer_dict=sublayer_dict,
+                sublayer_dict=sublayer_dict if stored_dict is None else stored_dict,
                 excel_file=os.environ.get("TESTING").replace("yaml/", "").replace(".yml", "") + ".xlsx",
             )
 
@@ -18,6 +18,8 @@ export PLT_PYTEST_TIMEOUT="${PLT_PYTEST_TIMEOUT:-200}"  # 超时10分钟则判
 #性能测试专属环境变量
 export PLT_BM_MODE="${PLT_BM_MODE:-latest}"  #基线任务为baseline, 测试任务为latest, 测试并设为新基线任务为latest_as_baseline
 export PLT_BM_DB="${PLT_BM_DB:-select}"  # insert: 存入数据, 作为基线或对比; select: 不存数据, 仅对比并生成表格; non-db: 不加载数据库，仅生成表格
+export PLT_BM_DB_BACKEND="${PLT_BM_DB_BACKEND:-mysql}"  # 数据库backend, mysql或sqlite(文件路径由PLT_BM_SQLITE指定, 用于离线调试)
+export PLT_BM_DB_FALLBACK="${PLT_BM_DB_FALLBACK:-None}"  # mysql连接失败时的备用backend, sqlite或None(不退回, 直接报错)
 export PLT_BM_EMAIL="${PLT_BM_EMAIL:-False}"  # True: 发送邮件  False: 不发送邮件
 export PLT_BM_REPEAT="${PLT_BM_REPEAT:-1000}"  # 性能测试重复轮次
 export TIMEIT_NUM="${TIMEIT_NUM:-1}"  # timeit number数
@@ -12,6 +12,8 @@ export FRAMEWORK="${FRAMEWORK:-paddle}"
 export USE_PADDLE_MODEL="${USE_PADDLE_MODEL:-None}"  # 设定是否使用paddle模型库, 可选PaddleOCR
 export MULTI_WORKER="${MULTI_WORKER:-0}"
 export MULTI_DOUBLE_CHECK="${MULTI_DOUBLE_CHECK:-True}"
+export PLT_EXEC_ENGINE="${PLT_EXEC_ENGINE:-pytest}"  # 多线程执行方式, pytest: 每个子图独立pytest进程; worker_pool: 常驻进程池
+export PLT_WORKER_MAX_TASKS="${PLT_WORKER_MAX_TASKS:-None}"  # worker_pool中单个worker最多执行的子图数, 达到后重启. None则不限
 
 export PLT_PYTEST_TIMEOUT="${PLT_PYTEST_TIMEOUT:-600}"  # 超时10分钟则判为失败. 设置为None则不限时
 export PLT_SPEC_USE_MULTI="${PLT_SPEC_USE_MULTI:-False}"  # 开启动态InputSpec搜索遍历
@@ -33,6 +35,8 @@ echo "PLT_DEVICE_ID is: ${PLT_DEVICE_ID}"
 echo "FRAMEWORK is: ${FRAMEWORK}"
 echo "MULTI_WORKER is: ${MULTI_WORKER}"
 echo "MULTI_DOUBLE_CHECK is: ${MULTI_DOUBLE_CHECK}"
+echo "PLT_EXEC_ENGINE is: ${PLT_EXEC_ENGINE}"
+echo "PLT_WORKER_MAX_TASKS is: ${PLT_WORKER_MAX_TASKS}"
 
 echo "PLT_PYTEST_TIMEOUT is: ${PLT_PYTEST_TIMEOUT}"
 echo "PLT_SPEC_USE_MULTI is: ${PLT_SPEC_USE_MULTI}"
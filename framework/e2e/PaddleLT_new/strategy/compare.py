@@ -10,10 +10,10 @@ import os
 import json
 
 # import logging
-import traceback
 import numpy as np
 
 from pltools.logger import Logger
+from strategy.tensor_compare import compare_array, format_report
 
 framework = ""
 if os.environ.get("FRAMEWORK") == "paddle":
@@ -26,15 +26,21 @@ elif os.environ.get("FRAMEWORK") == "torch":
     framework = "torch"
 
 
-def base_compare(result, expect, res_name, exp_name, logger, delta=1e-10, rtol=1e-10, exc_dict={}):
+def base_compare(result, expect, res_name, exp_name, logger, delta=1e-10, rtol=1e-10, exc_dict=None, fail_fast=False):
     """
     比较函数
     :param result: 待测值
     :param expect: 基线值
     :param delta: 误差值
     :param rtol: 相对误差
-    :return:
+    :param exc_dict: 失败项汇总, None时新建
+    :param fail_fast: 为True时出现第一个失败项即返回, 不再统计误差报告
+    :return: 失败项dict, {res_name: 对比报告}
     """
+    if exc_dict is None:
+        exc_dict = {}
+    if fail_fast and exc_dict:
+        return exc_dict
     if isinstance(result, str):
         raise Exception("result is exception !!!")
     if isinstance(expect, str):
@@ -69,21 +75,16 @@ def base_compare(result, expect, res_name, exp_name, logger, delta=1e-10, rtol=1
         #     # logger.error("{} is: {}".format(res_name, result))
         #     logger.error("{} and {} has diff! max diff: {}".format(exp_name, res_name, np.amax(diff)))
 
-        try:
-            np.testing.assert_allclose(actual=result, desired=expect, atol=delta, rtol=rtol, equal_nan=True)
-
-            if result.dtype != expect.dtype:
-                logger.warn(
-                    "Different output data types! res type is: {}, and expect type is: {}".format(
-                        result.dtype, expect.dtype
-                    )
+        if result.dtype != expect.dtype:
+            logger.warn(
+                "Different output data types! res type is: {}, and expect type is: {}".format(
+                    result.dtype, expect.dtype
                 )
-            # assert res
-            assert result.shape == expect.shape
-            assert result.dtype == expect.dtype
-        except Exception:
-            exc_dict[res_name] = traceback.format_exc()
-            logger.warn(traceback.format_exc())
+            )
+        report = compare_array(result, expect, atol=delta, rtol=rtol, fail_fast=fail_fast)
+        if not report["passed"]:
+            exc_dict[res_name] = report
+            logger.warn(format_report(res_name, exp_name, report))
 
     elif isinstance(expect, dict):
         if "multi_result" in result:
@@ -98,6 +99,7 @@ def base_compare(result, expect, res_name, exp_name, logger, delta=1e-10, rtol=1
                     delta=delta,
                     rtol=rtol,
                     exc_dict=exc_dict,
+                    fail_fast=fail_fast,
                 )
         else:
             for k, v in expect.items():
@@ -111,6 +113,7 @@ def base_compare(result, expect, res_name, exp_name, logger, delta=1e-10, rtol=1
                         delta=delta,
                         rtol=rtol,
                         exc_dict=exc_dict,
+                        fail_fast=fail_fast,
                     )
                 else:
                     Logger("PLT_compare").get_log().info(f"{exp_name} 有 {k}, 但是 {res_name} 没有 {k}, 所以跳过 {k} 精度对比")
@@ -128,6 +131,7 @@ def base_compare(result, expect, res_name, exp_name, logger, delta=1e-10, rtol=1
                     delta=delta,
                     rtol=rtol,
                     exc_dict=exc_dict,
+                    fail_fast=fail_fast,
                 )
             else:
                 base_compare(
@@ -139,6 +143,7 @@ def base_compare(result, expect, res_name, exp_name, logger, delta=1e-10, rtol=1
                     delta=delta,
                     rtol=rtol,
                     exc_dict=exc_dict,
+                    fail_fast=fail_fast,
                 )
     elif isinstance(expect, (bool, int, float)):
         assert expect == result
@@ -148,14 +153,16 @@ def base_compare(result, expect, res_name, exp_name, logger, delta=1e-10, rtol=1
     return exc_dict
 
 
-def infer_compare(result, expect, res_name, exp_name, logger, delta=1e-10, rtol=1e-10, exc_dict={}):
+def infer_compare(result, expect, res_name, exp_name, logger, delta=1e-10, rtol=1e-10, exc_dict=None, fail_fast=False):
     """
     比较函数
     :param result: 待测值
     :param expect: 基线值
     :param delta: 误差值
     :param rtol: 相对误差
-    :return:
+    :param exc_dict: 失败项汇总, None时新建
+    :param fail_fast: 为True时出现第一个失败项即返回
+    :return: 失败项dict
     """
     # 去除反向结果的数据
     forward_handled_result = {"logit": []}
@@ -181,6 +188,7 @@ def infer_compare(result, expect, res_name, exp_name, logger, delta=1e-10, rtol=
         delta=delta,
         rtol=rtol,
         exc_dict=exc_dict,
+        fail_fast=fail_fast,
     )
     return exc_dict
 
@@ -416,7 +424,6 @@ if __name__ == "__main__":
         logger=Logger("PaddleLT").get_log(),
         delta=1e-10,
         rtol=1e-10,
-        exc_dict={},
     )
     print("#############" * 3)
     print("res is: ", res)
@@ -0,0 +1,191 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+分块流式数组对比
+按固定元素数分块对比, 临时数组只占一个chunk的内存; 先只判定是否通过, 不通过时再统计结构化报告
+"""
+
+import numpy as np
+
+# 单个chunk的元素数
+CHUNK_SIZE = 1 << 20
+# 绝对误差直方图分桶边界
+HIST_BINS = [0.0, 1e-12, 1e-10, 1e-8, 1e-6, 1e-4, 1e-2, 1.0, np.inf]
+
+
+def _chunk_bad(res, exp, atol, rtol):
+    """
+    单个chunk的快速判定, 判定规则与np.testing.assert_allclose(equal_nan=True)一致
+    :return: 不通过mask
+    """
+    with np.errstate(invalid="ignore", over="ignore"):
+        ok = np.abs(res - exp) <= atol + rtol * np.abs(exp)
+    # inf与有限值之差为inf, 但容差项rtol*inf也为inf, 需要排除
+    ok &= np.isfinite(exp)
+    # 相等(含同号inf)或同为nan视为一致
+    ok |= res == exp
+    ok |= np.isnan(res) & np.isnan(exp)
+    return ~ok
+
+
+def _chunk_stats(res, exp, atol, rtol):
+    """
+    单个chunk的对比, 判定规则与np.testing.assert_allclose(equal_nan=True)一致
+    :return: 不通过mask, 有限值mask, 绝对误差, 相对误差, nan不一致mask, inf不一致mask
+    """
+    res_nan = np.isnan(res)
+    exp_nan = np.isnan(exp)
+    nan_mismatch = res_nan != exp_nan
+    res_inf = np.isinf(res)
+    exp_inf = np.isinf(exp)
+    # 同号inf视为相等
+    inf_mismatch = (res_inf | exp_inf) & ~(res == exp) & ~(res_nan | exp_nan)
+    finite = ~(res_nan | exp_nan | res_inf | exp_inf)
+
+    with np.errstate(invalid="ignore", over="ignore", divide="ignore"):
+        abs_err = np.abs(res - exp)
+        abs_exp = np.abs(exp)
+        abs_err[~finite] = 0
+        rel_err = abs_err / abs_exp
+        rel_err[~finite | (abs_err == 0)] = 0
+        bad = finite & (abs_err > atol + rtol * abs_exp)
+    bad |= nan_mismatch | inf_mismatch
+    return bad, finite, abs_err, rel_err, nan_mismatch, inf_mismatch
+
+
+def _unravel(index, shape):
+    """
+    展平下标转为多维下标
+    """
+    return [int(i) for i in np.unravel_index(index, shape)] if shape else []
+
+
+def compare_array(result, expect, atol=1e-10, rtol=1e-10, fail_fast=False, chunk_size=CHUNK_SIZE):
+    """
+    分块对比两个numpy数组
+    :param fail_fast: 为True时只判定是否通过, 遇到第一个不通过的chunk即返回第一个不一致元素的位置
+    :return: 对比报告dict, report["passed"]为是否通过
+    """
+    result = np.asarray(result)
+    expect = np.asarray(expect)
+    report = {
+        "passed": True,
+        "shape": [list(result.shape), list(expect.shape)],
+        "dtype": [str(result.dtype), str(expect.dtype)],
+        "numel": int(expect.size),
+    }
+    if result.shape != expect.shape:
+        report["passed"] = False
+        report["reason"] = "shape mismatch"
+        return report
+
+    # 连续数组reshape不产生拷贝
+    res_flat = result.reshape(-1)
+    exp_flat = expect.reshape(-1)
+    # bool/int转为浮点计算误差
+    dtype = np.result_type(result.dtype, expect.dtype, np.float16)
+
+    def chunks():
+        """按chunk_size切分"""
+        for start in range(0, exp_flat.size, chunk_size):
+            yield start, res_flat[start : start + chunk_size].astype(dtype, copy=False), exp_flat[
+                start : start + chunk_size
+            ].astype(dtype, copy=False)
+
+    first_mismatch = None
+    for start, res, exp in chunks():
+        bad = _chunk_bad(res, exp, atol, rtol)
+        if bad.any():
+            first_mismatch = start + int(np.argmax(bad))
+            break
+
+    if first_mismatch is None:
+        if result.dtype != expect.dtype:
+            report["passed"] = False
+            report["reason"] = "dtype mismatch"
+        return report
+
+    report["passed"] = False
+    report["reason"] = "value mismatch"
+    report["first_mismatch_index"] = _unravel(first_mismatch, expect.shape)
+    if fail_fast:
+        return report
+
+    # 不通过时再完整统计
+    mismatch = nan_mismatch = inf_mismatch = 0
+    max_abs, max_abs_index = 0.0, None
+    max_rel, max_rel_index = 0.0, None
+    hist = np.zeros(len(HIST_BINS) - 1, dtype=np.int64)
+    for start, res, exp in chunks():
+        bad, finite, abs_err, rel_err, nan_bad, inf_bad = _chunk_stats(res, exp, atol, rtol)
+        mismatch += int(np.count_nonzero(bad))
+        nan_mismatch += int(np.count_nonzero(nan_bad))
+        inf_mismatch += int(np.count_nonzero(inf_bad))
+        idx = int(np.argmax(abs_err))
+        if abs_err[idx] > max_abs:
+            max_abs, max_abs_index = float(abs_err[idx]), start + idx
+        idx = int(np.argmax(rel_err))
+        if rel_err[idx] > max_rel:
+            max_rel, max_rel_index = float(rel_err[idx]), start + idx
+        hist += np.histogram(abs_err[finite], bins=HIST_BINS)[0]
+
+    report["mismatch_count"] = mismatch
+    report["mismatch_ratio"] = mismatch / expect.size
+    report["nan_mismatch"] = nan_mismatch
+    report["inf_mismatch"] = inf_mismatch
+    report["max_abs_err"] = max_abs
+    report["max_abs_err_index"] = _unravel(max_abs_index, expect.shape) if max_abs_index is not None else None
+    report["max_rel_err"] = max_rel
+    report["max_rel_err_index"] = _unravel(max_rel_index, expect.shape) if max_rel_index is not None else None
+    report["abs_err_hist"] = {
+        "[{:g}, {:g})".format(HIST_BINS[i], HIST_BINS[i + 1]): int(hist[i]) for i in range(len(hist))
+    }
+    return report
+
+
+def format_report(res_name, exp_name, report):
+    """
+    对比报告转为日志文本
+    """
+    lines = ["{} 和 {} 对比失败: {}".format(res_name, exp_name, report.get("reason"))]
+    for key, value in report.items():
+        if key not in ["passed", "reason"]:
+            lines.append("    {}: {}".format(key, value))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # benchmark: 1亿元素float32数组, 原np.testing.assert_allclose与分块对比的耗时和峰值内存(不含输入本身)
+    # python strategy/tensor_compare.py [元素数, 默认100000000]
+    import sys
+    import time
+    import tracemalloc
+
+    numel = int(sys.argv[1]) if len(sys.argv) > 1 else 100000000
+    expect = np.random.rand(numel).astype("float32")
+    result = expect + np.float32(1e-7)
+
+    def assert_allclose():
+        """原对比方式"""
+        try:
+            np.testing.assert_allclose(actual=result, desired=expect, atol=1e-6, rtol=1e-6, equal_nan=True)
+        except AssertionError as e:
+            return str(e)
+
+    for case in ["passed", "failed"]:
+        if case == "failed":
+            result[numel // 2] += 1.0
+        for name, func in [
+            ("np.testing.assert_allclose", assert_allclose),
+            ("compare_array", lambda: compare_array(result, expect, atol=1e-6, rtol=1e-6)),
+            ("compare_array(fail_fast)", lambda: compare_array(result, expect, atol=1e-6, rtol=1e-6, fail_fast=True)),
+        ]:
+            tracemalloc.start()
+            start = time.perf_counter()
+            func()
+            cost = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print("{} {:<28}: {:7.3f}s, peak {:9.1f}MB".format(case, name, cost, peak / 2**20))
+    print(format_report("result", "expect", compare_array(result, expect, atol=1e-6, rtol=1e-6)))
@@ -5,9 +5,10 @@
 jelly_2 用于paddle单个产品执行
 """
 import random
-import timeit
+import time
 import os
 import json
+from functools import partial
 from inspect import isclass
 import paddle
 import numpy as np
@@ -21,6 +22,13 @@ PADDLE_DTYPE = {"float16": np.float16, "float32": np.float32, "float64": np.floa
 ACCURACY = "%.6g"
 
 
+def _empty_call():
+    """
+    空调用, 用于标定计时harness开销
+    """
+    pass
+
+
 class Jelly_v2(object):
     """
     compare tools
@@ -37,6 +45,8 @@ class Jelly_v2(object):
         # enable_backward=True,
         loops=50,
         base_times=1000,
+        sampler=None,
+        calibrate=False,
     ):
         """
 
@@ -44,6 +54,8 @@ class Jelly_v2(object):
         :param place:  cpu or gpu (string)
         :param card: 0 1 2 3 (int)
         :param explain: case的说明 会打印在日志中
+        :param sampler: jelly.sampler.AdaptiveSampler, 为None时使用固定loops*base_times次采样
+        :param calibrate: 是否标定并扣除计时harness的空调用开销
         """
         self.seed = 33
         # self.enable_backward = enable_backward
@@ -56,6 +68,10 @@ class Jelly_v2(object):
         self.loops = loops
         # timeit 基础运行时间
         self.base_times = base_times
+        # 自适应采样器
+        self.sampler = sampler
+        # 计时harness开销, calibrate后扣除
+        self.harness_overhead = 0.0
         # 设置logger
         # self.logger = logger
         self.logger = logger.get_log()
@@ -88,6 +104,8 @@ class Jelly_v2(object):
         self.card = card
         self._set_seed()
         self._set_place(self.card)
+        if calibrate:
+            self.calibrate()
 
     def _set_seed(self):
         """
@@ -187,161 +205,117 @@ class Jelly_v2(object):
                     else:
                         self.method[key][k] = v
 
-    def paddle_forward(self):
+    def _compile_forward(self):
         """
-        主体测试逻辑
+        call-plan编译: 一次性解析api对象、method及参数绑定, 返回前向无参可调用对象,
+        计时循环内不再执行eval和dict构建
         """
-        forward_time_list = []
         if self._layertypes(self.api) == "func":
-            input_param = dict(self.data, **self.param)
-            tmp = timeit.timeit(lambda: self.api(**input_param), number=int(0.2 * self.loops * self.base_times))  # 预热
-            for i in range(self.loops * self.base_times):
-                forward_time = timeit.timeit(lambda: self.api(**input_param), number=1)
-                forward_time_list.append(forward_time * self.base_times)
+            return partial(self.api, **dict(self.data, **self.param))
         elif self._layertypes(self.api) == "class":
-            # obj = self.api(**self.param)
-            # for i in range(self.loops):
-            #     forward_time = timeit.timeit(lambda: obj(*self.data.values()), number=self.base_times)
-            #     forward_time.append(forward_time)
             obj = self.api(**self.param)
-            # 预热
             if self.method == dict():
-                tmp = timeit.timeit(lambda: obj(*self.data.values()), number=int(0.2 * self.loops * self.base_times))
-            else:
-                obj_method = eval("obj" + "." + list(self.method.keys())[0])
-                method_params_dict = self.method[list(self.method.keys())[0]]
-                tmp = timeit.timeit(
-                    lambda: obj_method(**method_params_dict), number=int(0.2 * self.loops * self.base_times)
-                )
-            for i in range(self.loops * self.base_times):
-                if self.method == dict():
-                    forward_time = timeit.timeit(lambda: obj(*self.data.values()), number=1)
-                else:
-                    obj_method = eval("obj" + "." + list(self.method.keys())[0])
-                    method_params_dict = self.method[list(self.method.keys())[0]]
-                    forward_time = timeit.timeit(lambda: obj_method(**method_params_dict), number=1)
-                forward_time_list.append(forward_time * self.base_times)
+                return partial(obj, *self.data.values())
+            method_name = list(self.method.keys())[0]
+            return partial(getattr(obj, method_name), **self.method[method_name])
         elif self._layertypes(self.api) == "reload":
-            # 判断"reload" api中有一个输入还是两个输入
+            # "{} + {}" 编译为 lambda x, y: x + y, 只在此处eval一次
             if "y" in self.data.keys():
-                x = self.data["x"]
-                y = self.data["y"]
                 expression = self.reload.get(self.api).format("x", "y")
+                func = eval("lambda x, y: " + expression)
+                return partial(func, self.data["x"], self.data["y"])
             else:
-                x = self.data["x"]
                 expression = self.reload.get(self.api).format("x")
-
-            def func(x, y):
-                eval(expression)
-
-            def func_x(x):
-                eval(expression)
-
-            # 预热
-            if "y" in self.data.keys():
-                tmp = timeit.timeit(lambda: func(x, y), number=int(0.2 * self.loops * self.base_times))  # 预热
-            else:
-                tmp = timeit.timeit(lambda: func_x(x), number=int(0.2 * self.loops * self.base_times))  # 预热
-
-            for i in range(self.loops * self.base_times):
-                if "y" in self.data.keys():
-                    forward_time = timeit.timeit(lambda: func(x, y), number=1)
-                else:
-                    forward_time = timeit.timeit(lambda: func_x(x), number=1)
-                forward_time_list.append(forward_time * self.base_times)
+                func = eval("lambda x: " + expression)
+                return partial(func, self.data["x"])
         else:
             raise AttributeError
 
-        del tmp
-        return forward_time_list
-
-    def paddle_total(self):
+    def _compile_total(self):
         """
-        计算paddle 总体时间
+        call-plan编译: 返回前向+反向无参可调用对象
         """
-        total_time_list = []
-        if self._layertypes(self.api) == "func":
-            input_param = dict(self.data, **self.param)
-            res = self.api(**input_param)
-            grad_tensor = paddle.ones(res.shape, res.dtype)
-
-            def func(input_param):
-                res = self.api(**input_param)
-                res.backward(grad_tensor)
-
-            tmp = timeit.timeit(lambda: func(input_param), number=int(0.2 * self.loops * self.base_times))  # 预热
-            for i in range(self.loops * self.base_times):
-                total_time = timeit.timeit(lambda: func(input_param), number=1)
-                total_time_list.append(total_time * self.base_times)
-        elif self._layertypes(self.api) == "class":
-            # obj = self.api(**self.param)
-            # res = obj(*self.data.values())
-            # grad_tensor = paddle.ones(res.shape, res.dtype)
-            obj = self.api(**self.param)
-            if self.method == dict():
-                res = obj(*self.data.values())
-            else:
-                obj_method = eval("obj" + "." + list(self.method.keys())[0])
-                method_params_dict = self.method[list(self.method.keys())[0]]
-                res = obj_method(**method_params_dict)
-            grad_tensor = paddle.ones(res.shape, res.dtype)
+        forward = self._compile_forward()
+        res = forward()
+        grad_tensor = paddle.ones(res.shape, res.dtype)
 
-            def clas(input_param):
-                res = obj(*input_param)
-                res.backward(grad_tensor)
+        def total():
+            forward().backward(grad_tensor)
 
-            def clas_method(input_param):
-                res = obj_method(**input_param)
-                res.backward(grad_tensor)
-
-            # 预热
-            if self.method == dict():
-                tmp = timeit.timeit(lambda: clas(self.data.values()), number=int(0.2 * self.loops * self.base_times))
-            else:
-                tmp = timeit.timeit(
-                    lambda: clas_method(method_params_dict), number=int(0.2 * self.loops * self.base_times)
-                )
-            for i in range(self.loops * self.base_times):
-                if self.method == dict():
-                    total_time = timeit.timeit(lambda: clas(self.data.values()), number=1)
-                else:
-                    total_time = timeit.timeit(lambda: clas_method(method_params_dict), number=1)
-                total_time_list.append(total_time * self.base_times)
-        elif self._layertypes(self.api) == "reload":
-            if "y" in self.data.keys():
-                x = self.data["x"]
-                y = self.data["y"]
-                expression = self.reload.get(self.api).format("x", "y")
-            else:
-                x = self.data["x"]
-                expression = self.reload.get(self.api).format("x")
-            res = eval(expression)
-            grad_tensor = paddle.ones(res.shape, res.dtype)
+        return total
 
-            def func(x, y):
-                res = eval(expression)
-                res.backward(grad_tensor)
+    def _timing(self, func, number):
+        """
+        逐次计时, 返回放大base_times倍并扣除harness开销后的耗时list
+        """
+        timer = time.perf_counter
+        scale = self.base_times
+        overhead = self.harness_overhead
+        res = []
+        for _ in range(number):
+            start = timer()
+            func()
+            res.append(max((timer() - start) * scale - overhead, 0.0))
+        return res
+
+    def calibrate(self, number=10000):
+        """
+        标定模式: 测量空调用在计时harness中的耗时(放大base_times倍后的中位数), 后续采样中扣除
+        """
+        self.harness_overhead = 0.0
+        self.harness_overhead = float(np.median(self._timing(_empty_call, number)))
+        self.result["harness_overhead"] = ACCURACY % self.harness_overhead
+        if self.sampler is not None:
+            self.sampler.overhead = self.harness_overhead
+        self.logger.info("harness overhead of {} times is {}s".format(self.base_times, self.result["harness_overhead"]))
+        return self.harness_overhead
+
+    def _fixed_run(self, func):
+        """
+        固定次数采样: 预热20%后采样loops*base_times次
+        """
+        self._timing(func, int(0.2 * self.loops * self.base_times))  # 预热
+        return self._timing(func, self.loops * self.base_times)
 
-            def func_x(x):
-                res = eval(expression)
-                res.backward(grad_tensor)
+    def _adaptive_run(self, func, name):
+        """
+        自适应采样, 采样报告记录在self.result中
+        """
+        time_list, report = self.sampler.run(func)
+        self.result[name + "_sampling"] = report
+        self.logger.info(
+            "{} adaptive sampling: {} samples, {} {} CI [{}, {}], p50 {}, p90 {}, p99 {}, cv {}".format(
+                name,
+                report["sample_count"],
+                report["statistic"],
+                ACCURACY % report["value"],
+                ACCURACY % report["ci_low"],
+                ACCURACY % report["ci_high"],
+                ACCURACY % report["p50"],
+                ACCURACY % report["p90"],
+                ACCURACY % report["p99"],
+                ACCURACY % report["cv"],
+            )
+        )
+        return time_list
 
-            # 预热
-            if "y" in self.data.keys():
-                tmp = timeit.timeit(lambda: func(x, y), number=int(0.2 * self.loops * self.base_times))  # 预热
-            else:
-                tmp = timeit.timeit(lambda: func_x(x), number=int(0.2 * self.loops * self.base_times))  # 预热
-            for i in range(self.loops * self.base_times):
-                if "y" in self.data.keys():
-                    total_time = timeit.timeit(lambda: func(x, y), number=1)
-                else:
-                    total_time = timeit.timeit(lambda: func_x(x), number=1)
-                total_time_list.append(total_time * self.base_times)
-        else:
-            raise AttributeError
+    def paddle_forward(self):
+        """
+        主体测试逻辑
+        """
+        forward = self._compile_forward()
+        if self.sampler is not None:
+            return self._adaptive_run(forward, "forward")
+        return self._fixed_run(forward)
 
-        del tmp
-        return total_time_list
+    def paddle_total(self):
+        """
+        计算paddle 总体时间
+        """
+        total = self._compile_total()
+        if self.sampler is not None:
+            return self._adaptive_run(total, "total")
+        return self._fixed_run(total)
 
     # def run(self):
     #     """
@@ -436,3 +410,57 @@ class Jelly_v2(object):
             self.logger.info("[{}] log file save success!".format(self.log_file_name))
         except Exception as e:
             print(e)
+
+
+if __name__ == "__main__":
+    # harness开销micro-benchmark, 在api_benchmark_new目录下执行: PYTHONPATH=.. python -m jelly.jelly_v2
+    import timeit
+
+    number = 20000
+    x = np.random.rand(16, 16).astype("float32")
+    y = np.random.rand(16, 16).astype("float32")
+    cases = {
+        "paddle.abs": {"x": x},
+        "paddle.add": {"x": x, "y": y},
+        "paddle.nn.functional.relu": {"x": x},
+        "__add__": {"x": x, "y": y},
+    }
+    logger = Logger("Jelly_v2")
+    for api, inputs in cases.items():
+        jelly = Jelly_v2(api=api, logger=logger, place="cpu", title=api, calibrate=True)
+        jelly.set_paddle_param(inputs, {})
+
+        # 旧harness: 每次采样构建timeit.Timer, 运算符重载api在计时循环内eval表达式
+        if jelly._layertypes(jelly.api) == "reload":
+            expression = jelly.reload.get(jelly.api).format("x", "y")
+            data_x, data_y = jelly.data["x"], jelly.data["y"]
+
+            def legacy(x, y):
+                """旧harness调用"""
+                eval(expression)
+
+            legacy_call = lambda: legacy(data_x, data_y)  # noqa: E731
+        else:
+            input_param = dict(jelly.data, **jelly.param)
+            legacy_call = lambda: jelly.api(**input_param)  # noqa: E731
+        timeit.timeit(legacy_call, number=number)
+        legacy_list = [timeit.timeit(legacy_call, number=1) * jelly.base_times for _ in range(number)]
+        empty_list = [timeit.timeit(_empty_call, number=1) * jelly.base_times for _ in range(number)]
+
+        forward = jelly._compile_forward()
+        jelly._timing(forward, number)
+        new_list = jelly._timing(forward, number)
+
+        legacy_time = float(np.median(legacy_list))
+        new_time = float(np.median(new_list))
+        print(
+            "{}: legacy {}s (empty-call {}s), compiled+calibrated {}s (empty-call {}s), removed {}s per {} calls".format(
+                api,
+                ACCURACY % legacy_time,
+                ACCURACY % float(np.median(empty_list)),
+                ACCURACY % new_time,
+                jelly.result["harness_overhead"],
+                ACCURACY % (legacy_time - new_time),
+                jelly.base_times,
+            )
+        )
@@ -0,0 +1,247 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+自适应采样引擎: 自动判断预热收敛, 按统计量batch-means置信区间的相对半宽决定采样次数
+"""
+import time
+from statistics import NormalDist
+import numpy as np
+
+
+class AdaptiveSampler(object):
+    """
+    adaptive sampler
+    """
+
+    STATISTICS = ["trimmean", "best_top_k", "mean", "best"]
+
+    def __init__(
+        self,
+        statistic="trimmean",
+        ratio=0.2,
+        target_rel_ci=0.01,
+        confidence=0.95,
+        time_budget=20.0,
+        min_samples=5000,
+        min_time=2.0,
+        max_samples=50000,
+        batch_size=500,
+        num_batches=20,
+        stable_checks=3,
+        warmup_window=200,
+        warmup_tol=0.02,
+        warmup_stable=3,
+        min_warmup_time=0.5,
+        max_warmup=10000,
+        scale=1000,
+    ):
+        """
+        :param statistic: 汇报的统计量, trimmean/best_top_k/mean/best
+        :param ratio: trimmean/best_top_k 的比例
+        :param target_rel_ci: 置信区间相对半宽目标, 达到且估计值稳定即停止采样
+        :param confidence: 置信水平
+        :param time_budget: 单次run(预热+采样)的时间上限, 单位秒
+        :param min_samples: 开始判断置信区间前的最少采样数
+        :param min_time: 开始判断置信区间前的最少采样时间, 单位秒
+        :param max_samples: 最大采样数, 默认与固定模式loops*base_times一致
+        :param batch_size: 每批采样数, 每批之后判断一次是否停止
+        :param num_batches: 计算置信区间时将全部采样按时间顺序等分的批数, 每批的统计量为一个观测
+        :param stable_checks: 连续stable_checks次判断的估计值与当前估计值相对差均不超过target_rel_ci才停止
+        :param warmup_window: 预热窗口大小, 相邻窗口中位数相对变化小于warmup_tol视为稳定
+        :param warmup_tol: 预热收敛阈值
+        :param warmup_stable: 连续稳定的窗口数
+        :param min_warmup_time: 最少预热时间, 单位秒
+        :param max_warmup: 最大预热次数, 不足min_warmup_time时继续预热
+        :param scale: 单次耗时放大倍数, 与Jelly_v2中base_times含义一致
+        """
+        if statistic not in self.STATISTICS:
+            raise Exception("unknown statistic {}, only support {}".format(statistic, self.STATISTICS))
+        self.statistic = statistic
+        self.ratio = ratio
+        self.target_rel_ci = target_rel_ci
+        self.confidence = confidence
+        self.time_budget = time_budget
+        self.min_samples = min_samples
+        self.min_time = min_time
+        self.max_samples = max_samples
+        self.batch_size = batch_size
+        self.num_batches = num_batches
+        self.stable_checks = stable_checks
+        self.warmup_window = warmup_window
+        self.warmup_tol = warmup_tol
+        self.warmup_stable = warmup_stable
+        self.min_warmup_time = min_warmup_time
+        self.max_warmup = max_warmup
+        self.scale = scale
+        # 计时harness开销(已放大scale倍), 由调用方标定后设置, 采样时扣除
+        self.overhead = 0.0
+
+    def _sample(self, func, number):
+        """
+        逐次计时, 返回放大scale倍并扣除harness开销后的耗时list
+        """
+        timer = time.perf_counter
+        scale = self.scale
+        overhead = self.overhead
+        res = []
+        for _ in range(number):
+            start = timer()
+            func()
+            res.append(max((timer() - start) * scale - overhead, 0.0))
+        return res
+
+    def warmup(self, func, deadline):
+        """
+        预热直到至少min_warmup_time秒, 且相邻窗口中位数连续warmup_stable次相对变化小于warmup_tol
+        :return: 预热次数, 是否收敛
+        """
+        begin = time.perf_counter()
+        count = 0
+        stable = 0
+        prev = None
+        while time.perf_counter() < deadline:
+            if count >= self.max_warmup and time.perf_counter() - begin >= self.min_warmup_time:
+                break
+            median = float(np.median(self._sample(func, self.warmup_window)))
+            count += self.warmup_window
+            if prev is not None and prev > 0 and abs(median - prev) / prev <= self.warmup_tol:
+                stable += 1
+            else:
+                stable = 0
+            prev = median
+            if stable >= self.warmup_stable and time.perf_counter() - begin >= self.min_warmup_time:
+                return count, True
+        return count, False
+
+    def estimate(self, data):
+        """
+        对一维或二维(按行)数据计算统计量
+        """
+        data = np.sort(data, axis=-1)
+        n = data.shape[-1]
+        if self.statistic == "trimmean":
+            head = int(n * self.ratio)
+            tail = int(n - n * self.ratio)
+            return data[..., head:tail].mean(axis=-1)
+        elif self.statistic == "best_top_k":
+            head = max(int(n * self.ratio), 1)
+            return data[..., :head].mean(axis=-1)
+        elif self.statistic == "mean":
+            return data.mean(axis=-1)
+        else:
+            return data[..., 0]
+
+    def _t_quantile(self, df):
+        """
+        t分布双侧分位数, 由正态分位数按Cornish-Fisher展开近似
+        """
+        z = NormalDist().inv_cdf(1 - (1 - self.confidence) / 2)
+        return z + (z**3 + z) / (4 * df) + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * df**2)
+
+    def batch_means_ci(self, samples):
+        """
+        batch-means置信区间: 按时间顺序将采样等分为num_batches批, 每批的统计量视为一个观测,
+        批内吸收相邻采样的自相关, 不把逐次采样当作独立同分布
+        :return: 下界, 上界, 批数
+        """
+        k = min(self.num_batches, len(samples))
+        size = len(samples) // k
+        batches = self.estimate(np.asarray(samples[: k * size]).reshape(k, size))
+        center = float(batches.mean())
+        if k < 2:
+            return center, center, k
+        half = self._t_quantile(k - 1) * float(batches.std(ddof=1)) / np.sqrt(k)
+        return center - half, center + half, k
+
+    def run(self, func):
+        """
+        预热 + 自适应采样
+        :param func: 无参可调用对象
+        :return: 耗时list, 采样报告dict
+        """
+        begin = time.perf_counter()
+        deadline = begin + self.time_budget
+        warmup_count, warmup_converged = self.warmup(func, deadline)
+
+        sample_begin = time.perf_counter()
+        samples = []
+        history = []
+        stable = False
+        while len(samples) < self.max_samples:
+            samples.extend(self._sample(func, min(self.batch_size, self.max_samples - len(samples))))
+            out_of_time = time.perf_counter() >= deadline
+            if len(samples) < self.min_samples or time.perf_counter() - sample_begin < self.min_time:
+                if not out_of_time:
+                    continue
+            value = float(self.estimate(np.asarray(samples)))
+            history.append(value)
+            low, high, batches = self.batch_means_ci(samples)
+            rel_half_width = (high - low) / 2 / value if value > 0 else float("inf")
+            recent = history[-self.stable_checks - 1 : -1]
+            stable = len(recent) == self.stable_checks and all(
+                abs(v - value) <= self.target_rel_ci * value for v in recent
+            )
+            if (rel_half_width <= self.target_rel_ci and stable) or out_of_time:
+                break
+
+        data = np.asarray(samples)
+        value = float(self.estimate(data))
+        low, high, batches = self.batch_means_ci(samples)
+        rel_half_width = (high - low) / 2 / value if value > 0 else float("inf")
+        p50, p90, p99 = np.percentile(data, [50, 90, 99])
+        mean = float(data.mean())
+        report = {
+            "statistic": self.statistic,
+            "value": value,
+            "ci_low": low,
+            "ci_high": high,
+            "confidence": self.confidence,
+            "rel_half_width": rel_half_width,
+            "batches": batches,
+            "stable": stable,
+            "converged": rel_half_width <= self.target_rel_ci and stable,
+            "sample_count": len(samples),
+            "warmup_count": warmup_count,
+            "warmup_converged": warmup_converged,
+            "p50": float(p50),
+            "p90": float(p90),
+            "p99": float(p99),
+            "cv": float(data.std() / mean) if mean > 0 else 0.0,
+            "elapsed": time.perf_counter() - begin,
+        }
+        return samples, report
+
+
+if __name__ == "__main__":
+    # 每个算子重复5次: 自适应采样后紧接着做50000次固定采样作为参考值,
+    # 统计自适应估计相对参考值的误差, 以及参考值是否落在汇报的置信区间内
+    ops = {
+        "abs [64, 64]": (np.abs, np.random.rand(64, 64).astype("float32")),
+        "sort [4096]": (np.sort, np.random.rand(4096).astype("float32")),
+        "matmul [128, 128]": (lambda v: v @ v, np.random.rand(128, 128).astype("float32")),
+    }
+    for name, (func, x) in ops.items():
+        sampler = AdaptiveSampler(max_samples=50000)
+        for _ in range(5):
+            samples, report = sampler.run(lambda: func(x))
+            start = time.perf_counter()
+            reference = float(sampler.estimate(np.asarray(sampler._sample(lambda: func(x), 50000))))
+            fixed_cost = time.perf_counter() - start
+            print(
+                "{:<18} adaptive {:>5} samples (+{:>6} warmup) {:.6g} [{:.6g}, {:.6g}] {:6.3f}s, "
+                "fixed 50000 {:.6g} {:6.3f}s, error {:+.2%}, converged {}, covered {}".format(
+                    name,
+                    report["sample_count"],
+                    report["warmup_count"],
+                    report["value"],
+                    report["ci_low"],
+                    report["ci_high"],
+                    report["elapsed"],
+                    reference,
+                    fixed_cost,
+                    report["value"] / reference - 1,
+                    report["converged"],
+                    report["ci_low"] <= reference <= report["ci_high"],
+                )
+            )
@@ -20,8 +20,10 @@ import paddle
 sys.path.append("..")
 from utils.yaml_loader import YamlLoader
 from utils.logger import Logger
+from utils.result_store import ResultStore, env_fingerprint
 from benchtrans import BenchTrans
 from jelly.jelly_v2 import Jelly_v2
+from jelly.sampler import AdaptiveSampler
 
 # from jelly.jelly_v2_torch import Jelly_v2_torch
 
@@ -53,6 +55,21 @@ class ApiBenchmarkBASE(object):
         self.check_iters = 5
         self.now_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+        # 采样方式: fixed为固定loops*base_times次采样, adaptive为按置信区间自适应采样
+        self.sampling = os.environ.get("APIBM_SAMPLING", "fixed")
+        self.target_rel_ci = float(os.environ.get("APIBM_TARGET_REL_CI", 0.01))  # 置信区间相对半宽目标
+        self.time_budget = float(os.environ.get("APIBM_TIME_BUDGET", 20))  # 单个case前向/反向采样时间上限(秒)
+        self.calibrate = os.environ.get("APIBM_CALIBRATE", "False") == "True"  # 标定并扣除计时harness空调用开销
+
+        # 结果存储根目录(如./result_store): 每次执行为一个run, 按行追加各case统计值及原始采样; 未设置时不写入
+        self.result_store = os.environ.get("APIBM_RESULT_STORE")
+        self.run_tag = os.environ.get("APIBM_RUN_TAG")
+        self.store = None
+
+        # 分片执行: worker可用的cpu核(如"2-9"), 每个worker独占shard_group个核, 为空时串行执行, 见shard.py
+        self.shard_cores = os.environ.get("APIBM_SHARD_CORES")
+        self.shard_group = int(os.environ.get("APIBM_SHARD_GROUP", 1))
+
         # # 初始化数据库
         # self.db = DB(storage=self.storage)
 
@@ -104,6 +121,16 @@ class ApiBenchmarkBASE(object):
                     base_times=base_times,
                 )
             else:
+                if self.sampling == "adaptive":
+                    sampler = AdaptiveSampler(
+                        statistic="trimmean",
+                        target_rel_ci=self.target_rel_ci,
+                        time_budget=self.time_budget,
+                        max_samples=loops * base_times,
+                        scale=base_times,
+                    )
+                else:
+                    sampler = None
                 jelly = Jelly_v2(
                     api=api,
                     logger=self.logger,
@@ -113,23 +140,27 @@ class ApiBenchmarkBASE(object):
                     default_dtype=self.default_dtype,
                     loops=loops,
                     base_times=base_times,
+                    sampler=sampler,
+                    calibrate=self.calibrate,
                 )
             jelly.set_paddle_param(bt.get_paddle_inputs(), bt.get_paddle_param())
             jelly.set_paddle_method(bt.get_paddle_method())
 
+            forward_time_list = jelly.paddle_forward()
             if enable_backward_trigger:
-                forward_time_list = jelly.paddle_forward()
                 total_time_list = jelly.paddle_total()
-                backward_time_list = list(map(lambda x: x[0] - x[1], zip(total_time_list, forward_time_list)))
-
             else:
-                forward_time_list = jelly.paddle_forward()
                 total_time_list = forward_time_list
-                backward_time_list = list(map(lambda x: x[0] - x[1], zip(total_time_list, forward_time_list)))
             forward = self.statistics.trimmean(data_list=forward_time_list, ratio=0.2)
             forward_top_k = self.statistics.best_top_k(data_list=forward_time_list, ratio=0.2)
-            backward = self.statistics.trimmean(data_list=backward_time_list, ratio=0.2)
             total = self.statistics.trimmean(data_list=total_time_list, ratio=0.2)
+            if self.sampling == "adaptive":
+                # 自适应模式下前向与总体分别采样, 次数不同且逐次不对应, 反向耗时由两者的统计量相减
+                backward_time_list = None
+                backward = total - forward
+            else:
+                backward_time_list = list(map(lambda x: x[0] - x[1], zip(total_time_list, forward_time_list)))
+                backward = self.statistics.trimmean(data_list=backward_time_list, ratio=0.2)
             best_total = self.statistics.best(data_list=forward_time_list)
 
             jelly.result["forward"] = ACCURACY % forward
@@ -139,6 +170,12 @@ class ApiBenchmarkBASE(object):
             jelly.result["best_total"] = ACCURACY % best_total
 
             self._log_save(data=jelly.result, case_name=case_name, log=log)
+            self._store_save(
+                case_name=case_name,
+                result=jelly.result,
+                samples={"forward": forward_time_list, "backward": backward_time_list, "total": total_time_list},
+                extra={"loops": loops, "base_times": base_times},
+            )
 
             self._show(
                 forward_time=ACCURACY % forward,
@@ -159,6 +196,30 @@ class ApiBenchmarkBASE(object):
 
         return error_logo, error_info, api
 
+    def _skip_case(self, case_name):
+        """
+        按平台与yaml_info判断是否跳过case
+        """
+        if case_name in SKIP_DICT[platform.system()]:
+            self.logger.get_log().warning("skip case -->{}<--".format(case_name))
+            return True
+        if SPECIAL and case_name not in SKIP_DICT[platform.system()]:
+            self.logger.get_log().warning("case is not in index_dict, skipping...-->{}<--".format(case_name))
+            return True
+        if self.yaml_info == "case_0":
+            if not case_name.endswith("_0"):
+                self.logger.get_log().warning("skip case -->{}<--".format(case_name))
+                return True
+        if self.yaml_info == "case_1":
+            if case_name.endswith("_2"):
+                self.logger.get_log().warning("skip case -->{}<--".format(case_name))
+                return True
+        if self.yaml_info == "case_2":
+            if not case_name.endswith("_2"):
+                self.logger.get_log().warning("skip case -->{}<--".format(case_name))
+                return True
+        return False
+
     def _run_main(self, all_cases, loops, base_times, log="log"):
         """
         对指定case运行测试
@@ -167,6 +228,12 @@ class ApiBenchmarkBASE(object):
         :param iters: 迭代次数
         :return:
         """
+        all_cases = [case_name for case_name in all_cases if not self._skip_case(case_name)]
+        if getattr(self, "shard_cores", None):
+            from shard import run_sharded
+
+            return run_sharded(self, all_cases, loops=loops, base_times=base_times, log=log)
+
         error_dict = {}
 
         for case_name in all_cases:
@@ -181,25 +248,6 @@ class ApiBenchmarkBASE(object):
             # backward_top_k_res_list = []
             # best_total_res_list = []
 
-            if case_name in SKIP_DICT[platform.system()]:
-                self.logger.get_log().warning("skip case -->{}<--".format(case_name))
-                continue
-            if SPECIAL and case_name not in SKIP_DICT[platform.system()]:
-                self.logger.get_log().warning("case is not in index_dict, skipping...-->{}<--".format(case_name))
-                continue
-            if self.yaml_info == "case_0":
-                if not case_name.endswith("_0"):
-                    self.logger.get_log().warning("skip case -->{}<--".format(case_name))
-                    continue
-            if self.yaml_info == "case_1":
-                if case_name.endswith("_2"):
-                    self.logger.get_log().warning("skip case -->{}<--".format(case_name))
-                    continue
-            if self.yaml_info == "case_2":
-                if not case_name.endswith("_2"):
-                    self.logger.get_log().warning("skip case -->{}<--".format(case_name))
-                    continue
-
             error_logo, error_info, api = self._run_test(
                 case_name=case_name, loops=loops, base_times=base_times, log=log
             )
@@ -347,6 +395,44 @@ class ApiBenchmarkBASE(object):
         except Exception as e:
             print(e)
 
+    def _store_open(self):
+        """
+        结果存储, 首次调用时新建run
+        """
+        if self.store is None:
+            self.store = ResultStore(self.result_store, "api_benchmark")
+            self.store.start_run(
+                tag=self.run_tag,
+                fingerprint=env_fingerprint(framework=self.framework, place=self.place, card=self.card),
+            )
+        return self.store
+
+    def _store_save(self, case_name, result, samples, extra=None):
+        """
+        追加到结果存储, 与log目录下的json并存, 供latest vs baseline查询
+        :param extra: 各行附加信息, 如loops/base_times, 用于分片执行时按调用次数折算耗时
+        """
+        # 未调用ApiBenchmarkBASE.__init__的子类(如runner_user)不写入
+        if not getattr(self, "result_store", None):
+            return
+        try:
+            rows = []
+            for statistic in ["forward", "forward_top_k", "backward", "total", "best_total"]:
+                rows.append(
+                    {
+                        "case_name": case_name,
+                        "backend": self.framework,
+                        "dtype": self.default_dtype,
+                        "statistic": statistic,
+                        "value": result[statistic],
+                        "samples": samples.get(statistic),
+                        "extra": extra,
+                    }
+                )
+            self._store_open().append(rows)
+        except Exception as e:
+            self.logger.get_log().warning("[{}] result store save failed: {}".format(case_name, e))
+
     # def _log_load(self):
     #     """
     #     保存数据到磁盘
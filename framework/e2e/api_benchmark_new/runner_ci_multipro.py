@@ -179,6 +179,8 @@ class ApiBenchmarkCI(ApiBenchmarkBASE):
         """
         multi run main
         """
+        # 已经按core_index静态划分绑核, 子进程内不再分片
+        self.shard_cores = None
         error_dict = self._run_main(all_cases=all_cases, loops=loops, base_times=base_times)
         result_queue.put(error_dict)
 
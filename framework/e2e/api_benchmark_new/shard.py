@@ -0,0 +1,584 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+sharded runner
+api benchmark多进程分片执行:
+1. 按结果存储中最近的run估计每个case耗时: 优先用上次分片执行记录的wall_time, 否则用total换算的单次调用耗时,
+   均按本次loops * base_times的调用次数折算, 都没有时取中位数
+2. 每个worker独占一组cpu核(sched_setaffinity), worker数为核组数, 核组之间不重叠
+3. 最长耗时优先(LPT)动态调度: case按估计耗时降序排队, 由父进程逐个派发给空闲的worker
+4. 每执行sentinel_every个case重测一次哨兵op, 相对worker自身基线变慢超过sentinel_tol时认为受到干扰,
+   上次哨兵以来的case重新排队一次, 重跑仍受干扰时标记为noisy
+5. worker的结果汇总到父进程, 写入同一个结果存储run; log目录下的json按case分文件, 由worker直接写入
+6. worker崩溃(segfault/OOM)或单个case超时时, 正在执行的case记为报错, 已执行但未经哨兵校验的case重新排队,
+   在同一核组上重新拉起worker后继续; 父进程异常退出时也会先写入已收集的结果
+
+APIBM_SHARD_CORES: worker可用的cpu核, 如"2-9"或"2,3,4,5", 为空时串行执行
+APIBM_SHARD_GROUP: 每个worker独占的核数, 默认1
+APIBM_SHARD_SENTINEL_EVERY: 哨兵间隔case数, 默认5
+APIBM_SHARD_SENTINEL_TOL: 哨兵变慢阈值, 默认0.2
+"""
+
+import os
+import sys
+import time
+import heapq
+import traceback
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+
+WALL_TIME = "wall_time"
+MAX_RETRY = 1
+
+
+def parse_cores(spec):
+    """
+    解析核列表, 如"2-5,8" -> [2, 3, 4, 5, 8]
+    """
+    cores = []
+    for part in str(spec).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cores.extend(range(int(start), int(end) + 1))
+        else:
+            cores.append(int(part))
+    return cores
+
+
+def core_groups(cores, group_size=1):
+    """
+    将核划分为互不重叠的核组, 每个worker一组
+    """
+    cores = parse_cores(cores) if isinstance(cores, str) else list(cores)
+    if len(set(cores)) != len(cores):
+        raise Exception("duplicated cpu cores: {}".format(cores))
+    if hasattr(os, "sched_getaffinity"):
+        missing = set(cores) - os.sched_getaffinity(0)
+        if missing:
+            raise Exception(
+                "cpu cores {} are not available, affinity is {}".format(sorted(missing), os.sched_getaffinity(0))
+            )
+    groups = [set(cores[i : i + group_size]) for i in range(0, len(cores) - group_size + 1, group_size)]
+    if not groups:
+        raise Exception("no cpu core group, cores {} group_size {}".format(cores, group_size))
+    return groups
+
+
+def estimate_costs(cases, store=None, loops=50, base_times=1000, max_runs=10, default=1.0):
+    """
+    按最近的run估计每个case耗时(s), 按本次loops * base_times的调用次数折算;
+    行中没有记录loops/base_times时(旧数据)视为与本次相同
+    :param store: ResultStore, 为None时全部取default
+    :return: {case: cost}
+    """
+    costs = {}
+    cases = set(cases)
+    if store is not None:
+        for run in store.runs(limit=max_runs):
+            if cases.issubset(costs):
+                break
+            found = {}
+            for row in store.rows(run["run_id"], statistic=WALL_TIME):
+                if row["case_name"] in cases and row["value"] is not None:
+                    # wall_time为loops * base_times次调用的耗时
+                    extra = row["extra"] or {}
+                    calls = extra.get("loops", loops) * extra.get("base_times", base_times)
+                    found[row["case_name"]] = row["value"] * loops * base_times / float(calls)
+            for row in store.rows(run["run_id"], statistic="total"):
+                if row["case_name"] in cases and row["value"] is not None:
+                    # total为base_times次调用的耗时
+                    extra = row["extra"] or {}
+                    per_call = row["value"] / float(extra.get("base_times", base_times))
+                    found.setdefault(row["case_name"], per_call * loops * base_times)
+            for case, cost in found.items():
+                costs.setdefault(case, cost)
+    known = sorted(costs.values())
+    fill = known[len(known) // 2] if known else default
+    return {case: costs.get(case, fill) for case in cases}
+
+
+def static_split(cases, n):
+    """
+    与runner_ci_multipro.split_list相同的按序轮转划分
+    """
+    res = [[] for _ in range(n)]
+    for i, case in enumerate(cases):
+        res[i % n].append(case)
+    return res
+
+
+def static_makespan(cases, costs, n):
+    """
+    静态划分的完成时间
+    """
+    return max(sum(costs[case] for case in part) for part in static_split(cases, n))
+
+
+def lpt_makespan(costs, n):
+    """
+    LPT列表调度的完成时间
+    """
+    finish = [0.0] * n
+    for case in sorted(costs, key=lambda c: -costs[c]):
+        heapq.heapreplace(finish, finish[0] + costs[case])
+    return max(finish)
+
+
+def sentinel(repeat=5, number=200):
+    """
+    哨兵op: 小tensor的paddle.add, 取repeat轮中最快的一轮, 过滤偶发抖动, 只反映持续的干扰
+    """
+    import paddle
+
+    x = paddle.ones([32, 32], dtype="float32")
+    y = paddle.ones([32, 32], dtype="float32")
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            paddle.add(x, y)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class _Collector(object):
+    """
+    worker内替代ResultStore, 只收集行, 由父进程统一写入
+    """
+
+    def __init__(self):
+        self.pending = []
+
+    def append(self, rows, run_id=None):
+        """append"""
+        self.pending.extend(rows)
+        return len(rows)
+
+    def take(self):
+        """取出已收集的行"""
+        rows, self.pending = self.pending, []
+        return rows
+
+
+def _shard_worker(runner, index, group, inbox, outbox, loops, base_times, log, sentinel_every, sentinel_tol):
+    """
+    worker进程: 绑核后循环接收父进程派发的case
+    inbox消息: (case, attempt), "flush"(没有新case时对未校验的结果做哨兵), None(退出)
+    outbox消息: ready, done(case已执行待校验), check(哨兵结果及对应的case结果)
+    outbox为worker独占的管道写端, worker在写入时崩溃不会阻塞其他worker
+    """
+    try:
+        os.sched_setaffinity(0, group)
+        runner.shard_cores = None
+        runner.store = _Collector()
+        baseline = sentinel()
+        outbox.send({"type": "ready", "worker": index, "sentinel": baseline})
+        pending = []
+        while True:
+            item = inbox.get()
+            if item is None:
+                break
+            if item != "flush":
+                case, attempt = item
+                start = time.perf_counter()
+                error_logo, error_info, api = runner._run_test(
+                    case_name=case, loops=loops, base_times=base_times, log=log
+                )
+                pending.append(
+                    {
+                        "case": case,
+                        "attempt": attempt,
+                        "wall": time.perf_counter() - start,
+                        "error_logo": error_logo,
+                        "error_info": error_info,
+                        "api": api,
+                        "rows": runner.store.take(),
+                    }
+                )
+                if len(pending) < sentinel_every:
+                    outbox.send({"type": "done", "worker": index, "case": case})
+                    continue
+            cost = sentinel()
+            ratio = cost / baseline
+            interfered = ratio > 1 + sentinel_tol
+            if not interfered:
+                baseline = min(baseline, cost)
+            outbox.send(
+                {"type": "check", "worker": index, "ratio": ratio, "interfered": interfered, "results": pending}
+            )
+            pending = []
+    except Exception:
+        outbox.send({"type": "error", "worker": index, "exception": traceback.format_exc()})
+
+
+class ShardRunner(object):
+    """
+    分片执行引擎, 调度与汇总在父进程, case在绑核的worker中执行
+    """
+
+    def __init__(self, runner, groups, schedule="lpt", sentinel_every=5, sentinel_tol=0.2, timeout=3600):
+        """
+        :param runner: ApiBenchmarkBASE及其子类, 在worker中调用其_run_test
+        :param groups: core_groups()的结果
+        :param schedule: lpt为最长耗时优先动态调度, static为按序轮转静态划分(与runner_ci_multipro一致), 用于对比
+        :param timeout: 单个case最长执行时间s, 超时时杀掉worker, case记为报错
+        """
+        self.runner = runner
+        self.groups = groups
+        self.schedule = schedule
+        self.sentinel_every = sentinel_every
+        self.sentinel_tol = sentinel_tol
+        self.timeout = timeout
+        self.max_respawns = len(groups) * 3
+        self.results = {}
+        self.events = []
+        self.makespan = None
+
+    def _open_store(self):
+        """
+        runner配置了结果存储时返回ResultStore, 否则为None
+        """
+        if not getattr(self.runner, "result_store", None):
+            return None
+        from utils.result_store import ResultStore
+
+        return ResultStore(self.runner.result_store, "api_benchmark")
+
+    def _spawn(self, index, loops, base_times, log):
+        """
+        启动(或重新拉起)第index个worker, 绑定第index个核组
+        """
+        inbox = self.ctx.Queue()
+        reader, writer = self.ctx.Pipe(duplex=False)
+        process = self.ctx.Process(
+            target=_shard_worker,
+            args=(
+                self.runner,
+                index,
+                self.groups[index],
+                inbox,
+                writer,
+                loops,
+                base_times,
+                log,
+                self.sentinel_every,
+                self.sentinel_tol,
+            ),
+        )
+        process.start()
+        writer.close()
+        # running为正在执行的case, sent为上次哨兵校验后派发的全部case
+        self.workers[index] = {
+            "process": process,
+            "inbox": inbox,
+            "reader": reader,
+            "eof": False,
+            "running": None,
+            "start": None,
+            "sent": [],
+            "unchecked": 0,
+        }
+
+    def _stop(self, index, timeout=60):
+        """
+        结束worker
+        """
+        worker = self.workers[index]
+        if worker["process"].is_alive():
+            worker["inbox"].put(None)
+        worker["process"].join(timeout=timeout)
+        if worker["process"].is_alive():
+            worker["process"].kill()
+            worker["process"].join()
+        worker["reader"].close()
+
+    def _lost(self, index, tasks, costs, reason, logger):
+        """
+        worker崩溃或超时: 正在执行的case记为报错, 其余未经哨兵校验的case结果已丢失, 重新排队
+        """
+        worker = self.workers[index]
+        now = time.perf_counter()
+        for case, attempt in worker["sent"]:
+            if (case, attempt) == worker["running"]:
+                logger.warning("worker {} {} while running case {}".format(index, reason, case))
+                self.results[case] = {
+                    "case": case,
+                    "attempt": attempt,
+                    "wall": now - worker["start"],
+                    "error_logo": True,
+                    "error_info": "sharded runner worker {} {}".format(index, reason),
+                    "api": None,
+                    "rows": [],
+                    "worker": index,
+                    "noisy": False,
+                    "sentinel_ratio": None,
+                }
+            elif self.schedule == "lpt":
+                heapq.heappush(tasks, (-costs[case], -1, case, attempt))
+            else:
+                tasks.appendleft((case, attempt))
+        self.events.append({"worker": index, "lost": reason, "cases": [case for case, _ in worker["sent"]]})
+        self._stop(index, timeout=0)
+        self.respawns += 1
+        if self.respawns > self.max_respawns:
+            raise Exception("sharded runner: too many worker failures, last one {}".format(reason))
+
+    def run(self, cases, loops, base_times, log="log", poll_interval=1.0):
+        """
+        执行cases
+        :return: error_dict, 与ApiBenchmarkBASE._run_main一致
+        """
+        logger = self.runner.logger.get_log()
+        n = len(self.groups)
+        costs = estimate_costs(cases, self._open_store(), loops=loops, base_times=base_times)
+        if self.schedule == "lpt":
+            todo = [[(-costs[case], i, case, 0) for i, case in enumerate(cases)]]
+            heapq.heapify(todo[0])
+        else:
+            todo = [deque((case, 0) for case in part) for part in static_split(cases, n)]
+        logger.info(
+            "shard {} cases onto {} workers {}, schedule {}, estimated static {:.1f}s lpt {:.1f}s".format(
+                len(cases),
+                n,
+                [sorted(g) for g in self.groups],
+                self.schedule,
+                static_makespan(cases, costs, n),
+                lpt_makespan(costs, n),
+            )
+        )
+
+        self.ctx = multiprocessing.get_context("fork")
+        self.workers = {}
+        self.respawns = 0
+        start = time.perf_counter()
+        for i in range(n):
+            self._spawn(i, loops, base_times, log)
+
+        idle = set()
+        try:
+            while True:
+                readers = {worker["reader"]: i for i, worker in self.workers.items() if not worker["eof"]}
+                for reader in wait(list(readers), timeout=poll_interval):
+                    index = readers[reader]
+                    worker = self.workers[index]
+                    try:
+                        msg = reader.recv()
+                    except (EOFError, OSError):
+                        # worker已退出, 下面按exitcode处理
+                        worker["eof"] = True
+                        continue
+                    if msg["type"] == "error":
+                        raise Exception("sharded runner worker {} failed:\n{}".format(index, msg["exception"]))
+                    elif msg["type"] == "done":
+                        worker["unchecked"] += 1
+                    elif msg["type"] == "check":
+                        worker["unchecked"] = 0
+                        worker["sent"] = []
+                        self._check(msg, todo[0] if self.schedule == "lpt" else todo[index], costs, logger)
+                    worker["running"] = None
+                    idle.add(index)
+
+                for i, worker in list(self.workers.items()):
+                    process = worker["process"]
+                    reason = None
+                    if not process.is_alive():
+                        reason = "exited with code {}".format(process.exitcode)
+                    elif worker["running"] is not None and time.perf_counter() - worker["start"] > self.timeout:
+                        reason = "timed out after {}s".format(self.timeout)
+                    # 退出的worker先读完退出前已发出的消息
+                    if reason is None or (not process.is_alive() and not worker["eof"]):
+                        continue
+                    self._lost(i, todo[0] if self.schedule == "lpt" else todo[i], costs, reason, logger)
+                    idle.discard(i)
+                    self._spawn(i, loops, base_times, log)
+
+                for i in sorted(idle):
+                    worker = self.workers[i]
+                    tasks = todo[0] if self.schedule == "lpt" else todo[i]
+                    if tasks:
+                        if self.schedule == "lpt":
+                            _, _, case, attempt = heapq.heappop(tasks)
+                        else:
+                            case, attempt = tasks.popleft()
+                        worker["inbox"].put((case, attempt))
+                        worker["running"] = (case, attempt)
+                        worker["start"] = time.perf_counter()
+                        worker["sent"].append((case, attempt))
+                        idle.discard(i)
+                    elif worker["unchecked"]:
+                        worker["inbox"].put("flush")
+                        idle.discard(i)
+                if len(idle) == n and not any(todo) and not any(w["unchecked"] for w in self.workers.values()):
+                    break
+        finally:
+            for i in list(self.workers):
+                self._stop(i)
+            self.makespan = time.perf_counter() - start
+            # 异常退出时也写入已收集的结果
+            self._merge(loops, base_times)
+
+        busy = [0.0] * n
+        for res in self.results.values():
+            busy[res["worker"]] += res["wall"]
+        noisy = sorted(case for case, res in self.results.items() if res["noisy"])
+        logger.info(
+            "shard makespan {:.1f}s, worker busy {}, interference {} times, noisy cases {}".format(
+                self.makespan, ["{:.1f}".format(b) for b in busy], len(self.events), noisy
+            )
+        )
+
+        error_dict = {}
+        for case, res in self.results.items():
+            if res["error_logo"]:
+                error_dict[case] = {"api": res["api"], "exception": res["error_info"]}
+        return error_dict
+
+    def _check(self, msg, tasks, costs, logger):
+        """
+        处理哨兵结果: 未受干扰时接受结果; 受干扰时case重新排队, 已重跑过的接受并标记为noisy
+        """
+        if msg["interfered"]:
+            self.events.append(
+                {"worker": msg["worker"], "ratio": msg["ratio"], "cases": [res["case"] for res in msg["results"]]}
+            )
+            logger.warning(
+                "worker {} sentinel slowed down {:.2f}x, cases {}".format(
+                    msg["worker"], msg["ratio"], [res["case"] for res in msg["results"]]
+                )
+            )
+        for res in msg["results"]:
+            if msg["interfered"] and res["attempt"] < MAX_RETRY:
+                if self.schedule == "lpt":
+                    heapq.heappush(tasks, (-costs[res["case"]], -1, res["case"], res["attempt"] + 1))
+                else:
+                    tasks.append((res["case"], res["attempt"] + 1))
+                continue
+            res["worker"] = msg["worker"]
+            res["noisy"] = msg["interfered"]
+            res["sentinel_ratio"] = msg["ratio"]
+            self.results[res["case"]] = res
+
+    def _merge(self, loops, base_times):
+        """
+        全部worker的结果写入runner的同一个结果存储run, 附加每个case的wall_time
+        """
+        if not getattr(self.runner, "result_store", None) or not self.results:
+            return
+        rows = []
+        for case, res in self.results.items():
+            rows.extend(res["rows"])
+            rows.append(
+                {
+                    "case_name": case,
+                    "backend": self.runner.framework,
+                    "dtype": self.runner.default_dtype,
+                    "statistic": WALL_TIME,
+                    "value": res["wall"],
+                    "extra": {
+                        "worker": res["worker"],
+                        "cores": sorted(self.groups[res["worker"]]),
+                        "attempt": res["attempt"],
+                        "noisy": res["noisy"],
+                        "sentinel_ratio": res["sentinel_ratio"],
+                        "loops": loops,
+                        "base_times": base_times,
+                    },
+                }
+            )
+        try:
+            self.runner._store_open().append(rows)
+        except Exception as e:
+            self.runner.logger.get_log().warning("sharded result store save failed: {}".format(e))
+
+
+def run_sharded(runner, cases, loops, base_times, log="log"):
+    """
+    按runner的shard配置分片执行, 供ApiBenchmarkBASE._run_main调用
+    """
+    groups = core_groups(runner.shard_cores, runner.shard_group)
+    shard = ShardRunner(
+        runner,
+        groups,
+        sentinel_every=int(os.environ.get("APIBM_SHARD_SENTINEL_EVERY", 5)),
+        sentinel_tol=float(os.environ.get("APIBM_SHARD_SENTINEL_TOL", 0.2)),
+    )
+    return shard.run(cases, loops=loops, base_times=base_times, log=log)
+
+
+if __name__ == "__main__":
+    # benchmark: 静态轮转划分与LPT调度的makespan对比, 在api_benchmark_new目录下执行
+    # 模拟: python shard.py [--store ./result_store], 用结果存储最近run的case耗时, 没有时用对数正态分布的合成耗时
+    # 实测: python shard.py --yaml ../yaml/api_benchmark_fp32.yml --cores 2-5 --limit 40 --loops 5 --base_times 100
+    #       两种调度各执行一次, 静态划分的wall_time写入临时结果存储, 作为LPT的耗时估计
+    import random
+    import shutil
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="static split vs lpt makespan")
+    parser.add_argument("--store", type=str, default=None, help="结果存储根目录, 模拟时从中读取case耗时")
+    parser.add_argument("--yaml", type=str, default=None, help="实测时的case yaml")
+    parser.add_argument("--cores", type=str, default=None, help="实测时worker可用的cpu核")
+    parser.add_argument("--group", type=int, default=1, help="每个worker的核数")
+    parser.add_argument("--limit", type=int, default=40, help="实测case数")
+    parser.add_argument("--loops", type=int, default=5)
+    parser.add_argument("--base_times", type=int, default=100)
+    args = parser.parse_args()
+
+    def simulate(cases, costs):
+        """不同worker数下两种调度的makespan"""
+        total = sum(costs.values())
+        print("{} cases, serial {:.1f}s".format(len(cases), total))
+        for n in [2, 4, 8, 16]:
+            static, lpt = static_makespan(cases, costs, n), lpt_makespan(costs, n)
+            bound = max(total / n, max(costs.values()))
+            print(
+                "workers {:>2}  static {:8.1f}s  lpt {:8.1f}s  lower bound {:8.1f}s  static/lpt {:.2f}x".format(
+                    n, static, lpt, bound, static / lpt
+                )
+            )
+
+    if args.yaml is None:
+        if args.store:
+            sys.path.append("..")
+            from utils.result_store import ResultStore
+
+            store = ResultStore(args.store, "api_benchmark")
+            run_id = store.runs(limit=1)[0]["run_id"]
+            cases = sorted(set(row["case_name"] for row in store.rows(run_id)))
+            costs = estimate_costs(cases, store)
+        else:
+            rng = random.Random(33)
+            cases = ["case_{}".format(i) for i in range(600)]
+            costs = {case: rng.lognormvariate(0, 1.2) for case in cases}
+        simulate(cases, costs)
+    else:
+        from runner_base import ApiBenchmarkBASE
+
+        root = tempfile.mkdtemp()
+        log = os.path.join(root, "log")
+        try:
+            runner = ApiBenchmarkBASE(args.yaml)
+            runner.result_store = root
+            runner.yaml_info = None
+            cases = list(runner.all_cases)[: args.limit]
+            groups = core_groups(args.cores or ",".join(str(c) for c in sorted(os.sched_getaffinity(0))), args.group)
+            measured = {}
+            for schedule in ["static", "lpt"]:
+                runner.store = None
+                shard = ShardRunner(runner, groups, schedule=schedule)
+                shard.run(cases, loops=args.loops, base_times=args.base_times, log=log)
+                measured[schedule] = shard.makespan
+            print(
+                "{} cases, {} workers: static {:.1f}s  lpt {:.1f}s  static/lpt {:.2f}x".format(
+                    len(cases), len(groups), measured["static"], measured["lpt"], measured["static"] / measured["lpt"]
+                )
+            )
+            simulate(cases, {case: res["wall"] for case, res in shard.results.items()})
+        finally:
+            shutil.rmtree(root)
@@ -14,6 +14,7 @@ import paddle
 from paddle import to_tensor
 from utils.logger import logger
 from copy import deepcopy
+from stability import StabilityChecker
 
 
 
@@ -114,9 +115,9 @@ class Core(object):
             else:
                 self.param[key] = value
 
-    def paddle_run(self):
+    def _iter_run(self):
         """
-        计算paddle 总体时间
+        逐轮执行, 产出每轮的前向结果与反向梯度
         """
         self.api = eval(self.api)
         if self._layertypes(self.api) == "func":
@@ -124,15 +125,34 @@ class Core(object):
                 input_param = dict(self.data, **self.param)
                 res = self.api(**input_param)
                 grad = paddle.grad([res], *self.data.values(), retain_graph=False)
-                self.forward_res.append(res.numpy())
-                self.grad_res.append(grad)
+                yield res, grad
         elif self._layertypes(self.api) == "class":
             obj = self.api(**self.param)
             for i in range(self.loops):
                 res = obj(*self.data.values())
                 grad = paddle.grad([res], *self.data.values(), retain_graph=False)
-                self.forward_res.append(res.numpy())
-                self.grad_res.append(grad)
+                yield res, grad
         else:
             raise AttributeError
-        return self.forward_res, self.grad_res
\ No newline at end of file
+
+    def paddle_run(self):
+        """
+        计算paddle 总体时间
+        """
+        for res, grad in self._iter_run():
+            self.forward_res.append(res.numpy())
+            self.grad_res.append(grad)
+        return self.forward_res, self.grad_res
+
+    def paddle_stream_run(self, ulp=0):
+        """
+        流式稳定性执行, 每轮结果立即与第一轮比对, 不保存全部结果
+        :param ulp: 允许的ULP距离, 0表示逐bit一致
+        :return: 前向与反向的StabilityChecker
+        """
+        forward_checker = StabilityChecker(ulp=ulp)
+        grad_checker = StabilityChecker(ulp=ulp)
+        for res, grad in self._iter_run():
+            forward_checker.update(res)
+            grad_checker.update(grad)
+        return forward_checker, grad_checker
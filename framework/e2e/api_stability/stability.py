@@ -3,9 +3,18 @@
 # @author DDDivano
 # encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
 
+"""
+稳定性比对
+check_all_arrays_equal: 全部结果保存后统一比对
+StabilityChecker: 流式比对, 每轮结果产生后立即计算digest, 只保存第一轮结果作为基准及各digest计数, 内存与轮数无关
+"""
+
+import hashlib
+from collections import Counter
 
 import numpy as np
 
+
 def check_all_arrays_equal(lst):
     first_array = lst[0]
     if isinstance(first_array, (np.generic, np.ndarray)):
@@ -35,4 +44,225 @@ def check_all_arrays_equal(lst):
                 return False
         return True
     else:
-        raise TypeError("返回数据类型不能够进行比较")
\ No newline at end of file
+        raise TypeError("返回数据类型不能够进行比较")
+
+
+def to_arrays(res):
+    """
+    单轮结果转为numpy list, 支持numpy、Tensor及二者的list/tuple/dict
+    """
+    if isinstance(res, dict):
+        res = list(res.values())
+    elif not isinstance(res, (list, tuple)):
+        res = [res]
+    arrays = []
+    for x in res:
+        if hasattr(x, "numpy"):
+            x = x.numpy()
+        arrays.append(np.ascontiguousarray(x))
+    return arrays
+
+
+def ordered_int(arr):
+    """
+    浮点数按bit转为有序整数, 相邻浮点数相差1, 两者之差即ULP距离; -0.0与0.0相同
+    """
+    itype = {2: np.int16, 4: np.int32, 8: np.int64}[arr.dtype.itemsize]
+    bits = arr.view(itype).astype(np.int64)
+    return np.where(bits < 0, np.iinfo(itype).min - bits, bits)
+
+
+def ulp_distance(expect, actual):
+    """
+    逐元素ULP距离(uint64), 复数取实部与虚部ULP距离的较大者, 非浮点类型为差的绝对值; nan与nan视为相同
+    """
+    if expect.dtype.kind == "c":
+        return np.maximum(
+            ulp_distance(np.ascontiguousarray(expect.real), np.ascontiguousarray(actual.real)),
+            ulp_distance(np.ascontiguousarray(expect.imag), np.ascontiguousarray(actual.imag)),
+        )
+    if expect.dtype.kind == "f":
+        a, b = ordered_int(expect), ordered_int(actual)
+        same_nan = np.isnan(expect) & np.isnan(actual)
+    else:
+        a, b = expect.astype(np.int64), actual.astype(np.int64)
+        same_nan = np.zeros(expect.shape, dtype=bool)
+    # 差值可能超出int64, 按uint64取模后仍是正确的非负距离
+    dist = np.where(a >= b, (a - b).view(np.uint64), (b - a).view(np.uint64))
+    dist[same_nan] = 0
+    return dist
+
+
+class StabilityChecker(object):
+    """
+    流式稳定性比对
+    """
+
+    def __init__(self, ulp=0, quant_bits=4):
+        """
+        :param ulp: 允许的ULP距离, 0表示逐bit一致
+        :param quant_bits: 量化digest舍去的低位bit数, 用于统计在容差内抖动的结果种类
+        """
+        self.ulp = ulp
+        self.quant_bits = quant_bits
+        self.reference = None
+        self.ref_digest = None
+        self.loops = 0
+        self.digests = Counter()
+        self.quant_digests = Counter()
+        # 逐bit digest -> 量化digest, 相同结果不重复量化
+        self.quant_of = {}
+        self.divergence = None
+        self.max_ulp = 0
+
+    def _digest(self, arrays):
+        """
+        逐bit digest
+        """
+        h = hashlib.blake2b(digest_size=16)
+        for arr in arrays:
+            h.update(str((arr.dtype.str, arr.shape)).encode())
+            h.update(arr.reshape(-1).view(np.uint8))
+        return h.hexdigest()
+
+    def _quant_digest(self, arrays):
+        """
+        量化digest, 浮点数舍去ordered_int的低quant_bits位后计算
+        """
+        h = hashlib.blake2b(digest_size=16)
+        for arr in arrays:
+            h.update(str((arr.dtype.str, arr.shape)).encode())
+            if arr.dtype.kind == "f":
+                arr = np.ascontiguousarray(ordered_int(arr) >> self.quant_bits)
+            h.update(arr.reshape(-1).view(np.uint8))
+        return h.hexdigest()
+
+    def update(self, res):
+        """
+        输入一轮结果
+        :return: 本轮是否与基准在容差内一致
+        """
+        arrays = to_arrays(res)
+        digest = self._digest(arrays)
+        self.digests[digest] += 1
+        if digest not in self.quant_of:
+            self.quant_of[digest] = self._quant_digest(arrays)
+        self.quant_digests[self.quant_of[digest]] += 1
+        iteration = self.loops
+        self.loops += 1
+        if self.reference is None:
+            self.reference = [arr.copy() for arr in arrays]
+            self.ref_digest = digest
+            return True
+        if digest == self.ref_digest:
+            return True
+        return self._compare(iteration, arrays)
+
+    def _compare(self, iteration, arrays):
+        """
+        digest不一致时与基准逐元素比对, 记录第一次超出容差的位置
+        """
+        if len(arrays) != len(self.reference):
+            if self.divergence is None:
+                self.divergence = {"iteration": iteration, "reason": "output number changed"}
+            return False
+        ok = True
+        for i, (expect, actual) in enumerate(zip(self.reference, arrays)):
+            if expect.shape != actual.shape or expect.dtype != actual.dtype:
+                if self.divergence is None:
+                    self.divergence = {"iteration": iteration, "output": i, "reason": "shape or dtype changed"}
+                return False
+            dist = ulp_distance(expect, actual)
+            if dist.size == 0:
+                continue
+            self.max_ulp = max(self.max_ulp, int(dist.max()))
+            # ULP容差只用于浮点与复数, bool与整数逐元素精确比对
+            bad = np.flatnonzero(dist > (self.ulp if expect.dtype.kind in "fc" else 0))
+            if bad.size == 0:
+                continue
+            ok = False
+            if self.divergence is None:
+                index = np.unravel_index(bad[0], expect.shape)
+                self.divergence = {
+                    "iteration": iteration,
+                    "output": i,
+                    "index": tuple(int(j) for j in index),
+                    "ulp": int(dist.flat[bad[0]]),
+                    "expect": expect[index].item(),
+                    "actual": actual[index].item(),
+                    "mismatch": int(bad.size),
+                }
+        return ok
+
+    @property
+    def passed(self):
+        """
+        全部轮次与基准在容差内一致
+        """
+        return self.divergence is None
+
+    def report(self):
+        """
+        比对报告
+        """
+        return {
+            "passed": self.passed,
+            "loops": self.loops,
+            "bitwise_variants": len(self.digests),
+            "quantized_variants": len(self.quant_digests),
+            "max_ulp": self.max_ulp,
+            "divergence": self.divergence,
+        }
+
+
+if __name__ == "__main__":
+    # benchmark: 10k轮paddle cpu前向+反向, 对比保存全部结果与流式比对的内存增长
+    # cd framework/e2e/api_stability && python stability.py [stream|list]
+    import sys
+    import time
+    import resource
+    import tracemalloc
+    import paddle
+
+    paddle.set_device("cpu")
+    mode = sys.argv[1] if len(sys.argv) > 1 else "stream"
+    loops = 10000
+    x = paddle.to_tensor(np.random.RandomState(33).rand(64, 256).astype("float32"), stop_gradient=False)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    forward, grad = [], []
+    forward_checker, grad_checker = StabilityChecker(), StabilityChecker()
+    for i in range(loops):
+        res = paddle.nn.functional.softmax(x)
+        g = paddle.grad([res], [x], retain_graph=False)
+        if mode == "stream":
+            forward_checker.update(res)
+            grad_checker.update(g)
+        else:
+            forward.append(res.numpy())
+            grad.append(g)
+        if i + 1 in (loops // 10, loops):
+            print(
+                "{} loop {:>5}: numpy memory {:.1f}MB, max rss {:.1f}MB".format(
+                    mode,
+                    i + 1,
+                    tracemalloc.get_traced_memory()[0] / 1e6,
+                    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+                )
+            )
+    if mode != "stream":
+        check_all_arrays_equal(forward)
+        check_all_arrays_equal(grad)
+    cost = time.perf_counter() - start
+    print(
+        "{}: {:.2f}s, traced peak {:.1f}MB, max rss {:.1f}MB".format(
+            mode,
+            cost,
+            tracemalloc.get_traced_memory()[1] / 1e6,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        )
+    )
+    if mode == "stream":
+        print("forward:", forward_checker.report())
+        print("grad:", grad_checker.report())
@@ -0,0 +1,58 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+test StabilityChecker
+"""
+import numpy as np
+from stability import StabilityChecker, ulp_distance
+
+
+def _check(first, second, ulp=2):
+    """
+    两轮结果的比对报告
+    """
+    checker = StabilityChecker(ulp=ulp)
+    checker.update(first)
+    checker.update(second)
+    return checker.report()
+
+
+def test_float_ulp():
+    """
+    float32相邻值在容差内, 超出容差报告位置
+    """
+    x = np.array([1.0, 2.0, 3.0], dtype=np.float32)
+    y = x.copy()
+    y[1] = np.nextafter(y[1], np.float32(3))
+    assert _check(x, y)["passed"]
+    assert _check(x, y)["max_ulp"] == 1
+    y[2] = 3.5
+    report = _check(x, y)
+    assert not report["passed"]
+    assert report["divergence"]["index"] == (2,)
+
+
+def test_complex_ulp():
+    """
+    复数实部与虚部分别计算ULP距离
+    """
+    for dtype in [np.complex64, np.complex128]:
+        x = np.array([1 + 1j, 2 - 1j], dtype=dtype)
+        report = _check(x, np.array([1 + 2j, 2 - 1j], dtype=dtype))
+        assert not report["passed"]
+        assert report["divergence"]["index"] == (0,)
+        y = x.copy()
+        y.imag[1] = np.nextafter(y.imag[1], 0)
+        assert _check(x, y)["passed"]
+        assert ulp_distance(x, y).tolist() == [0, 1]
+
+
+def test_int_bool_exact():
+    """
+    bool与整数不使用ULP容差, 不一致即失败
+    """
+    assert not _check(np.array([1, 2], dtype=np.int32), np.array([1, 3], dtype=np.int32))["passed"]
+    assert not _check(np.array([1, 2], dtype=np.int64), np.array([1, 3], dtype=np.int64))["passed"]
+    assert not _check(np.array([True, False]), np.array([True, True]))["passed"]
+    assert _check(np.array([True, False]), np.array([True, False]))["passed"]
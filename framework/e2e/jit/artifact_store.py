@@ -0,0 +1,220 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+jit save/load 产物目录管理
+每个进程(pytest-xdist worker)使用独立根目录, 每个case使用唯一子目录, case结束后自动删除;
+后端由环境变量JIT_ARTIFACT_BACKEND指定:
+    memory: /dev/shm下的内存文件系统目录, 不可用时退回系统临时目录(默认)
+    disk: 当前目录下的jit_save, 与原有行为一致
+JIT_ARTIFACT_KEEP=1 时保留产物用于排查
+每个case每种测试方法记录模型/参数文件大小及save/load/infer耗时, 写入JIT_ARTIFACT_REPORT
+(默认JIT_ARTIFACT_LOG_DIR/jit_artifact_report.csv, JIT_ARTIFACT_LOG_DIR默认为当前目录下的jit_log);
+同一次执行的各进程追加写入同一报告, 新一次执行首次写入时清空报告.
+执行标识依次取JIT_ARTIFACT_RUN_ID、PYTEST_XDIST_TESTRUNUID, 均未设置时每个进程视为一次执行
+"""
+import os
+import csv
+import time
+import atexit
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+REPORT_FIELDS = ["case", "method", "save_ms", "load_ms", "infer_ms", "model_bytes", "params_bytes", "backend", "worker"]
+REPORT_NAME = "jit_artifact_report.csv"
+MODEL_SUFFIX = [".pdmodel", ".json"]
+PARAMS_SUFFIX = [".pdiparams"]
+
+
+def worker_id():
+    """
+    进程标识, pytest-xdist下为gw0/gw1..., 加上pid保证唯一
+    """
+    return "{}{}".format(os.environ.get("PYTEST_XDIST_WORKER", "main"), os.getpid())
+
+
+def run_id():
+    """
+    本次执行的标识, pytest-xdist下各worker共享PYTEST_XDIST_TESTRUNUID;
+    多进程逐case执行(如lazy_runner.py)时由父进程设置JIT_ARTIFACT_RUN_ID
+    """
+    return os.environ.get("JIT_ARTIFACT_RUN_ID") or os.environ.get("PYTEST_XDIST_TESTRUNUID") or worker_id()
+
+
+def file_size(prefix, suffixes):
+    """
+    jit.save产物大小, 不存在时为0
+    """
+    for suffix in suffixes:
+        if os.path.exists(prefix + suffix):
+            return os.path.getsize(prefix + suffix)
+    return 0
+
+
+class ArtifactStore(object):
+    """
+    jit save/load artifact store
+    """
+
+    _default = None
+
+    def __init__(self, backend=None, keep=None, report_path=None):
+        """
+        :param backend: memory or disk
+        :param keep: 是否保留产物
+        :param report_path: 耗时与大小报告, csv, 每次执行清空
+        """
+        self.backend = backend or os.environ.get("JIT_ARTIFACT_BACKEND", "memory")
+        if self.backend not in ["memory", "disk"]:
+            raise Exception("unknown jit artifact backend {}, only support memory and disk".format(self.backend))
+        if keep is None:
+            keep = os.environ.get("JIT_ARTIFACT_KEEP", "0") in ["1", "True", "true"]
+        self.keep = keep
+        self.report_path = report_path or os.environ.get(
+            "JIT_ARTIFACT_REPORT",
+            os.path.join(os.environ.get("JIT_ARTIFACT_LOG_DIR", os.path.join(os.getcwd(), "jit_log")), REPORT_NAME),
+        )
+        self.worker = worker_id()
+        self.run_id = run_id()
+        self.root = None
+        self.stats = {}
+
+    @classmethod
+    def default(cls):
+        """
+        进程内共享的store
+        """
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def _worker_root(self):
+        """
+        本进程的根目录, 进程退出时删除
+        """
+        if self.root is None:
+            if self.backend == "disk":
+                base = os.path.join(os.getcwd(), "jit_save")
+                os.makedirs(base, exist_ok=True)
+            elif os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+                base = "/dev/shm"
+            else:
+                base = None
+            self.root = tempfile.mkdtemp(prefix="jit_{}_".format(self.worker), dir=base)
+            if not self.keep:
+                atexit.register(shutil.rmtree, self.root, True)
+        return self.root
+
+    def case_dir(self, case_name):
+        """
+        为case创建唯一目录
+        """
+        return tempfile.mkdtemp(prefix=case_name + "_", dir=self._worker_root())
+
+    def release(self, path):
+        """
+        删除case目录
+        """
+        if not self.keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+    @contextmanager
+    def timer(self, case_name, method, stage):
+        """
+        记录save/load/infer耗时
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            row = self.stats.setdefault((case_name, method), {})
+            row[stage + "_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+    def flush(self, case_name, method, prefix):
+        """
+        统计产物大小, 与耗时一起追加写入报告; 报告属于上一次执行时先清空
+        :param prefix: jit.save的path
+        """
+        row = self.stats.pop((case_name, method), None)
+        if row is None:
+            return None
+        row.update(
+            {
+                "case": case_name,
+                "method": method,
+                "model_bytes": file_size(prefix, MODEL_SUFFIX),
+                "params_bytes": file_size(prefix, PARAMS_SUFFIX),
+                "backend": self.backend,
+                "worker": self.worker,
+            }
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(self.report_path)), exist_ok=True)
+        with open(self.report_path, "a", newline="") as f:
+            if fcntl is not None:
+                # 多个worker同时追加同一报告
+                fcntl.flock(f, fcntl.LOCK_EX)
+            self._rotate(f)
+            if f.tell() == 0:
+                csv.writer(f).writerow(REPORT_FIELDS)
+            csv.DictWriter(f, fieldnames=REPORT_FIELDS, restval="").writerow(row)
+            f.flush()
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return row
+
+    def _rotate(self, f):
+        """
+        报告旁的.run文件记录写入报告的执行标识, 与本次执行不同时清空报告, 需在持有报告文件锁时调用
+        """
+        run_path = self.report_path + ".run"
+        last_run = None
+        if os.path.exists(run_path):
+            with open(run_path) as run_f:
+                last_run = run_f.read().strip()
+        if last_run != self.run_id:
+            f.truncate(0)
+            f.seek(0)
+            with open(run_path, "w") as run_f:
+                run_f.write(self.run_id)
+
+
+def summarize(report_path, top=10):
+    """
+    汇总报告: 总耗时、总大小, 以及save耗时和模型最大的case
+    """
+    with open(report_path) as f:
+        rows = [row for row in csv.DictReader(f) if row["case"] != "case"]
+    if not rows:
+        print("empty report: {}".format(report_path))
+        return
+
+    def _num(row, key):
+        """数值列, 空值为0"""
+        return float(row[key]) if row.get(key) else 0.0
+
+    print("{} case-methods in {}".format(len(rows), report_path))
+    for key in ["save_ms", "load_ms", "infer_ms", "model_bytes", "params_bytes"]:
+        values = [_num(row, key) for row in rows if row.get(key)]
+        if values:
+            print(
+                "{:<13}: total {:.1f}, mean {:.1f}, max {:.1f}".format(
+                    key, sum(values), sum(values) / len(values), max(values)
+                )
+            )
+    for key in ["save_ms", "model_bytes"]:
+        print("top {} by {}:".format(top, key))
+        for row in sorted(rows, key=lambda r: _num(r, key), reverse=True)[:top]:
+            print("    {:<40} {:<24} {}".format(row["case"], row["method"], row[key]))
+
+
+if __name__ == "__main__":
+    # python artifact_store.py [jit_log/jit_artifact_report.csv]
+    import sys
+
+    summarize(sys.argv[1] if len(sys.argv) > 1 else os.path.join("jit_log", REPORT_NAME))
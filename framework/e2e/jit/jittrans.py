@@ -7,12 +7,12 @@ jittrans.py
 import os
 import logging
 from inspect import isclass
-import shutil
 import numpy as np
 import paddle
 import paddle.inference as paddle_infer
 from paddle.static import InputSpec
 from utils.weaktrans import WeakTrans
+from artifact_store import ArtifactStore
 
 
 def naive_func(a, in_params, func):
@@ -216,14 +216,9 @@ class JitTrans(WeakTrans):
         else:
             self.func_type = "func"
 
-        self.jit_save_path = os.path.join(os.getcwd(), "jit_save", self.case_name)
-
-        if not os.path.exists(os.path.join(os.getcwd(), "jit_save")):
-            os.mkdir(os.path.join(os.getcwd(), "jit_save"))
-
-        if os.path.exists(self.jit_save_path):
-            shutil.rmtree(self.jit_save_path)
-        os.mkdir(self.jit_save_path)
+        # jit.save产物目录, 每个case唯一, jit_run结束后删除
+        self.store = ArtifactStore.default()
+        self.jit_save_path = self.store.case_dir(self.case_name)
 
     def sort_intensor(self):
         """对输入进行排序，构建一个新的输入list"""
@@ -324,6 +319,11 @@ class JitTrans(WeakTrans):
         return res
 
     def jit_save(self, obj, method):
+        """动转静保存模型, 并记录耗时"""
+        with self.store.timer(self.case_name, method, "save"):
+            self._jit_save(obj, method)
+
+    def _jit_save(self, obj, method):
         """
         动转静保存模型，两种情况:
         1. 当self.func为class时，继承nn.Layer构建BuildClass类，
@@ -367,20 +367,22 @@ class JitTrans(WeakTrans):
         """paddle.jit.load加载"""
         if self.func in self.use_seed:
             paddle.seed(self.seed)
-        jit = paddle.jit.load(os.path.join(self.jit_save_path, self.get_func("paddle")))
+        with self.store.timer(self.case_name, method, "load"):
+            jit = paddle.jit.load(os.path.join(self.jit_save_path, self.get_func("paddle")))
         inputs_value = self.sort_intensor()
         res = jit(*inputs_value)
         return res
 
-    def infer_load(self):
+    def infer_load(self, method=None):
         """paddle预测库加载，只会用于测试nn.Layer"""
         if self.func in self.use_seed:
             paddle.seed(self.seed)
-        config = paddle_infer.Config(
-            os.path.join(self.jit_save_path, self.get_func("paddle") + ".pdmodel"),
-            os.path.join(self.jit_save_path, self.get_func("paddle") + ".pdiparams"),
-        )
-        predictor = paddle_infer.create_predictor(config)
+        with self.store.timer(self.case_name, method, "infer"):
+            config = paddle_infer.Config(
+                os.path.join(self.jit_save_path, self.get_func("paddle") + ".pdmodel"),
+                os.path.join(self.jit_save_path, self.get_func("paddle") + ".pdiparams"),
+            )
+            predictor = paddle_infer.create_predictor(config)
         input_names = predictor.get_input_names()
         input_list = self.sort_intensor()
 
@@ -395,6 +397,13 @@ class JitTrans(WeakTrans):
         return infer_res
 
     def jit_run(self):
+        """测试运行流程, 结束后删除jit.save产物"""
+        try:
+            self._jit_run()
+        finally:
+            self.store.release(self.jit_save_path)
+
+    def _jit_run(self):
         """测试运行流程"""
         if self.func not in self.ignore_api and self.case_name not in self.ignore_case:
             if self.func_type == "class":
@@ -409,6 +418,13 @@ class JitTrans(WeakTrans):
             self.logger.get_log().info("(api: {}) (case: {}) ignore all test...".format(self.func, self.case_name))
 
     def test_method(self, method):
+        """jit test method, 结束后记录jit.save产物大小与耗时"""
+        try:
+            self._test_method(method)
+        finally:
+            self.store.flush(self.case_name, method, os.path.join(self.jit_save_path, self.get_func("paddle")))
+
+    def _test_method(self, method):
         """jit test method"""
         # self.logger.get_log().info("self.in_tensor is: {}".format(self.in_tensor))
         # self.logger.get_log().info("self.in_params is: {}".format(self.in_params))
@@ -470,7 +486,7 @@ class JitTrans(WeakTrans):
             self.logger.get_log().info(
                 "start infer load ==========> case: {} test_method: {}".format(self.case_name, method)
             )
-            infer_res = self.infer_load()
+            infer_res = self.infer_load(method=method)
             # self.logger.get_log().info("infer_res is: {}".format(infer_res))
             if isinstance(exp, (list, tuple)):
                 exp = exp[0]
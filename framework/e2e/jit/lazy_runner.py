@@ -6,6 +6,7 @@ lazy runner
 """
 import os
 import sys
+import uuid
 
 sys.path.append(os.path.abspath(os.path.dirname(os.getcwd())))
 sys.path.append(os.path.join(os.path.abspath(os.path.dirname(os.getcwd())), "utils"))
@@ -19,6 +20,8 @@ yml = YamlLoader(yaml_path)
 cases = yml.get_all_case_name()
 print("all cases are here: ", cases)
 fail_cases = []
+# 各unit_runner子进程写入同一份jit_artifact_report.csv, 本次执行首次写入时清空上次的报告
+os.environ["JIT_ARTIFACT_RUN_ID"] = uuid.uuid4().hex
 
 # 执行有bug
 # for i in cases:
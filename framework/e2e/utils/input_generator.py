@@ -0,0 +1,190 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+case输入数据生成
+用numpy.random.Generator直接按目标dtype生成, 不再先生成float64再转换;
+随机种子由case名, 参数名与数据配置确定, 与生成顺序无关, 同一case中相同配置的数据只生成一次,
+paddle与torch取同一参数时共用; 日志只输出shape, dtype与min/max/mean
+WEAKTRANS_INPUT_GEN=0时按原方式使用全局np.random生成
+"""
+
+import os
+import zlib
+
+import numpy as np
+
+FLOAT_DTYPES = {"float": np.float64, "float16": np.float32, "float32": np.float32, "float64": np.float64}
+INT_DTYPES = {"int": np.int64, "int32": np.int32, "int64": np.int64}
+
+
+def generator_enabled():
+    """
+    是否启用Generator生成
+    """
+    return os.environ.get("WEAKTRANS_INPUT_GEN", "1") != "0"
+
+
+def uniform(rng, dtype, low, high, shape):
+    """
+    [low, high)均匀分布, 按dtype直接生成并原地缩放
+    """
+    data = rng.random(shape, dtype=dtype)
+    data *= high - low
+    data += low
+    return data
+
+
+def randtool(rng, dtype, low, high, shape):
+    """
+    按dtype生成随机数据
+    :param rng: numpy.random.Generator
+    """
+    if dtype in INT_DTYPES:
+        return rng.integers(low, high, shape, dtype=INT_DTYPES[dtype])
+    elif dtype in FLOAT_DTYPES:
+        data = uniform(rng, FLOAT_DTYPES[dtype], low, high, shape)
+        # Generator不支持直接生成float16
+        return data.astype(np.float16) if dtype == "float16" else data
+    elif dtype == "bfloat16":
+        return uniform(rng, np.float32, low, high, shape).astype("bfloat16")
+    elif dtype in ["complex", "complex64", "complex128"]:
+        part = np.float32 if dtype == "complex64" else np.float64
+        data = np.empty(shape, dtype=np.complex64 if dtype == "complex64" else np.complex128)
+        data.real = uniform(rng, part, low, high, shape)
+        data.imag = uniform(rng, part, low, high, shape)
+        return data
+    elif dtype == "bool":
+        return rng.integers(0, 2, shape, dtype=np.int8).astype(bool)
+    else:
+        assert False, "dtype is not supported"
+
+
+def legacy_randtool(dtype, low, high, shape):
+    """
+    原方式, 使用全局np.random
+    """
+    if dtype == "int":
+        return np.random.randint(low, high, shape)
+    elif dtype == "int32":
+        return np.random.randint(low, high, shape).astype("int32")
+    elif dtype == "int64":
+        return np.random.randint(low, high, shape).astype("int64")
+    elif dtype == "float":
+        return low + (high - low) * np.random.random(shape)
+    elif dtype == "float16":
+        return low + (high - low) * np.random.random(shape).astype("float16")
+    elif dtype == "float32":
+        return low + (high - low) * np.random.random(shape).astype("float32")
+    elif dtype == "float64":
+        return low + (high - low) * np.random.random(shape).astype("float64")
+    elif dtype == "bfloat16":
+        return low + (high - low) * np.random.random(shape).astype("bfloat16")
+    elif dtype in ["complex", "complex64", "complex128"]:
+        data = low + (high - low) * np.random.random(shape) + (low + (high - low) * np.random.random(shape)) * 1j
+        return data if dtype == "complex" or "complex128" else data.astype(np.complex64)
+    elif dtype == "bool":
+        data = np.random.randint(0, 2, shape).astype("bool")
+        return data
+    else:
+        assert False, "dtype is not supported"
+
+
+class InputGenerator(object):
+    """
+    单个case的输入生成器
+    """
+
+    def __init__(self, case_name, seed=None):
+        """
+        :param case_name: case名, 决定随机种子
+        :param seed: 额外的种子, 为None时只由case名决定
+        """
+        self.case_name = case_name
+        self.seed = seed
+        self.cache = {}
+        self.count = 0
+
+    def rng(self, key):
+        """
+        由case名与key确定的Generator
+        """
+        entropy = [zlib.crc32(self.case_name.encode()), zlib.crc32(repr(key).encode())]
+        if self.seed is not None:
+            entropy.append(self.seed)
+        return np.random.default_rng(entropy)
+
+    def random(self, dtype, low, high, shape, key=None):
+        """
+        生成随机数据, 相同key与配置只生成一次
+        :param key: 参数名, 为None时每次调用单独生成
+        """
+        if not generator_enabled():
+            return legacy_randtool(dtype, low, high, shape)
+        if key is None:
+            self.count += 1
+            return randtool(self.rng(("__call__", self.count, dtype, low, high, shape)), dtype, low, high, shape)
+        cache_key = (key, dtype, low, high, tuple(shape) if isinstance(shape, (list, tuple)) else shape)
+        if cache_key not in self.cache:
+            self.cache[cache_key] = randtool(self.rng(cache_key), dtype, low, high, shape)
+        return self.cache[cache_key]
+
+
+def summary(value):
+    """
+    用于日志的参数描述, 数组只输出shape, dtype与min/max/mean
+    """
+    if isinstance(value, np.ndarray):
+        desc = "ndarray(shape={}, dtype={}".format(list(value.shape), value.dtype)
+        if value.size > 0 and (np.issubdtype(value.dtype, np.integer) or np.issubdtype(value.dtype, np.floating)):
+            desc += ", min={:.6g}, max={:.6g}, mean={:.6g}".format(value.min(), value.max(), value.mean())
+        return desc + ")"
+    elif isinstance(value, (list, tuple)):
+        return "[{}]".format(", ".join(summary(v) for v in value))
+    elif isinstance(value, dict):
+        return "{{{}}}".format(", ".join("{}: {}".format(k, summary(v)) for k, v in value.items()))
+    return repr(value)
+
+
+if __name__ == "__main__":
+    # benchmark: api benchmark yaml全部case的输入生成与日志格式化耗时, 原方式与Generator方式对比
+    # cd framework/e2e && python -m utils.input_generator [yaml, 默认yaml/api_benchmark_fp32.yml]
+    import sys
+    import time
+    import logging
+
+    from utils.yaml_loader import YamlLoader
+    from utils.weaktrans import WeakTrans, Framework
+
+    class NullLogger(object):
+        """只格式化不输出的logger"""
+
+        def __init__(self):
+            self.log = logging.getLogger("input_generator_bench")
+            self.log.addHandler(logging.NullHandler())
+            self.log.propagate = False
+
+        def get_log(self):
+            """get_log"""
+            return self.log
+
+    e2e_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    yml = sys.argv[1] if len(sys.argv) > 1 else os.path.join(e2e_path, "yaml", "api_benchmark_fp32.yml")
+    loader = YamlLoader(yml)
+    cases = [loader.get_case_info(name) for name in loader.get_all_case_name()]
+    for flag in ["0", "1"]:
+        os.environ["WEAKTRANS_INPUT_GEN"] = flag
+        numel = 0
+        start = time.perf_counter()
+        for case in cases:
+            trans = WeakTrans(case, logger=NullLogger())
+            for value in list(trans.get_inputs(Framework.PADDLE).values()) + list(
+                trans.get_params(Framework.PADDLE).values()
+            ):
+                for v in value if isinstance(value, list) else [value]:
+                    numel += v.size if isinstance(v, np.ndarray) else 0
+        print(
+            "{:<10} cases {}  numel {}  setup {:.2f}s".format(
+                "legacy" if flag == "0" else "generator", len(cases), numel, time.perf_counter() - start
+            )
+        )
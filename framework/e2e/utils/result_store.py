@@ -0,0 +1,378 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+results store
+统一的测试结果存储: 每次执行为一个run, 带环境指纹; 结果按行追加
+(case, backend, dtype, statistic, value, samples), samples以float64数组存为BLOB;
+按 <root>/<suite>/<YYYY-MM>.sqlite 分区;
+提供 latest vs baseline 对比查询, xlsx/csv 报告由查询结果渲染
+"""
+
+import os
+import sys
+import json
+import array
+import time
+import uuid
+import sqlite3
+import hashlib
+import platform
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created REAL,
+    tag TEXT,
+    fingerprint TEXT,
+    fingerprint_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id TEXT,
+    case_name TEXT,
+    backend TEXT,
+    dtype TEXT,
+    statistic TEXT,
+    value REAL,
+    samples BLOB,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS results_run_case ON results (run_id, case_name, statistic);
+"""
+
+COLUMNS = ["run_id", "case_name", "backend", "dtype", "statistic", "value", "samples", "extra"]
+
+
+def env_fingerprint(**extra):
+    """
+    运行环境指纹, 只读取已导入的框架版本, 不触发导入
+    """
+    fingerprint = {
+        "host": platform.node(),
+        "system": platform.system(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "cuda_visible_devices": os.environ.get("CUDA_VISIBLE_DEVICES", ""),
+    }
+    if os.path.exists("/proc/cpuinfo"):
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    fingerprint["cpu"] = line.split(":", 1)[1].strip()
+                    break
+    for name in ["paddle", "torch"]:
+        module = sys.modules.get(name)
+        if module is not None:
+            fingerprint[name] = getattr(module, "__version__", "")
+            commit = getattr(getattr(module, "version", None), "commit", None)
+            if commit:
+                fingerprint[name + "_commit"] = commit
+    fingerprint.update(extra)
+    return fingerprint
+
+
+def fingerprint_hash(fingerprint, keys=None):
+    """
+    指纹hash, 用于查找可比的baseline; keys为参与比较的字段, 默认除框架版本外全部字段
+    """
+    if keys is None:
+        keys = [k for k in fingerprint if k not in ["paddle", "paddle_commit", "torch", "torch_commit"]]
+    content = json.dumps({k: fingerprint.get(k) for k in sorted(keys)}, sort_keys=True)
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+class ResultStore(object):
+    """
+    results store
+    """
+
+    def __init__(self, root, suite):
+        """
+        :param root: 存储根目录
+        :param suite: 测试类型, 如api_benchmark, paddlelt_perf, 每个suite一个子目录
+        """
+        self.root = root
+        self.suite = suite
+        self.dir = os.path.join(root, suite)
+        os.makedirs(self.dir, exist_ok=True)
+        self._conns = {}
+        self.run_id = None
+
+    def _connect(self, path):
+        """
+        打开分区, 不存在时建表
+        """
+        if path not in self._conns:
+            conn = sqlite3.connect(path, timeout=60)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conns[path] = conn
+        return self._conns[path]
+
+    def partitions(self):
+        """
+        全部分区, 按时间倒序
+        """
+        names = sorted((n for n in os.listdir(self.dir) if n.endswith(".sqlite")), reverse=True)
+        return [os.path.join(self.dir, n) for n in names]
+
+    def _partition_of(self, run_id):
+        """
+        run所在分区
+        """
+        for path in self.partitions():
+            if self._connect(path).execute("SELECT 1 FROM runs WHERE run_id=?", (run_id,)).fetchone():
+                return path
+        raise Exception("run {} not found in {}".format(run_id, self.dir))
+
+    def start_run(self, run_id=None, tag=None, fingerprint=None):
+        """
+        新建run, 之后append的行都属于该run
+        :param tag: 如baseline/latest/commit号, 用于查找baseline
+        """
+        self.run_id = run_id or "{}-{}".format(datetime.now().strftime("%Y%m%d%H%M%S"), uuid.uuid4().hex[:8])
+        fingerprint = fingerprint or env_fingerprint()
+        path = os.path.join(self.dir, datetime.now().strftime("%Y-%m") + ".sqlite")
+        conn = self._connect(path)
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?)",
+                (self.run_id, time.time(), tag, json.dumps(fingerprint), fingerprint_hash(fingerprint)),
+            )
+        self._run_path = path
+        return self.run_id
+
+    def append(self, rows, run_id=None):
+        """
+        追加结果, 一次事务写入
+        :param rows: list of dict, 必须包含case_name, statistic, value; 可选backend, dtype, samples(list), extra(dict)
+        """
+        run_id = run_id or self.run_id
+        if run_id is None:
+            raise Exception("call start_run before append")
+        path = self._run_path if run_id == self.run_id else self._partition_of(run_id)
+        conn = self._connect(path)
+        values = [
+            (
+                run_id,
+                row["case_name"],
+                row.get("backend", ""),
+                row.get("dtype", ""),
+                row["statistic"],
+                None if row.get("value") is None else float(row["value"]),
+                None if row.get("samples") is None else array.array("d", row["samples"]).tobytes(),
+                None if row.get("extra") is None else json.dumps(row["extra"]),
+            )
+            for row in rows
+        ]
+        with conn:
+            conn.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)", values)
+        return len(values)
+
+    def runs(self, tag=None, limit=None):
+        """
+        run列表, 按创建时间倒序
+        """
+        runs = []
+        for path in self.partitions():
+            sql = "SELECT run_id, created, tag, fingerprint, fingerprint_hash FROM runs"
+            params = ()
+            if tag is not None:
+                sql += " WHERE tag=?"
+                params = (tag,)
+            for run_id, created, run_tag, fingerprint, fp_hash in self._connect(path).execute(sql, params):
+                runs.append(
+                    {
+                        "run_id": run_id,
+                        "created": created,
+                        "tag": run_tag,
+                        "fingerprint": json.loads(fingerprint),
+                        "fingerprint_hash": fp_hash,
+                    }
+                )
+        runs.sort(key=lambda r: r["created"], reverse=True)
+        return runs[:limit] if limit else runs
+
+    def rows(self, run_id, case_name=None, statistic=None, with_samples=False):
+        """
+        查询某个run的结果
+        """
+        columns = COLUMNS if with_samples else [c for c in COLUMNS if c != "samples"]
+        sql = "SELECT {} FROM results WHERE run_id=?".format(", ".join(columns))
+        params = [run_id]
+        if case_name is not None:
+            sql += " AND case_name=?"
+            params.append(case_name)
+        if statistic is not None:
+            sql += " AND statistic=?"
+            params.append(statistic)
+        # 按写入顺序返回, 渲染的报告行列顺序与写入一致
+        sql += " ORDER BY rowid"
+        res = []
+        for values in self._connect(self._partition_of(run_id)).execute(sql, params):
+            row = dict(zip(columns, values))
+            if with_samples:
+                row["samples"] = array.array("d", row["samples"]).tolist() if row["samples"] else None
+            row["extra"] = json.loads(row["extra"]) if row["extra"] else None
+            res.append(row)
+        return res
+
+    def baseline_of(self, run_id, tag=None):
+        """
+        查找baseline: 指定tag时为该tag最新的run, 否则为同环境指纹的上一个run
+        """
+        runs = self.runs()
+        latest = next(r for r in runs if r["run_id"] == run_id)
+        for run in runs:
+            if run["run_id"] == run_id or run["created"] > latest["created"]:
+                continue
+            if tag is not None and run["tag"] == tag:
+                return run["run_id"]
+            if tag is None and run["fingerprint_hash"] == latest["fingerprint_hash"]:
+                return run["run_id"]
+        return None
+
+    def diff(self, latest=None, baseline=None, statistic=None, tag=None):
+        """
+        latest vs baseline
+        :param latest: 默认最新的run
+        :param baseline: 默认baseline_of(latest, tag)
+        :return: list of dict, 包含latest/baseline/ratio(latest/baseline), 只在一侧存在的行对应值为None
+        """
+        if latest is None:
+            runs = self.runs(limit=1)
+            if not runs:
+                return []
+            latest = runs[0]["run_id"]
+        if baseline is None:
+            baseline = self.baseline_of(latest, tag=tag)
+        key = ["case_name", "backend", "dtype", "statistic"]
+        conn = self._connect(self._partition_of(latest))
+        base = "main"
+        if baseline is not None and self._partition_of(baseline) != self._partition_of(latest):
+            # baseline在其他分区时attach后在同一条sql中join
+            conn.execute("ATTACH DATABASE ? AS base", (self._partition_of(baseline),))
+            base = "base"
+        join = " AND ".join("b.{0}=l.{0}".format(k) for k in key)
+        where = " AND l.statistic=?" if statistic is not None else ""
+        params = [baseline, latest] + ([statistic] if statistic is not None else [])
+        sql = (
+            "SELECT l.case_name, l.backend, l.dtype, l.statistic, l.value, b.value "
+            "FROM main.results l LEFT JOIN {base}.results b ON b.run_id=? AND {join} "
+            "WHERE l.run_id=?{where} "
+            "UNION ALL "
+            "SELECT l.case_name, l.backend, l.dtype, l.statistic, NULL, l.value "
+            "FROM {base}.results l WHERE l.run_id=?{where} AND NOT EXISTS "
+            "(SELECT 1 FROM main.results b WHERE b.run_id=? AND {join})"
+        ).format(base=base, join=join, where=where)
+        params += [baseline] + ([statistic] if statistic is not None else []) + [latest]
+        try:
+            records = conn.execute(sql, params).fetchall()
+        finally:
+            if base == "base":
+                conn.execute("DETACH DATABASE base")
+        res = []
+        for case_name, backend, dtype, stat, new, old in records:
+            res.append(
+                {
+                    "case_name": case_name,
+                    "backend": backend,
+                    "dtype": dtype,
+                    "statistic": stat,
+                    "latest": new,
+                    "baseline": old,
+                    "ratio": new / old if new is not None and old else None,
+                    "latest_run": latest,
+                    "baseline_run": baseline,
+                }
+            )
+        return res
+
+    def render(self, path, rows):
+        """
+        渲染报告, .xlsx使用pandas, 其余写csv
+        :param rows: rows()/diff()的查询结果
+        """
+        if path.endswith(".xlsx"):
+            import pandas as pd
+
+            pd.DataFrame(rows).to_excel(path, index=False)
+        else:
+            import csv
+
+            fields = list(rows[0].keys()) if rows else COLUMNS
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rows)
+        return path
+
+    def close(self):
+        """
+        关闭全部分区连接
+        """
+        for conn in self._conns.values():
+            conn.close()
+        self._conns = {}
+
+
+if __name__ == "__main__":
+    # benchmark: 100k行写入吞吐, 查询与latest vs baseline对比延迟
+    import shutil
+    import random
+    import tempfile
+
+    root = tempfile.mkdtemp()
+    try:
+        store = ResultStore(root, "api_benchmark")
+        rng = random.Random(33)
+        cases = ["case_{}".format(i) for i in range(5000)]
+        statistics = ["forward", "backward", "total", "best_total"]
+
+        def gen_rows(scale):
+            """5000 case x 4 statistic x 5 次 = 100k 行"""
+            return [
+                {
+                    "case_name": case,
+                    "backend": "paddle",
+                    "dtype": dtype,
+                    "statistic": stat,
+                    "value": rng.uniform(1, 2) * scale,
+                    "samples": [rng.uniform(1, 2) for _ in range(50)],
+                }
+                for case in cases
+                for stat in statistics
+                for dtype in ["float32", "float16", "bfloat16", "float64", "int32"]
+            ]
+
+        store.start_run(tag="baseline")
+        rows = gen_rows(1.0)
+        start = time.perf_counter()
+        store.append(rows)
+        cost = time.perf_counter() - start
+        print("append {} rows with 50 samples: {:.2f}s, {:.0f} rows/s".format(len(rows), cost, len(rows) / cost))
+
+        latest = store.start_run(tag="latest")
+        store.append(gen_rows(1.1))
+
+        start = time.perf_counter()
+        for case in rng.sample(cases, 100):
+            store.rows(latest, case_name=case)
+        print("case lookup: {:.2f}ms".format((time.perf_counter() - start) * 10))
+
+        start = time.perf_counter()
+        diff = store.diff(statistic="forward")
+        print("latest vs baseline (forward, {} rows): {:.1f}ms".format(len(diff), (time.perf_counter() - start) * 1000))
+        start = time.perf_counter()
+        diff = store.diff()
+        print("latest vs baseline (all, {} rows): {:.1f}ms".format(len(diff), (time.perf_counter() - start) * 1000))
+        start = time.perf_counter()
+        store.render(os.path.join(root, "diff.csv"), diff)
+        print("render csv: {:.1f}ms".format((time.perf_counter() - start) * 1000))
+        print("partition size: {:.1f}MB".format(sum(os.path.getsize(p) for p in store.partitions()) / 1e6))
+        store.close()
+    finally:
+        shutil.rmtree(root)
@@ -11,6 +11,7 @@ from inspect import isclass
 import paddle
 import numpy as np
 from utils.logger import logger
+from utils.input_generator import InputGenerator, generator_enabled, summary
 
 
 class Framework(object):
@@ -38,6 +39,8 @@ class WeakTrans(object):
         self.default_type = default_type
         self.params = dict()
         self.logger = logger
+        # 输入数据按case名确定随机种子, 相同配置的数据只生成一次, 各框架共用
+        self.generator = InputGenerator(self.case_name, seed)
         # desc
         self.logger.get_log().info(self.case_name)
         self.logger.get_log().info(self.case.get("desc", "没有描述"))
@@ -89,7 +92,7 @@ class WeakTrans(object):
         """
         inputs_info = self.case[framework].get("inputs", None)
         inputs = self._generate_params(inputs_info)
-        self.logger.get_log().info("Case的inputs设置：{}".format(inputs))
+        self.logger.get_log().info("Case的inputs设置：{}".format(summary(inputs) if generator_enabled() else inputs))
         return inputs
 
     def get_params(self, framework):
@@ -99,7 +102,7 @@ class WeakTrans(object):
         # 获取参数输入
         params_info = self.case[framework].get("params", None)
         params = self._generate_params(params_info)
-        self.logger.get_log().info("Case的params设置：{}".format(params))
+        self.logger.get_log().info("Case的params设置：{}".format(summary(params) if generator_enabled() else params))
         return params
 
     def get_method(self, framework):
@@ -119,34 +122,12 @@ class WeakTrans(object):
         # 获取测试方法
         return self.case[framework]["api_name"]
 
-    def _randtool(self, dtype, low, high, shape):
+    def _randtool(self, dtype, low, high, shape, key=None):
         """
         np random tools
+        :param key: 参数名, 同一case中相同key与配置的数据只生成一次
         """
-        if dtype == "int":
-            return np.random.randint(low, high, shape)
-        elif dtype == "int32":
-            return np.random.randint(low, high, shape).astype("int32")
-        elif dtype == "int64":
-            return np.random.randint(low, high, shape).astype("int64")
-        elif dtype == "float":
-            return low + (high - low) * np.random.random(shape)
-        elif dtype == "float16":
-            return low + (high - low) * np.random.random(shape).astype("float16")
-        elif dtype == "float32":
-            return low + (high - low) * np.random.random(shape).astype("float32")
-        elif dtype == "float64":
-            return low + (high - low) * np.random.random(shape).astype("float64")
-        elif dtype == "bfloat16":
-            return low + (high - low) * np.random.random(shape).astype("bfloat16")
-        elif dtype in ["complex", "complex64", "complex128"]:
-            data = low + (high - low) * np.random.random(shape) + (low + (high - low) * np.random.random(shape)) * 1j
-            return data if dtype == "complex" or "complex128" else data.astype(np.complex64)
-        elif dtype == "bool":
-            data = np.random.randint(0, 2, shape).astype("bool")
-            return data
-        else:
-            assert False, "dtype is not supported"
+        return self.generator.random(dtype, low, high, shape, key=key)
 
     def _generate_params(self, info):
         """
@@ -155,12 +136,10 @@ class WeakTrans(object):
         """
 
         kwargs = {}
-        kwargs_for_log = {}
         if not info:
             return kwargs
         for key, value in info.items():
             kwargs[key] = self._params_transform(key, value)
-            kwargs_for_log[key] = kwargs[key]
         return kwargs
 
     def _params_transform(self, key, value):
@@ -184,14 +163,18 @@ class WeakTrans(object):
         # print("value is : ", value)
         if isinstance(value, list) and isinstance(value[0], dict):
             data = []
-            for v in value:
+            for i, v in enumerate(value):
                 # 参数可靠性校验
                 self._param_check(key, v)
                 if v.get("random", False):
                     # 若开启random即进行自动数据生成,默认关闭
                     data_range = v.get("range", [-1, 1])
                     assert isinstance(data_range, list) and len(data_range) == 2
-                    data.append(self._randtool(v.get("dtype", "float"), data_range[0], data_range[1], v.get("shape")))
+                    data.append(
+                        self._randtool(
+                            v.get("dtype", "float"), data_range[0], data_range[1], v.get("shape"), key=(key, i)
+                        )
+                    )
                     # elif
                 else:
                     data.append(np.array(v.get("value")).astype(v.get("dtype")))
@@ -205,7 +188,9 @@ class WeakTrans(object):
                 # 若开启random即进行自动数据生成,默认关闭
                 data_range = value.get("range", [-1, 1])
                 assert isinstance(data_range, list) and len(data_range) == 2
-                data = self._randtool(value.get("dtype", "float"), data_range[0], data_range[1], value.get("shape"))
+                data = self._randtool(
+                    value.get("dtype", "float"), data_range[0], data_range[1], value.get("shape"), key=key
+                )
                 # elif
             else:
                 data = np.array(value.get("value")).astype(value.get("dtype"))
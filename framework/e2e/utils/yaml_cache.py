@@ -0,0 +1,236 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+yaml编译缓存
+yaml首次加载时(优先使用C loader)解析一次, 按case分别pickle后写入以文件内容hash命名的缓存文件,
+之后的加载只读取case索引, get单个case时按偏移读取反序列化, 不需要解析整个yaml
+缓存目录由环境变量YAML_CACHE_DIR指定, YAML_CACHE=0时关闭缓存, 按原方式用FullLoader直接解析yaml
+"""
+
+import os
+import pickle
+import struct
+import hashlib
+import tempfile
+
+import yaml
+
+# 与原YamlLoader一致的FullLoader语义, 有libyaml时使用C实现
+Loader = getattr(yaml, "CFullLoader", yaml.FullLoader)
+
+CACHE_VERSION = 1
+HEADER = struct.Struct("<8sQ")
+MAGIC = b"YMLCACHE"
+
+# 进程内缓存, 同一进程多次加载同一份yaml(如pytest收集大量case文件)只读一次索引
+_INDEX_MEMO = {}
+
+
+def cache_dir():
+    """
+    缓存目录
+    """
+    return os.environ.get("YAML_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "e2e_yaml"))
+
+
+def cache_enabled():
+    """
+    是否启用缓存
+    """
+    return os.environ.get("YAML_CACHE", "1") not in ["0", "False", "false"]
+
+
+def file_hash(yml):
+    """
+    yaml文件内容hash, 作为缓存key
+    """
+    with open(yml, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def parse_yaml(yml, loader=Loader):
+    """
+    解析整个yaml
+    """
+    with open(yml, encoding="utf-8") as f:
+        return yaml.load(f, Loader=loader)
+
+
+def compile_yaml(yml, cache_path):
+    """
+    解析yaml并写入缓存文件
+    文件格式: HEADER(magic, index长度) + pickle(index) + 各case的pickle数据
+    index为{"cases": {case_name: (offset, length)}}, 非dict的yaml整体存为{"doc": (offset, length)}
+    :return: index, 数据区起始位置
+    """
+    doc = parse_yaml(yml)
+    data = []
+    index = {"version": CACHE_VERSION}
+    if isinstance(doc, dict):
+        cases = {}
+        offset = 0
+        for name, info in doc.items():
+            blob = pickle.dumps(info, protocol=pickle.HIGHEST_PROTOCOL)
+            cases[name] = (offset, len(blob))
+            offset += len(blob)
+            data.append(blob)
+        index["cases"] = cases
+    else:
+        blob = pickle.dumps(doc, protocol=pickle.HIGHEST_PROTOCOL)
+        index["doc"] = (0, len(blob))
+        data.append(blob)
+    index_blob = pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL)
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    # 先写临时文件再rename, 多进程同时编译时不会读到半个文件
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(index_blob)))
+            f.write(index_blob)
+            f.write(b"".join(data))
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return index, HEADER.size + len(index_blob)
+
+
+def read_index(cache_path):
+    """
+    读取缓存文件的index
+    :return: index, 数据区起始位置; 文件损坏或版本不一致时返回None, None
+    """
+    try:
+        with open(cache_path, "rb") as f:
+            magic, length = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                return None, None
+            index = pickle.loads(f.read(length))
+    except Exception:
+        return None, None
+    if index.get("version") != CACHE_VERSION:
+        return None, None
+    return index, HEADER.size + length
+
+
+class YamlCache(object):
+    """
+    yaml编译缓存, 提供与dict一致的keys/get接口
+    """
+
+    def __init__(self, yml):
+        """
+        :param yml: yaml文件路径
+        """
+        self.path = yml
+        self.doc = None
+        self.index = None
+        self.cache_path = None
+        self.data_start = 0
+        if not cache_enabled():
+            self.doc = parse_yaml(yml, loader=yaml.FullLoader)
+            return
+
+        digest = file_hash(yml)
+        self.cache_path = os.path.join(cache_dir(), "{}.pkl".format(digest))
+        if digest in _INDEX_MEMO:
+            self.index, self.data_start = _INDEX_MEMO[digest]
+            return
+        index, data_start = read_index(self.cache_path)
+        if index is None:
+            try:
+                index, data_start = compile_yaml(yml, self.cache_path)
+            except OSError:
+                # 缓存目录不可写时退化为直接解析
+                self.doc = parse_yaml(yml)
+                return
+        self.index, self.data_start = index, data_start
+        _INDEX_MEMO[digest] = (index, data_start)
+
+    def _read(self, offset, length):
+        """
+        按偏移读取并反序列化
+        """
+        with open(self.cache_path, "rb") as f:
+            f.seek(self.data_start + offset)
+            return pickle.loads(f.read(length))
+
+    def load(self):
+        """
+        返回整个yaml内容
+        """
+        if self.doc is None:
+            if "cases" in self.index:
+                self.doc = {name: self._read(*pos) for name, pos in self.index["cases"].items()}
+            else:
+                self.doc = self._read(*self.index["doc"])
+        return self.doc
+
+    def keys(self):
+        """
+        全部case名
+        """
+        if self.doc is None and "cases" in self.index:
+            return self.index["cases"].keys()
+        return self.load().keys()
+
+    def get(self, case_name, default=None):
+        """
+        读取单个case, 不加载整个yaml
+        """
+        if self.doc is None and "cases" in self.index:
+            pos = self.index["cases"].get(case_name)
+            return default if pos is None else self._read(*pos)
+        return self.load().get(case_name, default)
+
+    def __bool__(self):
+        """与dict一致, 空yaml为False"""
+        if self.doc is None and "cases" in self.index:
+            return bool(self.index["cases"])
+        return bool(self.load())
+
+
+if __name__ == "__main__":
+    # benchmark: 单次加载耗时, 以及framework/e2e/jit下pytest收集耗时(YAML_CACHE=0为原方式)
+    # cd framework/e2e/utils && python yaml_cache.py [jit case数, 默认100]
+    import sys
+    import time
+    import glob
+    import subprocess
+
+    e2e_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    nn_yml = os.path.join(e2e_path, "yaml", "nn.yml")
+
+    start = time.perf_counter()
+    parse_yaml(nn_yml, loader=yaml.FullLoader)
+    print("FullLoader parse nn.yml     : {:.3f}s".format(time.perf_counter() - start))
+    start = time.perf_counter()
+    parse_yaml(nn_yml)
+    print("{} parse nn.yml    : {:.3f}s".format(Loader.__name__, time.perf_counter() - start))
+    start = time.perf_counter()
+    compile_yaml(nn_yml, os.path.join(cache_dir(), "{}.pkl".format(file_hash(nn_yml))))
+    print("compile nn.yml cache        : {:.3f}s".format(time.perf_counter() - start))
+    start = time.perf_counter()
+    cache = YamlCache(nn_yml)
+    cache.get("AdaptiveAvgPool1D_0")
+    print("cached load + get one case  : {:.4f}s".format(time.perf_counter() - start))
+
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    jit_path = os.path.join(e2e_path, "jit")
+    cases = sorted(glob.glob(os.path.join(jit_path, "test_*.py")))[:num]
+    for flag in ["0", "1"]:
+        env = dict(os.environ, YAML_CACHE=flag)
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "pytest", "--collect-only", "-q", "-p", "no:cacheprovider"] + cases,
+            cwd=jit_path,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        print(
+            "pytest collect {} jit cases, YAML_CACHE={}: {:.3f}s".format(len(cases), flag, time.perf_counter() - start)
+        )
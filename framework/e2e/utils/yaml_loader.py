@@ -5,7 +5,7 @@
 yaml base
 """
 
-import yaml
+from utils.yaml_cache import YamlCache
 
 # from old_design.logger import Logger, logger
 
@@ -18,12 +18,17 @@ class YamlLoader(object):
     def __init__(self, yml):
         """initialize"""
         try:
-            with open(yml, encoding="utf-8") as f:
-                self.yml = yaml.load(f, Loader=yaml.FullLoader)
+            # 通过编译缓存加载, 单个case按需读取
+            self.cache = YamlCache(yml)
         except Exception as e:
             print(e)
         # self.logger = logger
 
+    @property
+    def yml(self):
+        """整个yaml内容"""
+        return self.cache.load()
+
     def __str__(self):
         """str"""
         return str(self.yml)
@@ -33,11 +38,11 @@ class YamlLoader(object):
         get case info
         """
         # self.logger.get_log().info("get ->{}<- case profile".format(case_name))
-        return {"info": self.yml.get(case_name), "name": case_name}
+        return {"info": self.cache.get(case_name), "name": case_name}
 
     def get_all_case_name(self):
         """
         get all case name
         """
         # 获取全部case name
-        return self.yml.keys()
+        return self.cache.keys()
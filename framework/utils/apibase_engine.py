@@ -0,0 +1,806 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+APIBase执行引擎, framework/api下各目录的apibase.py继承APIBase并通过类属性设置目录策略
+静态图按(api, place, dtype, 输入shape, 属性)签名只构建一次, 缓存Program并复用Executor与Scope;
+_check_dtype的places x dtypes可在常驻进程池中并行执行, 进程池由预先import paddle的forkserver创建,
+worker跨case复用, 静态图缓存同样在worker内生效
+环境变量:
+    APIBASE_STATIC_CACHE: 0 关闭静态图缓存, 每次调用重新构建Program, 默认1
+    APIBASE_WORKERS: _check_dtype的进程数, 默认1串行; 只有CPU place时生效
+"""
+from inspect import isfunction
+import os
+import copy
+import logging
+import pickle
+import traceback
+import multiprocessing
+import pytest
+import numpy as np
+import paddle
+from paddle import to_tensor
+
+from numeric_grad import NumericGrad
+
+STATIC_CACHE = os.getenv("APIBASE_STATIC_CACHE", "1") != "0"
+WORKERS = int(os.getenv("APIBASE_WORKERS", "1"))
+
+# 进程内共享的静态图缓存与Executor, 进程池worker同样复用
+_STATIC_PROGRAMS = {}
+_EXECUTORS = {}
+_POOL = None
+
+
+class TestWithoutPIR:
+    """A context manager to test the static graph without pir mode."""
+
+    def __init__(self, obj) -> None:
+        self.obj = obj
+        self.flag = obj.support_pir
+
+    def __enter__(self):
+        self.obj.change(False)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.obj.change(self.flag)
+
+
+class APIBase(object):
+    """
+    API test base object
+    """
+
+    # 目录策略, 由各目录apibase.py的子类覆盖
+    # 数值梯度默认差分方式: forward / central
+    GRAD_METHOD = "forward"
+    # kwargs中的ndarray list是否作为Tensor list输入并求梯度
+    TENSOR_LIST = False
+
+    def _layertypes(self, func):
+        """
+        define layertypes
+        """
+        types = {0: "func", 1: "class"}
+        # 设置函数执行方式，函数式还是声明式.
+        if isfunction(func):
+            self.__layertype = types[0]
+        else:
+            self.__layertype = types[1]
+
+    def __init__(self, func):
+        self.seed = 33
+        np.random.seed(self.seed)
+        # pir mode supportion
+        self.support_pir = True
+        # debug mode
+        self.debug = False
+        # if debug mode=True choose whether test dygrpah or static
+        self.dygraph = True
+        self.static = True
+        self.enable_backward = True
+        self.dtype = None
+        # function for paddle api
+        self.func = func
+        self.types = []
+        self.places = []
+        self.backward_dtype = [np.float16, np.float32, np.float64]
+        # no grad var
+        self.no_grad_var = []
+        # calculate grad delta, You can rewrite these value
+        self.delta = 1e-6
+        self.gap = 0.001
+        self.rtol = 1e-7
+        # numeric grad engine: forward/central difference, stack perturbed inputs as a batch if api supports
+        self.grad_method = self.GRAD_METHOD
+        self.grad_batch = True
+        self.grad_batch_budget = 2**24
+        # choose layertypes [functional or classional]
+        self._layertypes(func)
+        # run hook, use user define vars and initials
+        self.hook()
+        # check self.types
+        if not isinstance(self.types, list):
+            raise TypeError("Types must be a list.")
+        if len(self.types) == 0:
+            raise TypeError("You must define types in hook function.")
+        # 设置执行device
+        if len(self.places) == 0 and paddle.device.is_compiled_with_cuda() is True:
+            self.places = [paddle.CPUPlace(), paddle.CUDAPlace(0)]
+        else:
+            # default
+            self.places = [paddle.CPUPlace()]
+        # 日志等级
+        if self.debug:
+            logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
+        else:
+            logging.basicConfig(level=logging.ERROR, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    def change(self, support_pir: bool) -> None:
+        """
+        Change support_pir to control whether test with pir mode.
+        """
+        self.support_pir = support_pir
+
+    def hook(self):
+        """
+        hook function
+        """
+        raise NotImplementedError
+
+    def base(self, res, data=None, **kwargs):
+        """
+        base test for usual tests
+        such as dtype test, broadcast test etc.
+        """
+        self._check_dtype(res, data, **kwargs)
+
+    def exception(self, etype, mode="c", data=None, **kwargs):
+        """
+        exception test
+        TODO: 框架还没有实现异常处理部分，现在异常没有类型
+        """
+        # 禁止输入res
+        if "res" in kwargs.keys():
+            assert False, "exception检测不需要输入res参数"
+        # 复用前向计算函数， 随便定义res
+        res = np.array([0])
+        if mode == "c":
+            try:
+                self.run(res, data, **kwargs)
+            except Exception as e:
+                e = str(e)
+                if etype in e:
+                    assert True
+                else:
+                    assert False, "异常校验失败,异常类型为" + etype
+        if mode == "python":
+            with pytest.raises(etype):
+                self.run(res, data, **kwargs)
+
+    def run(self, res, data=None, **kwargs):
+        """
+        run
+        Args:
+            res: expect result
+            **kwargs: kwargs
+
+        Returns:
+            Assertion
+        """
+        # 取默认type
+        if np.float64 in self.types:
+            self.dtype = np.float64
+        else:
+            self.dtype = self.types[0]
+        for place in self.places:
+            self.place = place
+            logging.info("[Place] is ===============================>>>>>>>>" + str(self.place))
+            self._baserun(res, data, **kwargs)
+
+    def _baserun(self, res, data=None, **kwargs):
+        """
+        baserun
+        Args:
+            res: expect result
+            **kwargs: kwargs
+
+        Returns:
+            Assertion
+        """
+        # (1) start run paddle dygraph
+        if self.dygraph:
+            paddle.disable_static(self.place)
+            if isinstance(self.place, paddle.CPUPlace):
+                paddle.set_device("cpu")
+            else:
+                paddle.set_device("gpu:0")
+            paddle.seed(self.seed)
+            logging.info("[start] run " + self.__class__.__name__ + " dygraph")
+            self._check_params(res, data, **kwargs)
+
+            # ① calculate forward result
+            dygraph_forward_res = self._dygraph_forward()
+            # ② check forward result
+            if isinstance(dygraph_forward_res, (list, tuple)):
+                compare(dygraph_forward_res, res, self.delta, self.rtol)
+                if self.debug:
+                    logging.info("dygraph forward result is :")
+                    logging.info(dygraph_forward_res)
+            else:
+                compare(dygraph_forward_res.numpy(False), res, self.delta, self.rtol)
+                if self.debug:
+                    logging.info("dygraph forward result is :")
+                    logging.info(dygraph_forward_res.numpy(False))
+            # ③ calculate backward result
+            if self.enable_backward:
+                dygraph_backward_res = self._dygraph_backward(dygraph_forward_res)
+                if self.debug:
+                    logging.info("[dygraph grad]")
+                    logging.info(dygraph_backward_res)
+
+        # (2) start run paddle static
+        if self.static and self.support_pir:
+            paddle.enable_static()
+            logging.info("[start] run " + self.__class__.__name__ + " static")
+            # ① calculate forward and backward result
+            if self.enable_backward:
+                static_forward_res, static_backward_res = self._static_forward(res, data, **kwargs)
+            else:
+                static_forward_res = self._static_forward(res, data, **kwargs)
+            if self.debug:
+                logging.info("static forward result is :")
+                logging.info(static_forward_res)
+                if self.enable_backward:
+                    logging.info("[static grad]")
+                    logging.info(static_backward_res)
+            # ② compare forward result
+            compare(static_forward_res, res, self.delta, self.rtol)
+
+        # (3) check gradient
+        if self.enable_backward:
+            # ① calculate numerical gradient
+            grad = self.compute_grad(res, data, **kwargs)
+            if self.debug:
+                logging.info("[numeric grad]")
+                logging.info(grad)
+            # ② compare gradient
+            if self.dygraph and self.static and self.support_pir:
+                compare_grad(static_backward_res, dygraph_backward_res, mode="both", no_grad_var=self.no_grad_var)
+            if self.dygraph:
+                compare_grad(
+                    dygraph_backward_res,
+                    grad,
+                    mode="dygraph",
+                    delta=self.delta,
+                    rtol=self.rtol,
+                    no_grad_var=self.no_grad_var,
+                )
+            if self.static and self.support_pir:
+                compare_grad(
+                    static_backward_res,
+                    grad,
+                    mode="static",
+                    delta=self.delta,
+                    rtol=self.rtol,
+                    no_grad_var=self.no_grad_var,
+                )
+
+    def _check_dtype(self, res, data, **kwargs):
+        """
+        check dtype
+        Args:
+            res: expect result
+            **kwargs: kwargs
+
+        Returns:
+            Assertion
+        """
+        # check whether dtype is wrong, but it won't stop test cases behind, it will report at last
+        # remember user enable_backward
+        backward_tag = self.enable_backward
+        # 判断是否应该做反向计算，只有float类型的需要反向，同时如果api明确没有反向，需要根据配置进行反向截断。
+        tasks = [
+            (i, dtype, dtype in self.backward_dtype and backward_tag)
+            for i in range(len(self.places))
+            for dtype in self.types
+        ]
+        workers = min(WORKERS, len(tasks))
+        payload = self._pool_payload(res, data, kwargs) if workers > 1 else None
+        if payload is not None:
+            self._pool_check_dtype(tasks, workers, payload)
+        else:
+            for i, dtype, enable_backward in tasks:
+                self.place = self.places[i]
+                logging.info("[Place] is ===============================>>>>>>>>" + str(self.place))
+                self.enable_backward = enable_backward
+                logging.info("[test dtype] " + self.__class__.__name__ + str(dtype))
+                try:
+                    self.dtype = dtype
+                    self._baserun(res, data, **kwargs)
+                except Exception as e:
+                    logging.error("[test dtype] " + self.__class__.__name__ + str(dtype) + " failed!!!")
+                    if self.debug:
+                        logging.error(e)
+                    assert False, "[Place {}] type check Error {}".format(str(self.place), str(dtype))
+        self.dtype = None
+        self.enable_backward = backward_tag
+
+    def _pool_payload(self, res, data, kwargs):
+        """
+        进程池任务的pickle数据, 含GPU place或case无法pickle(如func为lambda)时返回None, 串行执行
+        """
+        if not all(isinstance(place, paddle.CPUPlace) for place in self.places):
+            return None
+        try:
+            return pickle.dumps((self, res, data, kwargs))
+        except Exception as e:
+            logging.info("[test dtype] " + self.__class__.__name__ + " can not run in pool: " + str(e))
+            return None
+
+    def _pool_check_dtype(self, tasks, workers, payload):
+        """
+        进程池中执行(place, dtype), 全部完成后按顺序报告第一个失败
+        """
+        errors = _get_pool(workers).map(_pool_baserun, [(payload, task) for task in tasks], chunksize=1)
+        for (i, dtype, _), error in zip(tasks, errors):
+            if error is not None:
+                logging.error("[test dtype] " + self.__class__.__name__ + str(dtype) + " failed!!!")
+                logging.error(error)
+                assert False, "[Place {}] type check Error {}".format(str(self.places[i]), str(dtype))
+
+    def __getstate__(self):
+        """
+        进程池传递case时只保留配置, 运行时的Tensor不传递, place无法pickle, 只记录CPUPlace个数
+        """
+        state = {k: v for k, v in self.__dict__.items() if k not in ("kwargs", "data", "res", "place", "places")}
+        state["places"] = len(self.places)
+        return state
+
+    def __setstate__(self, state):
+        """
+        恢复配置, places全部为CPUPlace
+        """
+        self.__dict__.update(state)
+        self.places = [paddle.CPUPlace() for _ in range(state["places"])]
+
+    def _is_tensor_list(self, v, types):
+        """目录策略允许时, kwargs中元素为types的list视为Tensor list"""
+        return self.TENSOR_LIST and isinstance(v, (list, tuple)) and len(v) > 0 and isinstance(v[0], types)
+
+    def _check_params(self, res, data=None, **kwargs):
+        """
+        check params
+        Args:
+            res: expect result
+            **kwargs: kwargs
+        Returns:
+            None
+        """
+        if not isinstance(res, (list, tuple, np.generic, np.ndarray)):
+            raise TypeError("res must be numpy")
+        self.kwargs = copy.deepcopy(kwargs)
+        for k, v in self.kwargs.items():
+            if isinstance(v, (np.generic, np.ndarray)):
+                # no_grad_Var不需要转换类型
+                if self.no_grad_var is not None and k in self.no_grad_var:
+                    self.kwargs[k] = to_tensor(v)
+                else:
+                    self.kwargs[k] = to_tensor(v.astype(self.dtype))
+                # enable compute gradient
+                if self.enable_backward is True:
+                    self.kwargs[k].stop_gradient = False
+            elif self._is_tensor_list(v, (np.generic, np.ndarray)):
+                self.kwargs[k] = [to_tensor(i.astype(self.dtype)) for i in v]
+                if self.enable_backward is True:
+                    for t in self.kwargs[k]:
+                        t.stop_gradient = False
+        if data is not None:
+            self.data = to_tensor(data.astype(self.dtype))
+            # enable compute gradient
+            if self.enable_backward is True:
+                self.data.stop_gradient = False
+        self.res = res
+
+    def compute_grad(self, res, data=None, **kwargs):
+        """numeric compute grad, compute by dygraph forward
+
+        Args:
+            res (int|float): [result]
+            data ([numpy], optional): [input data]. Defaults to None.
+            delta (float, optional): [delta]. Defaults to 0.001.
+        """
+        paddle.disable_static(self.place)
+        logging.info("[grad] compute " + self.__class__.__name__ + " grad")
+        engine, inputs, names = self._grad_engine(res, data, **kwargs)
+        numeric_grad = engine.grad(inputs, names)
+        paddle.enable_static()
+        return self._group_grad(numeric_grad)
+
+    def check_grad_projection(self, grad, res, data=None, num=3, **kwargs):
+        """random projection check, compare numeric J·v with analytic <grad, v> for num random v,
+        costs 2 * num forwards instead of numel forwards, for large inputs
+
+        Args:
+            grad (dict): [analytic grad, such as dygraph backward result]
+            res (int|float): [result]
+            data ([numpy], optional): [input data]. Defaults to None.
+            num (int, optional): [random directions]. Defaults to 3.
+        """
+        paddle.disable_static(self.place)
+        logging.info("[grad] projection check " + self.__class__.__name__ + " grad")
+        engine, inputs, names = self._grad_engine(res, data, **kwargs)
+        projection = engine.projection(inputs, self._flatten_grad(grad), names, num=num, seed=self.seed)
+        paddle.enable_static()
+        # 按sum(|grad|*|v|)归一化后对比
+        numeric = np.array([p[0] / p[2] for p in projection])
+        analytic = np.array([p[1] / p[2] for p in projection])
+        compare(numeric, analytic, max(self.delta, 5e-3), max(self.rtol, 1e-3))
+
+    def _grad_engine(self, res, data=None, **kwargs):
+        """numeric grad engine, inputs and names to be perturbed,
+        Tensor list in kwargs is flattened to (k, n) inputs"""
+        self._check_params(res, data, **kwargs)
+
+        def forward(inputs):
+            params = dict(self.kwargs)
+            for key, v in inputs.items():
+                if data is not None and key == "data":
+                    continue
+                if isinstance(key, tuple):
+                    params[key[0]] = list(params[key[0]])
+                    params[key[0]][key[1]] = v
+                else:
+                    params[key] = v
+            if self.__layertype == "func":
+                return self.func(**params)
+            # class layer按扰动后的kwargs重新构建, 没有data输入时直接前向
+            obj = self.func(**params)
+            if data is not None:
+                return obj(inputs["data"])
+            return obj(self.data) if getattr(self, "data", None) is not None else obj()
+
+        if data is None:
+            inputs = {}
+            for k, v in self.kwargs.items():
+                if isinstance(v, paddle.Tensor):
+                    inputs[k] = v
+                elif self._is_tensor_list(v, paddle.Tensor):
+                    for n, t in enumerate(v):
+                        inputs[(k, n)] = t
+            no_grad_var = self.no_grad_var or []
+            names = [key for key in inputs.keys() if (key[0] if isinstance(key, tuple) else key) not in no_grad_var]
+        else:
+            inputs = {"data": to_tensor(data.astype(self.dtype))}
+            names = ["data"]
+        engine = NumericGrad(
+            forward,
+            gap=self.gap,
+            method=self.grad_method,
+            batch=self.grad_batch,
+            budget=self.grad_batch_budget,
+            dtype=self.dtype,
+            stop_gradient=self.enable_backward is not True,
+        )
+        return engine, inputs, names
+
+    @staticmethod
+    def _group_grad(grad):
+        """regroup (k, n) grads to list"""
+        res = {}
+        for key, v in grad.items():
+            if isinstance(key, tuple):
+                res.setdefault(key[0], []).append(v)
+            else:
+                res[key] = v
+        return res
+
+    @staticmethod
+    def _flatten_grad(grad):
+        """flatten list grads to (k, n)"""
+        res = {}
+        for key, v in grad.items():
+            if isinstance(v, (list, tuple)):
+                for n, g in enumerate(v):
+                    res[(key, n)] = g
+            else:
+                res[key] = v
+        return res
+
+    def _dygraph_forward(self):
+        """
+        _dygraph_forward
+        Returns:
+            result
+        """
+        if self.__layertype == "func":
+            for k, v in self.kwargs.items():
+                if isinstance(v, paddle.Tensor):
+                    v.retain_grads()
+            res = self.func(**self.kwargs)
+            return res
+        elif self.__layertype == "class":
+            obj = self.func(**self.kwargs)
+            self.data.retain_grads()
+            res = obj(self.data)
+            return res
+
+    def _dygraph_backward(self, res):
+        """dygraph backward
+
+        Args:
+            res ([variable]): forward_res
+        """
+        if isinstance(res, (list, tuple)):
+            loss = paddle.mean(res[0])
+        else:
+            loss = paddle.mean(res)
+        loss.backward()
+        grad = {}
+        for k, v in self.kwargs.items():
+            # 判断是不是Variable类型
+            if isinstance(v, paddle.Tensor):
+                grad[k] = v.gradient()
+            elif self._is_tensor_list(v, paddle.Tensor):
+                grad[k] = [t.gradient() for t in v]
+        if self.__layertype == "class":
+            grad["data"] = self.data.gradient()
+        return grad
+
+    def _static_forward(self, res, data=None, **kwargs):
+        """
+        _static_forward, 同一签名的Program只构建一次, 之后只更新feed
+        """
+        key = self._static_key(data, kwargs)
+        if key is None or key not in _STATIC_PROGRAMS:
+            program = self._build_static(data, kwargs)
+            if key is not None:
+                _STATIC_PROGRAMS[key] = program
+        else:
+            program = _STATIC_PROGRAMS[key]
+        main_program, scope, fetch_list, out_num, grad_keys = program
+        feed = {}
+        for k, v in kwargs.items():
+            if isinstance(v, (np.generic, np.ndarray)):
+                # no_grad_Var不需要转换类型
+                if self.no_grad_var is not None and k in self.no_grad_var:
+                    feed[k] = v
+                else:
+                    feed[k] = v.astype(self.dtype)
+            elif self._is_tensor_list(v, (np.generic, np.ndarray)):
+                for i, item in enumerate(v):
+                    feed[k + str(i)] = item.astype(self.dtype)
+        if self.__layertype == "class" and data is not None:
+            feed["data"] = data.astype(self.dtype)
+        paddle.seed(self.seed)
+        res = self._executor().run(main_program, feed=feed, fetch_list=fetch_list, scope=scope, return_numpy=True)
+        if not self.enable_backward:
+            return res[0]
+        grad = {}
+        for (k, n), value in zip(grad_keys, res[out_num:]):
+            if n is None:
+                grad[k] = value
+            else:
+                grad.setdefault(k, []).append(value)
+        return res[0], grad
+
+    def _static_key(self, data, kwargs):
+        """
+        静态图缓存签名, 非数组参数无法稳定表示(如ParamAttr等对象)时返回None, 不缓存
+        """
+        if not STATIC_CACHE:
+            return None
+        items = []
+        for k, v in kwargs.items():
+            if isinstance(v, (np.generic, np.ndarray)):
+                dtype = str(v.dtype) if self.no_grad_var is not None and k in self.no_grad_var else None
+                items.append((k, "array", np.shape(v), dtype))
+            elif self._is_tensor_list(v, (np.generic, np.ndarray)):
+                items.append((k, "array_list", tuple(np.shape(i) for i in v)))
+            else:
+                signature = _signature(v)
+                if signature is None:
+                    return None
+                items.append((k, signature))
+        return (
+            self.__class__,
+            self.func,
+            self.__layertype,
+            self.seed,
+            str(self.place),
+            str(self.dtype),
+            self.enable_backward,
+            tuple(self.no_grad_var or []),
+            paddle.framework.in_pir_mode(),
+            None if data is None else np.shape(data),
+            tuple(items),
+        )
+
+    def _executor(self):
+        """每个place复用一个Executor"""
+        if str(self.place) not in _EXECUTORS:
+            _EXECUTORS[str(self.place)] = paddle.static.Executor(self.place)
+        return _EXECUTORS[str(self.place)]
+
+    def _build_static(self, data, kwargs):
+        """
+        构建静态图并在独立Scope中执行startup
+        Returns:
+            (main_program, scope, fetch_list, 输出个数, 梯度对应的(k, n))
+        """
+        main_program = paddle.static.Program()
+        startup_program = paddle.static.Program()
+        if self.__layertype == "func":
+            paddle.seed(self.seed)
+        else:
+            main_program.random_seed = self.seed
+            startup_program.random_seed = self.seed
+        params = copy.deepcopy(kwargs)
+        grad_keys = []
+        with paddle.utils.unique_name.guard():
+            with paddle.static.program_guard(main_program=main_program, startup_program=startup_program):
+                for k, v in kwargs.items():
+                    if isinstance(v, (np.generic, np.ndarray)):
+                        # no_grad_Var不需要转换类型
+                        if self.no_grad_var is not None and k in self.no_grad_var:
+                            params[k] = paddle.static.data(name=k, shape=v.shape, dtype=v.dtype)
+                        else:
+                            params[k] = paddle.static.data(name=k, shape=v.shape, dtype=self.dtype)
+                            grad_keys.append((k, None))
+                        # enable compute gradient
+                        if self.enable_backward is True:
+                            params[k].stop_gradient = False
+                    elif self._is_tensor_list(v, (np.generic, np.ndarray)):
+                        params[k] = []
+                        for i, item in enumerate(v):
+                            params[k].append(paddle.static.data(name=k + str(i), shape=item.shape, dtype=self.dtype))
+                            grad_keys.append((k, i))
+                            if self.enable_backward is True:
+                                params[k][i].stop_gradient = False
+                if self.__layertype == "func":
+                    output = self.func(**params)
+                    inputs = [params[k] if i is None else params[k][i] for k, i in grad_keys]
+                else:
+                    x = self.data
+                    if data is not None:
+                        x = paddle.static.data(name="data", shape=data.shape, dtype=self.dtype)
+                        if self.enable_backward is True:
+                            x.stop_gradient = False
+                    output = self.func(**params)(x)
+                    grad_keys = [("data", None)]
+                    inputs = [x]
+                fetch_list = list(output) if isinstance(output, (list, tuple)) else [output]
+                out_num = len(fetch_list)
+                if self.enable_backward:
+                    loss = paddle.mean(fetch_list[0])
+                    for x in inputs:
+                        fetch_list.append(paddle.static.gradients(loss, x)[0])
+        scope = paddle.static.Scope()
+        self._executor().run(startup_program, scope=scope)
+        return main_program, scope, fetch_list, out_num, grad_keys
+
+
+def _get_pool(workers):
+    """
+    常驻进程池, forkserver预先import paddle, worker在进程退出前一直复用
+    """
+    global _POOL
+    if _POOL is None or _POOL._processes != workers:
+        if _POOL is not None:
+            _POOL.terminate()
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["numpy", "paddle"])
+        _POOL = ctx.Pool(workers)
+    return _POOL
+
+
+def _pool_baserun(args):
+    """进程池worker, 执行一个(place, dtype), 返回失败信息或None"""
+    payload, (i, dtype, enable_backward) = args
+    obj, res, data, kwargs = pickle.loads(payload)
+    obj.place = obj.places[i]
+    obj.dtype = dtype
+    obj.enable_backward = enable_backward
+    logging.info("[test dtype] " + obj.__class__.__name__ + str(dtype))
+    try:
+        obj._baserun(res, data, **kwargs)
+    except Exception:
+        return traceback.format_exc()
+    return None
+
+
+def _signature(v):
+    """非数组参数的签名, 只接受值可以由repr完整表示的类型, 否则返回None"""
+    if v is None or isinstance(v, (bool, int, float, complex, str, type, np.generic, np.dtype, paddle.dtype)):
+        return type(v).__name__, repr(v)
+    if isinstance(v, (list, tuple)):
+        items = [_signature(i) for i in v]
+        if any(i is None for i in items):
+            return None
+        return type(v).__name__, tuple(items)
+    if isinstance(v, dict):
+        items = [(k, _signature(i)) for k, i in v.items()]
+        if any(i is None for _, i in items):
+            return None
+        return "dict", tuple(items)
+    return None
+
+
+def compare_grad(result, expect, delta=1e-6, rtol=0.001, mode=None, no_grad_var=None):
+    """compare grad
+
+    Args:
+        result ([dict]): [result]
+        expect ([dict]): [expect]
+        delta ([delta], optional): [delta]. Defaults to 1e-6.
+    """
+    if delta < 1e-4:
+        delta = 1e-3 * 5
+    if rtol < 1e-4:
+        rtol = 1e-3
+    logging.info("[{}] start check grad:".format(mode))
+    if no_grad_var is not None:
+        for key in no_grad_var:
+            if key in result.keys():
+                result.pop(key)
+            if key in expect.keys():
+                expect.pop(key)
+    if result.keys() != expect.keys():
+        logging.error(result.keys())
+        logging.error(expect.keys())
+        assert False, "grad KeyError"
+    for k in result.keys():
+        logging.info("check " + k + " grad ... ")
+        compare(result[k], expect[k], delta, rtol)
+        logging.info("check " + k + " grad ... ok")
+
+
+def compare(result, expect, delta=1e-6, rtol=1e-5):
+    """
+    比较函数
+    :param result: 输入值
+    :param expect: 输出值
+    :param delta: 误差值
+    :return:
+    """
+    if isinstance(result, np.ndarray):
+        expect = np.array(expect)
+        res = np.allclose(result, expect, atol=delta, rtol=rtol, equal_nan=True)
+        # 出错打印错误数据
+        if res is False:
+            logging.error("the result is {}".format(result))
+            logging.error("the expect is {}".format(expect))
+        assert res
+        assert result.shape == expect.shape
+    elif isinstance(result, (list, tuple)):
+        for i, j in enumerate(result):
+            if isinstance(j, (np.generic, np.ndarray)):
+                compare(j, expect[i], delta, rtol)
+            else:
+                compare(j.numpy(False), expect[i], delta, rtol)
+    elif isinstance(result, str):
+        res = result == expect
+        if res is False:
+            logging.error("the result is {}".format(result))
+            logging.error("the expect is {}".format(expect))
+        assert res
+    else:
+        assert result == pytest.approx(expect, delta)
+
+
+def randtool(dtype, low, high, shape):
+    """
+    np random tools
+    """
+    if dtype == "int":
+        return np.random.randint(low, high, shape)
+
+    elif dtype == "float":
+        return low + (high - low) * np.random.random(shape)
+
+
+def sigmoid(x):
+    """
+    sigmoid
+    """
+    return 1 / (1 + np.exp(-x))
+
+
+def tanh(x):
+    """
+    tanh
+    """
+    s1 = np.exp(x) - np.exp(-x)
+    s2 = np.exp(x) + np.exp(-x)
+    s = s1 / s2
+    return s
+
+
+def relu(x):
+    """
+    relu
+    """
+    s = np.where(x < 0, 0, x)
+    return s
@@ -0,0 +1,285 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+数值梯度引擎, 供各目录apibase.py的compute_grad使用
+api支持在输入最前面增加一维时, 把全部扰动输入沿新维度堆叠成batch一次前向,
+否则退化为缓存数组的逐元素扰动; 支持前向/中心差分及随机投影方向导数校验
+"""
+
+import time
+import numpy as np
+import paddle
+from paddle import to_tensor
+
+
+class NumericGrad(object):
+    """
+    numeric grad engine
+    """
+
+    METHODS = ["forward", "central"]
+
+    def __init__(
+        self, forward, gap=0.001, method="forward", batch=True, budget=2**24, dtype=None, stop_gradient=True
+    ):
+        """
+        :param forward: 前向函数, forward(inputs) 返回输出Tensor(list/tuple时取第一个), inputs为{name: Tensor}
+        :param gap: 扰动步长
+        :param method: forward 前向差分 / central 中心差分
+        :param batch: 是否尝试batch扰动
+        :param budget: 单个batch的元素数上限(按输入与输出中较大者计算)
+        :param dtype: 扰动输入转换的数据类型, None表示保持输入原类型
+        :param stop_gradient: 扰动输入的stop_gradient, api内部需要求导(如jvp/vjp)时设为False
+        """
+        if method not in self.METHODS:
+            raise Exception("unknown grad method {}, only support {}".format(method, self.METHODS))
+        self.forward = forward
+        self.gap = gap
+        self.method = method
+        self.batch = batch
+        self.budget = budget
+        self.dtype = dtype
+        self.stop_gradient = stop_gradient
+
+    def _array(self, tensor):
+        """
+        Tensor转为numpy数组
+        """
+        value = tensor.numpy()
+        if self.dtype is not None:
+            value = value.astype(self.dtype)
+        return value
+
+    def _tensor(self, value):
+        """
+        numpy数组转为扰动输入Tensor
+        """
+        tensor = to_tensor(value)
+        tensor.stop_gradient = self.stop_gradient
+        return tensor
+
+    def _output(self, inputs, name=None, value=None):
+        """
+        替换inputs中name对应的输入后执行前向, 返回第一个输出
+        """
+        if name is not None:
+            inputs = dict(inputs)
+            inputs[name] = self._tensor(value)
+        out = self.forward(inputs)
+        if isinstance(out, (list, tuple)):
+            out = out[0]
+        return out
+
+    def _loss(self, inputs, name=None, value=None):
+        """
+        单个输入的loss, 与APIBase中mean(res)一致
+        """
+        return paddle.mean(self._output(inputs, name, value)).numpy()
+
+    def _batch_loss(self, inputs, name, batch, shape):
+        """
+        batch输入(rows, numel)按行计算loss
+        """
+        rows = batch.shape[0]
+        out = self._output(inputs, name, batch.reshape((rows,) + shape))
+        return paddle.mean(paddle.reshape(out, [rows, -1]), axis=1).numpy()
+
+    @staticmethod
+    def _stack(flat, index, step):
+        """
+        以flat为基准构造(len(index), numel)的扰动batch, 第i行的index[i]号元素加step[i]
+        """
+        batch = np.repeat(flat[np.newaxis], len(index), axis=0)
+        batch[np.arange(len(index)), index] += np.asarray(step, dtype=flat.dtype)
+        return batch
+
+    def _batchable(self, inputs, name, flat, shape):
+        """
+        探测api是否支持batch扰动: 输出需为(rows, *单输入输出shape), 且每行与单独前向结果一致
+        :return: (单输入输出的元素数, 单次前向耗时), 不支持时返回None
+        """
+        idx = flat.size // 2
+        batch = self._stack(flat, [idx, idx, idx], [0, self.gap, -self.gap])
+        expect = []
+        cost = float("inf")
+        try:
+            for row in batch:
+                start = time.perf_counter()
+                expect.append(self._output(inputs, name, row.reshape(shape)).numpy())
+                cost = min(cost, time.perf_counter() - start)
+            out = self._output(inputs, name, batch.reshape((3,) + shape)).numpy()
+        except Exception:
+            return None
+        if out.shape != (3,) + expect[0].shape:
+            return None
+        for row, exp in zip(out, expect):
+            if not np.allclose(row, exp, rtol=1e-4, atol=1e-6, equal_nan=True):
+                return None
+        return max(expect[0].size, 1), cost
+
+    def _batch_grad(self, inputs, name, flat, shape, out_numel, element_cost):
+        """
+        batch模式: 每个chunk一次前向
+        输入较大而单次前向很轻时, 堆叠带来的内存拷贝会超过逐元素前向的开销,
+        因此首个chunk后按实测单元素耗时与element_cost比较, 更慢则剩余元素改用逐元素模式
+        """
+        numel = flat.size
+        chunk = max(self.budget // max(numel, out_numel), 1)
+        grad = []
+        for start in range(0, numel, chunk):
+            index = np.arange(start, min(start + chunk, numel))
+            begin = time.perf_counter()
+            if self.method == "central":
+                batch = self._stack(
+                    flat, np.concatenate([index, index]), [self.gap] * len(index) + [-self.gap] * len(index)
+                )
+                loss = self._batch_loss(inputs, name, batch, shape)
+                grad.append((loss[: len(index)] - loss[len(index) :]) / self.gap / 2)
+            else:
+                # 每个chunk带一行基准输入, 保证基准loss与扰动loss走同一个reduce
+                batch = self._stack(flat, np.concatenate([[0], index]), [0] + [self.gap] * len(index))
+                loss = self._batch_loss(inputs, name, batch, shape)
+                grad.append((loss[1:] - loss[0]) / self.gap)
+            if start == 0 and index[-1] + 1 < numel and (time.perf_counter() - begin) / len(index) > element_cost:
+                grad.append(self._element_grad(inputs, name, flat, shape, range(index[-1] + 1, numel)))
+                break
+        return np.concatenate(grad)
+
+    def _element_grad(self, inputs, name, flat, shape, index=None):
+        """
+        逐元素模式: 原地扰动缓存的数组, 前向后复原
+        """
+        base = None if self.method == "central" else self._loss(inputs, name, flat.reshape(shape))
+        grad = []
+        for i in range(flat.size) if index is None else index:
+            orig = flat[i]
+            flat[i] = orig + self.gap
+            loss_pos = self._loss(inputs, name, flat.reshape(shape))
+            if self.method == "central":
+                flat[i] = orig - self.gap
+                g = (loss_pos - self._loss(inputs, name, flat.reshape(shape))) / self.gap / 2
+            else:
+                g = (loss_pos - base) / self.gap
+            flat[i] = orig
+            grad.append(g.item())
+        return np.array(grad)
+
+    def grad(self, inputs, names):
+        """
+        计算数值梯度
+        :param inputs: {name: Tensor}, 前向所需的全部Tensor输入
+        :param names: 需要计算梯度的输入名list
+        :return: {name: numpy梯度}
+        """
+        numeric_grad = {}
+        for name in names:
+            value = self._array(inputs[name])
+            shape = value.shape
+            flat = value.flatten()
+            probe = self._batchable(inputs, name, flat, shape) if self.batch and flat.size > 1 else None
+            if probe is None:
+                grad = self._element_grad(inputs, name, flat, shape)
+            else:
+                grad = self._batch_grad(inputs, name, flat, shape, *probe)
+            numeric_grad[name] = np.asarray(grad).reshape(shape)
+        return numeric_grad
+
+    def projection(self, inputs, analytic, names, num=3, seed=33):
+        """
+        随机投影方向导数校验: 沿随机方向v中心差分得到J·v, 与解析梯度的<grad, v>对比, 每个方向只需两次前向
+        :param analytic: {name: 解析梯度}
+        :return: [(数值J·v, 解析<grad, v>, 量级sum(|grad|*|v|)), ...], 对比时应按量级归一化
+        """
+        rng = np.random.RandomState(seed)
+        result = []
+        for _ in range(num):
+            pos, neg = dict(inputs), dict(inputs)
+            expect, scale = 0.0, 0.0
+            for name in names:
+                value = self._array(inputs[name])
+                v = rng.standard_normal(value.shape)
+                v = v / max(np.abs(v).max(), 1e-12)
+                pos[name] = self._tensor((value + self.gap * v).astype(value.dtype))
+                neg[name] = self._tensor((value - self.gap * v).astype(value.dtype))
+                grad = analytic[name]
+                if isinstance(grad, paddle.Tensor):
+                    grad = grad.numpy()
+                expect += np.sum(np.asarray(grad) * v)
+                scale += np.sum(np.abs(grad) * np.abs(v))
+            numeric = (self._loss(pos) - self._loss(neg)) / self.gap / 2
+            result.append((numeric.item(), expect.item(), max(scale.item(), 1e-12)))
+        return result
+
+
+if __name__ == "__main__":
+    # 1. api测试常见规模的输入上逐元素与batch模式的耗时
+    # 2. 对比逐元素扰动(原compute_grad写法)与batch引擎的耗时, 原方法在大输入上按前2000个元素外推;
+    #    输入很大而前向很轻时batch模式首个chunk后会退回逐元素模式, 两者耗时相当
+    import copy
+
+    paddle.disable_static()
+    limit = 2000
+
+    ops = {
+        "tanh(x) * y [100]": (lambda i: paddle.tanh(i["x"]) * i["y"], [100], [100]),
+        "matmul [16, 16]": (lambda i: paddle.matmul(i["x"], i["y"]), [16, 16], [16, 16]),
+        "matmul [32, 32]": (lambda i: paddle.matmul(i["x"], i["y"]), [32, 32], [32, 32]),
+        "softmax(x) * y [8, 64]": (lambda i: paddle.nn.functional.softmax(i["x"]) * i["y"], [8, 64], [8, 64]),
+    }
+    for name, (func, x_shape, y_shape) in ops.items():
+        inputs = {"x": to_tensor(np.random.rand(*x_shape)), "y": to_tensor(np.random.rand(*y_shape))}
+        costs = {}
+        grads = {}
+        for mode, batch in [("element", False), ("batch", True)]:
+            engine = NumericGrad(func, batch=batch)
+            start = time.perf_counter()
+            grads[mode] = engine.grad(inputs, ["x"])["x"]
+            costs[mode] = time.perf_counter() - start
+        assert np.allclose(grads["element"], grads["batch"], rtol=1e-4, atol=1e-6)
+        print(
+            "{:<24} element {:7.4f}s, batch {:7.4f}s, speedup {:.1f}x".format(
+                name, costs["element"], costs["batch"], costs["element"] / costs["batch"]
+            )
+        )
+
+    def forward(inputs):
+        """被测函数"""
+        return paddle.tanh(inputs["x"]) * inputs["y"]
+
+    for numel in [1000, 10000, 100000]:
+        x = np.random.rand(numel).astype("float64")
+        inputs = {"x": to_tensor(x), "y": to_tensor(np.random.rand(numel))}
+
+        start = time.perf_counter()
+        loss = paddle.mean(forward(inputs)).numpy()
+        old_grad = []
+        v = inputs["x"]
+        for i in range(min(numel, limit)):
+            tmp = copy.deepcopy(v.numpy().flatten())
+            tmp[i] = tmp[i] + 0.001
+            loss_delta = paddle.mean(forward(dict(inputs, x=to_tensor(tmp)))).numpy()
+            old_grad.append(((loss_delta - loss) / 0.001).item())
+        old_cost = (time.perf_counter() - start) * numel / min(numel, limit)
+
+        costs = {}
+        for mode, batch in [("element", False), ("batch", True)]:
+            engine = NumericGrad(forward, batch=batch)
+            start = time.perf_counter()
+            grad = engine.grad(inputs, ["x"])["x"]
+            costs[mode] = time.perf_counter() - start
+            assert np.allclose(grad[: len(old_grad)], old_grad, rtol=1e-4, atol=1e-6)
+
+        start = time.perf_counter()
+        engine.projection(inputs, {"x": grad}, ["x"], num=3)
+        costs["projection"] = time.perf_counter() - start
+        print(
+            "numel {:>6}: old {:8.3f}s{}, element {:8.3f}s, batch {:8.3f}s, projection(3) {:6.3f}s".format(
+                numel,
+                old_cost,
+                "(extrapolated)" if numel > limit else "",
+                costs["element"],
+                costs["batch"],
+                costs["projection"],
+            )
+        )
@@ -0,0 +1,376 @@
+"""
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+
+import os
+import csv
+import glob
+import json
+import time
+import logging
+import argparse
+import threading
+import itertools
+
+import numpy as np
+
+from paddle.inference import Config
+from paddle.inference import create_predictor
+from paddle.inference import PrecisionType
+
+
+FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+logging.basicConfig(level=logging.INFO, format=FORMAT)
+logger = logging.getLogger(__name__)
+
+# 输出表格列, 与parse_log.py中的列名保持一致
+COLUMNS = [
+    "frame_work",
+    "model_name",
+    "batch_size",
+    "device",
+    "trt_precision",
+    "cpu_math_library_num_threads",
+    "mkldnn",
+    "Average_latency(ms)",
+    "QPS",
+    "p50(ms)",
+    "p90(ms)",
+    "p99(ms)",
+    "max(ms)",
+    "throughput(samples/s)",
+    "peak_rss(MB)",
+    "warmup_times",
+    "warmup_converged",
+    "repeats",
+]
+
+
+def find_model(model_dir):
+    """
+    在model_dir中查找模型文件, 支持inference.pdmodel/model.pdmodel及PIR的.json
+    Args:
+        model_dir : model dir
+    Returns:
+        model_file, params_file
+    """
+    for params_file in sorted(glob.glob(os.path.join(model_dir, "*.pdiparams"))):
+        prefix = params_file[: -len(".pdiparams")]
+        for suffix in [".pdmodel", ".json"]:
+            if os.path.exists(prefix + suffix):
+                return prefix + suffix, params_file
+    raise Exception("can not find *.pdmodel/*.json with *.pdiparams in {}".format(model_dir))
+
+
+def parse_input_spec(input_spec):
+    """
+    解析输入描述, 多个输入以";"分隔, 每个输入为 name:shape:dtype[:low:high]
+    shape以"x"分隔, -1表示batch维; low == high时填充常量, 如
+    "im_shape:-1x2:float32:640:640;image:-1x3x640x640:float32:0:255;scale_factor:-1x2:float32:1:1"
+    也可以传入同样内容的json文件, 格式为[{"name", "shape", "dtype", "low", "high"}, ...]
+    Args:
+        input_spec : input spec string or json file
+    Returns:
+        list of dict
+    """
+    if os.path.exists(input_spec):
+        with open(input_spec) as f:
+            return json.load(f)
+    specs = []
+    for item in input_spec.split(";"):
+        if not item.strip():
+            continue
+        fields = item.strip().split(":")
+        if len(fields) not in [3, 5]:
+            raise Exception("input spec {} should be name:shape:dtype[:low:high]".format(item))
+        spec = {"name": fields[0], "shape": [int(i) for i in fields[1].split("x")], "dtype": fields[2]}
+        if len(fields) == 5:
+            spec["low"], spec["high"] = float(fields[3]), float(fields[4])
+        specs.append(spec)
+    return specs
+
+
+def gen_inputs(specs, batch_size, seed=15):
+    """
+    按输入描述生成随机输入
+    Args:
+        specs : parsed input spec
+        batch_size : batch size, replace -1 in shape
+    Returns:
+        dict of numpy array
+    """
+    rng = np.random.RandomState(seed)
+    inputs = {}
+    for spec in specs:
+        shape = [batch_size if i == -1 else i for i in spec["shape"]]
+        dtype = np.dtype(spec["dtype"])
+        low = spec.get("low", 0)
+        high = spec.get("high", 1 if dtype.kind == "f" else 255)
+        if low == high:
+            inputs[spec["name"]] = np.full(shape, low, dtype=dtype)
+        elif dtype.kind == "f":
+            inputs[spec["name"]] = rng.uniform(low, high, shape).astype(dtype)
+        else:
+            inputs[spec["name"]] = rng.randint(low, high, shape).astype(dtype)
+    return inputs
+
+
+def init_predictor(args, threads, mkldnn):
+    """
+    Args:
+        args : input args
+        threads : cpu math library num threads
+        mkldnn : enable mkldnn or not
+    """
+    config = Config(*find_model(args.model_dir))
+    if args.memory_optim:
+        config.enable_memory_optim()
+    trt_precision_map = {"fp32": PrecisionType.Float32, "fp16": PrecisionType.Half, "int8": PrecisionType.Int8}
+    if args.device == "gpu":
+        config.enable_use_gpu(1000, 0)
+        if args.use_trt:
+            config.enable_tensorrt_engine(
+                1 << 30,  # workspace_size
+                max(args.batch_size),  # max_batch_size
+                3,  # min_subgraph_size
+                trt_precision_map[args.trt_precision],  # precision
+                False,  # use_static
+                args.trt_precision == "int8",  # use_calib_mode
+            )
+    elif args.device == "cpu":
+        if mkldnn:
+            config.enable_mkldnn()
+        else:
+            config.disable_mkldnn()
+    config.set_cpu_math_library_num_threads(threads)
+    return create_predictor(config)
+
+
+class RSSMonitor(object):
+    """
+    进程峰值RSS, 优先重置/proc/self/clear_refs后读取VmHWM, 得到单个配置内的峰值
+    不支持时后台线程采样VmRSS
+    """
+
+    def __init__(self, interval=0.005):
+        """
+        Args:
+            interval : sample interval in seconds
+        """
+        self.interval = interval
+        self.peak = 0
+        self.stop = threading.Event()
+        self.thread = None
+        self.use_hwm = False
+
+    @staticmethod
+    def _status(key):
+        """
+        读取/proc/self/status中的字段, 单位kB
+        """
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(key + ":"):
+                    return int(line.split()[1])
+        return 0
+
+    def _sample(self):
+        """
+        后台采样
+        """
+        while not self.stop.wait(self.interval):
+            self.peak = max(self.peak, self._status("VmRSS"))
+
+    def __enter__(self):
+        """
+        重置峰值, 不支持时启动采样线程
+        """
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+            self.use_hwm = True
+        except Exception:
+            self.use_hwm = False
+        if not self.use_hwm and os.path.exists("/proc/self/status"):
+            self.thread = threading.Thread(target=self._sample, daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        """
+        读取峰值
+        """
+        if self.use_hwm:
+            self.peak = self._status("VmHWM")
+        elif self.thread is not None:
+            self.stop.set()
+            self.thread.join()
+            self.peak = max(self.peak, self._status("VmRSS"))
+        else:
+            import resource
+
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    @property
+    def peak_mb(self):
+        """
+        峰值RSS, 单位MB
+        """
+        return self.peak / 1024.0
+
+
+def timed_run(predictor, number):
+    """
+    逐次计时
+    Returns:
+        list of latency in ms
+    """
+    timer = time.perf_counter
+    res = []
+    for _ in range(number):
+        start = timer()
+        predictor.run()
+        res.append((timer() - start) * 1000)
+    return res
+
+
+def warmup(predictor, window, tol, max_times):
+    """
+    预热直到相邻两个窗口的中位数连续两次相对变化小于tol
+    Returns:
+        warmup times, converged or not
+    """
+    count = 0
+    stable = 0
+    prev = None
+    while count < max_times:
+        median = float(np.median(timed_run(predictor, window)))
+        count += window
+        if prev is not None and abs(median - prev) / prev <= tol:
+            stable += 1
+            if stable >= 2:
+                return count, True
+        else:
+            stable = 0
+        prev = median
+    return count, False
+
+
+def run_cell(args, predictor, inputs, batch_size):
+    """
+    单个配置: 设置输入, 预热收敛后采样
+    Returns:
+        result dict
+    """
+    for name in predictor.get_input_names():
+        input_tensor = predictor.get_input_handle(name)
+        input_tensor.reshape(inputs[name].shape)
+        input_tensor.copy_from_cpu(inputs[name].copy())
+
+    with RSSMonitor() as monitor:
+        warmup_times, converged = warmup(predictor, args.warmup_window, args.warmup_tol, args.max_warmup)
+        latency = np.asarray(timed_run(predictor, args.repeats))
+    p50, p90, p99 = np.percentile(latency, [50, 90, 99])
+    mean = float(latency.mean())
+    return {
+        "Average_latency(ms)": round(mean, 4),
+        "QPS": round(1000 / mean, 4),
+        "p50(ms)": round(float(p50), 4),
+        "p90(ms)": round(float(p90), 4),
+        "p99(ms)": round(float(p99), 4),
+        "max(ms)": round(float(latency.max()), 4),
+        "throughput(samples/s)": round(batch_size * 1000 / mean, 4),
+        "peak_rss(MB)": round(monitor.peak_mb, 2),
+        "warmup_times": warmup_times,
+        "warmup_converged": converged,
+        "repeats": args.repeats,
+    }
+
+
+def int_list(value):
+    """
+    "1,2,4" -> [1, 2, 4]
+    """
+    return [int(i) for i in value.split(",") if i]
+
+
+def parse_args():
+    """
+    parse args
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_dir", type=str, required=True, help="model dir with *.pdiparams")
+    parser.add_argument("--model_name", type=str, default=None, help="model name, default is model dir name")
+    parser.add_argument(
+        "--input_spec", type=str, required=True, help="name:shape:dtype[:low:high];... or json file, -1 is batch"
+    )
+    parser.add_argument("--batch_size", type=int_list, default=[1], help="batch sizes to sweep, e.g. 1,4,8")
+    parser.add_argument("--threads", type=int_list, default=[4], help="cpu math library threads to sweep, e.g. 1,2,4")
+    parser.add_argument("--mkldnn", type=int_list, default=[0], help="mkldnn on/off to sweep, e.g. 0,1")
+    parser.add_argument("--memory_optim", type=int, default=1, help="enable memory optim or not.")
+    parser.add_argument("--device", type=str, default="cpu", help="[gpu,cpu]")
+    parser.add_argument("--use_trt", action="store_true", help="Whether use trt.")
+    parser.add_argument(
+        "--trt_precision", type=str, default="fp32", help="trt precision, choice = ['fp32', 'fp16', 'int8']"
+    )
+    parser.add_argument("--repeats", type=int, default=1000, help="timed runs per cell.")
+    parser.add_argument("--warmup_window", type=int, default=10, help="runs per warmup window.")
+    parser.add_argument("--warmup_tol", type=float, default=0.02, help="warmup window median relative tolerance.")
+    parser.add_argument("--max_warmup", type=int, default=500, help="max warmup runs.")
+    parser.add_argument("--output", type=str, default="benchmark_result.csv", help="output table, .csv or .json")
+    return parser.parse_args()
+
+
+def save_table(rows, output):
+    """
+    保存为csv或json表格
+    """
+    if output.endswith(".json"):
+        with open(output, "w") as f:
+            json.dump(rows, f, indent=2)
+    else:
+        with open(output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def main():
+    """
+    sweep threads x mkldnn x batch_size
+    """
+    args = parse_args()
+    specs = parse_input_spec(args.input_spec)
+    model_name = args.model_name or os.path.basename(os.path.normpath(args.model_dir))
+    # gpu下threads/mkldnn不生效, 只扫batch_size
+    threads_list = args.threads if args.device == "cpu" else args.threads[:1]
+    mkldnn_list = args.mkldnn if args.device == "cpu" else [0]
+
+    rows = []
+    for threads, mkldnn in itertools.product(threads_list, mkldnn_list):
+        predictor = init_predictor(args, threads, mkldnn)
+        for batch_size in args.batch_size:
+            row = {
+                "frame_work": "paddle_model",
+                "model_name": model_name,
+                "batch_size": batch_size,
+                "device": args.device,
+                "trt_precision": args.trt_precision if args.use_trt else "",
+                "cpu_math_library_num_threads": threads,
+                "mkldnn": mkldnn,
+            }
+            row.update(run_cell(args, predictor, gen_inputs(specs, batch_size), batch_size))
+            logger.info(
+                "{model_name} bs={batch_size} threads={cpu_math_library_num_threads} mkldnn={mkldnn}: "
+                "p50 {p50(ms)}ms, p99 {p99(ms)}ms, {throughput(samples/s)} samples/s, "
+                "peak rss {peak_rss(MB)}MB".format(**row)
+            )
+            rows.append(row)
+            save_table(rows, args.output)
+        del predictor
+    logger.info("benchmark table saved to {}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
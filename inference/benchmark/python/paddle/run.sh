@@ -77,3 +77,7 @@ python squeezenet.py --device gpu --batch_size 8 --use_trt True --trt_precision
 python squeezenet.py --device gpu --batch_size 1 --use_trt True --trt_precision int8
 python squeezenet.py --device gpu --batch_size 4 --use_trt True --trt_precision int8
 python squeezenet.py --device gpu --batch_size 8 --use_trt True --trt_precision int8
+
+# 通用driver: cpu下扫threads x mkldnn x batch_size, 输出p50/p90/p99/max延迟、吞吐及峰值RSS表格, parse_log.py可直接读取
+python benchmark.py --model_dir ./ResNet101 --input_spec "x:-1x3x224x224:float32:0:255" --device cpu --threads 1,2,4,8 --mkldnn 0,1 --batch_size 1,4,8 --output logs/resnet101_cpu.csv
+python benchmark.py --model_dir ./fast_rcnn --input_spec "im_shape:-1x2:float32:640:640;image:-1x3x640x640:float32:0:255;scale_factor:-1x2:float32:1:1" --device cpu --threads 1,2,4,8 --mkldnn 0,1 --batch_size 1,4,8 --output logs/fast_rcnn_cpu.csv
@@ -6,6 +6,7 @@ parse benchmark log to excel
 
 import os
 import re
+import sys
 import argparse
 
 from openpyxl import load_workbook
@@ -13,6 +14,21 @@ from openpyxl.styles import *
 from openpyxl.utils import get_column_letter
 import pandas as pd
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../tools"))
+from log_extractor import LogExtractor, Schema
+
+# */paddle/*.py summary_config的输出, Model info为一条记录的开始, Perf info之后为性能数据
+LOG_SCHEMAS = [
+    Schema("model_info", r"-+ Model info -+", keyword="Model info"),
+    Schema("perf_info", r"-+ Perf info -+", keyword="Perf info"),
+    Schema("model", r"(?:^| )name: (?P<model_name>[^, \n]*).* type: .*?(?P<frame_work>\S+)\s*$", keyword="name: "),
+    Schema("batch", r"(?:^| )size: (?P<batch_size>[^, \n]*).* Num ", keyword="size: "),
+    Schema("device", r" INFO .*(?:^| )device: (?P<device>\S+)", keyword="device: "),
+    Schema("perf", r" (?P<latency>[^, \n]*),? QPS: .*?(?P<qps>\S+)\s*$", keyword="QPS: "),
+    Schema("threads", r"cpu_math_library_num_threads: .*?(?P<value>\S+)\s*$", keyword="cpu_math_library_num_threads:"),
+    Schema("trt_precision", r"trt_precision: .*?(?P<value>\S+)\s*$", keyword="trt_precision:"),
+]
+
 
 def parse_args():
     """
@@ -35,41 +51,59 @@ def find_all_logs(path_walk: str):
                 yield file_name, full_path
 
 
-def process_log(file_name: str, iden: str) -> list:
+def find_all_tables(path_walk: str):
     """
-    process log to List<dict>
+    find all .csv/.json tables generated by paddle/benchmark.py from target dir
+    """
+    for root, ds, files in os.walk(path_walk):
+        for file_name in files:
+            if file_name.endswith(".csv") or file_name.endswith(".json"):
+                yield file_name, os.path.join(root, file_name)
+
+
+def process_table(file_name: str) -> list:
+    """
+    process benchmark table to List<dict>, no log parsing needed
+    """
+    if file_name.endswith(".json"):
+        return pd.read_json(file_name, orient="records", dtype=False).to_dict("records")
+    return pd.read_csv(file_name, keep_default_na=False).to_dict("records")
+
+
+def process_log(file_name: str) -> list:
+    """
+    process log to List<dict>, one dict per Model info block which has Perf info
     """
     output_list = []
-    with open(file_name, "r") as f:
-        log_data_list = f.read().split(iden)
-    for log_data in log_data_list:
-        if "Perf info" not in log_data:
+    extractor = LogExtractor(LOG_SCHEMAS)
+    output_dict = None
+    has_perf = False
+    for name, record, _ in extractor.iter_file(file_name):
+        if name == "model_info":
+            if output_dict is not None and has_perf:
+                output_list.append(output_dict)
+            output_dict, has_perf = {}, False
+        elif output_dict is None:
             continue
-        output_dict = {}
-        try:
-            for i, data in enumerate(log_data.split("\n")):
-                line_lists = data.split(" ")
-                if "name:" in line_lists and "type:" in line_lists:
-                    pos_buf = line_lists.index("name:")
-                    output_dict["model_name"] = line_lists[pos_buf + 1].split(",")[0]
-                    output_dict["frame_work"] = line_lists[-1].strip()
-                if "Num" in line_lists and "size:" in line_lists:
-                    pos_buf = line_lists.index("size:")
-                    output_dict["batch_size"] = line_lists[pos_buf + 1].split(",")[0]
-                if "device:" in line_lists and "INFO" in line_lists:
-                    pos_buf = line_lists.index("device:")
-                    output_dict["device"] = line_lists[pos_buf + 1].strip()
-                if "QPS:" in line_lists and "latency(ms):" in line_lists:
-                    pos_buf = line_lists.index("QPS:")
-                    output_dict["Average_latency(ms)"] = line_lists[pos_buf - 1].split(",")[0]
-                    output_dict["QPS"] = line_lists[-1].strip()
-                if "cpu_math_library_num_threads:" in line_lists:
-                    output_dict["cpu_math_library_num_threads"] = line_lists[-1].strip()
-                if "trt_precision:" in line_lists:
-                    output_dict["trt_precision"] = line_lists[-1].strip()
-        except Exception:
-            output_dict = {}
+        elif name == "perf_info":
+            has_perf = True
+        elif name == "model":
+            output_dict.update(record)
+        elif name == "batch":
+            output_dict.update(record)
+        elif name == "device":
+            output_dict.update(record)
+        elif name == "perf":
+            output_dict["Average_latency(ms)"] = record["latency"]
+            output_dict["QPS"] = record["qps"]
+        elif name == "threads":
+            output_dict["cpu_math_library_num_threads"] = record["value"]
+        elif name == "trt_precision":
+            output_dict["trt_precision"] = record["value"]
+    if output_dict is not None and has_perf:
         output_list.append(output_dict)
+    if extractor.stats.bad:
+        print("{}: {}".format(file_name, extractor.stats.summary()))
 
     return output_list
 
@@ -110,14 +144,19 @@ def main():
         columns=["frame_work", "model_name", "batch_size", "device", "trt_precision", "Average_latency(ms)", "QPS"]
     )
 
-    iden = "----------------------- Model info ----------------------"
+    rows = []
     for file_name, full_path in find_all_logs(args.log_path):
-        list_log = process_log(full_path, iden)
+        list_log = process_log(full_path)
         for dict_log in list_log:
             if dict_log != {}:
-                origin_df = origin_df.append(dict_log, ignore_index=True)
+                rows.append(dict_log)
+    for file_name, full_path in find_all_tables(args.log_path):
+        rows.extend(process_table(full_path))
+    origin_df = pd.concat([origin_df, pd.DataFrame(rows)], ignore_index=True)
 
-    raw_df = origin_df.sort_values(by=["frame_work", "model_name", "batch_size", "device", "trt_precision"])
+    raw_df = origin_df.sort_values(
+        by=["frame_work", "model_name", "batch_size", "device", "trt_precision"], key=lambda col: col.astype(str)
+    )
     raw_df.to_excel(args.output_name)
     set_style(args.output_name)
 
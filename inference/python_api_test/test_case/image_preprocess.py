@@ -19,14 +19,22 @@ def read_images_path(images_path, images_size, center=True, model_type="class"):
     Returns:
         img_array(numpy): numpy array
     """
+    from .preprocess_cache import PreprocessCache, cache_enabled
+
     image_names = sorted(os.listdir(images_path))
     images_list = []
     images_origin_list = []
+    # class模型center=False时为随机裁剪, 结果不固定, 不走缓存
+    cache = PreprocessCache() if cache_enabled() and (center or model_type == "det") else None
     for name in image_names:
         image_path = os.path.join(images_path, name)
-        im = cv2.imread(image_path)
+        if cache is not None:
+            img, im = cache.get(image_path, images_size, center, model_type, with_origin=model_type == "det")
+        else:
+            im = cv2.imread(image_path)
+            img = preprocess(im, images_size, center, model_type)
         images_origin_list.append(im)
-        images_list.append(preprocess(im, images_size, center, model_type))
+        images_list.append(img)
     if model_type == "class":
         return images_list
     elif model_type == "det":
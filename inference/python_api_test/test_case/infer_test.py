@@ -15,18 +15,15 @@ import cv2
 import psutil
 import yaml
 import pytest
-import pynvml
 import numpy as np
 import paddle
 import paddle.inference as paddle_infer
 from paddle.inference import PrecisionType, PlaceType
 from paddle.inference import convert_to_mixed_precision
 
-from pynvml.smi import nvidia_smi
 from .image_preprocess import read_images_path, get_images_npy, read_npy_path, preprocess, sig_fig_compare
 from .text_preprocess import ernie_data as text_pre
-
-_gpu_mem_lists = []
+from .resource_monitor import ResourceMonitor, nvml_handle, gpu_stat
 
 FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 logging.basicConfig(level=logging.INFO, format=FORMAT)
@@ -244,9 +241,7 @@ class InferenceTest(object):
 
         ori_gpu_mem = float(get_gpu_mem(cuda_visible_device)["used(MB)"])
 
-        record_thread = threading.Thread(target=record_by_pid, args=(os.getpid(), cuda_visible_device))
-        record_thread.setDaemon(True)
-        record_thread.start()
+        monitor = ResourceMonitor(interval=0.01, gpu_id=cuda_visible_device).start()
 
         input_names = predictor.get_input_names()
         for i, input_data_name in enumerate(input_names):
@@ -259,7 +254,7 @@ class InferenceTest(object):
         output_names = predictor.get_output_names()
         output_handle = predictor.get_output_handle(output_names[0])
         output_data = output_handle.copy_to_cpu()
-        gpu_max_mem = max([float(i["used(MB)"]) for i in _gpu_mem_lists])
+        gpu_max_mem = monitor.stop().summary()["gpu_mem_used_mb"]["max"]
         assert abs(gpu_max_mem - ori_gpu_mem) < 1, "set disable_gpu(), but gpu activity found"
 
     def mkldnn_test(
@@ -920,40 +915,20 @@ class InferenceTest(object):
 
 def get_gpu_mem(gpu_id=0):
     """
-    get gpu mem from gpu id
+    get gpu mem from gpu id, nvml is initialized only once per process
     Args:
         gpu_id(int): gpu id
     Returns:
         gpu_mem(dict): gpu infomartion
     """
-    pynvml.nvmlInit()
-    gpu_handle = pynvml.nvmlDeviceGetHandleByIndex(gpu_id)
-    gpu_mem_info = pynvml.nvmlDeviceGetMemoryInfo(gpu_handle)
-    gpu_utilization_info = pynvml.nvmlDeviceGetUtilizationRates(gpu_handle)
+    gpu_handle = nvml_handle(gpu_id)
+    if gpu_handle is None:
+        raise Exception("nvml is not available for gpu {}".format(gpu_id))
+    used, free, total, gpu_util, mem_util = gpu_stat(gpu_handle)
     gpu_mem = {}
-    gpu_mem["total(MB)"] = gpu_mem_info.total / 1024.0**2
-    gpu_mem["free(MB)"] = gpu_mem_info.free / 1024.0**2
-    gpu_mem["used(MB)"] = gpu_mem_info.used / 1024.0**2
-    gpu_mem["gpu_utilization_rate(%)"] = gpu_utilization_info.gpu
-    gpu_mem["gpu_mem_utilization_rate(%)"] = gpu_utilization_info.memory
-    pynvml.nvmlShutdown()
+    gpu_mem["total(MB)"] = total
+    gpu_mem["free(MB)"] = free
+    gpu_mem["used(MB)"] = used
+    gpu_mem["gpu_utilization_rate(%)"] = gpu_util
+    gpu_mem["gpu_mem_utilization_rate(%)"] = mem_util
     return gpu_mem
-
-
-def record_by_pid(pid: int, cuda_visible_device: int):
-    """
-    record_by_pid
-    Args:
-        pid(int): pid of the process
-        cuda_visible_device(int): first gpu card of CUDA_VISIBLE_DEVICES
-    Returns:
-        gpu_max_mem(float): recorded max gpu mem
-    """
-    global _gpu_mem_lists
-
-    while psutil.pid_exists(pid):
-        gpu_mem = get_gpu_mem(cuda_visible_device)
-        _gpu_mem_lists.append(gpu_mem)
-
-    gpu_max_mem = max([float(i["used(MB)"]) for i in _gpu_mem_lists])
-    return gpu_max_mem
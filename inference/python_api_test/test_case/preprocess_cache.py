@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+preprocessed input cache
+按(图片内容hash, 预处理参数)缓存预处理结果为.npy, 读取时memory-map, 同一批图片在fp32/mkldnn/trt/ort等用例间只解码一次;
+多进程通过文件锁避免重复计算, 写入先写临时文件再rename
+缓存目录由环境变量INFER_PREPROCESS_CACHE_DIR指定, INFER_PREPROCESS_CACHE=0时关闭缓存
+"""
+import os
+import json
+import queue
+import hashlib
+import tempfile
+import threading
+
+import cv2
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # windows下没有fcntl, 只依赖原子rename, 多进程可能重复计算但结果一致
+    fcntl = None
+
+# 预处理逻辑(mean/std/resize等)变化时修改, 使旧缓存失效
+PREPROCESS_VERSION = 1
+
+
+def cache_enabled():
+    """
+    whether preprocess cache is enabled
+    """
+    return os.environ.get("INFER_PREPROCESS_CACHE", "1") not in ["0", "False", "false"]
+
+
+def file_sha1(path):
+    """
+    sha1 of file content
+    Args:
+        path(str): file path
+    Returns:
+        sha1(str): hex digest
+    """
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class FileLock(object):
+    """
+    fcntl file lock, no-op when fcntl is not available
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path(str): lock file path
+        """
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        """
+        acquire
+        """
+        if fcntl is not None:
+            self.fd = open(self.path, "a")
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        """
+        release
+        """
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            self.fd.close()
+            self.fd = None
+
+
+class PreprocessCache(object):
+    """
+    preprocessed input cache
+    """
+
+    def __init__(self, cache_dir=None):
+        """
+        Args:
+            cache_dir(str): cache dir, default INFER_PREPROCESS_CACHE_DIR or ~/.cache/infer_preprocess
+        """
+        self.cache_dir = cache_dir or os.environ.get(
+            "INFER_PREPROCESS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "infer_preprocess")
+        )
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _save(self, array, path):
+        """
+        atomic save .npy
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".npy.tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(tmp_path, path)
+
+    def _get_or_compute(self, path, compute):
+        """
+        读取缓存, 不存在时加锁计算; 返回copy-on-write的memmap, 调用方原地修改不影响缓存文件
+        """
+        if not os.path.exists(path):
+            with FileLock(path + ".lock"):
+                # 拿到锁后再检查一次, 其他进程可能已经写入
+                if not os.path.exists(path):
+                    self._save(compute(), path)
+        return np.load(path, mmap_mode="c")
+
+    def get(self, image_path, images_size, center=True, model_type="class", with_origin=False):
+        """
+        get preprocessed image
+        Args:
+            image_path(str): image path
+            images_size(int): images size
+            center(bool): Keep central area or not
+            model_type(str): model type
+            with_origin(bool): also return decoded origin image
+        Returns:
+            img(numpy), origin(numpy or None)
+        """
+        from .image_preprocess import preprocess
+
+        digest = file_sha1(image_path)
+        params = json.dumps([digest, images_size, center, model_type, PREPROCESS_VERSION])
+        key = hashlib.sha1(params.encode()).hexdigest()
+        decoded = {}
+
+        def _decode():
+            """decode once for both origin and preprocessed image"""
+            if "im" not in decoded:
+                decoded["im"] = cv2.imread(image_path)
+            return decoded["im"]
+
+        origin = None
+        if with_origin:
+            origin = self._get_or_compute(os.path.join(self.cache_dir, digest + ".origin.npy"), _decode)
+        img = self._get_or_compute(
+            os.path.join(self.cache_dir, key + ".npy"),
+            lambda: preprocess(np.array(_decode()), images_size, center, model_type),
+        )
+        return img, origin
+
+
+class BatchBuilder(object):
+    """
+    prefetching batch builder, 后台线程提前准备后续batch
+    """
+
+    def __init__(self, image_paths, images_size, batch_size=1, center=True, model_type="class", prefetch=2, cache=None):
+        """
+        Args:
+            image_paths(list): image paths
+            images_size(int): images size
+            batch_size(int): batch size, the last batch may be smaller
+            center(bool): Keep central area or not
+            model_type(str): model type
+            prefetch(int): number of batches prepared ahead
+            cache(PreprocessCache): cache, default PreprocessCache()
+        """
+        self.image_paths = list(image_paths)
+        self.images_size = images_size
+        self.batch_size = batch_size
+        self.center = center
+        self.model_type = model_type
+        self.prefetch = prefetch
+        self.cache = cache or PreprocessCache()
+
+    def _load(self, image_path):
+        """
+        load one preprocessed image
+        """
+        return self.cache.get(image_path, self.images_size, self.center, self.model_type)[0]
+
+    def _worker(self, batches, stop):
+        """
+        后台准备batch
+        """
+        try:
+            for start in range(0, len(self.image_paths), self.batch_size):
+                if stop.is_set():
+                    return
+                paths = self.image_paths[start : start + self.batch_size]
+                batches.put(np.stack([self._load(path) for path in paths]))
+        except Exception as e:
+            batches.put(e)
+        batches.put(None)
+
+    def __len__(self):
+        """
+        number of batches
+        """
+        return (len(self.image_paths) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        """
+        yield batch numpy array in (N, C, H, W)
+        """
+        batches = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        thread = threading.Thread(target=self._worker, args=(batches, stop), daemon=True)
+        thread.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            stop.set()
+            # 释放可能阻塞在put上的后台线程
+            while thread.is_alive():
+                try:
+                    batches.get_nowait()
+                except queue.Empty:
+                    thread.join(0.01)
+
+
+if __name__ == "__main__":
+    # benchmark: 模拟fp32/mkldnn/trt/ort四个用例各自读取同一批图片(class + det), 对比无缓存、冷缓存、热缓存的总预处理耗时
+    # cd inference/python_api_test && python -m test_case.preprocess_cache [图片数, 默认50]
+    import sys
+    import time
+    import shutil
+
+    from .image_preprocess import read_images_path
+
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    variants = ["fp32", "mkldnn", "trt", "ort"]
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        images_path = os.path.join(tmp_dir, "images")
+        os.makedirs(images_path)
+        rng = np.random.RandomState(33)
+        for i in range(num):
+            cv2.imwrite(os.path.join(images_path, "{}.jpg".format(i)), rng.randint(0, 255, (480, 640, 3), "uint8"))
+
+        def suite():
+            """all variants of one class model and one det model"""
+            start = time.perf_counter()
+            for _ in variants:
+                read_images_path(images_path, 224, center=True, model_type="class")
+                read_images_path(images_path, 608, center=False, model_type="det")
+            return time.perf_counter() - start
+
+        os.environ["INFER_PREPROCESS_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+        os.environ["INFER_PREPROCESS_CACHE"] = "0"
+        no_cache = suite()
+        os.environ["INFER_PREPROCESS_CACHE"] = "1"
+        cold = suite()
+        warm = suite()
+
+        cache = PreprocessCache()
+        paths = [os.path.join(images_path, name) for name in sorted(os.listdir(images_path))]
+        start = time.perf_counter()
+        for batch in BatchBuilder(paths, 224, batch_size=8, cache=cache):
+            pass
+        prefetch = time.perf_counter() - start
+
+        print("{} images x {} variants (class 224 + det 608):".format(num, len(variants)))
+        print("no cache   : {:.3f}s".format(no_cache))
+        print("cold cache : {:.3f}s".format(cold))
+        print("warm cache : {:.3f}s".format(warm))
+        print(
+            "BatchBuilder bs8 warm, {} batches: {:.3f}s".format(len(BatchBuilder(paths, 224, batch_size=8)), prefetch)
+        )
+    finally:
+        shutil.rmtree(tmp_dir)
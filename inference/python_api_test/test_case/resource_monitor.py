@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+# encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
+"""
+resource monitor
+后台线程按固定间隔采样进程cpu利用率、rss、线程数, 有NVML时同时采样gpu显存与利用率,
+样本写入环形缓冲区; 单次采样的cpu开销超过采样间隔的上限比例时放大采样间隔, 开销回落后再缩小回设定值
+"""
+import os
+import csv
+import json
+import time
+import threading
+from collections import deque
+
+import numpy as np
+
+try:
+    import psutil
+except Exception:
+    psutil = None
+
+FIELDS = ("time", "cpu_percent", "rss_mb", "threads", "gpu_mem_used_mb", "gpu_util")
+SUMMARY_FIELDS = ("cpu_percent", "rss_mb", "threads", "gpu_mem_used_mb", "gpu_util")
+
+_nvml_lock = threading.Lock()
+_nvml_state = {"init": None, "handles": {}}
+
+
+def nvml_handle(gpu_id=0):
+    """
+    获取NVML设备handle, 进程内只nvmlInit一次; 没有pynvml或没有gpu时返回None
+    Args:
+        gpu_id(int): gpu id
+    Returns:
+        handle or None
+    """
+    with _nvml_lock:
+        if _nvml_state["init"] is None:
+            try:
+                import pynvml
+
+                pynvml.nvmlInit()
+                _nvml_state["init"] = pynvml
+            except Exception:
+                _nvml_state["init"] = False
+        pynvml = _nvml_state["init"]
+        if not pynvml:
+            return None
+        if gpu_id not in _nvml_state["handles"]:
+            try:
+                _nvml_state["handles"][gpu_id] = pynvml.nvmlDeviceGetHandleByIndex(gpu_id)
+            except Exception:
+                _nvml_state["handles"][gpu_id] = None
+        return _nvml_state["handles"][gpu_id]
+
+
+def gpu_stat(handle):
+    """
+    读取gpu显存与利用率
+    Args:
+        handle: nvml device handle
+    Returns:
+        (used memory MB, free memory MB, total memory MB, gpu utilization %, memory utilization %)
+    """
+    pynvml = _nvml_state["init"]
+    mem_info = pynvml.nvmlDeviceGetMemoryInfo(handle)
+    util_info = pynvml.nvmlDeviceGetUtilizationRates(handle)
+    return (
+        mem_info.used / 1024.0**2,
+        mem_info.free / 1024.0**2,
+        mem_info.total / 1024.0**2,
+        util_info.gpu,
+        util_info.memory,
+    )
+
+
+class ProcStat(object):
+    """
+    进程cpu时间、rss、线程数, 优先一次读取/proc/<pid>/stat, 否则使用psutil
+    """
+
+    def __init__(self, pid):
+        """
+        Args:
+            pid(int): pid of the process
+        """
+        self.pid = pid
+        self.stat_path = "/proc/{}/stat".format(pid)
+        self.use_proc = os.path.exists(self.stat_path)
+        if self.use_proc:
+            self.clock_ticks = os.sysconf("SC_CLK_TCK")
+            self.page_size = os.sysconf("SC_PAGE_SIZE")
+        elif psutil is not None:
+            self.process = psutil.Process(pid)
+        else:
+            raise Exception("neither /proc nor psutil is available for resource monitor")
+
+    def read(self):
+        """
+        Returns:
+            (cpu seconds, rss MB, threads)
+        """
+        if self.use_proc:
+            with open(self.stat_path, "rb") as f:
+                # 进程名可能含空格, 从最后一个")"之后切分, fields[0]为state
+                fields = f.read().rsplit(b")", 1)[1].split()
+            cpu_time = (int(fields[11]) + int(fields[12])) / self.clock_ticks
+            return cpu_time, int(fields[21]) * self.page_size / 1024.0**2, int(fields[17])
+        with self.process.oneshot():
+            cpu_times = self.process.cpu_times()
+            return (
+                cpu_times.user + cpu_times.system,
+                self.process.memory_info().rss / 1024.0**2,
+                self.process.num_threads(),
+            )
+
+
+class ResourceMonitor(object):
+    """
+    sampling resource monitor
+    """
+
+    def __init__(self, pid=None, interval=0.1, capacity=100000, gpu_id=0, use_gpu=True, max_overhead=0.01):
+        """
+        Args:
+            pid(int): 被监控进程, 默认当前进程
+            interval(float): 采样间隔, 单位秒
+            capacity(int): 环形缓冲区大小, 超出后丢弃最早的样本
+            gpu_id(int): gpu id
+            use_gpu(bool): 是否采样gpu, NVML不可用时自动关闭
+            max_overhead(float): 单次采样cpu时间占采样间隔的上限, 超过时采样间隔翻倍
+        """
+        self.pid = pid or os.getpid()
+        self.base_interval = interval
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.samples = deque(maxlen=capacity)
+        self.proc = ProcStat(self.pid)
+        self.gpu_handle = nvml_handle(gpu_id) if use_gpu else None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.begin = None
+        self.end = None
+        self.sampler_cpu = 0.0
+        self.sample_count = 0
+
+    def _sample(self, last):
+        """
+        单次采样
+        Args:
+            last: 上一次的(时间, cpu时间), 用于计算cpu利用率
+        Returns:
+            sample tuple, (time, cpu time)
+        """
+        now = time.perf_counter()
+        cpu_time, rss, threads = self.proc.read()
+        cpu_percent = (cpu_time - last[1]) / (now - last[0]) * 100 if now > last[0] else 0.0
+        gpu_mem, gpu_util = np.nan, np.nan
+        if self.gpu_handle is not None:
+            try:
+                gpu_mem, _, _, gpu_util, _ = gpu_stat(self.gpu_handle)
+            except Exception:
+                pass
+        return (now - self.begin, cpu_percent, rss, threads, gpu_mem, gpu_util), (now, cpu_time)
+
+    def _adjust(self, cost):
+        """
+        按单次采样cpu开销调整采样间隔: 超过上限时翻倍, 低于上限的1/4时减半, 不小于设定值
+        Args:
+            cost(float): 平滑后的单次采样cpu时间
+        """
+        budget = self.max_overhead * self.interval
+        if cost > budget:
+            self.interval *= 2
+        elif cost * 4 < budget and self.interval > self.base_interval:
+            self.interval = max(self.interval / 2, self.base_interval)
+
+    def _run(self):
+        """
+        采样线程, 按固定时间点采样, 不随单次采样耗时漂移
+        """
+        cpu_begin = time.thread_time()
+        last = (self.begin, self.proc.read()[0])
+        next_time = self.begin
+        cpu_last = time.thread_time()
+        cost = None
+        while True:
+            next_time += self.interval
+            if self.stop_event.wait(max(next_time - time.perf_counter(), 0)):
+                break
+            sample, last = self._sample(last)
+            self.samples.append(sample)
+            self.sample_count += 1
+            # 本轮(唤醒+采样)的cpu时间, 指数平滑后与当前采样间隔比较
+            cpu_now = time.thread_time()
+            step, cpu_last = cpu_now - cpu_last, cpu_now
+            self.sampler_cpu = cpu_now - cpu_begin
+            cost = step if cost is None else 0.8 * cost + 0.2 * step
+            self._adjust(cost)
+            if next_time < time.perf_counter():
+                # 采样落后时从当前时间重新计时
+                next_time = time.perf_counter()
+        # 停止时补采一次, 保证监控时间短于采样间隔时也有样本
+        sample, last = self._sample(last)
+        self.samples.append(sample)
+        self.sample_count += 1
+        self.sampler_cpu = time.thread_time() - cpu_begin
+
+    def start(self):
+        """
+        start sampling thread
+        """
+        self.samples.clear()
+        self.stop_event.clear()
+        self.sample_count = 0
+        self.sampler_cpu = 0.0
+        self.interval = self.base_interval
+        self.begin = time.perf_counter()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        stop sampling thread
+        """
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+        self.end = time.perf_counter()
+        return self
+
+    def __enter__(self):
+        """
+        start
+        """
+        return self.start()
+
+    def __exit__(self, *args):
+        """
+        stop
+        """
+        self.stop()
+
+    def series(self):
+        """
+        时间序列
+        Returns:
+            list of dict
+        """
+        return [dict(zip(FIELDS, sample)) for sample in self.samples]
+
+    def summary(self):
+        """
+        各指标mean/p95/max, 及采样线程自身开销
+        Returns:
+            summary(dict)
+        """
+        result = {}
+        data = np.asarray(self.samples, dtype="float64").reshape(-1, len(FIELDS))
+        for i, field in enumerate(FIELDS):
+            if field not in SUMMARY_FIELDS:
+                continue
+            column = data[:, i]
+            column = column[~np.isnan(column)]
+            if column.size == 0:
+                result[field] = None
+                continue
+            result[field] = {
+                "mean": float(column.mean()),
+                "p95": float(np.percentile(column, 95)),
+                "max": float(column.max()),
+            }
+        elapsed = (self.end or time.perf_counter()) - self.begin if self.begin else 0.0
+        result["sample_count"] = self.sample_count
+        result["interval"] = self.interval
+        result["elapsed"] = elapsed
+        result["sampler_cpu"] = self.sampler_cpu
+        result["overhead"] = self.sampler_cpu / elapsed if elapsed > 0 else 0.0
+        return result
+
+    def export(self, path):
+        """
+        导出时间序列, .json或.csv
+        Args:
+            path(str): output file
+        """
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump({"summary": self.summary(), "series": self.series()}, f, indent=1)
+        else:
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(FIELDS)
+                writer.writerows(self.samples)
+
+
+if __name__ == "__main__":
+    # benchmark: 采样线程开销, 以及被监控负载在有/无监控时的耗时
+    x = np.random.rand(256, 256)
+
+    def workload():
+        """被测负载"""
+        start = time.perf_counter()
+        for _ in range(400):
+            np.dot(x, x)
+        return time.perf_counter() - start
+
+    base = min(workload() for _ in range(3))
+    for interval in [0.1, 0.01, 0.001]:
+        with ResourceMonitor(interval=interval) as monitor:
+            cost = min(workload() for _ in range(3))
+        summary = monitor.summary()
+        print(
+            "interval {:>6}s -> {:>7}s: {:>5} samples, sampler cpu {:.4f}s ({:.3%}), workload {:.3f}s vs {:.3f}s, "
+            "rss max {:.1f}MB, cpu p95 {:.1f}%".format(
+                interval,
+                summary["interval"],
+                summary["sample_count"],
+                summary["sampler_cpu"],
+                summary["overhead"],
+                cost,
+                base,
+                summary["rss_mb"]["max"],
+                summary["cpu_percent"]["p95"],
+            )
+        )
@@ -14,20 +14,15 @@
 # limitations under the License.
 """
 
-import multiprocessing
 import subprocess
 import time
 import sys
 import os
 import signal
-import cpuinfo
 
-try:
-    import pynvml
-    import psutil
-    import GPUtil
-except Exception as e:
-    sys.stderr.write("Cannot import pynvml, psutil, GPUtil, maybe it's not installed.\n")
+# 与test_case共用采样监控, resource_monitor.py不依赖test_case包内其他模块
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "test_case"))
+from resource_monitor import ResourceMonitor
 
 
 class StatBase(object):
@@ -87,23 +82,12 @@ class Monitor(StatBase):
         self.use_xpu = use_xpu
         self.interval = interval
 
-        self.cpu_stat_q = multiprocessing.Queue()
+        # cpu/rss/线程数及gpu(NVML可用时)在同一个后台线程中采样
+        self.resource_monitor = ResourceMonitor(interval=interval, gpu_id=self.gpu_id, use_gpu=use_gpu)
 
     def start(self):
         """start"""
-        cmd = "%s --id=%s --query-gpu=%s --format=csv,noheader%s -lms 50" % (
-            StatBase.nvidia_smi_path,
-            self.gpu_id,
-            ",".join(StatBase.gpu_keys),
-            StatBase.nu_opt,
-        )
         xpu_cmd = f"while true; do xpu_smi -d{self.xpu_id} -m; sleep 0.05; done"
-        # print(cmd)
-        if self.use_gpu:
-            self.gpu_stat_worker = subprocess.Popen(
-                cmd, stderr=subprocess.STDOUT, stdout=subprocess.PIPE, shell=True, close_fds=True, preexec_fn=os.setsid
-            )
-
         if self.use_xpu:
             self.xpu_stat_worker = subprocess.Popen(
                 xpu_cmd,
@@ -114,43 +98,23 @@ class Monitor(StatBase):
                 preexec_fn=os.setsid,
             )
 
-        # cpu stat
-        pid = os.getpid()
-        self.cpu_stat_worker = multiprocessing.Process(
-            target=self.cpu_stat_func, args=(self.cpu_stat_q, pid, self.interval)
-        )
-        self.cpu_stat_worker.start()
+        self.resource_monitor.start()
 
     def stop(self):
         """stop"""
         try:
-            if self.use_gpu:
-                os.killpg(self.gpu_stat_worker.pid, signal.SIGUSR1)
             if self.use_xpu:
                 os.killpg(self.xpu_stat_worker.pid, signal.SIGUSR1)
-            # os.killpg(p.pid, signal.SIGTERM)
-            self.cpu_stat_worker.terminate()
-            self.cpu_stat_worker.join(timeout=0.01)
+            self.resource_monitor.stop()
         except Exception as e:
             print(e)
             return
 
+        summary = self.resource_monitor.summary()
+
         # gpu
-        if self.use_gpu:
-            lines = self.gpu_stat_worker.stdout.readlines()
-            # print(lines)
-            lines = [line.strip().decode("utf-8") for line in lines if line.strip() != ""]
-            gpu_info_list = [{k: v for k, v in zip(StatBase.gpu_keys, line.split(", "))} for line in lines]
-            if len(gpu_info_list) == 0:
-                return
-            result = gpu_info_list[0]
-            for item in gpu_info_list:
-                for k in item.keys():
-                    if k not in ["name", "uuid", "timestamp"]:
-                        result[k] = max(int(result[k]), int(item[k]))
-                    else:
-                        result[k] = max(result[k], item[k])
-            self.result["result"]["gpu_memory.used"] = result["memory.used"]
+        if self.use_gpu and summary["gpu_mem_used_mb"] is not None:
+            self.result["result"]["gpu_memory.used"] = int(summary["gpu_mem_used_mb"]["max"])
 
         # xpu
         if self.use_xpu:
@@ -170,33 +134,16 @@ class Monitor(StatBase):
             self.result["XPU"] = result
 
         # cpu
-        cpu_result = {}
-        if self.cpu_stat_q.qsize() > 0:
-            cpu_result = {k: v for k, v in zip(StatBase.cpu_keys, self.cpu_stat_q.get())}
-        while not self.cpu_stat_q.empty():
-            item = {k: v for k, v in zip(StatBase.cpu_keys, self.cpu_stat_q.get())}
-            for k in StatBase.cpu_keys:
-                cpu_result[k] = max(cpu_result[k], item[k])
-        cpu_result["name"] = cpuinfo.get_cpu_info()["brand_raw"]
-        self.result["result"]["cpu_memory.used"] = cpu_result["memory.used"]
+        if summary["rss_mb"] is not None:
+            self.result["result"]["cpu_memory.used"] = round(summary["rss_mb"]["max"], 4)
 
     def output(self):
         """output"""
         return self.result
 
-    def cpu_stat_func(self, q, pid, interval=0.01):
-        """cpu stat function"""
-        stat_info = psutil.Process(pid)
-        while True:
-            # pid = os.getpid()
-            cpu_util, mem_util, mem_use = (
-                stat_info.cpu_percent(),
-                stat_info.memory_percent(),
-                round(stat_info.memory_info().rss / 1024.0 / 1024.0, 4),
-            )
-            q.put([cpu_util, mem_util, mem_use])
-            time.sleep(interval)
-        return
+    def export(self, path):
+        """export resource time series, .csv or .json"""
+        self.resource_monitor.export(path)
 
 
 if __name__ == "__main__":
@@ -20,6 +20,12 @@ import base_nv_trt_int8
 import mail_report
 import write_db
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../tools"))
+from log_extractor import LogExtractor, Schema
+
+
+# test_*_infer.py 输出的最终结果行: [Benchmark][final result]{python dict}
+FINAL_RESULT = Schema("final_result", r"\[Benchmark\]\[final result\](?P<result>\{.*\})", {"result": "literal"})
 
 FONT = {
     "g": "00ff00",
@@ -36,15 +42,15 @@ def get_runtime_info(log_file):
     benchmark_res = {}
     if not os.path.exists(log_file):
         return benchmark_res
-    with open(log_file) as fin:
-        benchmark_lines = ""
-        lines = fin.readlines()
-        for line in lines:
-            if "[Benchmark][final result]" in line:
-                tmp = line.strip("[Benchmark][final result]").strip()
-                res_json = eval(tmp)
-                model_name = res_json["model_name"]
-                benchmark_res[model_name] = res_json
+    extractor = LogExtractor([FINAL_RESULT])
+    for _, record, _ in extractor.iter_file(log_file):
+        res_json = record["result"]
+        model_name = res_json["model_name"]
+        benchmark_res[model_name] = res_json
+    if extractor.stats.bad:
+        print("{}: {}".format(log_file, extractor.stats.summary()))
+        for sample in extractor.stats.samples:
+            print("    line {line}: {reason}: {text}".format(**sample))
     return benchmark_res
 
 
@@ -14,6 +14,9 @@ import yaml
 import wget
 from Model_Build import Model_Build
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from dataset_provider import DatasetProvider
+
 logger = logging.getLogger("ce")
 
 
@@ -54,6 +57,7 @@ class PaddleClas_Build(Model_Build):
         self.models_list = args.models_list
         self.models_file = args.models_file
         self.clas_model_list = []
+        self.dataset_provider = None
         if str(self.models_list) != "None":
             for line in self.models_list.split(","):
                 if ".yaml" in line:
@@ -79,24 +83,23 @@ class PaddleClas_Build(Model_Build):
 
     def download_data(self, value=None):
         """
-        下载数据集
+        登记需要下载的数据集到当前目录, 由prepare_data统一并行下载解压
         """
         # 调用函数路径已切换至PaddleClas
+        # 有end回收数据，目标文件夹已存在时跳过
+        if self.dataset_provider is None:
+            self.dataset_provider = DatasetProvider()
+        self.dataset_provider.add(value, os.getcwd())
+        return 0
 
-        tar_name = value.split("/")[-1]
-        # if os.path.exists(tar_name) and os.path.exists(tar_name.replace(".tar", "")):
-        # 有end回收数据，只判断文件夹
-        if os.path.exists(tar_name.replace(".tar", "")):
-            logger.info("#### already download {}".format(tar_name))
-        else:
-            try:
-                logger.info("#### start download {}".format(tar_name))
-                wget.download(value.replace(" ", ""))
-                logger.info("#### end download {}".format(tar_name))
-                tf = tarfile.open(tar_name)
-                tf.extractall(os.getcwd())
-            except:
-                logger.info("#### prepare download failed {} failed".format(tar_name))
+    def prepare_data(self):
+        """
+        去重后并行下载解压已登记的数据集, 使用本地缓存
+        """
+        if self.dataset_provider is not None:
+            for url in self.dataset_provider.run():
+                logger.info("#### prepare download failed {} failed".format(url))
+            self.dataset_provider = None
         return 0
 
     def get_image_name(self, value=None, label=None):
@@ -199,6 +202,7 @@ class PaddleClas_Build(Model_Build):
                     value="https://paddle-imagenet-models-name.bj.bcebos.com\
                     /dygraph/rec/data/recognition_demo_data_en_v1.1.tar"
                 )
+                self.prepare_data()
                 logger.info("#### end download rec_demo")
             os.chdir(path_now)
         else:
@@ -287,6 +291,7 @@ class PaddleClas_Build(Model_Build):
                             self.reponame, image_name
                         )
                     )
+            self.prepare_data()
             os.chdir(path_now)
         else:
             logger.info("check you {} path".format(self.reponame))
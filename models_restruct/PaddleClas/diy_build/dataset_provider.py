@@ -0,0 +1,286 @@
+# encoding: utf-8
+"""
+数据集准备
+汇总整个模型列表需要的数据集url, 去重后用有限大小的线程池并行下载解压;
+本地缓存按内容sha1存放压缩包与解压结果, 以完成标记区分中断的下载/解压, 再次执行时从断点继续;
+解压结果在缓存中置为只读, 以硬链接方式放入目标目录, 不支持硬链接时退回复制;
+标注/列表等可能被原地改写的文本文件(后缀由DATASET_COPY_SUFFIXES指定)总是复制, 避免改写共享缓存
+缓存目录由环境变量DATASET_CACHE_DIR指定, 并行数由DATASET_WORKERS指定
+"""
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tarfile
+import zipfile
+import tempfile
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger("ce")
+
+CACHED = "cached"
+DOWNLOADED = "downloaded"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+COPY_SUFFIXES = tuple(os.getenv("DATASET_COPY_SUFFIXES", ".txt,.json,.yaml,.yml,.csv,.list").split(","))
+
+
+def clean_url(url):
+    """
+    去掉换行续写url中的空白
+    """
+    return "".join(url.split())
+
+
+def archive_root(url):
+    """
+    压缩包解压后的目录名, xxx.tar -> xxx
+    """
+    name = url.rstrip("/").split("/")[-1]
+    for suffix in [".tar.gz", ".tgz", ".tar", ".zip"]:
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+class FileLock(object):
+    """
+    fcntl文件锁, 多个构建进程共享缓存时使用
+    """
+
+    def __init__(self, path):
+        """
+        初始化变量
+        """
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        """
+        加锁
+        """
+        if fcntl is not None:
+            self.fd = open(self.path, "a")
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        """
+        解锁
+        """
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            self.fd.close()
+            self.fd = None
+
+
+def link_or_copy(src, dst):
+    """
+    硬链接单个文件, 可能被改写的文件、跨设备或不支持时复制为可写文件
+    """
+    if os.path.exists(dst):
+        os.remove(dst)
+    if not src.endswith(COPY_SUFFIXES):
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
+
+
+def make_read_only(root):
+    """
+    去掉整棵树文件的写权限, 硬链接共享inode, 目标目录中的原地写入会直接报错而不是改写缓存
+    """
+    for parent, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(parent, name)
+            os.chmod(path, os.stat(path).st_mode & ~0o222)
+
+
+def link_tree(src, dst, workers=8):
+    """
+    按目录结构硬链接整棵树
+    """
+    jobs = []
+    for root, dirs, files in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(target, exist_ok=True)
+        for name in files:
+            jobs.append((os.path.join(root, name), os.path.join(target, name)))
+    if workers <= 1 or len(jobs) < 64:
+        for job in jobs:
+            link_or_copy(*job)
+    else:
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(lambda job: link_or_copy(*job), jobs))
+    return len(jobs)
+
+
+class DatasetProvider(object):
+    """
+    数据集准备
+    """
+
+    def __init__(self, cache_dir=None, workers=None, retries=3, timeout=600):
+        """
+        初始化变量
+        """
+        self.cache_dir = cache_dir or os.getenv(
+            "DATASET_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "models_restruct_dataset")
+        )
+        self.workers = int(workers or os.getenv("DATASET_WORKERS", "4"))
+        self.retries = retries
+        self.timeout = timeout
+        for sub in ["objects", "trees", "refs", "tmp"]:
+            os.makedirs(os.path.join(self.cache_dir, sub), exist_ok=True)
+        # url -> 目标目录list, 保持加入顺序
+        self.requests = {}
+        self.results = {}
+        self._lock = threading.Lock()
+
+    def add(self, url, destination="."):
+        """
+        登记需要的数据集, 同一url只下载一次
+        """
+        url = clean_url(url)
+        destination = os.path.abspath(destination)
+        with self._lock:
+            dests = self.requests.setdefault(url, [])
+            if destination not in dests:
+                dests.append(destination)
+
+    def _path(self, *names):
+        """
+        缓存内路径
+        """
+        return os.path.join(self.cache_dir, *names)
+
+    def _download(self, url, ref_path):
+        """
+        下载到.part, 支持断点续传; 完成后按sha1移入objects并写入ref作为完成标记
+        """
+        key = hashlib.sha1(url.encode()).hexdigest()
+        part = self._path("tmp", key + ".part")
+        for attempt in range(self.retries):
+            try:
+                offset = os.path.getsize(part) if os.path.exists(part) else 0
+                request = urllib.request.Request(url)
+                if offset and not url.startswith("file://"):
+                    request.add_header("Range", "bytes={}-".format(offset))
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    # 服务端不支持Range时返回200, 从头下载
+                    mode = "ab" if offset and getattr(response, "status", 200) == 206 else "wb"
+                    with open(part, mode) as f:
+                        shutil.copyfileobj(response, f, 1 << 20)
+                break
+            except Exception as e:
+                logger.info("#### download {} failed ({}/{}): {}".format(url, attempt + 1, self.retries, e))
+                if attempt == self.retries - 1:
+                    raise
+        sha1 = hashlib.sha1()
+        with open(part, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha1.update(chunk)
+        digest = sha1.hexdigest()
+        os.replace(part, self._path("objects", digest))
+        with open(ref_path + ".tmp", "w") as f:
+            json.dump({"url": url, "sha1": digest}, f)
+        os.replace(ref_path + ".tmp", ref_path)
+        return digest
+
+    def _extract(self, url, digest):
+        """
+        解压到trees/<sha1>, 先解压到临时目录再rename, 目录存在即解压完成
+        """
+        tree = self._path("trees", digest)
+        if os.path.isdir(tree):
+            return tree
+        tmp = tempfile.mkdtemp(dir=self._path("tmp"))
+        archive = self._path("objects", digest)
+        try:
+            if zipfile.is_zipfile(archive):
+                with zipfile.ZipFile(archive) as zf:
+                    zf.extractall(tmp)
+            elif tarfile.is_tarfile(archive):
+                with tarfile.open(archive) as tf:
+                    tf.extractall(tmp)
+            else:
+                # 非压缩包按文件名直接放置
+                os.link(archive, os.path.join(tmp, url.rstrip("/").split("/")[-1]))
+            make_read_only(tmp)
+            os.rename(tmp, tree)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return tree
+
+    def _provide(self, url):
+        """
+        单个url: 查缓存或下载, 解压, 硬链接到全部目标目录
+        """
+        # 与原有逻辑一致, 目标目录下已有同名数据集(如end回收后保留的数据)时不再准备
+        if all(os.path.exists(os.path.join(dest, archive_root(url))) for dest in self.requests[url]):
+            return SKIPPED
+        key = hashlib.sha1(url.encode()).hexdigest()
+        ref_path = self._path("refs", key + ".json")
+        with FileLock(self._path("tmp", key + ".lock")):
+            status = CACHED
+            digest = None
+            if os.path.exists(ref_path):
+                with open(ref_path) as f:
+                    digest = json.load(f)["sha1"]
+                if not os.path.exists(self._path("objects", digest)):
+                    digest = None
+            if digest is None:
+                logger.info("#### start download {}".format(url))
+                digest = self._download(url, ref_path)
+                status = DOWNLOADED
+            tree = self._extract(url, digest)
+        for destination in self.requests[url]:
+            os.makedirs(destination, exist_ok=True)
+            for name in os.listdir(tree):
+                target = os.path.join(destination, name)
+                if os.path.exists(target):
+                    logger.info("#### already have {}".format(target))
+                    continue
+                if os.path.isdir(os.path.join(tree, name)):
+                    link_tree(os.path.join(tree, name), target)
+                else:
+                    link_or_copy(os.path.join(tree, name), target)
+        return status
+
+    def _run_one(self, url):
+        """
+        捕获单个url的异常, 不影响其他数据集
+        """
+        try:
+            status = self._provide(url)
+        except Exception as e:
+            logger.info("#### prepare {} failed: {}".format(url, e))
+            status = FAILED
+        with self._lock:
+            self.results[url] = status
+        logger.info("#### {} {}".format(status, url))
+        return status
+
+    def run(self):
+        """
+        并行准备全部已登记的数据集
+        :return: 失败的url list
+        """
+        urls = [url for url in self.requests if url not in self.results]
+        if urls:
+            with ThreadPoolExecutor(min(self.workers, len(urls))) as pool:
+                list(pool.map(self._run_one, urls))
+        return [url for url, status in self.results.items() if status == FAILED]
@@ -0,0 +1,157 @@
+# encoding: utf-8
+"""
+DatasetProvider测试, 使用本地http假源提供tar包
+"""
+import io
+import os
+import sys
+import json
+import stat
+import hashlib
+import tarfile
+import functools
+import threading
+import http.server
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from dataset_provider import DatasetProvider, CACHED, DOWNLOADED, SKIPPED
+
+NAMES = ["ILSVRC2012_{}".format(i) for i in range(3)]
+
+
+class RangeHandler(http.server.SimpleHTTPRequestHandler):
+    """支持Range的文件服务, 记录请求路径"""
+
+    def do_GET(self):
+        """返回文件, Range请求返回206"""
+        self.server.hits.append(self.path)
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].split("-")[0])
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+        self.wfile.write(data[start:])
+
+    def log_message(self, *args):
+        """关闭访问日志"""
+        pass
+
+
+@pytest.fixture
+def origin(tmp_path):
+    """
+    假源: 每个数据集一个tar包, 含图片与标注列表
+    """
+    root = tmp_path / "origin"
+    root.mkdir()
+    for name in NAMES:
+        with tarfile.open(str(root / (name + ".tar")), "w") as tf:
+            for member, payload in [
+                ("{}/train/0.jpg".format(name), os.urandom(4096)),
+                ("{}/train_list.txt".format(name), b"train/0.jpg 0\n"),
+            ]:
+                info = tarfile.TarInfo(member)
+                info.size = len(payload)
+                tf.addfile(info, io.BytesIO(payload))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(RangeHandler, directory=str(root)))
+    server.hits = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield root, "http://127.0.0.1:{}/".format(server.server_address[1]), server
+    server.shutdown()
+    server.server_close()
+
+
+def _provider(tmp_path, base, dest="dataset", cache="cache"):
+    """
+    多个模型引用同一组数据集
+    """
+    provider = DatasetProvider(cache_dir=str(tmp_path / cache), workers=3)
+    for i in range(9):
+        provider.add(base + NAMES[i % len(NAMES)] + ".tar", str(tmp_path / dest))
+    return provider
+
+
+def test_download_once_and_cache(tmp_path, origin):
+    """
+    同一url只下载一次, 再次准备时命中缓存, 目标目录已存在时跳过
+    """
+    _, base, server = origin
+    provider = _provider(tmp_path, base)
+    assert provider.run() == []
+    assert sorted(provider.results.values()) == [DOWNLOADED] * len(NAMES)
+    assert len(server.hits) == len(NAMES)
+    for name in NAMES:
+        assert os.path.isfile(str(tmp_path / "dataset" / name / "train" / "0.jpg"))
+
+    provider = _provider(tmp_path, base, dest="dataset_warm")
+    assert provider.run() == []
+    assert sorted(provider.results.values()) == [CACHED] * len(NAMES)
+    assert len(server.hits) == len(NAMES)
+
+    provider = _provider(tmp_path, base)
+    provider.run()
+    assert sorted(provider.results.values()) == [SKIPPED] * len(NAMES)
+
+
+def test_write_does_not_touch_cache(tmp_path, origin):
+    """
+    标注列表复制为可写文件, 图片硬链接到只读的缓存
+    """
+    _, base, _ = origin
+    provider = _provider(tmp_path, base)
+    provider.run()
+    tree = os.path.join(provider.cache_dir, "trees", os.listdir(os.path.join(provider.cache_dir, "trees"))[0])
+    name = os.listdir(tree)[0]
+    cached_list = os.path.join(tree, name, "train_list.txt")
+    target_list = str(tmp_path / "dataset" / name / "train_list.txt")
+    with open(target_list, "w") as f:
+        f.write("rewritten\n")
+    with open(cached_list) as f:
+        assert f.read() == "train/0.jpg 0\n"
+
+    cached_image = os.path.join(tree, name, "train", "0.jpg")
+    target_image = str(tmp_path / "dataset" / name / "train" / "0.jpg")
+    assert os.stat(cached_image).st_ino == os.stat(target_image).st_ino
+    assert not os.stat(target_image).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+
+
+def test_resume_partial_download(tmp_path, origin):
+    """
+    中断留下一半的.part, 再次下载从断点续传且sha1与源一致
+    """
+    root, base, server = origin
+    provider = DatasetProvider(cache_dir=str(tmp_path / "cache"))
+    url = base + NAMES[0] + ".tar"
+    key = hashlib.sha1(url.encode()).hexdigest()
+    with open(str(root / (NAMES[0] + ".tar")), "rb") as f:
+        data = f.read()
+    with open(provider._path("tmp", key + ".part"), "wb") as f:
+        f.write(data[: len(data) // 2])
+    provider.add(url, str(tmp_path / "dataset"))
+    assert provider.run() == []
+    with open(provider._path("refs", key + ".json")) as f:
+        assert json.load(f)["sha1"] == hashlib.sha1(data).hexdigest()
+    assert os.path.isfile(str(tmp_path / "dataset" / NAMES[0] / "train" / "0.jpg"))
+
+
+def test_failed_url(tmp_path, origin):
+    """
+    单个url失败不影响其他数据集
+    """
+    _, base, _ = origin
+    provider = DatasetProvider(cache_dir=str(tmp_path / "cache"), workers=2, retries=1)
+    provider.add(base + "missing.tar", str(tmp_path / "dataset"))
+    provider.add(base + NAMES[0] + ".tar", str(tmp_path / "dataset"))
+    assert provider.run() == [base + "missing.tar"]
+    assert provider.results[base + NAMES[0] + ".tar"] == DOWNLOADED
@@ -5,6 +5,7 @@
 import os
 import sys
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 
 class PaddleClas_small_data(object):
@@ -23,6 +24,29 @@ class PaddleClas_small_data(object):
         self.extra_path = extra_path
         self.max_file = max_file
         self.split_flag = split_flag
+        # 图片复制任务, 遍历时收集, 之后并行执行
+        self.copy_jobs = []
+        self.workers = int(os.getenv("SMALL_DATA_WORKERS", "8"))
+
+    def link_or_copy(self, data_org_path, data_target_path):
+        """
+        优先硬链接, 跨设备或不支持时复制
+        """
+        if os.path.exists(data_target_path) is True:
+            print("#### already have :", data_target_path)
+            os.remove(data_target_path)
+        try:
+            os.link(data_org_path, data_target_path)
+        except OSError:
+            shutil.copy(data_org_path, data_target_path)
+
+    def run_copy_jobs(self):
+        """
+        并行执行收集到的图片复制任务
+        """
+        with ThreadPoolExecutor(self.workers) as pool:
+            list(pool.map(lambda job: self.link_or_copy(*job), self.copy_jobs))
+        self.copy_jobs = []
 
     def image_endswith_flag(self, value=None):
         """
@@ -67,10 +91,7 @@ class PaddleClas_small_data(object):
             else:
                 if self.image_endswith_flag(value):
                     if index < self.num:  # 复制50张
-                        if os.path.exists(data_target_path) is True:
-                            print("#### already have :", data_target_path)
-                            os.remove(data_target_path)
-                        shutil.copy(data_org_path, data_target_path)
+                        self.copy_jobs.append((data_org_path, data_target_path))
                 elif os.path.isdir(os.path.join(data_org, value)):
                     # print('####data_org', data_org)
                     # print('####value', value)
@@ -147,6 +168,8 @@ class PaddleClas_small_data(object):
         """
         # 执行复制程序
         self.copy_deep_image(self.data_org, self.data_target)
+        # copy_deep_txt按图片是否存在筛选标注, 需要图片先复制完成
+        self.run_copy_jobs()
         self.copy_deep_txt(self.data_org, self.data_target)
 
 
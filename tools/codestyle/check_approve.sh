@@ -8,13 +8,19 @@ export PYTHONPATH=$DIR:$PYTHONPATH
 
 ignore="safecheck.py"
 
+files=()
 for file in $(git diff --name-only pr_${AGILE_PULL_ID} ${AGILE_COMPILE_BRANCH}); do
     if [[ ${file} =~ ${ignore} ]]; then
         echo "ignore safecheck.py"
     else
-        python ./tools/codestyle/safecheck.py ${file};
-        TOTAL_ERRORS=$(expr $TOTAL_ERRORS + $?);
+        files+=(${file})
     fi
 done
 
+# 一次调用批量检查全部改动文件, 未变化的文件命中缓存
+if [[ ${#files[@]} -gt 0 ]]; then
+    python ./tools/codestyle/safecheck.py ${files[@]};
+    TOTAL_ERRORS=$(expr $TOTAL_ERRORS + $?);
+fi
+
 exit $TOTAL_ERRORS
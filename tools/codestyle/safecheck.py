@@ -2,8 +2,14 @@
 # -*- coding: utf-8 -*-
 # encoding=utf-8 vi:ts=4:sw=4:expandtab:ft=python
 """ code style custom rule """
+import os
 import re
 import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 regex = [
     r".*@baidu\.com",
@@ -15,6 +21,13 @@ regex = [
 
 while_list = ["127.0.0.1", "4.4.0.46"]
 
+compiled = [re.compile(r) for r in regex]
+# 每条规则命中的必要条件合并为一个前置过滤, 只有命中的行才逐条规则检查;
+# 不直接合并regex, 开头的.*会使每个位置都扫描到行尾
+prefilter = re.compile(r"@baidu|username|password|\d\.\d{1,3}\.\d{1,3}\.\d")
+# 规则或白名单变化时缓存失效
+RULES_VERSION = hashlib.sha1(json.dumps([regex, while_list]).encode()).hexdigest()
+
 
 def check(file):
     """ check """
@@ -31,6 +44,257 @@ def check(file):
         print(e)
 
 
+def scan_text(text):
+    """scan text, return findings, one per line, same rule order as check"""
+    findings = []
+    hit = prefilter.search(text)
+    while hit:
+        line_start = text.rfind("\n", 0, hit.start()) + 1
+        line_end = text.find("\n", hit.end())
+        line = text[line_start:] if line_end < 0 else text[line_start : line_end + 1]
+        for i, r in enumerate(compiled):
+            match = r.search(line)
+            if match and match.group() not in while_list:
+                findings.append(
+                    {
+                        "line": text.count("\n", 0, line_start) + 1,
+                        "rule": i,
+                        "match": match.group(),
+                        "text": line.rstrip("\n"),
+                    }
+                )
+                break
+        if line_end < 0:
+            break
+        hit = prefilter.search(text, line_end + 1)
+    return findings
+
+
+def scan_file(file):
+    """scan one file, return (file, status, findings)"""
+    try:
+        with open(file, encoding="utf-8") as f:
+            text = f.read()
+    except FileNotFoundError:
+        return file, "missing", []
+    except UnicodeDecodeError:
+        return file, "binary", []
+    return file, "ok", scan_text(text)
+
+
+def file_sha1(file):
+    """sha1 of file content"""
+    with open(file, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def collect(paths):
+    """expand dirs to files, skip .git"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if d != ".git")
+                files.extend(os.path.join(root, name) for name in sorted(names))
+        else:
+            files.append(path)
+    return files
+
+
+class ScanCache(object):
+    """
+    结果缓存: files记录 path -> [mtime_ns, size, sha1], 未变化的文件不重新计算hash;
+    results记录 sha1 -> findings, 内容相同的文件只扫描一次
+    """
+
+    def __init__(self, path):
+        """load cache"""
+        self.path = path
+        self.files = {}
+        self.results = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                if data.get("rules") == RULES_VERSION:
+                    self.files = data["files"]
+                    self.results = data["results"]
+            except (ValueError, KeyError):
+                pass
+
+    def digest(self, file):
+        """content sha1, None if missing"""
+        try:
+            stat = os.stat(file)
+        except OSError:
+            return None
+        key = os.path.abspath(file)
+        entry = self.files.get(key)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+        digest = file_sha1(file)
+        self.files[key] = [stat.st_mtime_ns, stat.st_size, digest]
+        return digest
+
+    def save(self):
+        """atomic save"""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp, "w") as f:
+            json.dump({"rules": RULES_VERSION, "files": self.files, "results": self.results}, f)
+        os.replace(tmp, self.path)
+
+
+def scan(files, jobs=None, cache_path=None):
+    """
+    batch scan
+    :return: {file: findings}, stats
+    """
+    cache = ScanCache(cache_path)
+    report = {}
+    todo = {}
+    stats = {"files": len(files), "cached": 0, "scanned": 0, "missing": 0, "binary": 0}
+    for file in files:
+        digest = cache.digest(file) if cache_path else None
+        if digest is not None and digest in cache.results:
+            stats["cached"] += 1
+            report[file] = cache.results[digest]
+        else:
+            todo[file] = digest
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(todo) > 64:
+        with ProcessPoolExecutor(jobs) as pool:
+            results = list(pool.map(scan_file, todo, chunksize=64))
+    else:
+        results = [scan_file(file) for file in todo]
+    for file, status, findings in results:
+        if status != "ok":
+            stats[status] += 1
+            if status == "missing":
+                # 与check一致, 已删除的文件不报错
+                print("No such file: {}".format(file), file=sys.stderr)
+            continue
+        stats["scanned"] += 1
+        report[file] = findings
+        if todo[file] is not None:
+            cache.results[todo[file]] = findings
+    if cache_path:
+        cache.save()
+    return {file: report[file] for file in files if report.get(file)}, stats
+
+
+def to_sarif(report):
+    """SARIF 2.1.0"""
+    rules = [{"id": "safecheck/{}".format(i), "shortDescription": {"text": r}} for i, r in enumerate(regex)]
+    results = []
+    for file, findings in report.items():
+        for finding in findings:
+            results.append(
+                {
+                    "ruleId": "safecheck/{}".format(finding["rule"]),
+                    "level": "error",
+                    "message": {"text": "sensitive content: {}".format(finding["match"])},
+                    "locations": [
+                        {
+                            "physicalLocation": {
+                                "artifactLocation": {"uri": file},
+                                "region": {"startLine": finding["line"], "snippet": {"text": finding["text"]}},
+                            }
+                        }
+                    ],
+                }
+            )
+    return {
+        "version": "2.1.0",
+        "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+        "runs": [{"tool": {"driver": {"name": "safecheck", "rules": rules}}, "results": results}],
+    }
+
+
+def benchmark(files, jobs):
+    """legacy per-line x per-regex check vs prefilter vs warm cache, in one process"""
+    import tempfile
+
+    start = time.perf_counter()
+    legacy = 0
+    for file in files:
+        try:
+            with open(file, encoding="utf-8") as f:
+                for line in f:
+                    for r in regex:
+                        match = re.search(r, line)
+                        if match and match.group() not in while_list:
+                            legacy += 1
+                            break
+                    else:
+                        continue
+                    break
+        except (FileNotFoundError, UnicodeDecodeError):
+            pass
+    legacy_cost = time.perf_counter() - start
+
+    cache_path = os.path.join(tempfile.mkdtemp(), "safecheck.json")
+    start = time.perf_counter()
+    report, _ = scan(files, jobs=jobs)
+    prefilter_cost = time.perf_counter() - start
+    start = time.perf_counter()
+    scan(files, jobs=jobs, cache_path=cache_path)
+    cold_cost = time.perf_counter() - start
+    start = time.perf_counter()
+    _, stats = scan(files, jobs=jobs, cache_path=cache_path)
+    warm_cost = time.perf_counter() - start
+    os.remove(cache_path)
+    print("{} files, {} jobs, {} files with findings (legacy {})".format(len(files), jobs, len(report), legacy))
+    print("legacy regex loop  : {:.2f}s".format(legacy_cost))
+    print("prefilter regex    : {:.2f}s".format(prefilter_cost))
+    print("cold cache         : {:.2f}s".format(cold_cost))
+    print("warm cache         : {:.2f}s ({} cached)".format(warm_cost, stats["cached"]))
+
+
+def main():
+    """main"""
+    parser = argparse.ArgumentParser(description="sensitive content check")
+    parser.add_argument("paths", nargs="+", help="files or dirs")
+    parser.add_argument("--jobs", type=int, default=None, help="process number, default cpu count")
+    parser.add_argument(
+        "--cache",
+        default=os.getenv("SAFECHECK_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "safecheck.json")),
+        help="result cache file, empty to disable",
+    )
+    parser.add_argument("--format", default="text", choices=["text", "json", "sarif"], help="output format")
+    parser.add_argument("--output", default=None, help="output file, default stdout")
+    parser.add_argument("--benchmark", action="store_true", help="compare with the legacy check")
+    args = parser.parse_args()
+
+    files = collect(args.paths)
+    if args.benchmark:
+        benchmark(files, args.jobs or os.cpu_count() or 1)
+        return 0
+    if len(files) == 1:
+        # 进度信息写stderr, json/sarif输出到stdout时保持为合法json
+        print("check {}".format(files[0]), file=sys.stderr)
+    report, stats = scan(files, jobs=args.jobs, cache_path=args.cache or None)
+
+    if args.format == "text":
+        lines = []
+        for file, findings in report.items():
+            for finding in findings:
+                lines.append("error file:" + file)
+                lines.append("error line:" + finding["text"] + "\n")
+        content = "\n".join(lines)
+    elif args.format == "json":
+        content = json.dumps({"stats": stats, "findings": report}, indent=1)
+    else:
+        content = json.dumps(to_sarif(report), indent=1)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(content)
+    elif content:
+        print(content)
+    return 1 if report else 0
+
+
 if __name__ == "__main__":
-    print("check {}".format(str(sys.argv[1])))
-    check(sys.argv[1])
+    sys.exit(main())
@@ -0,0 +1,504 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+benchmark日志解析
+每种记录由Schema声明: 关键字(字面量前置过滤) + 正则(命名分组) + 各字段的类型转换;
+按块流式读取, 先用bytes.find在块内定位含关键字的候选行, 只有候选行才解码并匹配, 不会把整个文件读入内存;
+字段值用int/float/ast.literal_eval/json等转换, 不使用eval;
+命中关键字但正则不匹配、或字段转换失败的行计入统计并保留样例, 不再静默丢弃;
+build_index为大日志生成偏移索引(<log>.idx), 之后只读取索引中的行; 日志追加写入后索引从上次位置增量更新
+"""
+import os
+import re
+import ast
+import sys
+import json
+import array
+import base64
+import hashlib
+
+CHUNK_SIZE = 16 << 20
+INDEX_VERSION = 1
+
+
+def to_literal(value):
+    """
+    python字面量, 如 {'model_name': 'resnet50', 'fps': 12.3}
+    """
+    return ast.literal_eval(value.strip())
+
+
+CONVERTERS = {
+    "str": str,
+    "int": int,
+    "float": float,
+    "literal": to_literal,
+    "json": json.loads,
+}
+
+
+class Schema(object):
+    """
+    单种记录的声明
+    """
+
+    def __init__(self, name, pattern, fields=None, keyword=None):
+        """
+        :param name: 记录名称
+        :param pattern: 正则, 命名分组即字段
+        :param fields: dict, 分组名 -> 类型(CONVERTERS中的名称或callable), 未声明的分组按str
+        :param keyword: 行内必然出现的字面量, 用于前置过滤; 默认为正则中最长的字面量片段
+        """
+        self.name = name
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+        self.fields = {}
+        for group in self.regex.groupindex:
+            converter = (fields or {}).get(group, "str")
+            self.fields[group] = CONVERTERS[converter] if isinstance(converter, str) else converter
+        # str字段无需转换
+        self._typed = [(group, converter) for group, converter in self.fields.items() if converter is not str]
+        self.keyword = keyword or self._literal_of(pattern)
+        if not self.keyword:
+            raise Exception("schema {} needs a keyword for prefilter".format(name))
+
+    @staticmethod
+    def _literal_of(pattern):
+        """
+        正则中最长的无元字符片段
+        """
+        parts = re.split(r"\\.|[\[\](){}.*+?^$|]", pattern)
+        return max(parts, key=len) if parts else ""
+
+    def signature(self):
+        """
+        用于判断索引是否与schema一致
+        """
+        return "{}|{}|{}".format(self.name, self.pattern, self.keyword)
+
+    def parse(self, line):
+        """
+        :return: 字段dict; 正则不匹配返回None; 转换失败抛出ValueError
+        """
+        match = self.regex.search(line)
+        if match is None:
+            return None
+        record = match.groupdict()
+        for group, converter in self._typed:
+            value = record[group]
+            if value is None:
+                continue
+            try:
+                record[group] = converter(value)
+            except Exception as e:
+                raise ValueError("field {}={!r}: {}".format(group, value, e))
+        return record
+
+
+class ExtractStats(object):
+    """
+    解析统计
+    """
+
+    def __init__(self, max_samples=20):
+        """
+        初始化
+        """
+        self.max_samples = max_samples
+        self.bytes = 0
+        self.lines = 0
+        self.candidates = 0
+        self.records = {}
+        self.unmatched = {}
+        self.errors = {}
+        self.samples = []
+
+    def bad_line(self, kind, schema, lineno, line, reason):
+        """
+        记录无法解析的行
+        """
+        counter = self.unmatched if kind == "unmatched" else self.errors
+        counter[schema] = counter.get(schema, 0) + 1
+        if len(self.samples) < self.max_samples:
+            self.samples.append(
+                {"kind": kind, "schema": schema, "line": lineno, "text": line.rstrip("\n")[:200], "reason": reason}
+            )
+
+    @property
+    def bad(self):
+        """
+        无法解析的行数
+        """
+        return sum(self.unmatched.values()) + sum(self.errors.values())
+
+    def report(self):
+        """
+        统计结果
+        """
+        return {
+            "bytes": self.bytes,
+            "lines": self.lines,
+            "candidates": self.candidates,
+            "records": self.records,
+            "unmatched": self.unmatched,
+            "errors": self.errors,
+            "samples": self.samples,
+        }
+
+    def summary(self):
+        """
+        单行摘要, 便于打印到stderr
+        """
+        return "{} lines, {} records {}, {} unparseable lines (unmatched {}, errors {})".format(
+            self.lines, sum(self.records.values()), self.records, self.bad, self.unmatched, self.errors
+        )
+
+
+class LogExtractor(object):
+    """
+    schema驱动的日志解析
+    """
+
+    def __init__(self, schemas, max_samples=20):
+        """
+        :param schemas: Schema list
+        """
+        self.schemas = list(schemas)
+        names = [s.name for s in self.schemas]
+        if len(set(names)) != len(names):
+            raise Exception("duplicate schema name in {}".format(names))
+        self._keywords = [(s, s.keyword.encode("utf-8")) for s in self.schemas]
+        # 每个关键字单独用bytes.find查找, 比合并为一个多分支正则快一个数量级
+        self.prefilter = sorted(set(k for _, k in self._keywords))
+        self.max_samples = max_samples
+        self.stats = None
+
+    def _candidates(self, f, start=0, end=None):
+        """
+        从start开始按块读取, yield (行偏移, 行号, 行bytes), 只产出包含关键字的行
+        行号从start所在行开始计数(start=0时为文件行号)
+        """
+        f.seek(start)
+        offset = start
+        lineno = 1
+        carry = b""
+        while end is None or offset < end:
+            size = CHUNK_SIZE if end is None else min(CHUNK_SIZE, end - offset - len(carry))
+            chunk = f.read(size) if size > 0 else b""
+            if not chunk:
+                block, carry = carry, b""
+                if not block:
+                    break
+                if not block.endswith(b"\n"):
+                    block += b"\n"
+            else:
+                buf = carry + chunk
+                cut = buf.rfind(b"\n") + 1
+                if cut == 0:
+                    carry = buf
+                    continue
+                block, carry = buf[:cut], buf[cut:]
+            spans = []
+            for keyword in self.prefilter:
+                find = block.find
+                hit = find(keyword)
+                while hit >= 0:
+                    line_end = find(b"\n", hit) + 1
+                    spans.append((block.rfind(b"\n", 0, hit) + 1, line_end))
+                    hit = find(keyword, line_end)
+            if len(self.prefilter) > 1:
+                # 多个关键字命中同一行时只产出一次
+                spans = sorted(set(spans))
+            pos = 0
+            for line_start, line_end in spans:
+                lineno += block.count(b"\n", pos, line_start)
+                yield offset + line_start, lineno, block[line_start:line_end]
+                lineno += 1
+                pos = line_end
+            lineno += block.count(b"\n", pos)
+            self.stats.lines = lineno - 1
+            offset += len(block)
+            self.stats.bytes = offset - start
+            if not chunk:
+                break
+
+    def _parse(self, line_bytes, lineno):
+        """
+        解析单个候选行
+        :return: [(schema名称, record)]
+        """
+        stats = self.stats
+        stats.candidates += 1
+        line = line_bytes.decode("utf-8", errors="replace")
+        res = []
+        for schema, keyword in self._keywords:
+            if keyword not in line_bytes:
+                continue
+            try:
+                record = schema.parse(line)
+            except ValueError as e:
+                stats.bad_line("error", schema.name, lineno, line, str(e))
+                continue
+            if record is None:
+                stats.bad_line("unmatched", schema.name, lineno, line, "pattern not matched")
+                continue
+            stats.records[schema.name] = stats.records.get(schema.name, 0) + 1
+            res.append((schema.name, record))
+        return res
+
+    def iter_file(self, path):
+        """
+        流式解析整个文件, yield (schema名称, record, 行号)
+        """
+        self.stats = ExtractStats(self.max_samples)
+        with open(path, "rb") as f:
+            for _, lineno, line_bytes in self._candidates(f):
+                for name, record in self._parse(line_bytes, lineno):
+                    yield name, record, lineno
+
+    def extract(self, path, index=False):
+        """
+        解析整个文件
+        :param index: 使用并更新偏移索引
+        :return: dict, schema名称 -> record list
+        """
+        res = {s.name: [] for s in self.schemas}
+        records = self.iter_indexed(path) if index else self.iter_file(path)
+        for name, record, _ in records:
+            res[name].append(record)
+        return res
+
+    def _index_path(self, path):
+        """
+        索引文件路径
+        """
+        return path + ".idx"
+
+    def _signature(self):
+        """
+        schema整体签名
+        """
+        return hashlib.sha1("\n".join(s.signature() for s in self.schemas).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _tail_digest(f, end):
+        """
+        end之前4KB内容的hash, 用于判断已索引部分是否被改写
+        """
+        start = max(0, end - 4096)
+        f.seek(start)
+        return hashlib.sha1(f.read(end - start)).hexdigest()
+
+    def _load_index(self, path, f):
+        """
+        读取索引, 日志被截断/改写或schema变化时失效
+        """
+        index_path = self._index_path(path)
+        if not os.path.exists(index_path):
+            return None
+        try:
+            with open(index_path) as fi:
+                index = json.load(fi)
+        except ValueError:
+            return None
+        size = os.fstat(f.fileno()).st_size
+        if (
+            index.get("version") != INDEX_VERSION
+            or index.get("signature") != self._signature()
+            or index["scanned"] > size
+            or index["tail"] != self._tail_digest(f, index["scanned"])
+        ):
+            return None
+        offsets = array.array("q")
+        offsets.frombytes(base64.b64decode(index["offsets"]))
+        index["offsets"] = offsets
+        return index
+
+    def build_index(self, path):
+        """
+        生成或增量更新偏移索引, 记录所有候选行的偏移
+        :return: 候选行数, 本次扫描的字节数
+        """
+        self.stats = ExtractStats(self.max_samples)
+        with open(path, "rb") as f:
+            index = self._load_index(path, f)
+            if index is None:
+                index = {"offsets": array.array("q"), "scanned": 0, "lines": 0}
+            start = index["scanned"]
+            size = os.fstat(f.fileno()).st_size
+            # 只索引完整的行, 最后一行可能仍在写入
+            f.seek(max(start, size - CHUNK_SIZE))
+            tail = f.read(size - max(start, size - CHUNK_SIZE))
+            cut = tail.rfind(b"\n")
+            end = size - len(tail) + cut + 1 if cut >= 0 else start
+            offsets = index["offsets"]
+            for line_offset, _, _ in self._candidates(f, start, end):
+                offsets.append(line_offset)
+            index.update(
+                {
+                    "version": INDEX_VERSION,
+                    "signature": self._signature(),
+                    "scanned": end,
+                    "lines": index["lines"] + self.stats.lines,
+                    "tail": self._tail_digest(f, end),
+                    "offsets": base64.b64encode(offsets.tobytes()).decode("ascii"),
+                }
+            )
+        tmp = "{}.{}.tmp".format(self._index_path(path), os.getpid())
+        with open(tmp, "w") as fo:
+            json.dump(index, fo)
+        os.replace(tmp, self._index_path(path))
+        return len(offsets), end - start
+
+    def iter_indexed(self, path):
+        """
+        按索引只读取候选行, yield (schema名称, record, 候选行序号); 索引不存在或过期时先更新
+        """
+        self.build_index(path)
+        with open(path, "rb") as f:
+            index = self._load_index(path, f)
+            self.stats = ExtractStats(self.max_samples)
+            self.stats.lines = index["lines"]
+            for i, line_offset in enumerate(index["offsets"]):
+                f.seek(line_offset)
+                line_bytes = f.readline()
+                for name, record in self._parse(line_bytes, "#{}".format(i)):
+                    yield name, record, i
+            self.stats.bytes = index["scanned"]
+
+
+def _benchmark_schemas():
+    """
+    benchmark使用的schema
+    """
+    return [
+        Schema(
+            "step",
+            r"step: (?P<step>\d+), loss: (?P<loss>[-+.\w]+),.* ips: (?P<ips>[-+.\w]+) (?P<unit>\S+)",
+            {"step": "int", "loss": "float", "ips": "float"},
+            keyword="ips: ",
+        ),
+        Schema("final", r"\[Benchmark\]\[final result\](?P<result>\{.*\})", {"result": "literal"}),
+    ]
+
+
+def _benchmark_run(mode, log_file):
+    """
+    子进程中执行单个模式, 输出耗时与峰值内存
+    """
+    import time
+    import resource
+
+    start = time.perf_counter()
+    if mode == "legacy":
+        # 与TimeAnalyzer._distil相同: readlines后逐行split, 异常直接跳过
+        records = []
+        with open(log_file, "r") as f_object:
+            lines = f_object.readlines()
+            for line in lines:
+                if "ips:" not in line:
+                    continue
+                try:
+                    result = None
+                    line_words = line.strip().split()
+                    for i in range(len(line_words) - 1):
+                        if line_words[i] == "ips:":
+                            result = line_words[i + 1]
+                            break
+                    records.append(float(result[0:]))
+                except Exception:
+                    continue
+        info = "{} records, failures unknown".format(len(records))
+    else:
+        extractor = LogExtractor(_benchmark_schemas())
+        res = extractor.extract(log_file, index=mode == "index")
+        records = [r["ips"] for r in res["step"]]
+        info = extractor.stats.summary()
+    cost = time.perf_counter() - start
+    print(
+        "{:<7}: {:.2f}s ({:.0f}MB/s), max rss {:.0f}MB, {}".format(
+            mode,
+            cost,
+            os.path.getsize(log_file) / 1e6 / cost,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+            info,
+        )
+    )
+    print("checksum {:.6f}".format(sum(records)))
+
+
+if __name__ == "__main__":
+    # benchmark: 生成约1GB的训练日志, 对比readlines逐行解析(TimeAnalyzer._distil)、流式解析、建立索引及按索引解析
+    # python log_extractor.py [size_mb]
+    import time
+    import random
+    import tempfile
+    import subprocess
+
+    if len(sys.argv) > 2:
+        _benchmark_run(sys.argv[1], sys.argv[2])
+        sys.exit(0)
+
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    work = tempfile.mkdtemp()
+    log_file = os.path.join(work, "train.log")
+    rng = random.Random(33)
+    noise = [
+        "[2024-05-01 10:00:00,000] [    INFO] - loading batch {} from reader queue, prefetch=8\n",
+        "W0501 10:00:00.000000 12345 gpu_resources.cc:119] Please NOTE: device: 0, GPU Compute Capability: 8.0\n",
+        "[2024-05-01 10:00:00,000] [   DEBUG] - dataloader worker {} heartbeat ok, queue size 64\n",
+    ]
+    start = time.perf_counter()
+    with open(log_file, "w") as f:
+        written = 0
+        step = 0
+        while written < size_mb << 20:
+            buf = []
+            for _ in range(1000):
+                if rng.random() < 0.1:
+                    step += 1
+                    if rng.random() < 0.001:
+                        # 异常行: 数值被截断
+                        line = (
+                            "[2024-05-01 10:00:00,000] [    INFO] - epoch: 0, step: {}, loss: 2.3, ips: nan-\n".format(
+                                step
+                            )
+                        )
+                    else:
+                        line = (
+                            "[2024-05-01 10:00:00,000] [    INFO] - epoch: 0, step: {}, loss: {:.6f}, "
+                            "batch_cost: {:.5f} s, ips: {:.3f} images/s\n".format(
+                                step, rng.uniform(1, 3), rng.uniform(0.1, 0.3), rng.uniform(300, 400)
+                            )
+                        )
+                else:
+                    line = rng.choice(noise).format(step)
+                buf.append(line)
+                written += len(line)
+            f.write("".join(buf))
+        f.write("[Benchmark][final result]{'model_name': 'ResNet50_vd', 'ips': {'value': 350.1, 'unit': 'images/s'}}\n")
+    print("generate {:.0f}MB log: {:.1f}s".format(os.path.getsize(log_file) / 1e6, time.perf_counter() - start))
+
+    try:
+        for mode in ["legacy", "stream"]:
+            subprocess.run([sys.executable, __file__, mode, log_file])
+        extractor = LogExtractor(_benchmark_schemas())
+        start = time.perf_counter()
+        candidates, scanned = extractor.build_index(log_file)
+        print(
+            "build index: {:.2f}s, {} candidate lines, index {:.1f}MB".format(
+                time.perf_counter() - start, candidates, os.path.getsize(log_file + ".idx") / 1e6
+            )
+        )
+        subprocess.run([sys.executable, __file__, "index", log_file])
+        with open(log_file, "a") as f:
+            f.write(
+                "[2024-05-01 10:00:00,000] [    INFO] - epoch: 1, step: 1, loss: 1.0, batch_cost: 0.1 s, ips: 1 x\n"
+            )
+        start = time.perf_counter()
+        candidates, scanned = extractor.build_index(log_file)
+        print("append one line, update index: {:.3f}s, scanned {} bytes".format(time.perf_counter() - start, scanned))
+    finally:
+        for name in os.listdir(work):
+            os.remove(os.path.join(work, name))
+        os.rmdir(work)
@@ -16,9 +16,15 @@ from __future__ import print_function
 
 import argparse
 import json
+import os
 import re
+import sys
 import traceback
 
+# 仓库内从tools/下导入; run_tools8.sh拷贝到模型repo执行时log_extractor.py一同拷贝到同目录
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../.."))
+from log_extractor import LogExtractor, Schema
+
 
 def parse_args():
     parser = argparse.ArgumentParser(description=__doc__)
@@ -84,41 +90,41 @@ class TimeAnalyzer(object):
         self.records = None
         self._distil()
 
+    def _distil_line(self, line):
+        result = None
+
+        # Distil the string from a line.
+        line = line.strip()
+        line_words = line.split(self.separator) if self.separator else line.split()
+        if self.position:  # 明确切分后result的位置
+            result = line_words[self.position]
+        else:
+            # Distil the string following the keyword.
+            for i in range(len(line_words) - 1):
+                if line_words[i] == self.keyword:
+                    result = line_words[i + 1]
+                    break
+        if result is None:
+            raise ValueError("no value after keyword {}".format(self.keyword))
+
+        # Distil the result from the picked string.
+        if not self.range:
+            result = result[0:]
+        elif _is_number(self.range):
+            result = result[0: int(self.range)]
+        else:
+            result = result[int(self.range.split(":")[0]): int(self.range.split(":")[1])]
+        return float(result)
+
     def _distil(self):
-        self.records = []
-        with open(self.filename, "r") as f_object:
-            lines = f_object.readlines()
-            for line in lines:
-                if self.keyword not in line:
-                    continue
-                try:
-                    result = None
-
-                    # Distil the string from a line.
-                    line = line.strip()
-                    line_words = line.split(self.separator) if self.separator else line.split()
-                    if args.position:  # 明确切分后result的位置
-                        result = line_words[self.position]
-                    else:
-                        # Distil the string following the keyword.
-                        for i in range(len(line_words) - 1):
-                            if line_words[i] == self.keyword:
-                                result = line_words[i + 1]
-                                break
-
-                    # Distil the result from the picked string.
-                    if not self.range:
-                        result = result[0:]
-                    elif _is_number(self.range):
-                        result = result[0: int(self.range)]
-                    else:
-                        result = result[int(self.range.split(":")[0]): int(self.range.split(":")[1])]
-                    self.records.append(float(result))
-                except Exception as exc:
-                    continue
-                    # print("line is: {}; separator={}; position={}".format(line, self.separator, self.position))
-
-        # print("Extract {} records: separator={}; position={}".format(len(self.records), self.separator, self.position))
+        # 流式读取, 含keyword但无法解析的行计数后输出到stderr, stdout只保留ips结果
+        schema = Schema("record", r"(?P<value>.*)", {"value": self._distil_line}, keyword=self.keyword)
+        extractor = LogExtractor([schema])
+        self.records = [record["value"] for _, record, _ in extractor.iter_file(self.filename)]
+        if extractor.stats.bad:
+            sys.stderr.write("{}: {}\n".format(self.filename, extractor.stats.summary()))
+            for sample in extractor.stats.samples:
+                sys.stderr.write("    line {line}: {reason}: {text}\n".format(**sample))
 
     def _get_fps(self, mode, batch_size, gpu_num, avg_of_records, run_mode, unit=None):
         if mode == -1 and run_mode == 'sp':
@@ -208,4 +214,4 @@ if __name__ == "__main__":
             print("Not support!")
     except Exception:
         traceback.print_exc()
-    print("{" + '"ips": {}'.format(str(run_info["FINAL_RESULT"]) + "}", end='')
+    print("{" + '"ips": {}'.format(str(run_info["FINAL_RESULT"])) + "}", end='')
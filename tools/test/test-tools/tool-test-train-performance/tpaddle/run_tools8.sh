@@ -208,6 +208,7 @@ if [ $1 = "ResNet50_vd" ];then
     rm -rf run_ResNet50_vd.sh;
     cp ${tools_path}/run_ResNet50_vd.sh ./
     cp ${tools_path}/analysis.py ./
+    cp ${tools_path}/../../../../log_extractor.py ./
     if [ $2 = "1" ];then
         dynamic_ResNet50_vd_bs64_1_1_sp
     elif [ $2 = "8" ];then
@@ -220,6 +221,7 @@ elif [ $1 = "MobileNetV1" ];then
     rm -rf run_MobileNetV1.sh
     cp ${tools_path}/run_MobileNetV1.sh ./
     cp ${tools_path}/analysis.py ./
+    cp ${tools_path}/../../../../log_extractor.py ./
 
     if [ $2 = "1" ];then
         dynamic_MobileNetV1_bs128_1_sp
@@ -233,6 +235,7 @@ elif [ $1 = "yolov3" ];then
     rm -rf run_yolov3.sh
     cp ${tools_path}/run_yolov3.sh ./
     cp ${tools_path}/analysis.py ./
+    cp ${tools_path}/../../../../log_extractor.py ./
     if [ $2 = "1" ];then
         dynamic_yolov3_bs8_1_sp
     elif [ $2 = "8" ];then